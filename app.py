@@ -1,3 +1,4 @@
+import os
 import sys
 from flask import Flask
 
@@ -5,8 +6,10 @@ from flask import Flask
 sys.modules['app'] = sys.modules.get(__name__)
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from utils.replica import RoutingSession
 
-db = SQLAlchemy()
+# Reads on reporting endpoints may go to the 'replica' bind (utils/replica.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
 # If this file is executed as a script, ensure imports of `app` (from other modules)
@@ -16,21 +19,39 @@ login_manager = LoginManager()
 if __name__ == "__main__":
     sys.modules.setdefault('app', sys.modules.get('__main__'))
 
-def create_app():
+def create_app(test_config=None, config_name=None):
     app = Flask(__name__)
-    app.config['SECRET_KEY'] = 'hospital-management-system-secret-key-2025'
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///hospital.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['REMEMBER_COOKIE_DURATION'] = 86400 * 7  # 7 days
-    app.config['REMEMBER_COOKIE_SECURE'] = False  # Set to True in production with HTTPS
-    app.config['PERMANENT_SESSION_LIFETIME'] = 86400 * 7  # 7 days
+    
+    # Settings come from config.py; FLASK_CONFIG picks the class
+    from config import config
+    app.config.from_object(config[config_name or os.environ.get('FLASK_CONFIG', 'default')])
+    
+    # Overrides for tests and scripts (e.g. a separate database file)
+    if test_config:
+        app.config.update(test_config)
     
     # Initialize extensions
     db.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     
+    # Raise on template lazy loads in debug mode
+    from utils import lazy_loads
+    lazy_loads.init_app(app)
+    
     with app.app_context():
+        # WAL, busy timeout and cache PRAGMAs on every pooled SQLite connection
+        from utils import sqlite_profile
+        sqlite_profile.init_app(app)
+        
+        # Per-endpoint latency, SQL and lazy-load metrics when INSTRUMENTATION_ENABLED
+        from utils import instrumentation
+        instrumentation.init_app(app)
+        
+        # Statements over SLOW_QUERY_MS are kept with their plan for /admin/slow-queries
+        from utils import slow_queries
+        slow_queries.init_app(app)
+        
         # Import models after app context
         from models.user import User
         from models.department import Department
@@ -38,9 +59,55 @@ def create_app():
         from models.patient import Patient
         from models.appointment import Appointment
         from models.treatment import Treatment, DoctorAvailability
+        from models.stats_counter import StatsCounter
+        from models.patient_phone import PatientPhone
+        from models.schedule_version import ScheduleVersion
+        from models.doctor_queue import DoctorQueue
+        from models.job import Job
+        from models.identity_version import IdentityVersion
+        
+        # Keep dashboard counters current on every flush
+        from utils import counters
+        counters.init_app(app)
+        
+        # Keep the normalized phone lookup table current
+        from utils import phones
+        phones.init_app(app)
+        
+        # Per-(doctor, date) booking bitmaps, versioned in the database
+        from utils import schedule_cache
+        schedule_cache.init_app(app)
         
-        # Create all tables
-        db.create_all()
+        # Publish committed appointment and queue changes to live subscribers
+        from utils import events
+        events.init_app(app)
+        
+        # Deferred side effects run by background workers (flask run-jobs)
+        from utils import jobs
+        jobs.init_app(app)
+        
+        # Nightly appointment reminders (flask send-reminders)
+        from utils import reminders
+        reminders.init_app(app)
+        
+        # Cache the logged-in user's identity across requests
+        from utils import identity
+        identity.init_app(app)
+        
+        # Route reporting endpoints to the read replica when one is configured
+        from utils import replica
+        replica.init_app(app)
+        
+        # Create all tables on the primary (a replica is a copy of it)
+        db.create_all(bind_key=None)
+        
+        # Apply versioned schema changes (indexes etc.) to existing databases
+        from utils.migrations import run_migrations
+        run_migrations()
+        
+        # Search by FTS5 where migration 4 built the index, ILIKE otherwise
+        from utils import search
+        search.init_app(app)
         
         # Create default departments if they don't exist
         if db.session.query(Department).count() == 0:
@@ -74,8 +141,8 @@ def create_app():
     
     @login_manager.user_loader
     def load_user(user_id):
-        from models.user import User
-        return db.session.query(User).get(int(user_id))
+        from utils.identity import load_user as load_identity
+        return load_identity(int(user_id))
     
     @app.route('/')
     def index():
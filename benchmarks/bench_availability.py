@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""
+Benchmark: a 30-day calendar of free slots for every doctor, built with one
+query per doctor and day (the obvious implementation) vs utils/availability.py
+(one query for the whole range, then the warm schedule cache), and
+GET /api/doctors/<id>/slots per doctor.
+
+Usage: python benchmarks/bench_availability.py [doctors] [days]
+Default: 200 doctors, 30 days, about half of the upcoming slots booked and
+200000 past appointments.
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models.user import User
+from models.doctor import Doctor
+from models.patient import Patient
+from models.appointment import Appointment
+from models.department import Department
+from models.treatment import DoctorAvailability
+from utils.availability import Schedule, free_slots, to_minutes
+from utils.schedule_cache import DayCalendar, current_cache
+
+PATIENTS = 20000
+HISTORY = 200000
+REPEAT = 5
+SESSIONS = [('09:00', '13:00', '14:00', '18:00'), ('08:00', '12:00', '16:00', '20:00'), ('10:00', '14:00', '', '')]
+
+def seed(doctors, days):
+    rng = random.Random(7)
+    departments = [d.id for d in Department.query.all()]
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'user{i}', 'email': f'user{i}@bench.test', 'password_hash': 'x',
+         'role': 'doctor' if i < doctors else 'patient'} for i in range(doctors + PATIENTS)])
+    rows = []
+    for i in range(doctors):
+        morning_start, morning_end, evening_start, evening_end = SESSIONS[i % len(SESSIONS)]
+        rows.append({'user_id': i + 1, 'department_id': departments[i % len(departments)],
+                     'working_days': rng.choice(['Mon-Fri', 'Mon-Sat', 'Mon, Wed, Fri', 'Daily']),
+                     'morning_slot_start': morning_start, 'morning_slot_end': morning_end,
+                     'evening_slot_start': evening_start, 'evening_slot_end': evening_end,
+                     'avg_consultation_time': rng.choice([15, 20, 30]), 'is_available': True})
+    db.session.execute(Doctor.__table__.insert(), rows)
+    db.session.execute(Patient.__table__.insert(), [{'user_id': doctors + i + 1} for i in range(PATIENTS)])
+
+    today = date.today()
+    history = [{'patient_id': rng.randrange(PATIENTS) + 1, 'doctor_id': rng.randrange(doctors) + 1,
+                'appointment_date': today - timedelta(days=rng.randrange(1, 730)),
+                'appointment_time': f'{9 + i % 9:02d}:00', 'status': 'Completed'} for i in range(HISTORY)]
+    db.session.execute(Appointment.__table__.insert(), history)
+
+    # Book about half of every doctor's upcoming slots, and give some a day off
+    upcoming, overrides = [], []
+    now = datetime(2000, 1, 1)
+    for doctor in Doctor.query.all():
+        for day, minutes in Schedule(doctor).free_slots(today, today + timedelta(days=days - 1), {}, now):
+            if rng.random() < 0.5:
+                upcoming.append({'patient_id': rng.randrange(PATIENTS) + 1, 'doctor_id': doctor.id,
+                                 'appointment_date': day, 'appointment_time': f'{minutes // 60:02d}:{minutes % 60:02d}',
+                                 'status': 'Booked'})
+        if rng.random() < 0.3:
+            overrides.append({'doctor_id': doctor.id, 'date': today + timedelta(days=rng.randrange(days)),
+                              'is_available': False})
+    db.session.execute(Appointment.__table__.insert(), upcoming)
+    db.session.execute(DoctorAvailability.__table__.insert(), overrides)
+    db.session.commit()
+    return len(upcoming)
+
+def per_day(doctors, start, end):
+    """One bookings query and one overrides query per doctor and day"""
+    calendar = {}
+    for doctor in doctors:
+        schedule, slots = Schedule(doctor), []
+        day = start
+        while day <= end:
+            booked = [to_minutes(time) for time, in db.session.query(Appointment.appointment_time).filter(
+                Appointment.doctor_id == doctor.id, Appointment.appointment_date == day,
+                Appointment.status.in_(['Booked', 'Confirmed']))]
+            overrides = [(row.start_time, row.end_time, row.is_available)
+                         for row in DoctorAvailability.query.filter_by(doctor_id=doctor.id, date=day)]
+            slots.extend(schedule.free_slots(day, day, {day: DayCalendar(0, schedule.step, booked, overrides)}))
+            day += timedelta(days=1)
+        calendar[doctor.id] = slots
+    return calendar
+
+def ranged(doctors, start, end, warm=False):
+    if not warm:
+        current_cache().clear()
+    return {doctor_id: list(stream) for doctor_id, stream in free_slots(doctors, start, end).items()}
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, result
+
+def main(doctors=200, days=30):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/bench.db'})
+        with app.app_context():
+            booked = seed(doctors, days)
+            admin = User(username='bench-admin', email='admin@bench.test', password_hash='x', role='admin')
+            db.session.add(admin)
+            db.session.commit()
+            admin_id = admin.id
+            print(f'{doctors} doctors, {days} days, {booked} upcoming bookings')
+
+            start = date.today() + timedelta(days=1)
+            end = start + timedelta(days=days - 1)
+            everyone = Doctor.query.all()
+            legacy_ms, legacy = timed(lambda: per_day(everyone, start, end), 1)
+            ranged_ms, result = timed(lambda: ranged(everyone, start, end), REPEAT)
+            cached_ms, cached = timed(lambda: ranged(everyone, start, end, warm=True), REPEAT)
+            assert legacy == result == cached
+            slots = sum(len(found) for found in result.values())
+            print(f"{'method':>28} | {'ms':>8} | {'free slots':>10}")
+            print(f"{'query per doctor and day':>28} | {legacy_ms:>8.1f} | {slots:>10}")
+            print(f"{'one range query':>28} | {ranged_ms:>8.1f} | {slots:>10}")
+            print(f"{'schedule cache (warm)':>28} | {cached_ms:>8.1f} | {slots:>10}")
+            db.session.remove()
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin_id)
+            sess['_fresh'] = True
+        timings = []
+        for doctor_id in range(1, doctors + 1):
+            started = time.perf_counter()
+            response = client.get(f'/api/doctors/{doctor_id}/slots?from={start}&days={days}')
+            timings.append(time.perf_counter() - started)
+            assert response.status_code == 200
+        timings.sort()
+        print(f'GET /api/doctors/<id>/slots ({days} days): median {statistics.median(timings) * 1000:.2f} ms, '
+              f'p95 {timings[int(len(timings) * 0.95)] * 1000:.2f} ms, all {doctors} doctors {sum(timings) * 1000:.0f} ms')
+
+        with app.app_context():
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Benchmark: /api/bulk import throughput (rows/s) for patients, doctors and
+appointments, NDJSON and CSV bodies, at a few batch sizes.
+
+Usage: python benchmarks/bench_bulk_import.py [rows]
+Default is 50000 rows per import. Each run uses a fresh SQLite file.
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models.user import User
+from models.department import Department
+
+def patient_rows(count, prefix):
+    return [{'username': f'{prefix}{i}', 'email': f'{prefix}{i}@bench.test', 'phone': f'9{i:09d}',
+             'city': 'Pune', 'date_of_birth': '1990-01-01', 'password_hash': 'pbkdf2:sha256:1$x$y'}
+            for i in range(count)]
+
+def doctor_rows(count, prefix, department_ids):
+    return [{'username': f'{prefix}{i}', 'email': f'{prefix}{i}@bench.test',
+             'department_id': department_ids[i % len(department_ids)], 'license_number': f'{prefix}-{i}'}
+            for i in range(count)]
+
+def appointment_rows(count, patients, doctors):
+    rng = random.Random(7)
+    start = date(2020, 1, 1)
+    return [{'patient_id': rng.randint(1, patients), 'doctor_id': rng.randint(1, doctors),
+             'appointment_date': (start + timedelta(days=i // 40)).isoformat(),
+             'appointment_time': f'{9 + i % 8:02d}:{i % 40 // 8 * 10:02d}', 'status': 'Completed'}
+            for i in range(count)]
+
+def encode(rows, fmt):
+    if fmt == 'ndjson':
+        return '\n'.join(json.dumps(row) for row in rows).encode()
+    names = list(rows[0])
+    lines = [','.join(names)] + [','.join(str(row[name]) for name in names) for row in rows]
+    return '\n'.join(lines).encode()
+
+def run(client, kind, body, fmt, batch_size):
+    started = time.perf_counter()
+    resp = client.post(f'/api/bulk/{kind}?format={fmt}&batch_size={batch_size}', data=body)
+    elapsed = time.perf_counter() - started
+    report = resp.get_json()['data']
+    assert not report['errors'], report['errors'][:3]
+    return report['inserted'], elapsed
+
+def main(rows):
+    print(f"{'import':>12} | {'format':>6} | {'batch':>5} | {'rows':>6} | {'seconds':>7} | {'rows/s':>7}")
+    for fmt in ('ndjson', 'csv'):
+        for batch_size in (500, 2000, 10000):
+            with tempfile.TemporaryDirectory() as tmp:
+                app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/bench.db'})
+                with app.app_context():
+                    admin = User(username='bench-admin', email='admin@bench.test', password_hash='x', role='admin')
+                    db.session.add(admin)
+                    db.session.commit()
+                    admin_id = admin.id
+                    department_ids = [d.id for d in Department.query.all()]
+                    db.session.remove()
+
+                client = app.test_client()
+                with client.session_transaction() as sess:
+                    sess['_user_id'] = str(admin_id)
+                    sess['_fresh'] = True
+
+                doctors = max(rows // 100, 1)
+                imports = [
+                    ('patients', patient_rows(rows, 'p')),
+                    ('doctors', doctor_rows(doctors, 'd', department_ids)),
+                    ('appointments', appointment_rows(rows, rows, doctors)),
+                ]
+                for kind, data in imports:
+                    inserted, elapsed = run(client, kind, encode(data, fmt), fmt, batch_size)
+                    print(f'{kind:>12} | {fmt:>6} | {batch_size:>5} | {inserted:>6} | {elapsed:>7.2f}'
+                          f' | {inserted / elapsed:>7.0f}')
+
+                with app.app_context():
+                    db.engine.dispose()
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Benchmark: /api/appointments/export throughput and peak Python memory, which
+should stay flat as the number of exported rows grows.
+
+Usage: python benchmarks/bench_export.py [appointment counts...]
+Default sizes are 100000 1000000. Each size uses a fresh SQLite file.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models.user import User
+from bench_stats import seed
+
+def stream(client, url):
+    """Consume a streamed response chunk by chunk; returns (bytes, lines)"""
+    resp = client.get(url, buffered=False)
+    size = lines = 0
+    for chunk in resp.response:
+        size += len(chunk)
+        lines += chunk.count(b'\n') if isinstance(chunk, bytes) else chunk.count('\n')
+    resp.close()
+    return size, lines
+
+def main(sizes):
+    print(f"{'appointments':>12} | {'format':>6} | {'rows':>8} | {'MB out':>7} | {'rows/s':>9} | {'peak MB':>7}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/bench.db'})
+            with app.app_context():
+                seed(size)
+                admin = User(username='bench-admin', email='admin@bench.test', password_hash='x', role='admin')
+                db.session.add(admin)
+                db.session.commit()
+                admin_id = admin.id
+                db.session.remove()
+
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(admin_id)
+                sess['_fresh'] = True
+
+            for fmt in ('ndjson', 'csv'):
+                tracemalloc.start()
+                started = time.perf_counter()
+                out, lines = stream(client, f'/api/appointments/export?format={fmt}')
+                elapsed = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                rows = lines - (fmt == 'csv')
+                print(f'{size:>12} | {fmt:>6} | {rows:>8} | {out / 2**20:>7.1f} | {rows / elapsed:>9.0f}'
+                      f' | {peak / 2**20:>7.1f}')
+
+            with app.app_context():
+                db.engine.dispose()
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100000, 1000000])
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Benchmark: cost of the request instrumentation (utils/instrumentation.py).
+
+Two apps share one seeded database, one with INSTRUMENTATION_ENABLED and one
+without. Rounds of the same request mix (doctor list, one doctor, one
+patient's appointments) alternate between them so drift in the machine hits
+both equally. Reported: median per-request latency of each app and the
+overhead of the instrumented one, as the median of the per-round on/off
+ratios (each pair of rounds runs back to back, so slow patches of the
+machine cancel out).
+
+Usage: python benchmarks/bench_instrumentation.py [rounds]
+Default: 40 rounds of 50 requests per app.
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models.user import User
+import bench_availability
+
+DOCTORS = 50
+URLS = ['/api/doctors', '/api/doctors/1', '/api/appointments?patient_id=1', '/api/doctors/2/slots']
+PER_ROUND = 50
+
+def logged_in_client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    return client
+
+def run_round(client):
+    started = time.perf_counter()
+    for n in range(PER_ROUND):
+        response = client.get(URLS[n % len(URLS)])
+        assert response.status_code == 200, response.status_code
+    return (time.perf_counter() - started) / PER_ROUND
+
+def main(rounds=40):
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = f'sqlite:///{tmp}/bench.db'
+        plain = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'JOB_WORKERS': 0})
+        with plain.app_context():
+            bench_availability.HISTORY = 5000
+            bench_availability.seed(DOCTORS, 1)
+            admin = User(username='bench-admin', email='admin@bench.test', password_hash='x', role='admin')
+            db.session.add(admin)
+            db.session.commit()
+            admin_id = admin.id
+        instrumented = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'JOB_WORKERS': 0,
+                                   'INSTRUMENTATION_ENABLED': True})
+        clients = {'off': logged_in_client(plain, admin_id), 'on': logged_in_client(instrumented, admin_id)}
+
+        for client in clients.values():
+            run_round(client)  # warm up
+        timings = {'off': [], 'on': []}
+        for n in range(rounds):
+            order = ('off', 'on') if n % 2 else ('on', 'off')
+            for label in order:
+                timings[label].append(run_round(clients[label]))
+
+        off, on = (statistics.median(timings[label]) * 1000 for label in ('off', 'on'))
+        print(f'{rounds} rounds x {PER_ROUND} requests per app over {len(URLS)} endpoints')
+        print(f"{'instrumentation':>15} | {'median ms/request':>17}")
+        print(f"{'off':>15} | {off:>17.3f}")
+        print(f"{'on':>15} | {on:>17.3f}")
+        overhead = statistics.median(a / b for a, b in zip(timings['on'], timings['off'])) - 1
+        print(f'overhead: {overhead * 100:+.2f}% (median of paired rounds)')
+        with instrumented.app_context():
+            recorded = sum(row['requests'] for row in instrumented.extensions['instrumentation'].rows())
+            print(f'instrumented app recorded {recorded} requests')
+        for app in (plain, instrumented):
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Benchmark: POST /api/appointments with the doctor/patient totals and the
+dashboard counters updated inside the booking transaction (as before) vs
+deferred to a background job (utils/jobs.py), plus how fast a runner drains
+the queued jobs.
+
+The inline variant books with SlotReservation and runs the job's handler in
+the request instead of queueing it. Reported: median and p95 booking
+latency, time the write transaction is held (first write to commit), the
+statements each booking transaction writes per table, and job throughput.
+
+Usage: python benchmarks/bench_jobs.py [bookings]
+Default: 2000 bookings spread over 200 doctors.
+"""
+
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from app import create_app, db
+from models.user import User
+from utils import booking
+from utils.jobs import current_runner
+import bench_availability
+import routes.api
+
+DOCTORS = 200
+
+def inline_booking(patient_id, doctor_id, appointment_date, appointment_time, **fields):
+    """The old behaviour: counters (flush hook) and totals written in the booking transaction"""
+    appointment = booking.SlotReservation().book(patient_id, doctor_id, appointment_date, appointment_time,
+                                                 **fields)
+    booking.record_booking({'doctor_id': doctor_id, 'patient_id': patient_id,
+                            'booked_at': datetime.now().isoformat()})
+    return appointment
+
+WRITE = re.compile(r'^(?:INSERT INTO|UPDATE|DELETE FROM)\s+"?(\w+)', re.IGNORECASE)
+
+def write_spans(engine):
+    """
+    Record, per transaction, the time from its first write statement to
+    commit, and count the write statements per (verb, table)
+    """
+    spans, first, writes = [], {}, Counter()
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        match = WRITE.match(statement)
+        if match:
+            first.setdefault(id(conn), time.perf_counter())
+            writes[statement.split(None, 1)[0].upper(), match.group(1)] += 1
+
+    def commit(conn):
+        started = first.pop(id(conn), None)
+        if started is not None:
+            spans.append(time.perf_counter() - started)
+
+    event.listen(engine, 'before_cursor_execute', before)
+    event.listen(engine, 'commit', commit)
+    return spans, writes
+
+def book_all(client, bookings, offset):
+    timings = []
+    day = date.today() + timedelta(days=90 + offset)
+    for n in range(bookings):
+        doctor_id = n % DOCTORS + 1
+        slot = n // DOCTORS
+        started = time.perf_counter()
+        response = client.post('/api/appointments', json={
+            'patient_id': n % 1000 + 1, 'doctor_id': doctor_id, 'appointment_date': day.isoformat(),
+            'appointment_time': f'{8 + slot // 4:02d}:{slot % 4 * 15:02d}'})
+        timings.append(time.perf_counter() - started)
+        assert response.status_code == 201, response.get_json()
+    timings.sort()
+    return statistics.median(timings) * 1000, timings[int(len(timings) * 0.95)] * 1000
+
+def main(bookings=2000):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/bench.db', 'JOB_WORKERS': 0})
+        with app.app_context():
+            bench_availability.HISTORY = 20000
+            bench_availability.seed(DOCTORS, 1)
+            admin = User(username='bench-admin', email='admin@bench.test', password_hash='x', role='admin')
+            db.session.add(admin)
+            db.session.commit()
+            admin_id = admin.id
+            spans, writes = write_spans(db.engine)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin_id)
+            sess['_fresh'] = True
+
+        print(f'{bookings} bookings over {DOCTORS} doctors')
+        print(f"{'totals, counters':>22} | {'median ms':>9} | {'p95 ms':>7} | {'write txn ms (median)':>21}")
+        deferred = routes.api.book_deferred
+        for offset, (label, book) in enumerate([('inline in the booking', inline_booking),
+                                                ('deferred to a job', deferred)]):
+            routes.api.book_deferred = book
+            spans.clear()
+            writes.clear()
+            median, p95 = book_all(client, bookings, offset)
+            held = statistics.median(spans) * 1000
+            print(f'{label:>22} | {median:>9.2f} | {p95:>7.2f} | {held:>21.3f}')
+            print(' ' * 25 + 'writes per booking: ' + ', '.join(
+                f'{verb} {table} {count / bookings:g}' for (verb, table), count in sorted(writes.items())))
+        routes.api.book_deferred = deferred
+
+        with app.app_context():
+            started = time.perf_counter()
+            ran = current_runner().run_pending()
+            elapsed = time.perf_counter() - started
+            print(f'runner drained {ran} jobs in {elapsed * 1000:.0f} ms ({ran / elapsed:.0f} jobs/s, one thread)')
+            db.session.remove()
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Benchmark: POST /auth/login throughput for several password hashing policies,
+verified inline and in the process pool.
+
+Usage: python benchmarks/bench_login.py [logins per run]
+Default is 40 logins per run. "per core" divides by the cores the run could
+use: 1 for inline verification, min(workers, cpu_count) for the pool.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models.user import User
+from utils import passwords
+
+METHODS = ['scrypt', 'scrypt:16384:8:1', 'pbkdf2:sha256:1000000', 'pbkdf2:sha256:600000']
+USERS = 8
+
+def login_rate(app, logins, threads):
+    def login(i):
+        client = app.test_client()
+        resp = client.post('/auth/login', data={
+            'username': f'user{i % USERS}', 'password': 'bench-password', 'role': 'patient'})
+        assert resp.status_code == 302, resp.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(login, range(logins)))
+    return logins / (time.perf_counter() - started)
+
+def main(logins):
+    cpus = os.cpu_count() or 1
+    workers = max(cpus, 2)
+    print(f'{cpus} CPU(s) available')
+    print(f"{'method':>24} | {'mode':>12} | {'logins/s':>8} | {'per core':>8}")
+    for method in METHODS:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/bench.db',
+                              'PASSWORD_HASH_METHOD': method})
+            with app.app_context():
+                for i in range(USERS):
+                    user = User(username=f'user{i}', email=f'user{i}@bench.test', role='patient')
+                    user.set_password('bench-password')
+                    db.session.add(user)
+                db.session.commit()
+
+            inline = login_rate(app, logins, threads=1)
+            print(f'{method:>24} | {"inline":>12} | {inline:>8.1f} | {inline:>8.1f}')
+
+            app.config['PASSWORD_VERIFY_WORKERS'] = workers
+            login_rate(app, workers, threads=workers)  # start the pool processes
+            pooled = login_rate(app, logins, threads=workers * 2)
+            passwords.shutdown_pool()
+            mode = f'pool x{workers}'
+            print(f'{method:>24} | {mode:>12} | {pooled:>8.1f} | {pooled / min(workers, cpus):>8.1f}')
+
+            with app.app_context():
+                db.engine.dispose()
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 40)
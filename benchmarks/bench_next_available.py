@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Benchmark: earliest open slots across one large department, materialising
+every doctor's calendar and sorting vs utils.availability.earliest_slots
+(heap merge over growing windows), and GET /api/departments/<id>/next-available.
+
+Usage: python benchmarks/bench_next_available.py [doctors] [days booked]
+Default: 500 doctors in one department, about half of their slots booked
+for the next 14 days.
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models.user import User
+from models.doctor import Doctor
+from utils.availability import free_slots, earliest_slots
+import bench_availability
+
+COUNT = 10
+HORIZON = 62
+REPEAT = 20
+
+def materialised(doctors, start):
+    """Every free slot of every doctor up to the horizon, sorted"""
+    streams = free_slots(doctors, start, start + timedelta(days=HORIZON - 1))
+    return sorted((day, minutes, doctor_id) for doctor_id, stream in streams.items()
+                  for day, minutes in stream)[:COUNT]
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, result
+
+def main(doctors=500, days=14):
+    bench_availability.HISTORY = 50000
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/bench.db'})
+        with app.app_context():
+            booked = bench_availability.seed(doctors, days)
+            department_id = db.session.scalar(db.select(Doctor.department_id).limit(1))
+            db.session.execute(db.update(Doctor).values(department_id=department_id))
+            admin = User(username='bench-admin', email='admin@bench.test', password_hash='x', role='admin')
+            db.session.add(admin)
+            db.session.commit()
+            admin_id = admin.id
+            print(f'{doctors} doctors in one department, {booked} bookings over {days} days')
+
+            start = date.today() + timedelta(days=1)
+            everyone = Doctor.query.all()
+            full_ms, expected = timed(lambda: materialised(everyone, start), 3)
+            heap_ms, found = timed(lambda: earliest_slots(everyone, COUNT, start, horizon=HORIZON), REPEAT)
+            assert found == expected
+            print(f"{'method':>30} | {'ms':>8}")
+            print(f"{'materialise and sort':>30} | {full_ms:>8.1f}")
+            print(f"{'heap merge, growing windows':>30} | {heap_ms:>8.2f}")
+            db.session.remove()
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin_id)
+            sess['_fresh'] = True
+        timings = []
+        for offset in range(REPEAT * 5):
+            day = start + timedelta(days=offset % days)
+            started = time.perf_counter()
+            response = client.get(f'/api/departments/{department_id}/next-available?count={COUNT}&from={day}')
+            timings.append(time.perf_counter() - started)
+            assert response.status_code == 200 and len(response.get_json()['data']['slots']) == COUNT
+        timings.sort()
+        print(f'GET /api/departments/<id>/next-available: median {statistics.median(timings) * 1000:.2f} ms, '
+              f'p95 {timings[int(len(timings) * 0.95)] * 1000:.2f} ms')
+
+        with app.app_context():
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Benchmark: /api/appointments paging, page numbers (COUNT + OFFSET) vs
+after= cursors, at increasing depth into the table.
+
+Usage: python benchmarks/bench_pagination.py [appointment count]
+Default is 1000000 appointments in a fresh SQLite file.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models.appointment import Appointment
+from utils.pagination import keyset_paginate, encode_cursor
+from bench_stats import seed
+
+PER_PAGE = 20
+REPEAT = 5
+KEY = [Appointment.appointment_date, Appointment.appointment_time, Appointment.id]
+
+def timed(fn):
+    timings = []
+    for _ in range(REPEAT):
+        db.session.expire_all()
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return sorted(timings)[len(timings) // 2] * 1000
+
+def main(size):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/bench.db'})
+        with app.app_context():
+            seed(size)
+            query = Appointment.query.order_by(*[column.desc() for column in KEY])
+            print(f"{'page':>8} | {'offset ms':>9} | {'cursor ms':>9}")
+            for page in (1, 10, 100, 1000, 10000, size // PER_PAGE // 2):
+                # The cursor a client would hold after walking to this page
+                previous = query.offset((page - 1) * PER_PAGE - 1).first() if page > 1 else None
+                after = encode_cursor([getattr(previous, c.key) for c in KEY]) if previous else None
+                offset_ms = timed(lambda: query.paginate(page=page, per_page=PER_PAGE, error_out=False).items)
+                cursor_ms = timed(lambda: keyset_paginate(query, KEY, after, PER_PAGE, descending=True).items)
+                print(f'{page:>8} | {offset_ms:>9.2f} | {cursor_ms:>9.2f}')
+            db.session.remove()
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
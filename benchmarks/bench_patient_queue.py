@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Benchmark: check-in queue operations (utils/patient_queue.py) as the queue
+grows. Each operation is an index seek plus a single-row update, so the cost
+per call should stay flat from a hundred to a few thousand waiting patients.
+
+Usage: python benchmarks/bench_patient_queue.py [sizes...]
+Default: queues of 100, 400 and 1200 patients for one doctor, on top of
+200000 past appointments.
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models.doctor import Doctor
+from models.appointment import Appointment
+from utils.patient_queue import PatientQueue
+import bench_availability
+
+SAMPLES = 50
+
+def timed(fn, samples=SAMPLES):
+    """Median ms of fn() plus commit, each call in a fresh session like a request"""
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        fn()
+        db.session.commit()
+        timings.append(time.perf_counter() - started)
+        db.session.remove()
+    return statistics.median(timings) * 1000
+
+def run(size, doctor_id):
+    today = date.today()
+    Appointment.query.filter_by(doctor_id=doctor_id, appointment_date=today).delete()
+    db.session.execute(db.text('DELETE FROM doctor_queues'))
+    db.session.execute(Appointment.__table__.insert(), [
+        {'patient_id': i % 1000 + 1, 'doctor_id': doctor_id, 'appointment_date': today,
+         'appointment_time': f'{i // 60 % 24:02d}:{i % 60:02d}', 'status': 'Booked'} for i in range(size)])
+    db.session.commit()
+    ids = iter(db.session.scalars(db.select(Appointment.id).filter_by(
+        doctor_id=doctor_id, appointment_date=today)).all())
+    queue = lambda: PatientQueue(doctor_id)
+    appointment = lambda appointment_id: db.session.get(Appointment, appointment_id)
+
+    check_in = timed(lambda: queue().check_in(appointment(next(ids))), size)
+    last = db.session.scalar(db.select(Appointment.id).filter_by(doctor_id=doctor_id, appointment_date=today)
+                             .order_by(Appointment.queue_position.desc()))
+    estimate = timed(lambda: queue().estimate(appointment(last)))
+    called = []
+    call_next = timed(lambda: called.append(queue().call_next().id))
+    skip = timed(lambda: queue().skip(appointment(called.pop())))
+    no_show = timed(lambda: queue().no_show(queue().call_next()))
+    return check_in, call_next, skip, no_show, estimate
+
+def main(*sizes):
+    sizes = sizes or (100, 400, 1200)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/bench.db'})
+        with app.app_context():
+            bench_availability.seed(20, 1)
+            doctor_id = Doctor.query.first().id
+            print(f"{'queue size':>10} | {'check-in':>8} | {'call-next':>9} | {'skip':>6} | {'no-show':>7} | {'estimate':>8}  (median ms)")
+            for size in sizes:
+                print('{:>10} | {:>8.3f} | {:>9.3f} | {:>6.3f} | {:>7.3f} | {:>8.3f}'.format(size, *run(size, doctor_id)))
+            db.session.remove()
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
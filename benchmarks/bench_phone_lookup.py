@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Benchmark: front-desk phone lookup, ILIKE '%digits%' on patients.phone and
+alternate_phone vs the normalized patient_phones index (utils/phones.py).
+
+Usage: python benchmarks/bench_phone_lookup.py [patients]
+Default: 1000000 patients with mixed phone formatting.
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import or_
+from app import create_app, db
+from models.user import User
+from models.patient import Patient
+from utils.phones import matching, rebuild_phones
+
+BATCH = 50000
+REPEAT = 7
+FORMATS = [
+    lambda n: f'+91 {n[:5]} {n[5:]}',
+    lambda n: f'0{n}',
+    lambda n: f'{n[:3]}-{n[3:6]}-{n[6:]}',
+    lambda n: n,
+    lambda n: f'+91-{n}',
+]
+
+def seed(patients):
+    rng = random.Random(11)
+    numbers = []
+    for start in range(0, patients, BATCH):
+        count = min(BATCH, patients - start)
+        db.session.execute(User.__table__.insert(), [
+            {'username': f'p{i}', 'email': f'p{i}@bench.test', 'password_hash': 'x', 'role': 'patient'}
+            for i in range(start, start + count)])
+        rows = []
+        for n in range(count):
+            number = str(rng.randrange(6 * 10 ** 9, 10 ** 10))
+            numbers.append(number)
+            rows.append({'user_id': start + n + 1, 'phone': rng.choice(FORMATS)(number)})
+        db.session.execute(Patient.__table__.insert(), rows)
+        db.session.commit()
+    with db.engine.begin() as conn:
+        rebuild_phones(conn)
+    return numbers
+
+def legacy(digits):
+    like = f'%{digits}%'
+    return Patient.query.filter(or_(Patient.phone.ilike(like), Patient.alternate_phone.ilike(like))).limit(20).all()
+
+def indexed(digits):
+    return Patient.query.filter(Patient.id.in_(matching(digits))).limit(20).all()
+
+def timed(fn, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        rows = fn(text)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, len(rows)
+
+def main(patients=1000000):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/bench.db'})
+        with app.app_context():
+            started = time.perf_counter()
+            numbers = seed(patients)
+            print(f'seeded {patients} patients in {time.perf_counter() - started:.1f}s')
+
+            number = numbers[patients // 2]
+            queries = [
+                ('exact, plain', number),
+                ('exact, +91 spaced', f'+91 {number[:5]} {number[5:]}'),
+                ('last 6 digits', number[-6:]),
+                ('last 4 digits', number[-4:]),
+            ]
+            print(f"{'lookup':>18} | {'input':>17} | {'ILIKE ms':>9} | {'rows':>4} | {'index ms':>9} | {'rows':>4}")
+            for label, text in queries:
+                like_ms, like_rows = timed(legacy, text, 3)
+                index_ms, index_rows = timed(indexed, text, REPEAT)
+                print(f'{label:>18} | {text:>17} | {like_ms:>9.1f} | {like_rows:>4} | {index_ms:>9.2f} | {index_rows:>4}')
+            db.session.remove()
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Benchmark: a night's reminders sent one appointment at a time (load, send,
+set reminder_sent, commit) vs utils/reminders.py (indexed keyset batches,
+concurrent sends per channel, one bulk UPDATE per batch).
+
+The per-appointment loop runs on a sample and is scaled up. Also reports the
+longest write transaction, i.e. how long bookings could be kept waiting.
+
+Usage: python benchmarks/bench_reminders.py [reminders] [sample]
+Default: 100000 reminders due tomorrow (1000 doctors), on top of 200000 past
+appointments, with a 5000-appointment sample for the per-appointment loop.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models.user import User
+from models.doctor import Doctor
+from models.patient import Patient
+from models.appointment import Appointment
+from models.department import Department
+from utils import reminders
+from utils.reminders import ReminderDispatcher, Transport, to_reminder, due_batch
+
+DOCTORS = 1000
+PATIENTS = 20000
+HISTORY = 200000
+SEND_LATENCY = 0.002  # seconds per send() call, as a gateway round trip
+
+class GatewayStub(Transport):
+    def send(self, batch):
+        time.sleep(SEND_LATENCY)
+        return [reminder.appointment_id for reminder in batch]
+
+def seed(count):
+    rng = random.Random(11)
+    departments = [d.id for d in Department.query.all()]
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'user{i}', 'email': f'user{i}@bench.test', 'password_hash': 'x',
+         'role': 'doctor' if i < DOCTORS else 'patient'} for i in range(DOCTORS + PATIENTS)])
+    db.session.execute(Doctor.__table__.insert(), [
+        {'user_id': i + 1, 'department_id': departments[i % len(departments)]} for i in range(DOCTORS)])
+    db.session.execute(Patient.__table__.insert(), [
+        {'user_id': DOCTORS + i + 1, 'phone': f'98{i:08d}',
+         'notification_preference': rng.choice(['email', 'email', 'sms', 'whatsapp'])} for i in range(PATIENTS)])
+    today = date.today()
+    db.session.execute(Appointment.__table__.insert(), [
+        {'patient_id': rng.randrange(PATIENTS) + 1, 'doctor_id': rng.randrange(DOCTORS) + 1,
+         'appointment_date': today - timedelta(days=rng.randrange(1, 730)),
+         'appointment_time': '10:00', 'status': 'Completed'} for _ in range(HISTORY)])
+    per_doctor = -(-count // DOCTORS)
+    db.session.execute(Appointment.__table__.insert(), [
+        {'patient_id': rng.randrange(PATIENTS) + 1, 'doctor_id': i // per_doctor + 1,
+         'appointment_date': today + timedelta(days=1),
+         'appointment_time': f'{8 + i % per_doctor // 60:02d}:{i % per_doctor % 60:02d}',
+         'status': 'Booked'} for i in range(count)])
+    db.session.commit()
+
+def one_at_a_time(limit):
+    """The obvious loop: load each due appointment, send, flag it, commit"""
+    transport = GatewayStub()
+    tomorrow = date.today() + timedelta(days=1)
+    longest = 0
+    for row in due_batch(tomorrow, tomorrow, limit=limit):
+        transport.send([to_reminder(row)])
+        started = time.perf_counter()
+        appointment = db.session.get(Appointment, row.id)
+        appointment.reminder_sent = True
+        db.session.commit()
+        longest = max(longest, time.perf_counter() - started)
+    return longest
+
+def timed_marks():
+    """Wrap mark_sent to record how long each bulk write transaction takes"""
+    durations, original = [], reminders.mark_sent
+
+    def mark_sent(ids):
+        started = time.perf_counter()
+        original(ids)
+        durations.append(time.perf_counter() - started)
+    reminders.mark_sent = mark_sent
+    return durations
+
+def main(count=100000, sample=5000):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/bench.db'})
+        with app.app_context():
+            seed(count)
+            tomorrow = date.today() + timedelta(days=1)
+
+            started = time.perf_counter()
+            loop_lock = one_at_a_time(sample)
+            loop_s = (time.perf_counter() - started) / sample * count
+            db.session.execute(db.update(Appointment).values(reminder_sent=False))
+            db.session.commit()
+
+            marks = timed_marks()
+            stub = GatewayStub()
+            dispatcher = ReminderDispatcher({channel: stub for channel in reminders.CHANNELS},
+                                            batch_size=1000, chunk_size=200, concurrency=4)
+            started = time.perf_counter()
+            report = dispatcher.run(tomorrow, tomorrow)
+            batched_s = time.perf_counter() - started
+            assert sum(report.values()) == count, report
+
+            print(f'{count} reminders due, gateway round trip {SEND_LATENCY * 1000:.0f} ms per send() call')
+            print(f"{'method':>24} | {'total s':>8} | {'longest write ms':>16}")
+            print(f"{'one at a time (scaled)':>24} | {loop_s:>8.1f} | {loop_lock * 1000:>16.2f}")
+            print(f"{'batched pipeline':>24} | {batched_s:>8.1f} | {max(marks) * 1000:>16.2f}")
+            db.session.remove()
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
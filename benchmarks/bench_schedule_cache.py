@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Benchmark: refusing a booking for a taken slot, by letting the INSERT trip
+the unique slot index (cold schedule cache) vs the cached occupancy bitmap
+plus a version stamp lookup (warm cache).
+
+Usage: python benchmarks/bench_schedule_cache.py [attempts]
+Default: 2000 attempts against 200 doctors with half their slots booked.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models.doctor import Doctor
+from models.appointment import Appointment
+from utils.availability import free_slots
+from utils.booking import SlotReservation, SlotUnavailable
+from utils.schedule_cache import current_cache
+import bench_availability
+
+DOCTORS = 200
+DAYS = 14
+
+def attempt_all(taken, warm):
+    refused = 0
+    started = time.perf_counter()
+    for patient_id, doctor_id, day, time_ in taken:
+        if not warm:
+            current_cache().clear()
+        try:
+            SlotReservation().book(patient_id, doctor_id, day, time_)
+        except SlotUnavailable:
+            refused += 1
+    elapsed = time.perf_counter() - started
+    assert refused == len(taken)
+    return elapsed / len(taken) * 1000
+
+def main(attempts=2000):
+    bench_availability.HISTORY = 50000
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/bench.db'})
+        with app.app_context():
+            bench_availability.seed(DOCTORS, DAYS)
+            rng = random.Random(3)
+            start = date.today() + timedelta(days=1)
+            booked = db.session.execute(db.select(
+                Appointment.patient_id, Appointment.doctor_id, Appointment.appointment_date,
+                Appointment.appointment_time).where(Appointment.status == 'Booked',
+                                                    Appointment.appointment_date >= start)).all()
+            taken = [tuple(row) for row in rng.sample(booked, attempts)]
+
+            cold_ms = attempt_all(taken, warm=False)
+            # A calendar view warms the cache, as it would before patients pick a slot
+            for stream in free_slots(Doctor.query.all(), start, start + timedelta(days=DAYS - 2)).values():
+                list(stream)
+            warm_ms = attempt_all(taken, warm=True)
+
+            print(f'{attempts} bookings of taken slots')
+            print(f"{'conflict check':>34} | {'ms per attempt':>14}")
+            print(f"{'INSERT trips the unique index':>34} | {cold_ms:>14.3f}")
+            print(f"{'cached bitmap + version lookup':>34} | {warm_ms:>14.3f}")
+            db.session.remove()
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Benchmark: admin patient search, the old ILIKE '%q%' scan vs the FTS5 index
+(utils/search.py), at 1M patients. Rows are inserted through the sync
+triggers, so the load time includes index maintenance.
+
+Usage: python benchmarks/bench_search.py [patients]
+Default: 1000000 patients.
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import or_
+from sqlalchemy.orm import contains_eager
+from app import create_app, db
+from models.user import User
+from models.patient import Patient
+from utils.search import patient_index
+
+FIRST = ['james', 'mary', 'john', 'patricia', 'robert', 'jennifer', 'michael', 'linda', 'william',
+         'elizabeth', 'david', 'barbara', 'richard', 'susan', 'joseph', 'jessica', 'thomas', 'sarah',
+         'ahmed', 'priya', 'wei', 'olga', 'fatima', 'diego', 'yuki', 'kwame', 'ingrid', 'rahul']
+LAST = ['smith', 'johnson', 'williams', 'brown', 'jones', 'garcia', 'miller', 'davis', 'rodriguez',
+        'martinez', 'wilson', 'anderson', 'taylor', 'moore', 'jackson', 'martin', 'lee', 'thompson',
+        'white', 'harris', 'clark', 'lewis', 'robinson', 'patel', 'kim', 'nguyen', 'chen', 'singh',
+        'khan', 'ivanova', 'okafor', 'muller', 'rossi', 'kowalski', 'haddad', 'tanaka', 'silva']
+BATCH = 50000
+LIMIT = 50
+REPEAT = 7
+
+def seed(patients):
+    rng = random.Random(7)
+    phones = []
+    for start in range(0, patients, BATCH):
+        users = []
+        for i in range(start, min(start + BATCH, patients)):
+            name = f'{rng.choice(FIRST)}.{rng.choice(LAST)}.{i}'
+            users.append({'username': name, 'email': f'{name}@mail.test', 'password_hash': 'x', 'role': 'patient'})
+            phones.append(f'555-{rng.randrange(10 ** 7):07d}')
+        db.session.execute(User.__table__.insert(), users)
+        first_id = db.session.execute(db.select(db.func.max(User.id))).scalar() - len(users) + 1
+        db.session.execute(Patient.__table__.insert(), [
+            {'user_id': first_id + n, 'phone': phones[start + n]} for n in range(len(users))])
+        db.session.commit()
+    return phones
+
+def legacy(text):
+    """admin.search_patients before the FTS index"""
+    return Patient.query.join(User).options(contains_eager(Patient.user)).filter(or_(
+        User.username.ilike(f'%{text}%'),
+        User.email.ilike(f'%{text}%'),
+        Patient.phone.ilike(f'%{text}%'),
+        Patient.alternate_phone.ilike(f'%{text}%'),
+    )).limit(LIMIT).all()
+
+def indexed(text):
+    query = Patient.query.join(User).options(contains_eager(Patient.user))
+    return patient_index.search(query, text, LIMIT).all()
+
+def timed(fn, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        rows = fn(text)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, len(rows)
+
+def main(patients=1000000):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/bench.db'})
+        with app.app_context():
+            started = time.perf_counter()
+            phones = seed(patients)
+            print(f'seeded {patients} patients (with index triggers) in {time.perf_counter() - started:.1f}s')
+
+            name = db.session.execute(db.select(User.username).where(User.id == patients // 2)).scalar()
+            first, last, number = name.split('.')
+            queries = [
+                ('full username', name),
+                ('name + number', f'{first} {last} {number}'),
+                ('name prefixes', f'{first[:3]} {last[:4]} {number[:4]}'),
+                ('phone prefix', phones[patients // 3][:9]),
+                ('typo + number', f'{first[1] + first[0] + first[2:]} {number}'),
+                ('broad (1 name)', last),
+            ]
+            print(f"{'query':>15} | {'text':>28} | {'ILIKE ms':>9} | {'rows':>4} | {'FTS ms':>7} | {'rows':>4}")
+            for label, text in queries:
+                like_ms, like_rows = timed(legacy, text, 3)
+                fts_ms, fts_rows = timed(indexed, text, REPEAT)
+                print(f'{label:>15} | {text:>28} | {like_ms:>9.1f} | {like_rows:>4} | {fts_ms:>7.2f} | {fts_rows:>4}')
+            db.session.remove()
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
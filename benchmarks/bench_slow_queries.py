@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Benchmark: cost of the slow-query log (utils/slow_queries.py).
+
+The log times every statement, so its steady-state cost is paid even when
+nothing is slow. Two apps share one seeded database, one with the default
+SLOW_QUERY_MS and one with the log off, and rounds of the same request mix
+alternate between them. Also reported: the cost of one capture (plan, frame
+and parameters) with every statement over the threshold.
+
+Usage: python benchmarks/bench_slow_queries.py [rounds]
+Default: 40 rounds of 50 requests per app.
+"""
+
+import logging
+import os
+import statistics
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models.user import User
+from bench_instrumentation import URLS, PER_ROUND, logged_in_client, run_round
+import bench_availability
+
+DOCTORS = 50
+
+def main(rounds=40):
+    logging.getLogger('utils.slow_queries').setLevel(logging.ERROR)
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = f'sqlite:///{tmp}/bench.db'
+        apps = {
+            'off': create_app({'SQLALCHEMY_DATABASE_URI': uri, 'JOB_WORKERS': 0, 'SLOW_QUERY_MS': None}),
+            'default': create_app({'SQLALCHEMY_DATABASE_URI': uri, 'JOB_WORKERS': 0}),
+            'everything': create_app({'SQLALCHEMY_DATABASE_URI': uri, 'JOB_WORKERS': 0, 'SLOW_QUERY_MS': 1e-6}),
+        }
+        with apps['off'].app_context():
+            bench_availability.HISTORY = 5000
+            bench_availability.seed(DOCTORS, 1)
+            admin = User(username='bench-admin', email='admin@bench.test', password_hash='x', role='admin')
+            db.session.add(admin)
+            db.session.commit()
+            admin_id = admin.id
+        clients = {label: logged_in_client(app, admin_id) for label, app in apps.items()}
+
+        for client in clients.values():
+            run_round(client)  # warm up
+        timings = {label: [] for label in clients}
+        for n in range(rounds):
+            order = list(clients) if n % 2 else list(clients)[::-1]
+            for label in order:
+                timings[label].append(run_round(clients[label]))
+
+        with apps['everything'].app_context():
+            captured = apps['everything'].extensions['slow_queries'].total
+        requests = (rounds + 1) * PER_ROUND
+        off = statistics.median(timings['off']) * 1000
+        print(f'{rounds} rounds x {PER_ROUND} requests per app over {len(URLS)} endpoints')
+        print(f"{'slow-query log':>28} | {'median ms/request':>17} | {'vs off':>7}")
+        for label, title in (('off', 'off'), ('default', 'on, nothing slow (250 ms)'),
+                             ('everything', 'on, every statement captured')):
+            median = statistics.median(timings[label]) * 1000
+            print(f'{title:>28} | {median:>17.3f} | {(median - off) / off * 100:>+6.1f}%')
+        every = statistics.median(timings['everything']) * 1000
+        print(f'{captured / requests:.1f} captures per request, '
+              f'~{(every - off) / (captured / requests) * 1000:.0f} us per capture')
+        for app in apps.values():
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
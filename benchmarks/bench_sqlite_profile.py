@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Benchmark: mixed read/write API load against SQLite with the default engine
+settings (rollback journal, no busy timeout, default pool) and with the
+config.py profile (WAL, synchronous=NORMAL, busy_timeout, mmap, cache, pool).
+
+Usage: python benchmarks/bench_sqlite_profile.py [seconds per profile] [threads]
+Defaults: 10 seconds, 8 threads, 30% of requests are bookings.
+"""
+
+import itertools
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from models.user import User
+from bench_stats import seed, DOCTORS, PATIENTS
+
+WRITE_RATIO = 0.3
+READS = ['/api/appointments?per_page=20', '/api/stats', '/api/doctors?per_page=20&after=']
+
+PROFILES = {
+    'default': {'SQLITE_PRAGMAS': {}, 'SQLALCHEMY_ENGINE_OPTIONS': {}},
+    'profile': {},
+}
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000 if values else 0.0
+
+def run_load(app, admin_id, seconds, threads):
+    slots = itertools.count()
+    results = {'read': [], 'write': []}
+    errors = {'read': 0, 'write': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(seed_value):
+        rng = random.Random(seed_value)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin_id)
+            sess['_fresh'] = True
+        while time.perf_counter() < deadline:
+            write = rng.random() < WRITE_RATIO
+            started = time.perf_counter()
+            try:
+                if write:
+                    n = next(slots)
+                    resp = client.post('/api/appointments', json={
+                        'doctor_id': n % DOCTORS + 1, 'patient_id': rng.randint(1, PATIENTS),
+                        'appointment_date': (date(2031, 1, 1) + timedelta(days=n // (DOCTORS * 16))).isoformat(),
+                        'appointment_time': f'{9 + n // DOCTORS % 16 // 2:02d}:{n // DOCTORS % 2 * 30:02d}'})
+                else:
+                    resp = client.get(rng.choice(READS))
+                failed = resp.status_code >= 500
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - started
+            kind = 'write' if write else 'read'
+            with lock:
+                results[kind].append(elapsed)
+                errors[kind] += failed
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return results, errors
+
+def main(seconds, threads):
+    print(f"{'profile':>8} | {'kind':>5} | {'requests':>8} | {'req/s':>7} | {'p50 ms':>7} | {'p95 ms':>7}"
+          f" | {'p99 ms':>8} | {'errors':>6}")
+    for name, overrides in PROFILES.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app(dict(overrides, SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp}/bench.db'))
+            with app.app_context():
+                seed(100000)
+                admin = User(username='bench-admin', email='admin@bench.test', password_hash='x', role='admin')
+                db.session.add(admin)
+                db.session.commit()
+                admin_id = admin.id
+                db.session.remove()
+
+            results, errors = run_load(app, admin_id, seconds, threads)
+            for kind, timings in results.items():
+                print(f'{name:>8} | {kind:>5} | {len(timings):>8} | {len(timings) / seconds:>7.1f}'
+                      f' | {percentile(timings, 50):>7.1f} | {percentile(timings, 95):>7.1f}'
+                      f' | {percentile(timings, 99):>8.1f} | {errors[kind]:>6}')
+
+            with app.app_context():
+                db.engine.dispose()
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [10, 8][len(args):]))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""
+Benchmark: dashboard statistics, per-KPI COUNT queries vs grouped aggregates
+vs the materialised stats_counters table.
+
+Usage: python benchmarks/bench_stats.py [appointment counts...]
+Default sizes are 10000 100000 1000000. Each size uses a fresh SQLite file.
+"""
+
+import os
+import sys
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, and_
+from app import create_app, db
+from models.user import User
+from models.doctor import Doctor
+from models.patient import Patient
+from models.appointment import Appointment
+from models.department import Department
+from models.treatment import Treatment
+from utils.stats import dashboard_stats, compute_counters
+from utils.counters import rebuild_counters
+
+DOCTORS = 200
+PATIENTS = 20000
+STATUSES = ['Booked', 'Completed', 'Completed', 'Completed', 'Cancelled', 'No-show']
+REPEAT = 5
+
+def legacy_stats():
+    """The queries admin.dashboard/api.get_stats ran before utils/stats.py"""
+    today = datetime.today().date()
+    result = {
+        'total_doctors': Doctor.query.count(),
+        'total_patients': Patient.query.count(),
+        'total_appointments': Appointment.query.count(),
+        'upcoming': Appointment.query.filter(and_(
+            Appointment.appointment_date >= today,
+            Appointment.status.in_(['Booked', 'Confirmed']))).count(),
+        'completed': Appointment.query.filter(Appointment.status == 'Completed').count(),
+        'active_doctors': Doctor.query.join(User).filter(User.is_active == True).count(),
+        'active_patients': Patient.query.join(User).filter(User.is_active == True).count(),
+        'treatments': Treatment.query.count(),
+    }
+    result['departments'] = [
+        Doctor.query.filter_by(department_id=dept.id).count() for dept in Department.query.all()
+    ]
+    return result
+
+def seed(appointments):
+    rng = random.Random(42)
+    departments = [d.id for d in Department.query.all()]
+    users = [{'username': f'user{i}', 'email': f'user{i}@bench.test', 'password_hash': 'x',
+              'role': 'doctor' if i < DOCTORS else 'patient', 'is_active': rng.random() > 0.05}
+             for i in range(DOCTORS + PATIENTS)]
+    db.session.execute(User.__table__.insert(), users)
+    db.session.execute(Doctor.__table__.insert(), [
+        {'user_id': i + 1, 'department_id': departments[i % len(departments)]} for i in range(DOCTORS)])
+    db.session.execute(Patient.__table__.insert(), [
+        {'user_id': DOCTORS + i + 1} for i in range(PATIENTS)])
+
+    start = date.today() - timedelta(days=730)
+    batch = []
+    for i in range(appointments):
+        status = STATUSES[rng.randrange(len(STATUSES))]
+        batch.append({
+            'patient_id': rng.randrange(PATIENTS) + 1,
+            'doctor_id': rng.randrange(DOCTORS) + 1,
+            'appointment_date': start + timedelta(days=rng.randrange(760)),
+            'appointment_time': f'{9 + i % 9:02d}:{(i // 9) % 2 * 30:02d}',
+            # Slots collide at this density; only one of them may stay Booked
+            'status': 'Completed' if status == 'Booked' else status,
+        })
+        if len(batch) == 50000:
+            db.session.execute(Appointment.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Appointment.__table__.insert(), batch)
+    db.session.execute(Treatment.__table__.insert().from_select(
+        ['appointment_id', 'patient_id', 'doctor_id'],
+        db.select(Appointment.id, Appointment.patient_id, Appointment.doctor_id)
+        .where(Appointment.status == 'Completed')))
+    db.session.commit()
+    # Core inserts bypass the flush hooks
+    rebuild_counters()
+
+def measure(fn):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    timings = []
+    try:
+        for _ in range(REPEAT):
+            db.session.expire_all()
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return len(statements) // REPEAT, sorted(timings)[len(timings) // 2] * 1000
+
+def main(sizes):
+    print(f"{'appointments':>12} | {'legacy queries':>14} {'ms':>7} | {'grouped queries':>15} {'ms':>7}"
+          f" | {'counter queries':>15} {'ms':>7}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/bench.db'})
+            with app.app_context():
+                seed(size)
+                legacy = measure(legacy_stats)
+                grouped = measure(compute_counters)
+                counters = measure(dashboard_stats)
+                print(f'{size:>12} | {legacy[0]:>14} {legacy[1]:>7.1f} | {grouped[0]:>15} {grouped[1]:>7.1f}'
+                      f' | {counters[0]:>15} {counters[1]:>7.1f}')
+                db.session.remove()
+                db.engine.dispose()
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+"""
+Benchmark suite: every blueprint driven through Flask's test client against
+a deterministic synthetic hospital (benchmarks/synthetic.py).
+
+Each scenario is one URL as one role: pages of the main, auth, admin,
+doctor and patient blueprints, the JSON API (reads, exports, search, queue
+and a booking write) and the debug endpoint. Scenarios run round-robin, in a
+seeded order, so drift in the machine is spread over all of them. For each
+one the suite reports throughput, p50/p95/p99 latency and SQL statements per
+request, plus totals. The SSE stream is left out (it never finishes).
+
+Results can be written as JSON and compared with an earlier run. The gate
+fails (exit status 1) when a scenario's p50 or p95 grows by more than
+--threshold (and by at least --min-ms), or when it runs more statements per
+request than before. Statement counts are exact, so they are comparable
+across machines. Latencies are not: back-to-back runs of the same commit on
+a shared machine can differ by 30% across the board. With --normalize the
+baseline is first scaled by the run-wide drift (the median p50 ratio), so
+the gate flags scenarios that got slower relative to the rest, and the drift
+itself fails the gate once it exceeds --threshold: a change that slows every
+request alike is still a regression. Without it raw latencies are compared,
+which only makes sense against a baseline from the same machine.
+
+Usage:
+  python benchmarks/bench_suite.py --output before.json
+  python benchmarks/bench_suite.py --baseline before.json --output after.json
+  python benchmarks/bench_suite.py --from after.json --baseline before.json
+Defaults: 8 departments, 80 doctors, 4000 patients, 2 years of history,
+30 timed requests per scenario after 3 warm-up rounds.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy
+from sqlalchemy import event
+from app import create_app, db
+import synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class Scenario:
+    """One request shape: role, method and a URL (and body) built from the dataset and round number"""
+
+    def __init__(self, name, role, url, method='GET', body=None, form=None, status=200):
+        self.name = name
+        self.role = role
+        self.url = url
+        self.method = method
+        self.body = body
+        self.form = form
+        self.status = status
+
+def scenarios(data):
+    """The scenario list for a generated Dataset"""
+    busy_doctor, usual_doctor = data.doctors[0][0], data.doctors[1][0]
+    heavy_patient, usual_patient = data.patients[0][0], data.patients[1][0]
+    phone_tail = data.patients[1][2][-6:]
+    surname, prefix = data.search_terms
+    today = date.today()
+    month_ago = (today - timedelta(days=30)).isoformat()
+
+    def booking(n):
+        minutes = 8 * 60 + n % 600
+        return {'patient_id': usual_patient, 'doctor_id': usual_doctor,
+                'appointment_date': (today + timedelta(days=400 + n // 600)).isoformat(),
+                'appointment_time': f'{minutes // 60:02d}:{minutes % 60:02d}'}
+
+    return [
+        Scenario('main.index', None, '/'),
+        Scenario('auth.login_page', None, '/auth/login'),
+        Scenario('auth.login', None, '/auth/login', 'POST', status=302, form={
+            'username': 'bench-admin', 'password': synthetic.PASSWORD, 'role': 'admin'}),
+        Scenario('auth.register_page', None, '/auth/register'),
+        Scenario('admin.dashboard', 'admin', '/admin/dashboard'),
+        Scenario('admin.doctors', 'admin', '/admin/doctors'),
+        Scenario('admin.patients', 'admin', '/admin/patients'),
+        Scenario('admin.appointments', 'admin', '/admin/appointments'),
+        Scenario('admin.treatments', 'admin', '/admin/treatments'),
+        Scenario('admin.search_patients', 'admin', f'/admin/search/patients?q={surname}'),
+        Scenario('admin.search_doctors', 'admin', f'/admin/search/doctors?q={prefix}'),
+        Scenario('admin.patient_treatments', 'admin', f'/admin/patient/{heavy_patient}/treatments'),
+        Scenario('admin.edit_doctor', 'admin', f'/admin/doctor/{busy_doctor}/edit'),
+        Scenario('doctor.dashboard', 'doctor', '/doctor/dashboard'),
+        Scenario('doctor.appointments', 'doctor', '/doctor/appointments'),
+        Scenario('doctor.patients', 'doctor', '/doctor/patients'),
+        Scenario('doctor.patient_history', 'doctor', f'/doctor/patient/{data.regular}/history'),
+        Scenario('doctor.profile', 'doctor', '/doctor/profile'),
+        Scenario('patient.dashboard', 'patient', '/patient/dashboard'),
+        Scenario('patient.my_appointments', 'patient', '/patient/my-appointments'),
+        Scenario('patient.treatment_history', 'patient', '/patient/treatment-history'),
+        Scenario('patient.search_doctors', 'patient', '/patient/search-doctors'),
+        Scenario('patient.book_appointment', 'patient', f'/patient/book-appointment/{busy_doctor}'),
+        Scenario('patient.profile', 'patient', '/patient/profile'),
+        Scenario('api.get_doctors', 'admin', '/api/doctors'),
+        Scenario('api.get_doctor', 'admin', f'/api/doctors/{busy_doctor}'),
+        Scenario('api.get_doctor_slots', 'patient', f'/api/doctors/{busy_doctor}/slots?days=14'),
+        Scenario('api.department_next_available', 'patient',
+                 f'/api/departments/{data.department}/next-available?count=10'),
+        Scenario('api.get_appointments', 'admin', '/api/appointments?status=Booked'),
+        Scenario('api.get_appointments_patient', 'patient', '/api/appointments'),
+        Scenario('api.get_appointment', 'admin', f'/api/appointments/{data.completed[0]}'),
+        Scenario('api.create_appointment', 'admin', '/api/appointments', 'POST', body=booking, status=201),
+        Scenario('api.get_patients', 'admin', '/api/patients'),
+        Scenario('api.get_patient', 'admin', f'/api/patients/{heavy_patient}'),
+        Scenario('api.lookup_patients', 'admin', f'/api/patients/lookup?phone={phone_tail}'),
+        Scenario('api.search', 'admin', f'/api/search?q={surname}'),
+        Scenario('api.get_stats', 'admin', '/api/stats'),
+        Scenario('api.get_doctor_queue', 'doctor', f'/api/doctors/{busy_doctor}/queue'),
+        Scenario('api.export_appointments', 'admin', f'/api/appointments/export?date_from={month_ago}'),
+        Scenario('api.export_treatments', 'doctor', f'/api/treatments/export?date_from={month_ago}'),
+        Scenario('api.get_job_metrics', 'admin', '/api/jobs/metrics'),
+        Scenario('debug.current_user', 'patient', '/debug/current_user'),
+    ]
+
+def logged_in(app, user_id):
+    client = app.test_client()
+    if user_id is not None:
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+            sess['_fresh'] = True
+    return client
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def summarize(timings, statements):
+    seconds = sum(timings)
+    return {
+        'requests': len(timings),
+        'throughput_rps': round(len(timings) / seconds, 1) if seconds else None,
+        'mean_ms': round(seconds / len(timings) * 1000, 3),
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+        'queries_per_request': round(statements / len(timings), 2),
+    }
+
+def run(app, data, requests=30, warmup=3, seed=1, only=None):
+    """Drive every scenario `warmup + requests` times, round-robin; returns {name: summary}"""
+    selected = [s for s in scenarios(data) if not only or s.name.split('.')[0] in only]
+    random.Random(seed).shuffle(selected)
+    users = {'admin': data.admin, 'doctor': data.doctors[0][1], 'patient': data.patients[0][1], None: None}
+    clients = {role: logged_in(app, user_id) for role, user_id in users.items()}
+
+    count = [0]
+
+    def counter(conn, cursor, statement, parameters, context, executemany):
+        count[0] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', counter)
+    timings = {s.name: [] for s in selected}
+    statements = dict.fromkeys(timings, 0)
+    try:
+        for n in range(warmup + requests):
+            for scenario in selected:
+                client = app.test_client() if scenario.method == 'POST' and scenario.role is None \
+                    else clients[scenario.role]
+                kwargs = {}
+                if scenario.body:
+                    kwargs['json'] = scenario.body(n)
+                if scenario.form:
+                    kwargs['data'] = scenario.form
+                count[0] = 0
+                started = time.perf_counter()
+                response = client.open(scenario.url, method=scenario.method, **kwargs)
+                response.get_data()
+                elapsed = time.perf_counter() - started
+                if response.status_code != scenario.status:
+                    raise AssertionError(f'{scenario.name}: {scenario.method} {scenario.url} returned '
+                                         f'{response.status_code}, expected {scenario.status}')
+                if n >= warmup:
+                    timings[scenario.name].append(elapsed)
+                    statements[scenario.name] += count[0]
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+
+    results = {}
+    for scenario in sorted(selected, key=lambda s: s.name):
+        summary = summarize(timings[scenario.name], statements[scenario.name])
+        results[scenario.name] = {'method': scenario.method, 'url': scenario.url, 'role': scenario.role, **summary}
+    everything = [t for name in timings for t in timings[name]]
+    return results, summarize(everything, sum(statements.values()))
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def benchmark(scale, requests=30, warmup=3, only=None):
+    """Generate the dataset in a temporary database and run the suite; returns the results document"""
+    logging.getLogger('utils.slow_queries').setLevel(logging.ERROR)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp}/bench.db', 'JOB_WORKERS': 0})
+        with app.app_context():
+            started = time.perf_counter()
+            data = synthetic.generate(**scale)
+            generated = time.perf_counter() - started
+            fingerprint = synthetic.fingerprint()
+        scenario_results, total = run(app, data, requests, warmup, scale.get('seed', 1), only)
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+    commit, dirty = git_revision()
+    return {
+        'meta': {
+            'commit': commit, 'dirty': dirty, 'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'sqlalchemy': sqlalchemy.__version__,
+            'sqlite': sqlite3.sqlite_version, 'machine': platform.machine(), 'cpus': os.cpu_count(),
+            'requests': requests, 'warmup': warmup, 'scale': scale,
+        },
+        'dataset': {**data.counts, 'fingerprint': fingerprint, 'generate_seconds': round(generated, 2)},
+        'total': total,
+        'scenarios': scenario_results,
+    }
+
+def drift(baseline, current):
+    """Median p50 ratio over the scenarios both runs have: how much slower this machine/run is overall"""
+    ratios = [current['scenarios'][name]['p50_ms'] / before['p50_ms']
+              for name, before in baseline['scenarios'].items()
+              if name in current['scenarios'] and before['p50_ms']]
+    return statistics.median(ratios) if ratios else 1.0
+
+def compare(baseline, current, threshold=0.25, min_ms=1.0, normalize=False):
+    """
+    Regressions of current against baseline as readable lines (empty when the
+    gate passes). With normalize, baseline latencies are first scaled by the
+    run-wide drift, which is reported as one regression when it exceeds the
+    threshold instead of once per scenario
+    """
+    scale = drift(baseline, current) if normalize else 1.0
+    regressions = []
+    if scale > 1 + threshold:
+        regressions.append(f'run-wide drift: p50 {(scale - 1) * 100:+.0f}% across all scenarios')
+    for name, now in sorted(current['scenarios'].items()):
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            expected = before[metric] * scale
+            if now[metric] > expected * (1 + threshold) and now[metric] - expected >= min_ms:
+                regressions.append(f'{name}: {metric} {before[metric]:.2f} -> {now[metric]:.2f} '
+                                   f'({(now[metric] / expected - 1) * 100:+.0f}%)')
+        if now['queries_per_request'] >= before['queries_per_request'] + 0.5:
+            regressions.append(f"{name}: queries/request {before['queries_per_request']:g} -> "
+                               f"{now['queries_per_request']:g}")
+    return regressions
+
+def report(results, baseline=None):
+    meta, dataset, total = results['meta'], results['dataset'], results['total']
+    print(f"dataset {dataset['fingerprint']}: {dataset['departments']} departments, {dataset['doctors']} doctors, "
+          f"{dataset['patients']} patients, {dataset['appointments']} appointments, "
+          f"{dataset['treatments']} treatments")
+    print(f"{meta['requests']} timed requests per scenario, commit {(meta['commit'] or '?')[:10]}"
+          f"{' (dirty)' if meta['dirty'] else ''}")
+    print(f"{'scenario':<34} | {'req/s':>7} | {'p50 ms':>7} | {'p95 ms':>7} | {'p99 ms':>7} | {'queries':>7}"
+          + (f" | {'p50 vs base':>11}" if baseline else ''))
+    for name, row in results['scenarios'].items():
+        line = (f"{name:<34} | {row['throughput_rps']:>7.1f} | {row['p50_ms']:>7.2f} | {row['p95_ms']:>7.2f} | "
+                f"{row['p99_ms']:>7.2f} | {row['queries_per_request']:>7.2f}")
+        before = baseline and baseline['scenarios'].get(name)
+        if before:
+            line += f" | {(row['p50_ms'] / before['p50_ms'] - 1) * 100:>+10.1f}%"
+        elif baseline:
+            line += f" | {'new':>11}"
+        print(line)
+    print(f"{'all':<34} | {total['throughput_rps']:>7.1f} | {total['p50_ms']:>7.2f} | {total['p95_ms']:>7.2f} | "
+          f"{total['p99_ms']:>7.2f} | {total['queries_per_request']:>7.2f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the HMS benchmark suite.')
+    synthetic.add_arguments(parser)
+    parser.add_argument('--requests', type=int, default=30, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=3, help='untimed rounds first')
+    parser.add_argument('--only', help='comma-separated blueprints to run (main, auth, admin, doctor, patient, api, debug)')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--from', dest='source', help='load results from JSON instead of running')
+    parser.add_argument('--baseline', help='earlier results JSON to gate against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed p50/p95 growth (0.25 = 25%%)')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='ignore latency growth smaller than this')
+    parser.add_argument('--normalize', action='store_true',
+                        help='correct latencies for run-wide drift (the drift still fails past --threshold)')
+    args = parser.parse_args(argv)
+
+    if args.source:
+        with open(args.source) as f:
+            results = json.load(f)
+    else:
+        results = benchmark(synthetic.scale(args), args.requests, args.warmup,
+                            args.only.split(',') if args.only else None)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f'wrote {args.output}')
+    if baseline is None:
+        return 0
+    if baseline['dataset']['fingerprint'] != results['dataset']['fingerprint']:
+        print('warning: the baseline was measured on a different dataset')
+    print(f'run-wide drift against the baseline: {(drift(baseline, results) - 1) * 100:+.1f}% (median p50 ratio)')
+    regressions = compare(baseline, results, args.threshold, args.min_ms, args.normalize)
+    for line in regressions:
+        print(f'REGRESSION {line}')
+    print(f'{len(regressions)} regression(s) against {args.baseline}')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+"""
+Deterministic synthetic hospital data for benchmarks.
+
+generate() fills the current app's database with departments, doctors,
+patients and `years` of appointment history plus the next weeks of bookings,
+and a treatment for most completed visits. The same arguments and seed give
+the same rows; dates are relative to `today` (default: the run day), so
+fingerprint() compares datasets by day offsets rather than calendar dates.
+
+The skew follows what a hospital sees rather than uniform noise:
+- departments and doctors are Zipf-popular (a few carry most of the load)
+- how often a patient visits is Pareto-distributed (a small group of chronic
+  patients visit many times, most patients once or twice)
+- volume grows towards the present, peaks in winter and the monsoon, is
+  highest on Mondays and lowest on Sundays, and mornings are busier
+- diagnoses are Zipf-distributed over a list of common ICD-10 codes
+
+Derived data is rebuilt afterwards: booking totals, the stats counters and the
+patient phone lookup table. The search index follows through its triggers.
+
+Usage: python benchmarks/synthetic.py [database path] [--patients N ...]
+Writes a standalone database, e.g. to try the app against realistic volumes.
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+from collections import Counter, namedtuple
+from datetime import date, datetime, time, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import db
+from models.user import User
+from models.doctor import Doctor
+from models.patient import Patient
+from models.appointment import Appointment
+from models.department import Department
+from models.treatment import Treatment
+from utils.counters import rebuild_counters
+from utils.passwords import hash_password
+from utils.phones import rebuild_phones
+
+PASSWORD = 'bench-password'
+UPCOMING_DAYS = 28
+CHUNK = 5000
+
+DEPARTMENTS = ['Cardiology', 'Neurology', 'Orthopedics', 'Dermatology', 'Pediatrics', 'General Medicine',
+               'ENT', 'Ophthalmology', 'Gynecology', 'Psychiatry', 'Gastroenterology', 'Pulmonology',
+               'Endocrinology', 'Nephrology', 'Urology', 'Oncology']
+FIRST_NAMES = ['aarav', 'vivaan', 'aditya', 'arjun', 'sai', 'reyansh', 'krishna', 'ishaan', 'rohan', 'kabir',
+               'ananya', 'diya', 'saanvi', 'aadhya', 'isha', 'kavya', 'meera', 'riya', 'priya', 'neha',
+               'rahul', 'amit', 'sunita', 'pooja', 'vikram', 'deepa', 'sanjay', 'lakshmi', 'manoj', 'geeta']
+LAST_NAMES = ['sharma', 'verma', 'patel', 'reddy', 'iyer', 'nair', 'gupta', 'singh', 'kumar', 'das',
+              'menon', 'joshi', 'rao', 'mehta', 'shah', 'chopra', 'bose', 'pillai', 'mishra', 'khan']
+CITIES = [('Mumbai', 30), ('Pune', 18), ('Thane', 12), ('Nashik', 8), ('Nagpur', 7), ('Aurangabad', 5),
+          ('Kolhapur', 4), ('Solapur', 3), ('Satara', 2), ('Ratnagiri', 1)]
+BLOOD_GROUPS = [('O+', 37), ('B+', 32), ('A+', 22), ('AB+', 7), ('O-', 1), ('B-', 1), ('A-', 0.5), ('AB-', 0.5)]
+QUALIFICATIONS = ['MBBS', 'MBBS, MD', 'MBBS, MS', 'MBBS, DNB', 'MBBS, MD, DM']
+WORKING_DAYS = [('Mon-Fri', 5), ('Mon-Sat', 4), ('Mon, Wed, Fri', 2), ('Daily', 1)]
+SESSIONS = [('09:00', '13:00', '16:00', '19:00'), ('08:00', '12:00', '17:00', '20:00'),
+            ('10:00', '14:00', '', ''), ('', '', '14:00', '20:00')]
+DIAGNOSES = [('J06.9', 'Acute upper respiratory infection'), ('I10', 'Essential hypertension'),
+             ('E11.9', 'Type 2 diabetes mellitus'), ('M54.5', 'Low back pain'), ('K21.9', 'Gastro-oesophageal reflux'),
+             ('J45.9', 'Asthma'), ('L20.9', 'Atopic dermatitis'), ('R51', 'Headache'), ('N39.0', 'Urinary tract infection'),
+             ('F41.1', 'Generalized anxiety disorder'), ('M17.9', 'Osteoarthritis of knee'), ('H10.9', 'Conjunctivitis'),
+             ('E03.9', 'Hypothyroidism'), ('A09', 'Infectious gastroenteritis'), ('G43.9', 'Migraine')]
+MEDICINES = ['Paracetamol 500mg', 'Amoxicillin 500mg', 'Metformin 500mg', 'Amlodipine 5mg', 'Pantoprazole 40mg',
+             'Cetirizine 10mg', 'Ibuprofen 400mg', 'Levothyroxine 50mcg', 'Salbutamol inhaler', 'Vitamin D3 60000IU']
+WEEKDAY_WEIGHTS = [1.3, 1.1, 1.0, 1.0, 0.9, 0.6, 0.15]  # Monday .. Sunday
+MONTH_WEIGHTS = [1.25, 1.2, 1.0, 0.9, 0.85, 0.9, 1.1, 1.15, 1.1, 1.0, 1.0, 1.2]  # January .. December
+
+Dataset = namedtuple('Dataset', 'counts admin doctors patients department regular upcoming completed search_terms')
+
+def zipf(n, s, rng):
+    """n Zipf(s) weights in a random (seeded) order"""
+    weights = [1 / (rank + 1) ** s for rank in range(n)]
+    rng.shuffle(weights)
+    return weights
+
+def weighted(rng, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights)[0]
+
+def slot_times(morning_start, morning_end, evening_start, evening_end, step):
+    """Appointment start times of a doctor's sessions, morning first"""
+    def session(start, end):
+        if not start or not end:
+            return []
+        minutes = int(start[:2]) * 60 + int(start[3:])
+        last = int(end[:2]) * 60 + int(end[3:])
+        return [f'{m // 60:02d}:{m % 60:02d}' for m in range(minutes, last, step)]
+    return session(morning_start, morning_end), session(evening_start, evening_end)
+
+def visit_day(rng, today, span_days):
+    """A past day: denser towards the present, by weekday and by season"""
+    peak = max(WEEKDAY_WEIGHTS) * max(MONTH_WEIGHTS)
+    while True:
+        day = today - timedelta(days=1 + int(span_days * (1 - rng.random() ** 0.5)))
+        if rng.random() * peak < WEEKDAY_WEIGHTS[day.weekday()] * MONTH_WEIGHTS[day.month - 1]:
+            return day
+
+def insert(table, rows):
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(table.insert(), rows[start:start + CHUNK])
+
+def generate(departments=8, doctors=80, patients=4000, years=2, visits_per_year=2.5, seed=1, today=None):
+    """Fill the current app's (empty) database; returns a Dataset of counts and handy ids"""
+    rng = random.Random(seed)
+    today = today or date.today()
+    password_hash = hash_password(PASSWORD)
+
+    # ---- departments ----
+    existing = {d.name: d.id for d in Department.query.all()}
+    names = DEPARTMENTS[:departments] + [f'Department {n}' for n in range(len(DEPARTMENTS), departments)]
+    for name in names:
+        if name not in existing:
+            department = Department(name=name, description=f'{name} services')
+            db.session.add(department)
+            db.session.flush()
+            existing[name] = department.id
+    department_ids = [existing[name] for name in names]
+    department_weights = zipf(len(department_ids), 0.8, rng)
+
+    # ---- users, doctors, patients ----
+    first_user = (db.session.scalar(db.select(db.func.max(User.id))) or 0) + 1
+    users = [{'id': first_user, 'username': 'bench-admin', 'email': 'admin@bench.test',
+              'password_hash': password_hash, 'role': 'admin', 'is_active': True}]
+    doctor_rows, patient_rows = [], []
+    surnames = Counter()
+    for n in range(doctors):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        user_id = first_user + 1 + n
+        users.append({'id': user_id, 'username': f'dr.{first}.{last}{n}', 'email': f'dr.{first}.{last}{n}@bench.test',
+                      'password_hash': password_hash, 'role': 'doctor', 'is_active': rng.random() > 0.03})
+        department = rng.choices(range(len(department_ids)), department_weights)[0]
+        sessions = rng.choice(SESSIONS)
+        experience = int(rng.triangular(1, 35, 8))
+        doctor_rows.append({
+            'id': n + 1, 'user_id': user_id, 'department_id': department_ids[department],
+            'phone': f'98{rng.randrange(10 ** 8):08d}', 'license_number': f'MMC{100000 + n}',
+            'experience_years': experience, 'qualification': rng.choice(QUALIFICATIONS),
+            'specialization': names[department], 'bio': f'{experience} years in {names[department].lower()}.',
+            'consultation_fees': float(300 + 50 * min(experience // 3, 14)), 'rating': round(rng.uniform(3.2, 5.0), 1),
+            'is_available': rng.random() > 0.05, 'clinic_name': f'{names[department]} OPD',
+            'working_days': weighted(rng, WORKING_DAYS), 'morning_slot_start': sessions[0],
+            'morning_slot_end': sessions[1], 'evening_slot_start': sessions[2], 'evening_slot_end': sessions[3],
+            'avg_consultation_time': rng.choice([10, 15, 15, 20, 30]),
+        })
+    for n in range(patients):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        user_id = first_user + 1 + doctors + n
+        surnames[last] += 1
+        users.append({'id': user_id, 'username': f'{first}.{last}{n}', 'email': f'{first}.{last}{n}@bench.test',
+                      'password_hash': password_hash, 'role': 'patient', 'is_active': rng.random() > 0.01})
+        age = min(int(rng.gammavariate(2.2, 16)), 95)
+        insured = rng.random() < 0.35
+        patient_rows.append({
+            'id': n + 1, 'user_id': user_id, 'phone': f'+91 9{rng.randrange(10 ** 9):09d}',
+            'alternate_phone': f'0{rng.randrange(10 ** 10):010d}' if rng.random() < 0.2 else None,
+            'date_of_birth': today - timedelta(days=age * 365 + rng.randrange(365)),
+            'gender': rng.choice(['Male', 'Female']), 'blood_group': weighted(rng, BLOOD_GROUPS),
+            'address': f'{rng.randrange(1, 400)} Main Road', 'city': weighted(rng, CITIES),
+            'pincode': f'4{rng.randrange(10 ** 5):05d}',
+            'allergies': rng.choice(['Penicillin', 'Dust', 'Peanuts']) if rng.random() < 0.1 else None,
+            'insurance_provider': rng.choice(['Star Health', 'HDFC Ergo', 'ICICI Lombard']) if insured else None,
+            'insurance_id': f'INS{rng.randrange(10 ** 8):08d}' if insured else None,
+            'notification_preference': weighted(rng, [('email', 5), ('sms', 3), ('whatsapp', 2)]),
+            'total_visits': 0, 'total_spent': 0.0,
+        })
+    insert(User.__table__, users)
+    insert(Doctor.__table__, doctor_rows)
+    insert(Patient.__table__, patient_rows)
+
+    # ---- appointments ----
+    doctor_weights = zipf(doctors, 0.9, rng)
+    patient_weights = [min(rng.paretovariate(1.8), 40) for _ in range(patients)]
+    slots = {d['id']: slot_times(d['morning_slot_start'], d['morning_slot_end'], d['evening_slot_start'],
+                                 d['evening_slot_end'], d['avg_consultation_time']) for d in doctor_rows}
+    fees = {d['id']: d['consultation_fees'] for d in doctor_rows}
+    span = int(365 * years)
+    past = int(patients * visits_per_year * years)
+    upcoming = int(patients * visits_per_year * UPCOMING_DAYS / 365)
+    doctor_picks = rng.choices(range(1, doctors + 1), doctor_weights, k=past + upcoming)
+    patient_picks = rng.choices(range(1, patients + 1), patient_weights, k=past + upcoming)
+    taken = set()
+    appointments = []
+    for n in range(past + upcoming):
+        doctor_id, patient_id = doctor_picks[n], patient_picks[n]
+        morning, evening = slots[doctor_id]
+        session = morning if morning and (not evening or rng.random() < 0.65) else evening
+        appointment_time = rng.choice(session)
+        if n < past:
+            day = visit_day(rng, today, span)
+            status = weighted(rng, [('Completed', 80), ('Cancelled', 13), ('No-show', 7)])
+        else:
+            day = today + timedelta(days=int(rng.triangular(0, UPCOMING_DAYS, 0)))
+            status = weighted(rng, [('Booked', 70), ('Confirmed', 20), ('Cancelled', 10)])
+            if status == 'Booked':
+                if (doctor_id, day, appointment_time) in taken:
+                    continue
+                taken.add((doctor_id, day, appointment_time))
+        booked = datetime.combine(day - timedelta(days=int(rng.expovariate(1 / 6))), time(8)) + \
+            timedelta(minutes=rng.randrange(12 * 60))
+        appointments.append({
+            'patient_id': patient_id, 'doctor_id': doctor_id, 'appointment_date': day,
+            'appointment_time': appointment_time, 'status': status,
+            'appointment_type': weighted(rng, [('Regular', 75), ('Follow-up', 20), ('Emergency', 5)]),
+            'consultation_fees': fees[doctor_id], 'reminder_sent': day < today,
+            'payment_status': weighted(rng, [('Paid', 3), ('Insurance', 1)]) if status == 'Completed' else 'Pending',
+            'is_confirmed': status in ('Completed', 'Confirmed'), 'created_at': min(booked, datetime.now()),
+        })
+    appointments.sort(key=lambda a: (a['created_at'], a['doctor_id'], a['appointment_time']))
+    for n, appointment in enumerate(appointments, 1):
+        appointment['id'] = n
+    insert(Appointment.__table__, appointments)
+
+    # ---- treatments ----
+    diagnosis_weights = zipf(len(DIAGNOSES), 1.0, rng)
+    treatments = []
+    for appointment in appointments:  # the treatment form always submits notes, possibly empty
+        if appointment['status'] != 'Completed' or rng.random() > 0.85:
+            continue
+        code, diagnosis = rng.choices(DIAGNOSES, diagnosis_weights)[0]
+        duration = rng.choice([3, 5, 7, 10, 14, 30, 90])
+        seen = datetime.combine(appointment['appointment_date'], time.fromisoformat(appointment['appointment_time']))
+        follow_up = rng.random() < 0.25
+        treatments.append({
+            'appointment_id': appointment['id'], 'patient_id': appointment['patient_id'],
+            'doctor_id': appointment['doctor_id'], 'diagnosis': diagnosis, 'icd_code': code,
+            'prescription': ', '.join(rng.sample(MEDICINES, rng.randint(1, 3))),
+            'dosage_instructions': rng.choice(['After meals', 'Twice daily', 'At bedtime', 'As needed']),
+            'duration_days': duration, 'follow_up_required': follow_up,
+            'follow_up_days': rng.choice([7, 14, 30]) if follow_up else None,
+            'consultation_duration': rng.randint(5, 30),
+            'notes': rng.choice(['Review with reports', 'Advised rest and fluids', 'Continue current medication', '']),
+            'status': 'Completed' if appointment['appointment_date'] + timedelta(days=duration) < today else 'Active',
+            'created_at': seen + timedelta(minutes=rng.randint(5, 40)),
+        })
+    insert(Treatment.__table__, treatments)
+
+    # ---- derived data ----
+    booked_by_doctor = Counter(a['doctor_id'] for a in appointments)
+    patients_by_doctor = Counter(doctor_id for doctor_id, _ in {(a['doctor_id'], a['patient_id']) for a in appointments})
+    db.session.execute(Doctor.__table__.update().where(Doctor.id == db.bindparam('_id')).values(
+        total_appointments=db.bindparam('total_appointments'), total_patients=db.bindparam('total_patients')),
+        [{'_id': d, 'total_appointments': booked_by_doctor[d], 'total_patients': patients_by_doctor[d]}
+         for d in booked_by_doctor])
+    visits, spent, last_visit = Counter(), Counter(), {}
+    for a in appointments:
+        visits[a['patient_id']] += 1
+        last_visit[a['patient_id']] = max(last_visit.get(a['patient_id'], a['created_at']), a['created_at'])
+        if a['status'] == 'Completed':
+            spent[a['patient_id']] += a['consultation_fees']
+    db.session.execute(Patient.__table__.update().where(Patient.id == db.bindparam('_id')).values(
+        total_visits=db.bindparam('total_visits'), total_spent=db.bindparam('total_spent'),
+        last_visit=db.bindparam('last_visit')),
+        [{'_id': p, 'total_visits': visits[p], 'total_spent': spent[p], 'last_visit': last_visit[p]} for p in visits])
+    connection = db.session.connection()
+    rebuild_phones(connection)
+    rebuild_counters(connection)
+    db.session.commit()
+
+    # ---- handy ids for scenarios: the busiest and a median active doctor and patient ----
+    active = {user['id'] for user in users if user['is_active']}
+    by_load = sorted((d for d in booked_by_doctor if doctor_rows[d - 1]['user_id'] in active),
+                     key=lambda d: (-booked_by_doctor[d], d))
+    by_visits = sorted((p for p in visits if patient_rows[p - 1]['user_id'] in active),
+                       key=lambda p: (-visits[p], p))
+    pick_doctors = [by_load[0], by_load[len(by_load) // 2]]
+    pick_patients = [by_visits[0], by_visits[len(by_visits) // 2]]
+    upcoming_ids = [a['id'] for a in appointments if a['status'] == 'Booked' and a['doctor_id'] == by_load[0]]
+    completed_ids = [a['id'] for a in appointments if a['status'] == 'Completed' and a['patient_id'] == by_visits[0]]
+    return Dataset(
+        counts={'departments': len(department_ids), 'doctors': doctors, 'patients': patients,
+                'appointments': len(appointments), 'treatments': len(treatments)},
+        admin=first_user,
+        doctors=[(d, doctor_rows[d - 1]['user_id']) for d in pick_doctors],
+        patients=[(p, patient_rows[p - 1]['user_id'], patient_rows[p - 1]['phone']) for p in pick_patients],
+        department=department_ids[max(range(len(department_ids)), key=lambda i: department_weights[i])],
+        regular=Counter(a['patient_id'] for a in appointments if a['doctor_id'] == by_load[0]).most_common(1)[0][0],
+        upcoming=upcoming_ids,
+        completed=completed_ids,
+        search_terms=[surnames.most_common(1)[0][0], surnames.most_common()[-1][0][:3]],
+    )
+
+def fingerprint(today=None):
+    """Digest of the generated appointments and treatments, with dates as offsets from today"""
+    today = today or date.today()
+    digest = hashlib.sha256()
+    for row in db.session.execute(db.select(
+            Appointment.id, Appointment.patient_id, Appointment.doctor_id, Appointment.appointment_date,
+            Appointment.appointment_time, Appointment.status).order_by(Appointment.id)):
+        digest.update(f'{row.id},{row.patient_id},{row.doctor_id},{(row.appointment_date - today).days},'
+                      f'{row.appointment_time},{row.status};'.encode())
+    for row in db.session.execute(db.select(Treatment.appointment_id, Treatment.icd_code).order_by(Treatment.id)):
+        digest.update(f'{row.appointment_id},{row.icd_code};'.encode())
+    return digest.hexdigest()[:16]
+
+def add_arguments(parser):
+    parser.add_argument('--departments', type=int, default=8)
+    parser.add_argument('--doctors', type=int, default=80)
+    parser.add_argument('--patients', type=int, default=4000)
+    parser.add_argument('--years', type=float, default=2)
+    parser.add_argument('--visits-per-year', type=float, default=2.5)
+    parser.add_argument('--seed', type=int, default=1)
+
+def scale(args):
+    return {name: getattr(args, name) for name in
+            ('departments', 'doctors', 'patients', 'years', 'visits_per_year', 'seed')}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic hospital database.')
+    parser.add_argument('database', nargs='?', default='synthetic.db')
+    add_arguments(parser)
+    args = parser.parse_args()
+    if os.path.exists(args.database):
+        sys.exit(f'{args.database} already exists')
+    from app import create_app
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(args.database)}', 'JOB_WORKERS': 0})
+    with app.app_context():
+        dataset = generate(**scale(args))
+        print(f'{args.database}: {dataset.counts}, fingerprint {fingerprint()}')
+        print(f'every user logs in with password {PASSWORD!r}; admin is bench-admin')
@@ -1,11 +1,90 @@
 # Database configuration
 import os
 
+def _threshold_ms(name, default):
+    """A millisecond threshold from the environment: unset gives default; '', '0' or 'off' give None (disabled)"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    if value.strip().lower() in ('', '0', 'off'):
+        return None
+    return float(value)
+
 class Config:
     """Base configuration"""
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///hospital.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///hospital.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SECRET_KEY = 'hospital-management-system-secret-key-2025'
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'hospital-management-system-secret-key-2025')
+    REMEMBER_COOKIE_DURATION = 86400 * 7  # 7 days
+    REMEMBER_COOKIE_SECURE = False  # Set to True in production with HTTPS
+    PERMANENT_SESSION_LIFETIME = 86400 * 7  # 7 days
+    BULK_IMPORT_BATCH_SIZE = 2000  # rows per executemany/transaction in /api/bulk
+    PASSWORD_HASH_METHOD = 'scrypt'  # Werkzeug method:cost for new password hashes
+    PASSWORD_VERIFY_WORKERS = 0  # >0 verifies logins in a process pool of this size
+    PASSWORD_VERIFY_QUEUE = 4  # checks in flight per pool worker before further logins wait
+    SEARCH_RESULT_LIMIT = 50  # rows shown by the admin patient/doctor search pages
+    SLOT_MAX_DAYS = 62  # longest range /api/doctors/<id>/slots returns
+    SCHEDULE_CACHE_SIZE = 50000  # (doctor, date) calendars kept in memory per process
+    EVENT_BUFFER_SIZE = 256  # recent events per doctor kept for SSE reconnects (Last-Event-ID)
+    SSE_HEARTBEAT_SECONDS = 15  # keep-alive comment interval on idle event streams
+    REMINDER_TRANSPORT = 'log'  # stand-in reminder transport: 'log' or 'file' (NDJSON per channel)
+    REMINDER_OUTBOX = 'outbox'  # directory for the 'file' transport
+    REMINDER_BATCH_SIZE = 1000  # due appointments read and marked per batch
+    REMINDER_CHUNK_SIZE = 200  # reminders per transport send() call
+    REMINDER_CONCURRENCY = 4  # send() calls in flight
+    JOB_WORKERS = 2  # background job threads per web process, started on first enqueue (0 = use flask run-jobs)
+    JOB_POLL_SECONDS = 1.0  # idle workers look for due retries this often
+    JOB_LEASE_SECONDS = 300  # a job running longer is assumed abandoned and claimed again
+    JOB_RETRY_DELAY_SECONDS = 5  # first retry delay, doubled per attempt
+    JOB_RETENTION_SECONDS = 86400  # finished jobs are purged after this long
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED') == '1'  # per-endpoint metrics at /admin/metrics
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # lets a Prometheus scraper read /admin/metrics/prometheus with a bearer token
+    # Statements this slow are logged with their plan. None or 0 turns the log
+    # off; so do SLOW_QUERY_MS='', '0' or 'off' in the environment
+    SLOW_QUERY_MS = _threshold_ms('SLOW_QUERY_MS', 250.0)
+    SLOW_QUERY_BUFFER_SIZE = 100  # slow statements kept per process for /admin/slow-queries
+    SLOW_QUERY_EXPLAIN = True  # capture EXPLAIN QUERY PLAN for each slow statement
+    PHONE_NATIONAL_DIGITS = 10  # phone lookups compare this many trailing digits (+91 / 0 dropped)
+
+    # Connection pool (SQLAlchemy uses a QueuePool for file-backed SQLite)
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 10,
+        'max_overflow': 10,
+        'pool_timeout': 30,
+    }
+
+    # PRAGMAs run on every new SQLite connection (ignored for other databases).
+    # WAL lets dashboards read while a booking writes; readers and the single
+    # writer only wait on busy_timeout (ms) instead of failing with
+    # "database is locked". synchronous=NORMAL is durable in WAL mode except
+    # for the last transactions before a power loss.
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # negative = KiB, i.e. 64 MiB per connection
+        'temp_store': 'MEMORY',
+    }
+
+    # Read replica: reporting endpoints (blueprint or blueprint.endpoint names)
+    # read from the 'replica' bind when DATABASE_REPLICA_URL is set. A user who
+    # just wrote reads from the primary for REPLICA_STICKY_SECONDS.
+    SQLALCHEMY_BINDS = {'replica': os.environ['DATABASE_REPLICA_URL']} if os.environ.get('DATABASE_REPLICA_URL') else {}
+    REPLICA_ENDPOINTS = [
+        'admin.dashboard',
+        'admin.appointments',
+        'admin.all_treatments',
+        'admin.search_patients',
+        'admin.search_doctors',
+        'api.search',
+        'api.get_stats',
+        'api.export_appointments',
+        'api.export_treatments',
+        'patient.my_appointments',
+        'patient.treatment_history',
+    ]
+    REPLICA_STICKY_SECONDS = 10
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -19,3 +98,12 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+
+# Selected with create_app(config_name=...) or the FLASK_CONFIG environment variable
+config = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+    'default': Config,
+}
@@ -0,0 +1,130 @@
+# Shared pytest fixtures
+# Each test gets its own SQLite file so tests never touch instance/hospital.db.
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Manual scripts that need a live server on localhost:5000 or the real database
+collect_ignore = [
+    'test_api.py',
+    'test_login.py',
+    'test_session.py',
+    'test_doctor_login_manual.py',
+    'test_milestone2_auth.py',
+    'debug_login_test.py',
+]
+
+@pytest.fixture
+def app(tmp_path):
+    from app import create_app, db
+    app = create_app({
+        'TESTING': True,
+        'RAISE_ON_TEMPLATE_LAZY_LOAD': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+    })
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def query_counter(app):
+    """Context manager that records the SQL statements run inside it"""
+    from contextlib import contextmanager
+    from sqlalchemy import event
+    from app import db
+
+    @contextmanager
+    def _count():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    return _count
+
+@pytest.fixture
+def assert_max_queries(query_counter):
+    """Fail if the block runs more than `limit` SQL statements"""
+    from contextlib import contextmanager
+
+    @contextmanager
+    def _assert(limit):
+        with query_counter() as statements:
+            yield statements
+        assert len(statements) <= limit, \
+            f'{len(statements)} queries (limit {limit}):\n' + '\n'.join(statements)
+    return _assert
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def factory(app):
+    """Helpers to create users with role profiles without hashing passwords"""
+    from app import db
+    from models.user import User
+    from models.doctor import Doctor
+    from models.patient import Patient
+    from models.department import Department
+
+    class Factory:
+        counter = 0
+
+        def user(self, role, **fields):
+            Factory.counter += 1
+            n = Factory.counter
+            user = User(username=fields.pop('username', f'{role}{n}'),
+                        email=fields.pop('email', f'{role}{n}@test.com'),
+                        password_hash='unused', role=role,
+                        is_active=fields.pop('is_active', True))
+            db.session.add(user)
+            db.session.flush()
+            return user
+
+        def admin(self):
+            user = self.user('admin')
+            db.session.commit()
+            return user
+
+        def doctor(self, department_id=None, **fields):
+            user = self.user('doctor', **{k: fields.pop(k) for k in ('username', 'is_active') if k in fields})
+            if department_id is None:
+                department_id = Department.query.first().id
+            doctor = Doctor(user_id=user.id, department_id=department_id, **fields)
+            db.session.add(doctor)
+            db.session.commit()
+            return doctor
+
+        def patient(self, **fields):
+            user = self.user('patient', **{k: fields.pop(k) for k in ('username', 'is_active') if k in fields})
+            patient = Patient(user_id=user.id, **fields)
+            db.session.add(patient)
+            db.session.commit()
+            return patient
+
+    return Factory()
+
+@pytest.fixture
+def login(client):
+    """Log the test client in as the given user"""
+    def _login(user):
+        from flask import g
+        # Requests reuse the fixture's app context, so drop Flask-Login's cached
+        # user and the per-request identity (utils/identity.py)
+        g.pop('_login_user', None)
+        g.pop('_identity', None)
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user.id)
+            sess['_fresh'] = True
+        return client
+    return _login
@@ -3,6 +3,31 @@ from datetime import datetime
 
 class Appointment(db.Model):
     __tablename__ = 'appointments'
+    __table_args__ = (
+        # Double-booking check and doctor schedules
+        db.Index('ix_appointments_doctor_slot', 'doctor_id', 'appointment_date', 'appointment_time', 'status'),
+        # Patient appointment lists and history
+        db.Index('ix_appointments_patient_date', 'patient_id', 'appointment_date', 'appointment_time'),
+        # Admin lists ordered by date, optionally filtered by status
+        db.Index('ix_appointments_date_time', 'appointment_date', 'appointment_time'),
+        db.Index('ix_appointments_status_date', 'status', 'appointment_date', 'appointment_time'),
+        db.Index('ix_appointments_created_at', 'created_at'),
+        # At most one active booking per doctor slot (see utils/booking.py)
+        db.Index('uq_appointments_active_slot', 'doctor_id', 'appointment_date', 'appointment_time',
+                 unique=True,
+                 sqlite_where=db.text("status = 'Booked'"),
+                 postgresql_where=db.text("status = 'Booked'")),
+        # One appointment per queue position and the queue's call order (see utils/patient_queue.py)
+        db.Index('uq_appointments_queue_position', 'doctor_id', 'appointment_date', 'queue_position',
+                 unique=True,
+                 sqlite_where=db.text('queue_position IS NOT NULL'),
+                 postgresql_where=db.text('queue_position IS NOT NULL')),
+        # Upcoming appointments still owed a reminder (see utils/reminders.py); the constant
+        # reminder_sent column gives SQLite an equality term, so it picks this over status_date
+        db.Index('ix_appointments_reminder_due', 'reminder_sent', 'appointment_date', 'id',
+                 sqlite_where=db.text("reminder_sent = 0 AND status IN ('Booked', 'Confirmed')"),
+                 postgresql_where=db.text("reminder_sent = false AND status IN ('Booked', 'Confirmed')")),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
@@ -0,0 +1,11 @@
+from app import db
+
+class DoctorQueue(db.Model):
+    __tablename__ = 'doctor_queues'
+
+    # One row per doctor and day with a check-in queue (utils/patient_queue.py)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    last_position = db.Column(db.Integer, nullable=False, default=0)  # highest position handed out
+    serving_position = db.Column(db.Integer, nullable=False, default=0)  # position called last, 0 = none yet
+    called_at = db.Column(db.DateTime)
@@ -0,0 +1,9 @@
+from app import db
+
+class IdentityVersion(db.Model):
+    __tablename__ = 'identity_versions'
+
+    # Bumped with every change to a user's cached identity (utils/identity.py);
+    # a missing row is version 0. No foreign key: the row outlives a deleted user
+    user_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,22 @@
+from app import db
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Workers claim the oldest runnable job (see utils/jobs.py)
+        db.Index('ix_jobs_status_run_after', 'status', 'run_after', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), nullable=False)  # handler registered with utils.jobs.job()
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    idempotency_key = db.Column(db.String(120), unique=True)  # enqueueing the same key again is a no-op
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False)
+    locked_by = db.Column(db.String(80))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    finished_at = db.Column(db.DateTime)
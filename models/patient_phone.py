@@ -0,0 +1,15 @@
+from app import db
+
+class PatientPhone(db.Model):
+    __tablename__ = 'patient_phones'
+
+    # One row per stored number, kept in sync by utils/phones.py
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), primary_key=True)
+    field = db.Column(db.String(20), primary_key=True)  # phone or alternate_phone
+    digits = db.Column(db.String(20), nullable=False)  # national number, digits only
+    reversed_digits = db.Column(db.String(20), nullable=False)  # for "last N digits" lookups
+
+    __table_args__ = (
+        db.Index('ix_patient_phones_digits', 'digits', 'patient_id'),
+        db.Index('ix_patient_phones_reversed', 'reversed_digits', 'patient_id'),
+    )
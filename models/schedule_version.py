@@ -0,0 +1,10 @@
+from app import db
+
+class ScheduleVersion(db.Model):
+    __tablename__ = 'schedule_versions'
+
+    # Bumped with every change to a doctor's bookings or availability on a date
+    # (utils/schedule_cache.py); a missing row is version 0
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,8 @@
+from app import db
+
+class StatsCounter(db.Model):
+    __tablename__ = 'stats_counters'
+
+    # e.g. doctors.total, appointments.status.Booked, departments.3.doctors
+    key = db.Column(db.String(120), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
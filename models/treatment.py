@@ -2,6 +2,14 @@ from app import db
 
 class Treatment(db.Model):
     __tablename__ = 'treatments'
+    __table_args__ = (
+        # Patient treatment history ordered by newest first
+        db.Index('ix_treatments_patient_created', 'patient_id', 'created_at'),
+        db.Index('ix_treatments_doctor_created', 'doctor_id', 'created_at'),
+        db.Index('ix_treatments_appointment', 'appointment_id'),
+        # Admin list of all treatments
+        db.Index('ix_treatments_created_at', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=False)
@@ -25,6 +33,10 @@ class Treatment(db.Model):
 
 class DoctorAvailability(db.Model):
     __tablename__ = 'doctor_availabilities'
+    __table_args__ = (
+        # Date overrides read by the availability engine (utils/availability.py)
+        db.Index('ix_doctor_availabilities_doctor_date', 'doctor_id', 'date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
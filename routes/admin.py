@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, current_app, abort
 from flask_login import login_required, current_user
 from app import db
 from models.user import User
@@ -7,8 +7,15 @@ from models.patient import Patient
 from models.appointment import Appointment
 from models.department import Department
 from models.treatment import Treatment
+from utils.stats import dashboard_stats
+from utils.search import patient_index, doctor_index
+from utils.phones import matching as phone_matches, looks_like_phone
+from utils.instrumentation import current_metrics
+from utils.slow_queries import current_slow_queries
 from datetime import datetime
+import hmac
 from sqlalchemy import or_, and_
+from sqlalchemy.orm import joinedload, contains_eager
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -25,67 +32,34 @@ def admin_required(f):
 @admin_required
 def dashboard():
     """Enhanced admin dashboard with KPIs and statistics"""
-    total_doctors = Doctor.query.count()
-    total_patients = Patient.query.count()
-    total_appointments = Appointment.query.count()
-    
-    # Upcoming appointments (today onwards)
-    today = datetime.today().date()
-    upcoming_appointments = Appointment.query.filter(
-        and_(
-            Appointment.appointment_date >= today,
-            Appointment.status.in_(['Booked', 'Confirmed'])
-        )
-    ).count()
-    
-    # Past appointments (completed)
-    past_appointments = Appointment.query.filter(
-        Appointment.status == 'Completed'
-    ).count()
-    
-    # Get active doctors (is_active = True)
-    active_doctors = Doctor.query.join(User).filter(User.is_active == True).count()
-    
-    # Get active patients (is_active = True)
-    active_patients = Patient.query.join(User).filter(User.is_active == True).count()
-    
-    # Total treatments
-    total_treatments = Treatment.query.count()
-    
-    # Department statistics
-    departments = Department.query.all()
-    dept_stats = []
-    for dept in departments:
-        doctor_count = Doctor.query.filter_by(department_id=dept.id).count()
-        dept_stats.append({
-            'name': dept.name,
-            'doctors': doctor_count
-        })
+    stats = dashboard_stats()
     
     return render_template('admin/dashboard.html', 
-                         total_doctors=total_doctors,
-                         active_doctors=active_doctors,
-                         total_patients=total_patients,
-                         active_patients=active_patients,
-                         total_appointments=total_appointments,
-                         upcoming_appointments=upcoming_appointments,
-                         past_appointments=past_appointments,
-                         total_treatments=total_treatments,
-                         dept_stats=dept_stats)
+                         total_doctors=stats['doctors']['total'],
+                         active_doctors=stats['doctors']['active'],
+                         total_patients=stats['patients']['total'],
+                         active_patients=stats['patients']['active'],
+                         total_appointments=stats['appointments']['total'],
+                         upcoming_appointments=stats['appointments']['upcoming'],
+                         past_appointments=stats['appointments']['completed'],
+                         total_treatments=stats['treatments']['total'],
+                         dept_stats=stats['departments'])
 
 @admin_bp.route('/doctors')
 @admin_required
 def doctors():
     """View all doctors with active/inactive status"""
     page = request.args.get('page', 1, type=int)
-    doctors = Doctor.query.join(User).paginate(page=page, per_page=10)
+    doctors = Doctor.query.join(User).options(
+        contains_eager(Doctor.user), joinedload(Doctor.department)
+    ).paginate(page=page, per_page=10)
     return render_template('admin/doctors.html', doctors=doctors)
 
 @admin_bp.route('/doctor/<int:doctor_id>/edit', methods=['GET', 'POST'])
 @admin_required
 def edit_doctor(doctor_id):
     """Edit doctor profile"""
-    doctor = Doctor.query.get_or_404(doctor_id)
+    doctor = Doctor.query.options(joinedload(Doctor.user)).filter_by(id=doctor_id).first_or_404()
     departments = Department.query.all()
     
     if request.method == 'POST':
@@ -215,7 +189,11 @@ def appointments():
     page = request.args.get('page', 1, type=int)
     status_filter = request.args.get('status', 'all')
     
-    query = Appointment.query
+    query = Appointment.query.options(
+        joinedload(Appointment.patient).joinedload(Patient.user),
+        joinedload(Appointment.doctor).joinedload(Doctor.user),
+        joinedload(Appointment.doctor).joinedload(Doctor.department)
+    )
     
     # Filter by status
     if status_filter != 'all':
@@ -232,7 +210,7 @@ def appointments():
 def patients():
     """View all patients with active/inactive status"""
     page = request.args.get('page', 1, type=int)
-    patients = Patient.query.join(User).paginate(page=page, per_page=10)
+    patients = Patient.query.join(User).options(contains_eager(Patient.user)).paginate(page=page, per_page=10)
     return render_template('admin/patients.html', patients=patients)
 
 @admin_bp.route('/search/patients', methods=['GET', 'POST'])
@@ -246,16 +224,18 @@ def search_patients():
         query_text = request.form.get('q') or request.args.get('q', '')
         
         if query_text:
-            # Search in patient name (via user), email, phone, or ID
-            results = Patient.query.join(User).filter(
-                or_(
-                    User.username.ilike(f'%{query_text}%'),
-                    User.email.ilike(f'%{query_text}%'),
-                    Patient.phone.ilike(f'%{query_text}%'),
-                    Patient.alternate_phone.ilike(f'%{query_text}%'),
-                    Patient.id == query_text if query_text.isdigit() else False
-                )
-            ).all()
+            # Ranked full-text search over name, email and phones, plus an exact ID match
+            limit = current_app.config['SEARCH_RESULT_LIMIT']
+            query = Patient.query.join(User).options(contains_eager(Patient.user))
+            results = patient_index.search(query, query_text, limit).all()
+            # Phone numbers in any format: exact number or its last digits, listed first
+            if looks_like_phone(query_text):
+                by_phone = query.filter(Patient.id.in_(phone_matches(query_text))).order_by(Patient.id).limit(limit).all()
+                results = by_phone + [patient for patient in results if patient not in by_phone]
+            if query_text.isdigit():
+                by_id = query.filter(Patient.id == int(query_text)).first()
+                if by_id and by_id not in results:
+                    results.insert(0, by_id)
     
     return render_template('admin/search_patients.html', results=results, query=query_text)
 
@@ -270,14 +250,11 @@ def search_doctors():
         query_text = request.form.get('q') or request.args.get('q', '')
         
         if query_text:
-            # Search in doctor name (via user) or specialization
-            results = Doctor.query.join(User).filter(
-                or_(
-                    User.username.ilike(f'%{query_text}%'),
-                    Doctor.specialization.ilike(f'%{query_text}%'),
-                    Doctor.qualification.ilike(f'%{query_text}%')
-                )
-            ).all()
+            # Ranked full-text search over name, email, specialization and qualification
+            query = Doctor.query.join(User).options(
+                contains_eager(Doctor.user), joinedload(Doctor.department)
+            )
+            results = doctor_index.search(query, query_text, current_app.config['SEARCH_RESULT_LIMIT']).all()
     
     return render_template('admin/search_doctors.html', results=results, query=query_text)
 
@@ -366,8 +343,11 @@ def remove_patient(patient_id):
 @admin_required
 def patient_treatments(patient_id):
     """View all treatment records for a specific patient"""
-    patient = Patient.query.get_or_404(patient_id)
-    treatments = Treatment.query.filter_by(patient_id=patient_id).order_by(Treatment.created_at.desc()).all()
+    patient = Patient.query.options(joinedload(Patient.user)).filter_by(id=patient_id).first_or_404()
+    treatments = Treatment.query.options(
+        joinedload(Treatment.doctor).joinedload(Doctor.user),
+        joinedload(Treatment.doctor).joinedload(Doctor.department)
+    ).filter_by(patient_id=patient_id).order_by(Treatment.created_at.desc()).all()
     
     return render_template('admin/patient_treatments.html', patient=patient, treatments=treatments)
 
@@ -377,6 +357,56 @@ def patient_treatments(patient_id):
 def all_treatments():
     """View all treatment records in the system"""
     page = request.args.get('page', 1, type=int)
-    treatments = Treatment.query.order_by(Treatment.created_at.desc()).paginate(page=page, per_page=15)
+    treatments = Treatment.query.options(
+        joinedload(Treatment.patient).joinedload(Patient.user),
+        joinedload(Treatment.doctor).joinedload(Doctor.user),
+        joinedload(Treatment.doctor).joinedload(Doctor.department)
+    ).order_by(Treatment.created_at.desc()).paginate(page=page, per_page=15)
     
     return render_template('admin/treatments.html', treatments=treatments)
+
+@admin_bp.route('/metrics')
+@admin_required
+def metrics():
+    """Per-endpoint latency percentiles, queries and lazy loads per request (INSTRUMENTATION_ENABLED)"""
+    recorder = current_metrics()
+    return render_template('admin/metrics.html', enabled=recorder is not None,
+                           rows=recorder.rows() if recorder else [],
+                           since=datetime.fromtimestamp(recorder.started) if recorder else None)
+
+@admin_bp.route('/metrics/reset', methods=['POST'])
+@admin_required
+def reset_metrics():
+    recorder = current_metrics()
+    if recorder:
+        recorder.reset()
+        flash('Metrics reset', 'success')
+    return redirect(url_for('admin.metrics'))
+
+@admin_bp.route('/metrics/prometheus')
+def prometheus_metrics():
+    """The same metrics in Prometheus text format, for admins or a scraper holding METRICS_TOKEN"""
+    token = current_app.config.get('METRICS_TOKEN')
+    scraper = token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not scraper and (not current_user.is_authenticated or current_user.role != 'admin'):
+        abort(403)
+    recorder = current_metrics()
+    if recorder is None:
+        abort(404)
+    return Response(recorder.prometheus(), mimetype='text/plain; version=0.0.4')
+
+@admin_bp.route('/slow-queries')
+@admin_required
+def slow_queries():
+    """Recent statements over SLOW_QUERY_MS with their parameters, origin and query plan"""
+    log = current_slow_queries()
+    return render_template('admin/slow_queries.html', log=log, entries=log.entries() if log else [])
+
+@admin_bp.route('/slow-queries/clear', methods=['POST'])
+@admin_required
+def clear_slow_queries():
+    log = current_slow_queries()
+    if log:
+        log.clear()
+        flash('Slow-query log cleared', 'success')
+    return redirect(url_for('admin.slow_queries'))
@@ -1,4 +1,4 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, current_app
 from flask_login import login_required, current_user
 from app import db
 from models.user import User
@@ -6,8 +6,25 @@ from models.doctor import Doctor
 from models.patient import Patient
 from models.appointment import Appointment
 from models.department import Department
-from datetime import datetime
+from models.treatment import Treatment
+from utils.booking import SlotReservation, SlotUnavailable, book_deferred
+from utils.stats import dashboard_stats
+from utils.serializers import DoctorSerializer, PatientSerializer, AppointmentSerializer
+from utils.pagination import keyset_paginate, InvalidCursor
+from utils.export import export_response, FORMATS as EXPORT_FORMATS
+from utils.bulk_import import IMPORTERS, read_rows
+from utils.identity import current_doctor_id, current_patient_id
+from utils.replica import pin_to_primary
+from utils.search import patient_index, doctor_index
+from utils.phones import matching as phone_matches, MIN_SUFFIX_DIGITS
+from utils.availability import Schedule, SCHEDULE_COLUMNS, free_slots, earliest_slots, to_clock
+from utils.patient_queue import PatientQueue, QueueError
+from utils.events import current_broker, event_stream, patient_channel
+from utils.jobs import metrics as job_metrics
+import csv
+from datetime import datetime, timedelta
 from sqlalchemy import or_, and_
+from sqlalchemy.orm import aliased
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -49,122 +66,121 @@ def error_response(message, status=400):
         'error': message
     }), status
 
+def keyset_response(name, serializer, query, columns, per_page, descending=False):
+    """
+    Cursor-mode list response, used when the request has an after= parameter
+    (empty for the first page). No COUNT is run; pagination.after is the token
+    for the next page, or null on the last one.
+    """
+    try:
+        page = keyset_paginate(serializer.apply(query), columns, request.args.get('after'),
+                               per_page, descending)
+    except InvalidCursor as e:
+        return error_response(str(e))
+    return success_response({
+        name: serializer.dump_many(page.items),
+        'pagination': page.to_dict()
+    })
+
+def scoped_query(model, date_column):
+    """
+    Role-scoped query for Appointment or Treatment (admin: all rows, doctor and
+    patient: their own), filtered by the status, date_from and date_to query
+    params. Returns (query, None) or (None, error response).
+    """
+    status = request.args.get('status')
+    date_from = request.args.get('date_from')
+    date_to = request.args.get('date_to')
+    
+    # Base query based on role
+    if current_user.role == 'admin':
+        query = model.query
+    elif current_user.role == 'doctor':
+        doctor_id = current_doctor_id()
+        if not doctor_id:
+            return None, error_response('Doctor profile not found', 404)
+        query = model.query.filter_by(doctor_id=doctor_id)
+    elif current_user.role == 'patient':
+        patient_id = current_patient_id()
+        if not patient_id:
+            return None, error_response('Patient profile not found', 404)
+        query = model.query.filter_by(patient_id=patient_id)
+    else:
+        return None, error_response('Unauthorized', 403)
+    
+    # Apply filters
+    if status:
+        query = query.filter(model.status == status)
+    
+    # DateTime columns compare against whole days
+    day_range = isinstance(date_column.type, db.DateTime)
+    
+    if date_from:
+        try:
+            date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
+            query = query.filter(date_column >= (date_from_obj if day_range else date_from_obj.date()))
+        except ValueError:
+            return None, error_response('Invalid date_from format. Use YYYY-MM-DD')
+    
+    if date_to:
+        try:
+            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d')
+            if day_range:
+                query = query.filter(date_column < date_to_obj + timedelta(days=1))
+            else:
+                query = query.filter(date_column <= date_to_obj.date())
+        except ValueError:
+            return None, error_response('Invalid date_to format. Use YYYY-MM-DD')
+    
+    return query, None
+
+def visible_patients():
+    """
+    Patients the current user may see (admin: all active, doctor: those with
+    appointments with them, patient: themselves), joined to User.
+    Returns (query, None) or (None, error response).
+    """
+    if current_user.role == 'admin':
+        return Patient.query.join(User).filter(User.is_active == True), None
+    elif current_user.role == 'doctor':
+        doctor_id = current_doctor_id()
+        if not doctor_id:
+            return None, error_response('Doctor profile not found', 404)
+        
+        # Patients with appointments, as a subquery rather than a separate round trip
+        patient_ids = db.session.query(Appointment.patient_id).filter_by(doctor_id=doctor_id)
+        return Patient.query.join(User).filter(Patient.id.in_(patient_ids)), None
+    elif current_user.role == 'patient':
+        return Patient.query.join(User).filter(Patient.id == current_patient_id()), None
+    return None, error_response('Unauthorized', 403)
+
+def export_format():
+    """Export format from the format query param (ndjson or csv), or None if unsupported"""
+    fmt = request.args.get('format', 'ndjson').lower()
+    return fmt if fmt in EXPORT_FORMATS else None
+
+def named_parties(query, model):
+    """Join a query on Appointment or Treatment to the patient's and doctor's users"""
+    patient_user, doctor_user = aliased(User), aliased(User)
+    query = query.join(Patient, model.patient_id == Patient.id) \
+        .join(patient_user, Patient.user_id == patient_user.id) \
+        .join(Doctor, model.doctor_id == Doctor.id) \
+        .join(doctor_user, Doctor.user_id == doctor_user.id)
+    return query, patient_user, doctor_user
+
 # ==================== Model Serialization ====================
 
 def doctor_to_dict(doctor, include_user=True):
     """Convert Doctor model to dictionary"""
-    data = {
-        'id': doctor.id,
-        'phone': doctor.phone,
-        'license_number': doctor.license_number,
-        'experience_years': doctor.experience_years,
-        'qualification': doctor.qualification,
-        'specialization': doctor.specialization,
-        'bio': doctor.bio,
-        'consultation_fees': doctor.consultation_fees,
-        'rating': doctor.rating,
-        'total_patients': doctor.total_patients,
-        'total_appointments': doctor.total_appointments,
-        'is_available': doctor.is_available,
-        'clinic_name': doctor.clinic_name,
-        'working_days': doctor.working_days,
-        'morning_slot_start': doctor.morning_slot_start,
-        'morning_slot_end': doctor.morning_slot_end,
-        'evening_slot_start': doctor.evening_slot_start,
-        'evening_slot_end': doctor.evening_slot_end,
-        'avg_consultation_time': doctor.avg_consultation_time,
-        'created_at': doctor.created_at.isoformat() if doctor.created_at else None,
-    }
-    
-    if include_user and doctor.user:
-        data['user'] = {
-            'id': doctor.user.id,
-            'username': doctor.user.username,
-            'email': doctor.user.email,
-            'is_active': doctor.user.is_active
-        }
-    
-    if doctor.department:
-        data['department'] = {
-            'id': doctor.department.id,
-            'name': doctor.department.name
-        }
-    
-    return data
+    return DoctorSerializer(include_user).dump(doctor)
 
 def patient_to_dict(patient, include_user=True):
     """Convert Patient model to dictionary"""
-    data = {
-        'id': patient.id,
-        'phone': patient.phone,
-        'alternate_phone': patient.alternate_phone,
-        'date_of_birth': patient.date_of_birth.isoformat() if patient.date_of_birth else None,
-        'gender': patient.gender,
-        'blood_group': patient.blood_group,
-        'address': patient.address,
-        'city': patient.city,
-        'pincode': patient.pincode,
-        'medical_history': patient.medical_history,
-        'allergies': patient.allergies,
-        'insurance_provider': patient.insurance_provider,
-        'insurance_id': patient.insurance_id,
-        'emergency_contact': patient.emergency_contact,
-        'emergency_contact_name': patient.emergency_contact_name,
-        'enable_notifications': patient.enable_notifications,
-        'notification_preference': patient.notification_preference,
-        'last_visit': patient.last_visit.isoformat() if patient.last_visit else None,
-        'total_visits': patient.total_visits,
-        'total_spent': patient.total_spent,
-        'created_at': patient.created_at.isoformat() if patient.created_at else None,
-    }
-    
-    if include_user and patient.user:
-        data['user'] = {
-            'id': patient.user.id,
-            'username': patient.user.username,
-            'email': patient.user.email,
-            'is_active': patient.user.is_active
-        }
-    
-    return data
+    return PatientSerializer(include_user).dump(patient)
 
 def appointment_to_dict(appointment, include_relations=True):
     """Convert Appointment model to dictionary"""
-    data = {
-        'id': appointment.id,
-        'patient_id': appointment.patient_id,
-        'doctor_id': appointment.doctor_id,
-        'appointment_date': appointment.appointment_date.isoformat() if appointment.appointment_date else None,
-        'appointment_time': appointment.appointment_time,
-        'status': appointment.status,
-        'notes': appointment.notes,
-        'queue_position': appointment.queue_position,
-        'reminder_sent': appointment.reminder_sent,
-        'appointment_type': appointment.appointment_type,
-        'consultation_fees': appointment.consultation_fees,
-        'payment_status': appointment.payment_status,
-        'is_confirmed': appointment.is_confirmed,
-        'created_at': appointment.created_at.isoformat() if appointment.created_at else None,
-    }
-    
-    if include_relations:
-        if appointment.patient and appointment.patient.user:
-            data['patient'] = {
-                'id': appointment.patient.id,
-                'name': appointment.patient.user.username,
-                'email': appointment.patient.user.email,
-                'phone': appointment.patient.phone
-            }
-        
-        if appointment.doctor and appointment.doctor.user:
-            data['doctor'] = {
-                'id': appointment.doctor.id,
-                'name': appointment.doctor.user.username,
-                'specialization': appointment.doctor.specialization,
-                'department': appointment.doctor.department.name if appointment.doctor.department else None
-            }
-    
-    return data
+    return AppointmentSerializer(include_relations).dump(appointment)
 
 # ==================== Doctor API Endpoints ====================
 
@@ -173,7 +189,7 @@ def appointment_to_dict(appointment, include_relations=True):
 def get_doctors():
     """
     GET /api/doctors - List all doctors
-    Query params: department_id, specialization, is_available, page, per_page
+    Query params: department_id, specialization, is_available, page, per_page, after
     """
     # Get query parameters
     department_id = request.args.get('department_id', type=int)
@@ -195,10 +211,13 @@ def get_doctors():
         is_available_bool = is_available.lower() in ['true', '1', 'yes']
         query = query.filter(Doctor.is_available == is_available_bool)
     
-    # Paginate
-    doctors_page = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Paginate, eager-loading what the serializer reads
+    serializer = DoctorSerializer()
+    if 'after' in request.args:
+        return keyset_response('doctors', serializer, query, [Doctor.id], per_page)
+    doctors_page = serializer.apply(query).paginate(page=page, per_page=per_page, error_out=False)
     
-    doctors_data = [doctor_to_dict(doctor) for doctor in doctors_page.items]
+    doctors_data = serializer.dump_many(doctors_page.items)
     
     return success_response({
         'doctors': doctors_data,
@@ -221,6 +240,43 @@ def get_doctor(doctor_id):
     
     return success_response(doctor_to_dict(doctor))
 
+@api_bp.route('/doctors/<int:doctor_id>/slots', methods=['GET'])
+@api_auth_required
+def get_doctor_slots(doctor_id):
+    """
+    GET /api/doctors/<id>/slots - Free appointment slots for a date range
+    Query params: from (YYYY-MM-DD, default today), to (inclusive) or days (default 7),
+    at most SLOT_MAX_DAYS days
+    """
+    doctor = Doctor.query.filter_by(id=doctor_id).first()
+    if not doctor:
+        return error_response('Doctor not found', 404)
+    
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else datetime.now().date()
+        if request.args.get('to'):
+            end = datetime.strptime(request.args['to'], '%Y-%m-%d').date()
+        else:
+            end = start + timedelta(days=request.args.get('days', 7, type=int) - 1)
+    except ValueError:
+        return error_response('Invalid date format. Use YYYY-MM-DD')
+    
+    max_days = current_app.config.get('SLOT_MAX_DAYS', 62)
+    if end < start or (end - start).days >= max_days:
+        return error_response(f'Date range must cover 1 to {max_days} days')
+    
+    days = {}
+    for day, minutes in free_slots([doctor], start, end)[doctor.id]:
+        days.setdefault(day, []).append(to_clock(minutes))
+    
+    return success_response({
+        'doctor_id': doctor.id,
+        'slot_minutes': Schedule(doctor).step,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'days': [{'date': day.isoformat(), 'slots': slots} for day, slots in days.items()]
+    })
+
 @api_bp.route('/doctors', methods=['POST'])
 @admin_required
 def create_doctor():
@@ -361,6 +417,49 @@ def delete_doctor(doctor_id):
         db.session.rollback()
         return error_response(f'Error deleting doctor: {str(e)}', 500)
 
+# ==================== Department API Endpoints ====================
+
+@api_bp.route('/departments/<int:department_id>/next-available', methods=['GET'])
+@api_auth_required
+def department_next_available(department_id):
+    """
+    GET /api/departments/<id>/next-available - Earliest open slots across the department's doctors
+    Query params: count (default 10, max 50), from (YYYY-MM-DD, default today)
+    Searches up to SLOT_MAX_DAYS days ahead
+    """
+    department = Department.query.filter_by(id=department_id).first()
+    if not department:
+        return error_response('Department not found', 404)
+    
+    count = min(max(request.args.get('count', 10, type=int), 1), 50)
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else None
+    except ValueError:
+        return error_response('Invalid date format. Use YYYY-MM-DD')
+    
+    # Plain rows: hydrating every doctor of a large department would cost more than the search
+    doctors = db.session.execute(
+        db.select(*SCHEDULE_COLUMNS, Doctor.specialization, User.username).join(User, Doctor.user_id == User.id).where(
+            Doctor.department_id == department_id,
+            Doctor.is_available == True,
+            User.is_active == True
+        )
+    ).all()
+    by_id = {doctor.id: doctor for doctor in doctors}
+    slots = earliest_slots(doctors, count, start, horizon=current_app.config.get('SLOT_MAX_DAYS', 62))
+    
+    return success_response({
+        'department_id': department.id,
+        'department': department.name,
+        'slots': [{
+            'date': day.isoformat(),
+            'time': to_clock(minutes),
+            'doctor_id': doctor_id,
+            'doctor_name': by_id[doctor_id].username,
+            'specialization': by_id[doctor_id].specialization
+        } for day, minutes, doctor_id in slots]
+    })
+
 # ==================== Patient API Endpoints ====================
 
 @api_bp.route('/patients', methods=['GET'])
@@ -371,35 +470,22 @@ def get_patients():
     Admin: can see all patients
     Doctor: can see their patients
     Patient: can only see themselves
-    Query params: page, per_page
+    Query params: page, per_page, after
     """
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     
-    if current_user.role == 'admin':
-        # Admin can see all patients
-        query = Patient.query.join(User).filter(User.is_active == True)
-    elif current_user.role == 'doctor':
-        # Doctor can see their patients (who have appointments with them)
-        doctor = Doctor.query.filter_by(user_id=current_user.id).first()
-        if not doctor:
-            return error_response('Doctor profile not found', 404)
-        
-        # Get patient IDs from appointments
-        patient_ids = db.session.query(Appointment.patient_id).filter_by(doctor_id=doctor.id).distinct().all()
-        patient_ids = [pid[0] for pid in patient_ids]
-        
-        query = Patient.query.filter(Patient.id.in_(patient_ids))
-    elif current_user.role == 'patient':
-        # Patient can only see themselves
-        query = Patient.query.filter_by(user_id=current_user.id)
-    else:
-        return error_response('Unauthorized', 403)
+    query, error = visible_patients()
+    if error:
+        return error
     
-    # Paginate
-    patients_page = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Paginate, eager-loading what the serializer reads
+    serializer = PatientSerializer()
+    if 'after' in request.args:
+        return keyset_response('patients', serializer, query, [Patient.id], per_page)
+    patients_page = serializer.apply(query).paginate(page=page, per_page=per_page, error_out=False)
     
-    patients_data = [patient_to_dict(patient) for patient in patients_page.items]
+    patients_data = serializer.dump_many(patients_page.items)
     
     return success_response({
         'patients': patients_data,
@@ -411,6 +497,33 @@ def get_patients():
         }
     })
 
+@api_bp.route('/patients/lookup', methods=['GET'])
+@api_auth_required
+def lookup_patients():
+    """
+    GET /api/patients/lookup - Find patients by phone number, ignoring formatting
+    Query params: phone, match (exact, suffix or auto: exact for a full number,
+    otherwise the last 4+ digits), limit (max 100)
+    Scoped like GET /api/patients
+    """
+    phone = request.args.get('phone', '')
+    match = request.args.get('match', 'auto')
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    
+    if match not in ('auto', 'exact', 'suffix'):
+        return error_response('Invalid match. Use exact, suffix or auto')
+    patient_ids = phone_matches(phone, match)
+    if patient_ids is None:
+        return error_response(f'phone must have at least {MIN_SUFFIX_DIGITS} digits')
+    
+    query, error = visible_patients()
+    if error:
+        return error
+    
+    serializer = PatientSerializer()
+    patients = serializer.apply(query.filter(Patient.id.in_(patient_ids))).order_by(Patient.id).limit(limit).all()
+    return success_response({'patients': serializer.dump_many(patients)})
+
 @api_bp.route('/patients/<int:patient_id>', methods=['GET'])
 @api_auth_required
 def get_patient(patient_id):
@@ -425,8 +538,7 @@ def get_patient(patient_id):
         return error_response('Unauthorized access', 403)
     elif current_user.role == 'doctor':
         # Check if doctor has treated this patient
-        doctor = Doctor.query.filter_by(user_id=current_user.id).first()
-        has_appointment = Appointment.query.filter_by(doctor_id=doctor.id, patient_id=patient_id).first()
+        has_appointment = Appointment.query.filter_by(doctor_id=current_doctor_id(), patient_id=patient_id).first()
         if not has_appointment:
             return error_response('Unauthorized access', 403)
     
@@ -589,55 +701,26 @@ def get_appointments():
     Admin: all appointments
     Doctor: their appointments
     Patient: their appointments
-    Query params: status, date_from, date_to, page, per_page
+    Query params: status, date_from, date_to, page, per_page, after
     """
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
-    status = request.args.get('status')
-    date_from = request.args.get('date_from')
-    date_to = request.args.get('date_to')
-    
-    # Base query based on role
-    if current_user.role == 'admin':
-        query = Appointment.query
-    elif current_user.role == 'doctor':
-        doctor = Doctor.query.filter_by(user_id=current_user.id).first()
-        if not doctor:
-            return error_response('Doctor profile not found', 404)
-        query = Appointment.query.filter_by(doctor_id=doctor.id)
-    elif current_user.role == 'patient':
-        patient = Patient.query.filter_by(user_id=current_user.id).first()
-        if not patient:
-            return error_response('Patient profile not found', 404)
-        query = Appointment.query.filter_by(patient_id=patient.id)
-    else:
-        return error_response('Unauthorized', 403)
     
-    # Apply filters
-    if status:
-        query = query.filter(Appointment.status == status)
-    
-    if date_from:
-        try:
-            date_from_obj = datetime.strptime(date_from, '%Y-%m-%d').date()
-            query = query.filter(Appointment.appointment_date >= date_from_obj)
-        except ValueError:
-            return error_response('Invalid date_from format. Use YYYY-MM-DD')
-    
-    if date_to:
-        try:
-            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d').date()
-            query = query.filter(Appointment.appointment_date <= date_to_obj)
-        except ValueError:
-            return error_response('Invalid date_to format. Use YYYY-MM-DD')
+    query, error = scoped_query(Appointment, Appointment.appointment_date)
+    if error:
+        return error
     
     # Order by date and time
     query = query.order_by(Appointment.appointment_date.desc(), Appointment.appointment_time.desc())
     
-    # Paginate
-    appointments_page = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Paginate, eager-loading what the serializer reads
+    serializer = AppointmentSerializer()
+    if 'after' in request.args:
+        key = [Appointment.appointment_date, Appointment.appointment_time, Appointment.id]
+        return keyset_response('appointments', serializer, query, key, per_page, descending=True)
+    appointments_page = serializer.apply(query).paginate(page=page, per_page=per_page, error_out=False)
     
-    appointments_data = [appointment_to_dict(appointment) for appointment in appointments_page.items]
+    appointments_data = serializer.dump_many(appointments_page.items)
     
     return success_response({
         'appointments': appointments_data,
@@ -649,6 +732,44 @@ def get_appointments():
         }
     })
 
+@api_bp.route('/appointments/export', methods=['GET'])
+@api_auth_required
+def export_appointments():
+    """
+    GET /api/appointments/export - Stream all matching appointments
+    Same role scoping and filters as GET /api/appointments, without pagination
+    Query params: status, date_from, date_to, format (ndjson or csv)
+    """
+    fmt = export_format()
+    if not fmt:
+        return error_response('Invalid format. Use ndjson or csv')
+    
+    query, error = scoped_query(Appointment, Appointment.appointment_date)
+    if error:
+        return error
+    
+    query, patient_user, doctor_user = named_parties(query, Appointment)
+    query = query.outerjoin(Department, Doctor.department_id == Department.id) \
+        .order_by(Appointment.appointment_date, Appointment.appointment_time, Appointment.id)
+    
+    fields = [
+        ('id', Appointment.id),
+        ('patient_id', Appointment.patient_id),
+        ('patient_name', patient_user.username),
+        ('doctor_id', Appointment.doctor_id),
+        ('doctor_name', doctor_user.username),
+        ('department', Department.name),
+        ('appointment_date', Appointment.appointment_date),
+        ('appointment_time', Appointment.appointment_time),
+        ('status', Appointment.status),
+        ('appointment_type', Appointment.appointment_type),
+        ('consultation_fees', Appointment.consultation_fees),
+        ('payment_status', Appointment.payment_status),
+        ('notes', Appointment.notes),
+        ('created_at', Appointment.created_at),
+    ]
+    return export_response(query, fields, fmt, 'appointments')
+
 @api_bp.route('/appointments/<int:appointment_id>', methods=['GET'])
 @api_auth_required
 def get_appointment(appointment_id):
@@ -660,12 +781,10 @@ def get_appointment(appointment_id):
     
     # Authorization check
     if current_user.role == 'patient':
-        patient = Patient.query.filter_by(user_id=current_user.id).first()
-        if not patient or appointment.patient_id != patient.id:
+        if appointment.patient_id != current_patient_id():
             return error_response('Unauthorized access', 403)
     elif current_user.role == 'doctor':
-        doctor = Doctor.query.filter_by(user_id=current_user.id).first()
-        if not doctor or appointment.doctor_id != doctor.id:
+        if appointment.doctor_id != current_doctor_id():
             return error_response('Unauthorized access', 403)
     
     return success_response(appointment_to_dict(appointment))
@@ -691,10 +810,9 @@ def create_appointment():
     
     # Get patient_id
     if current_user.role == 'patient':
-        patient = Patient.query.filter_by(user_id=current_user.id).first()
-        if not patient:
+        patient_id = current_patient_id()
+        if not patient_id:
             return error_response('Patient profile not found', 404)
-        patient_id = patient.id
     elif current_user.role == 'admin':
         if 'patient_id' not in data:
             return error_response('Admin must specify patient_id')
@@ -716,42 +834,23 @@ def create_appointment():
         # Parse appointment date
         appointment_date = datetime.strptime(data['appointment_date'], '%Y-%m-%d').date()
         
-        # Check for double booking (conflict prevention)
-        existing = Appointment.query.filter_by(
-            doctor_id=data['doctor_id'],
-            appointment_date=appointment_date,
-            appointment_time=data['appointment_time'],
-            status='Booked'
-        ).first()
-        
-        if existing:
-            return error_response('This time slot is already booked. Please choose another time.')
-        
-        # Create appointment
-        appointment = Appointment(
+        # Create appointment - the insert fails atomically on double booking.
+        # Doctor/patient totals and dashboard counters are applied by a background job
+        appointment = book_deferred(
             patient_id=patient_id,
             doctor_id=data['doctor_id'],
             appointment_date=appointment_date,
             appointment_time=data['appointment_time'],
             appointment_type=data.get('appointment_type', 'Regular'),
             notes=data.get('notes'),
-            consultation_fees=doctor.consultation_fees,
-            status='Booked'
+            consultation_fees=doctor.consultation_fees
         )
-        
-        db.session.add(appointment)
-        
-        # Update doctor stats
-        doctor.total_appointments = (doctor.total_appointments or 0) + 1
-        
-        # Update patient stats
-        patient.total_visits = (patient.total_visits or 0) + 1
-        patient.last_visit = datetime.now()
-        
         db.session.commit()
         
         return success_response(appointment_to_dict(appointment), 'Appointment created successfully', 201)
     
+    except SlotUnavailable as e:
+        return error_response(str(e))
     except ValueError:
         return error_response('Invalid date format. Use YYYY-MM-DD')
     except Exception as e:
@@ -774,12 +873,10 @@ def update_appointment(appointment_id):
     
     # Authorization check
     if current_user.role == 'patient':
-        patient = Patient.query.filter_by(user_id=current_user.id).first()
-        if not patient or appointment.patient_id != patient.id:
+        if appointment.patient_id != current_patient_id():
             return error_response('Unauthorized access', 403)
     elif current_user.role == 'doctor':
-        doctor = Doctor.query.filter_by(user_id=current_user.id).first()
-        if not doctor or appointment.doctor_id != doctor.id:
+        if appointment.doctor_id != current_doctor_id():
             return error_response('Unauthorized access', 403)
     
     data = request.get_json()
@@ -793,23 +890,11 @@ def update_appointment(appointment_id):
                 new_date = datetime.strptime(data.get('appointment_date', str(appointment.appointment_date)), '%Y-%m-%d').date()
                 new_time = data.get('appointment_time', appointment.appointment_time)
                 
-                # Check for conflicts (excluding current appointment)
-                existing = Appointment.query.filter(
-                    Appointment.doctor_id == appointment.doctor_id,
-                    Appointment.appointment_date == new_date,
-                    Appointment.appointment_time == new_time,
-                    Appointment.status == 'Booked',
-                    Appointment.id != appointment_id
-                ).first()
-                
-                if existing:
-                    return error_response('This time slot is already booked. Please choose another time.')
-                
-                appointment.appointment_date = new_date
-                appointment.appointment_time = new_time
+                # Fails atomically if the new slot is taken
+                SlotReservation().move(appointment, new_date, new_time)
             
             if 'status' in data and data['status'] == 'Cancelled':
-                appointment.status = 'Cancelled'
+                SlotReservation().cancel(appointment)
             
             if 'notes' in data:
                 appointment.notes = data['notes']
@@ -819,7 +904,7 @@ def update_appointment(appointment_id):
             if 'status' in data:
                 allowed_statuses = ['Completed', 'No-show', 'Booked']
                 if data['status'] in allowed_statuses:
-                    appointment.status = data['status']
+                    SlotReservation().change_status(appointment, data['status'])
             
             if 'notes' in data:
                 appointment.notes = data['notes']
@@ -829,12 +914,14 @@ def update_appointment(appointment_id):
         
         # Admin can update anything
         elif current_user.role == 'admin':
-            if 'appointment_date' in data:
-                appointment.appointment_date = datetime.strptime(data['appointment_date'], '%Y-%m-%d').date()
-            if 'appointment_time' in data:
-                appointment.appointment_time = data['appointment_time']
+            if 'appointment_date' in data or 'appointment_time' in data:
+                SlotReservation().move(
+                    appointment,
+                    data.get('appointment_date', appointment.appointment_date),
+                    data.get('appointment_time', appointment.appointment_time)
+                )
             if 'status' in data:
-                appointment.status = data['status']
+                SlotReservation().change_status(appointment, data['status'])
             if 'notes' in data:
                 appointment.notes = data['notes']
             if 'appointment_type' in data:
@@ -848,6 +935,8 @@ def update_appointment(appointment_id):
         
         return success_response(appointment_to_dict(appointment), 'Appointment updated successfully')
     
+    except SlotUnavailable as e:
+        return error_response(str(e))
     except Exception as e:
         db.session.rollback()
         return error_response(f'Error updating appointment: {str(e)}', 500)
@@ -867,11 +956,10 @@ def delete_appointment(appointment_id):
     
     # Authorization check
     if current_user.role == 'patient':
-        patient = Patient.query.filter_by(user_id=current_user.id).first()
-        if not patient or appointment.patient_id != patient.id:
+        if appointment.patient_id != current_patient_id():
             return error_response('Unauthorized access', 403)
         # Patient can only cancel, not delete
-        appointment.status = 'Cancelled'
+        SlotReservation().cancel(appointment)
         db.session.commit()
         return success_response({'id': appointment_id}, 'Appointment cancelled successfully')
     
@@ -890,48 +978,299 @@ def delete_appointment(appointment_id):
     
     return error_response('Unauthorized', 403)
 
+# ==================== Queue Endpoints ====================
+
+def queue_staff(doctor_id):
+    """True when the current user may run this doctor's queue (admin or the doctor)"""
+    return current_user.role == 'admin' or (current_user.role == 'doctor' and doctor_id == current_doctor_id())
+
+def queued_appointment(appointment_id, patient_allowed=False):
+    """(appointment, None) if the current user may act on its queue entry, else (None, error response)"""
+    appointment = db.session.get(Appointment, appointment_id)
+    if not appointment:
+        return None, error_response('Appointment not found', 404)
+    if queue_staff(appointment.doctor_id):
+        return appointment, None
+    if patient_allowed and current_user.role == 'patient' and appointment.patient_id == current_patient_id():
+        return appointment, None
+    return None, error_response('Unauthorized access', 403)
+
+def queue_for(appointment):
+    return PatientQueue(appointment.doctor_id, appointment.appointment_date)
+
+def event_response(channel):
+    """Server-Sent Events response for a broker channel, resuming after Last-Event-ID"""
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return error_response('Invalid Last-Event-ID')
+    broker = current_broker()
+    # Pin the starting point now; the generator only runs once the response is being sent
+    last_id = broker.last_id(channel) if last_id is None else last_id
+    stream = event_stream(broker, channel, last_id, current_app.config.get('SSE_HEARTBEAT_SECONDS', 15))
+    # Not wrapped in stream_with_context: the app context (and its DB session)
+    # is torn down as soon as the response starts, so idle streams hold no connection
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@api_bp.route('/doctors/<int:doctor_id>/queue', methods=['GET'])
+@api_auth_required
+def get_doctor_queue(doctor_id):
+    """
+    GET /api/doctors/<id>/queue - Now serving and the waiting patients with estimated waits
+    Query params: date (YYYY-MM-DD, default today)
+    """
+    if not queue_staff(doctor_id):
+        return error_response('Unauthorized access', 403)
+    try:
+        day = datetime.strptime(request.args['date'], '%Y-%m-%d').date() if request.args.get('date') else datetime.now().date()
+    except ValueError:
+        return error_response('Invalid date format. Use YYYY-MM-DD')
+    return success_response(PatientQueue(doctor_id, day).snapshot())
+
+@api_bp.route('/doctors/<int:doctor_id>/queue/call-next', methods=['POST'])
+@api_auth_required
+def call_next_patient(doctor_id):
+    """POST /api/doctors/<id>/queue/call-next - Call the first waiting patient of today's queue"""
+    if not queue_staff(doctor_id):
+        return error_response('Unauthorized access', 403)
+    try:
+        appointment = PatientQueue(doctor_id).call_next()
+        db.session.commit()
+    except QueueError as e:
+        db.session.rollback()
+        return error_response(str(e), 409)
+    if appointment is None:
+        return success_response(None, 'Nobody is waiting')
+    return success_response(appointment_to_dict(appointment), 'Patient called')
+
+@api_bp.route('/doctors/<int:doctor_id>/events', methods=['GET'])
+@api_auth_required
+def doctor_events(doctor_id):
+    """
+    GET /api/doctors/<id>/events - Server-Sent Events stream of the doctor's
+    appointment changes ("appointment") and patient calls ("queue"), for the
+    doctor and admins
+    Resumes after the Last-Event-ID header (or last_event_id param) when still buffered
+    """
+    if not Doctor.query.filter_by(id=doctor_id).first():
+        return error_response('Doctor not found', 404)
+    if not queue_staff(doctor_id):
+        return error_response('Unauthorized access', 403)
+    return event_response(doctor_id)
+
+@api_bp.route('/patients/<int:patient_id>/events', methods=['GET'])
+@api_auth_required
+def patient_events(patient_id):
+    """
+    GET /api/patients/<id>/events - Server-Sent Events stream of the patient's
+    own appointment changes ("appointment") and the calls of the queues they
+    wait in ("queue"), for the patient and admins
+    Resumes after the Last-Event-ID header (or last_event_id param) when still buffered
+    """
+    if not Patient.query.filter_by(id=patient_id).first():
+        return error_response('Patient not found', 404)
+    if current_user.role != 'admin' and current_patient_id() != patient_id:
+        return error_response('Unauthorized access', 403)
+    return event_response(patient_channel(patient_id))
+
+@api_bp.route('/appointments/<int:appointment_id>/check-in', methods=['POST'])
+@api_auth_required
+def check_in_appointment(appointment_id):
+    """POST /api/appointments/<id>/check-in - Join the doctor's queue for the appointment's day"""
+    appointment, error = queued_appointment(appointment_id, patient_allowed=True)
+    if error:
+        return error
+    try:
+        position = queue_for(appointment).check_in(appointment)
+        db.session.commit()
+    except QueueError as e:
+        db.session.rollback()
+        return error_response(str(e))
+    return success_response({'id': appointment.id, 'queue_position': position}, 'Checked in')
+
+@api_bp.route('/appointments/<int:appointment_id>/skip', methods=['POST'])
+@api_auth_required
+def skip_appointment(appointment_id):
+    """POST /api/appointments/<id>/skip - Move a checked-in patient to the back of the queue"""
+    appointment, error = queued_appointment(appointment_id)
+    if error:
+        return error
+    try:
+        position = queue_for(appointment).skip(appointment)
+        db.session.commit()
+    except QueueError as e:
+        db.session.rollback()
+        return error_response(str(e))
+    return success_response({'id': appointment.id, 'queue_position': position}, 'Moved to the back of the queue')
+
+@api_bp.route('/appointments/<int:appointment_id>/no-show', methods=['POST'])
+@api_auth_required
+def no_show_appointment(appointment_id):
+    """POST /api/appointments/<id>/no-show - Mark a checked-in patient as not present"""
+    appointment, error = queued_appointment(appointment_id)
+    if error:
+        return error
+    try:
+        queue_for(appointment).no_show(appointment)
+        db.session.commit()
+    except QueueError as e:
+        db.session.rollback()
+        return error_response(str(e))
+    return success_response({'id': appointment.id, 'status': appointment.status}, 'Marked as no-show')
+
+@api_bp.route('/appointments/<int:appointment_id>/wait', methods=['GET'])
+@api_auth_required
+def appointment_wait(appointment_id):
+    """GET /api/appointments/<id>/wait - Patients ahead and estimated minutes until called"""
+    appointment, error = queued_appointment(appointment_id, patient_allowed=True)
+    if error:
+        return error
+    try:
+        ahead, minutes = queue_for(appointment).estimate(appointment)
+    except QueueError as e:
+        return error_response(str(e))
+    return success_response({
+        'id': appointment.id,
+        'queue_position': appointment.queue_position,
+        'ahead': ahead,
+        'estimated_wait_minutes': minutes
+    })
+
+# ==================== Treatment API Endpoints ====================
+
+@api_bp.route('/treatments/export', methods=['GET'])
+@api_auth_required
+def export_treatments():
+    """
+    GET /api/treatments/export - Stream all matching treatments
+    Admin: all treatments
+    Doctor: treatments they recorded
+    Patient: their treatments
+    Query params: status, date_from, date_to (on created_at), format (ndjson or csv)
+    """
+    fmt = export_format()
+    if not fmt:
+        return error_response('Invalid format. Use ndjson or csv')
+    
+    query, error = scoped_query(Treatment, Treatment.created_at)
+    if error:
+        return error
+    
+    query, patient_user, doctor_user = named_parties(query, Treatment)
+    query = query.order_by(Treatment.created_at, Treatment.id)
+    
+    fields = [
+        ('id', Treatment.id),
+        ('appointment_id', Treatment.appointment_id),
+        ('patient_id', Treatment.patient_id),
+        ('patient_name', patient_user.username),
+        ('doctor_id', Treatment.doctor_id),
+        ('doctor_name', doctor_user.username),
+        ('diagnosis', Treatment.diagnosis),
+        ('icd_code', Treatment.icd_code),
+        ('prescription', Treatment.prescription),
+        ('medicine_details', Treatment.medicine_details),
+        ('dosage_instructions', Treatment.dosage_instructions),
+        ('duration_days', Treatment.duration_days),
+        ('follow_up_required', Treatment.follow_up_required),
+        ('follow_up_days', Treatment.follow_up_days),
+        ('lab_tests_recommended', Treatment.lab_tests_recommended),
+        ('notes', Treatment.notes),
+        ('status', Treatment.status),
+        ('created_at', Treatment.created_at),
+    ]
+    return export_response(query, fields, fmt, 'treatments')
+
+# ==================== Bulk Import Endpoints ====================
+
+@api_bp.route('/bulk/<any(patients, doctors, appointments):kind>', methods=['POST'])
+@admin_required
+def bulk_import(kind):
+    """
+    POST /api/bulk/patients|doctors|appointments - Import many rows (admin only)
+    Body: NDJSON (application/x-ndjson) or CSV (text/csv) with the same fields
+    as the single-record POST endpoints; patients and doctors may carry a
+    pre-hashed password_hash instead of password
+    Query params: format (ndjson or csv, overrides Content-Type), batch_size
+    Invalid rows are skipped and listed in errors by row number
+    """
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return error_response('Invalid format. Use ndjson or csv')
+    
+    batch_size = request.args.get('batch_size', current_app.config['BULK_IMPORT_BATCH_SIZE'], type=int)
+    if batch_size < 1:
+        return error_response('batch_size must be positive')
+    
+    try:
+        report = IMPORTERS[kind](batch_size).run(read_rows(request.stream, fmt))
+    except (UnicodeDecodeError, csv.Error) as e:
+        return error_response(f'Could not read {fmt} body: {str(e)}')
+    
+    # Core inserts skip the session flush, so ask for read-your-writes here
+    pin_to_primary()
+    return success_response(report.to_dict(), f'Imported {report.inserted} {kind}')
+
+# ==================== Search Endpoints ====================
+
+@api_bp.route('/search', methods=['GET'])
+@api_auth_required
+def search():
+    """
+    GET /api/search - Ranked, prefix and typo tolerant search over patients and doctors
+    Query params: q, type (patients, doctors or all), limit (max 100)
+    Patients are scoped like GET /api/patients; doctors are the active ones
+    """
+    text = request.args.get('q', '').strip()
+    kind = request.args.get('type', 'all')
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    
+    if not text:
+        return error_response('q is required')
+    if kind not in ('patients', 'doctors', 'all'):
+        return error_response('Invalid type. Use patients, doctors or all')
+    
+    data = {}
+    if kind in ('patients', 'all'):
+        query, error = visible_patients()
+        if error:
+            return error
+        serializer = PatientSerializer()
+        data['patients'] = serializer.dump_many(
+            serializer.apply(patient_index.search(query, text, limit)).all())
+    if kind in ('doctors', 'all'):
+        query = Doctor.query.join(User).filter(User.is_active == True)
+        serializer = DoctorSerializer()
+        data['doctors'] = serializer.dump_many(
+            serializer.apply(doctor_index.search(query, text, limit)).all())
+    
+    return success_response(data)
+
 # ==================== Statistics Endpoints ====================
 
 @api_bp.route('/stats', methods=['GET'])
 @admin_required
 def get_stats():
     """GET /api/stats - Get system statistics (admin only)"""
-    total_doctors = Doctor.query.count()
-    total_patients = Patient.query.count()
-    total_appointments = Appointment.query.count()
-    
-    active_doctors = Doctor.query.join(User).filter(User.is_active == True).count()
-    active_patients = Patient.query.join(User).filter(User.is_active == True).count()
-    
-    booked_appointments = Appointment.query.filter_by(status='Booked').count()
-    completed_appointments = Appointment.query.filter_by(status='Completed').count()
-    cancelled_appointments = Appointment.query.filter_by(status='Cancelled').count()
-    
-    # Department statistics
-    departments = Department.query.all()
-    dept_stats = []
-    for dept in departments:
-        doctor_count = Doctor.query.filter_by(department_id=dept.id).count()
-        dept_stats.append({
-            'id': dept.id,
-            'name': dept.name,
-            'doctors': doctor_count
-        })
+    stats = dashboard_stats()
+    appointments = stats['appointments']
     
     return success_response({
-        'doctors': {
-            'total': total_doctors,
-            'active': active_doctors
-        },
-        'patients': {
-            'total': total_patients,
-            'active': active_patients
-        },
+        'doctors': stats['doctors'],
+        'patients': stats['patients'],
         'appointments': {
-            'total': total_appointments,
-            'booked': booked_appointments,
-            'completed': completed_appointments,
-            'cancelled': cancelled_appointments
+            'total': appointments['total'],
+            'booked': appointments['booked'],
+            'completed': appointments['completed'],
+            'cancelled': appointments['cancelled']
         },
-        'departments': dept_stats
+        'departments': stats['departments']
     })
+
+@api_bp.route('/jobs/metrics', methods=['GET'])
+@admin_required
+def get_job_metrics():
+    """GET /api/jobs/metrics - Background job counts by name and status, queue lag and worker stats (admin only)"""
+    return success_response(job_metrics())
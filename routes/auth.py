@@ -27,6 +27,11 @@ def login():
                 flash(f'Your account is registered as {user.role.capitalize()}. Please select the correct role.', 'warning')
                 return redirect(url_for('auth.login'))
             
+            # Upgrade the stored hash while the plain password is at hand
+            if user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
+            
             # Login user with remember flag to persist session
             login_user(user, remember=True)
             if user.role == 'admin':
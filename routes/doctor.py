@@ -5,6 +5,8 @@ from models.doctor import Doctor
 from models.appointment import Appointment
 from models.treatment import Treatment
 from models.patient import Patient
+from sqlalchemy.orm import joinedload
+from utils.identity import current_doctor, current_doctor_id
 
 doctor_bp = Blueprint('doctor', __name__, url_prefix='/doctor')
 
@@ -20,7 +22,7 @@ def doctor_required(f):
 @doctor_bp.route('/dashboard')
 @doctor_required
 def dashboard():
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    doctor = current_doctor(joinedload(Doctor.department))
     if not doctor:
         # Create doctor profile if it doesn't exist (safety fallback)
         from models.department import Department
@@ -33,18 +35,30 @@ def dashboard():
             flash('Error: No departments found. Please contact administrator.', 'danger')
             return redirect(url_for('auth.logout'))
     
-    appointments = Appointment.query.filter_by(doctor_id=doctor.id).all() if doctor.id else []
+    # Counts per status in SQL instead of loading every appointment
+    status_counts = dict(
+        db.session.query(Appointment.status, db.func.count())
+        .filter(Appointment.doctor_id == doctor.id)
+        .group_by(Appointment.status)
+        .all()
+    )
+    appointment_counts = {
+        'total': sum(status_counts.values()),
+        'completed': status_counts.get('Completed', 0),
+        'booked': status_counts.get('Booked', 0)
+    }
     
     return render_template('doctor/dashboard.html', 
                          doctor=doctor, 
-                         appointments=appointments)
+                         appointment_counts=appointment_counts)
 
 @doctor_bp.route('/appointments')
 @login_required
 @doctor_required
 def appointments():
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
-    appointments = Appointment.query.filter_by(doctor_id=doctor.id).all()
+    appointments = Appointment.query.options(
+        joinedload(Appointment.patient).joinedload(Patient.user)
+    ).filter_by(doctor_id=current_doctor_id()).all()
     
     return render_template('doctor/appointments.html', appointments=appointments)
 
@@ -52,7 +66,9 @@ def appointments():
 @login_required
 @doctor_required
 def add_treatment(appointment_id):
-    appointment = Appointment.query.get(appointment_id)
+    appointment = Appointment.query.options(
+        joinedload(Appointment.patient).joinedload(Patient.user)
+    ).filter_by(id=appointment_id).first()
     
     if request.method == 'POST':
         diagnosis = request.form.get('diagnosis')
@@ -79,9 +95,9 @@ def add_treatment(appointment_id):
 @login_required
 @doctor_required
 def patients():
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
-    appointments = Appointment.query.filter_by(doctor_id=doctor.id).all()
-    patients = list(set([appointment.patient for appointment in appointments]))
+    # Distinct patients with appointments, resolved in SQL
+    patient_ids = db.session.query(Appointment.patient_id).filter(Appointment.doctor_id == current_doctor_id())
+    patients = Patient.query.options(joinedload(Patient.user)).filter(Patient.id.in_(patient_ids)).all()
     
     return render_template('doctor/patients.html', patients=patients)
 
@@ -90,18 +106,22 @@ def patients():
 @doctor_required
 def patient_history(patient_id):
     """View a patient's complete treatment history (only for patients who have appointments with this doctor)"""
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
-    patient = Patient.query.get_or_404(patient_id)
+    patient = Patient.query.options(joinedload(Patient.user)).filter_by(id=patient_id).first_or_404()
     
     # Verify doctor has treated this patient
-    has_appointment = Appointment.query.filter_by(doctor_id=doctor.id, patient_id=patient_id).first()
+    has_appointment = Appointment.query.filter_by(doctor_id=current_doctor_id(), patient_id=patient_id).first()
     if not has_appointment:
         flash('You can only view history for your own patients.', 'danger')
         return redirect(url_for('doctor.patients'))
     
     # Get all treatments for this patient (from all doctors)
-    treatments = Treatment.query.filter_by(patient_id=patient_id).order_by(Treatment.created_at.desc()).all()
-    appointments = Appointment.query.filter_by(patient_id=patient_id).order_by(Appointment.appointment_date.desc()).all()
+    treatments = Treatment.query.options(
+        joinedload(Treatment.doctor).joinedload(Doctor.user),
+        joinedload(Treatment.doctor).joinedload(Doctor.department)
+    ).filter_by(patient_id=patient_id).order_by(Treatment.created_at.desc()).all()
+    appointments = Appointment.query.options(
+        joinedload(Appointment.doctor).joinedload(Doctor.user)
+    ).filter_by(patient_id=patient_id).order_by(Appointment.appointment_date.desc()).all()
     
     return render_template('doctor/patient_history.html', patient=patient, treatments=treatments, appointments=appointments)
 
@@ -109,7 +129,7 @@ def patient_history(patient_id):
 @login_required
 @doctor_required
 def profile():
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    doctor = current_doctor()
     
     if request.method == 'POST':
         doctor.phone = request.form.get('phone')
@@ -6,7 +6,10 @@ from models.doctor import Doctor
 from models.department import Department
 from models.appointment import Appointment
 from models.treatment import Treatment
+from utils.booking import SlotReservation, SlotUnavailable
+from utils.identity import current_patient, current_patient_id
 from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload
 
 patient_bp = Blueprint('patient', __name__, url_prefix='/patient')
 
@@ -22,7 +25,7 @@ def patient_required(f):
 @patient_bp.route('/dashboard')
 @patient_required
 def dashboard():
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
+    patient = current_patient()
     departments = Department.query.all()
     
     return render_template('patient/dashboard.html', 
@@ -35,7 +38,9 @@ def dashboard():
 @patient_required
 def search_doctors():
     department_id = request.args.get('department_id')
-    doctors = Doctor.query.filter_by(department_id=department_id).all() if department_id else []
+    doctors = Doctor.query.options(
+        joinedload(Doctor.user), joinedload(Doctor.department)
+    ).filter_by(department_id=department_id).all() if department_id else []
     
     return render_template('patient/search_doctors.html', doctors=doctors)
 
@@ -43,32 +48,26 @@ def search_doctors():
 @login_required
 @patient_required
 def book_appointment(doctor_id):
-    doctor = Doctor.query.get(doctor_id)
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
+    doctor = Doctor.query.options(joinedload(Doctor.user), joinedload(Doctor.department)).filter_by(id=doctor_id).first()
     
     if request.method == 'POST':
         appointment_date = request.form.get('appointment_date')
         appointment_time = request.form.get('appointment_time')
         
-        # Conflict prevention: Check for double booking
-        existing = Appointment.query.filter_by(
-            doctor_id=doctor_id,
-            appointment_date=appointment_date,
-            appointment_time=appointment_time,
-            status='Booked'
-        ).first()
-        
-        if existing:
+        # Conflict prevention: the insert fails atomically if the slot is taken
+        try:
+            SlotReservation().book(patient_id=current_patient_id(),
+                                   doctor_id=doctor_id,
+                                   appointment_date=appointment_date,
+                                   appointment_time=appointment_time)
+            db.session.commit()
+        except SlotUnavailable:
             flash('⚠️ Time slot already booked for this doctor. Please choose another time.', 'danger')
             return redirect(url_for('patient.book_appointment', doctor_id=doctor_id))
-        
-        appointment = Appointment(patient_id=patient.id,
-                                 doctor_id=doctor_id,
-                                 appointment_date=appointment_date,
-                                 appointment_time=appointment_time)
-        
-        db.session.add(appointment)
-        db.session.commit()
+        except (ValueError, TypeError):
+            # strptime raises TypeError, not ValueError, when a field is missing
+            flash('Please select a valid date and time', 'danger')
+            return redirect(url_for('patient.book_appointment', doctor_id=doctor_id))
         
         flash('Appointment booked successfully', 'success')
         return redirect(url_for('patient.my_appointments'))
@@ -79,8 +78,10 @@ def book_appointment(doctor_id):
 @login_required
 @patient_required
 def my_appointments():
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
-    appointments = Appointment.query.filter_by(patient_id=patient.id).all()
+    appointments = Appointment.query.options(
+        joinedload(Appointment.doctor).joinedload(Doctor.user),
+        joinedload(Appointment.doctor).joinedload(Doctor.department)
+    ).filter_by(patient_id=current_patient_id()).all()
     
     return render_template('patient/appointments.html', appointments=appointments)
 
@@ -88,8 +89,9 @@ def my_appointments():
 @login_required
 @patient_required
 def treatment_history():
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
-    treatments = Treatment.query.filter_by(patient_id=patient.id).all()
+    treatments = Treatment.query.options(
+        joinedload(Treatment.doctor).joinedload(Doctor.user)
+    ).filter_by(patient_id=current_patient_id()).all()
     
     return render_template('patient/treatment_history.html', treatments=treatments)
 
@@ -98,7 +100,7 @@ def treatment_history():
 @patient_required
 def cancel_appointment(appointment_id):
     appointment = Appointment.query.get(appointment_id)
-    appointment.status = 'Cancelled'
+    SlotReservation().cancel(appointment)
     db.session.commit()
     
     flash('Appointment cancelled', 'success')
@@ -109,7 +111,11 @@ def cancel_appointment(appointment_id):
 @patient_required
 def reschedule_appointment(appointment_id):
     """Allow patient to reschedule their appointment to a different date/time"""
-    appointment = Appointment.query.get_or_404(appointment_id)
+    appointment = Appointment.query.options(
+        joinedload(Appointment.patient),
+        joinedload(Appointment.doctor).joinedload(Doctor.user),
+        joinedload(Appointment.doctor).joinedload(Doctor.department)
+    ).filter_by(id=appointment_id).first_or_404()
     doctor = appointment.doctor
     
     # Check if appointment belongs to current patient
@@ -131,27 +137,16 @@ def reschedule_appointment(appointment_id):
             flash('Please select a valid date and time', 'danger')
             return redirect(url_for('patient.reschedule_appointment', appointment_id=appointment_id))
         
-        # Check for double booking - prevent conflict
-        existing = Appointment.query.filter(
-            Appointment.doctor_id == appointment.doctor_id,
-            Appointment.appointment_date == new_date,
-            Appointment.appointment_time == new_time,
-            Appointment.status == 'Booked',
-            Appointment.id != appointment_id  # Exclude current appointment
-        ).first()
-        
-        if existing:
-            flash(f'⚠️ Time slot {new_time} on {new_date} is already booked for this doctor. Please choose another time.', 'danger')
-            return redirect(url_for('patient.reschedule_appointment', appointment_id=appointment_id))
-        
         try:
-            # Update appointment
-            appointment.appointment_date = new_date
-            appointment.appointment_time = new_time
+            # Update appointment - fails atomically if the new slot is taken
+            SlotReservation().move(appointment, new_date, new_time)
             db.session.commit()
             
             flash(f'✅ Appointment rescheduled successfully to {new_date} at {new_time}', 'success')
             return redirect(url_for('patient.my_appointments'))
+        except SlotUnavailable:
+            flash(f'⚠️ Time slot {new_time} on {new_date} is already booked for this doctor. Please choose another time.', 'danger')
+            return redirect(url_for('patient.reschedule_appointment', appointment_id=appointment_id))
         except Exception as e:
             db.session.rollback()
             flash(f'Error rescheduling appointment: {str(e)}', 'danger')
@@ -163,7 +158,7 @@ def reschedule_appointment(appointment_id):
 @login_required
 @patient_required
 def profile():
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
+    patient = current_patient()
     
     if request.method == 'POST':
         patient.phone = request.form.get('phone')
@@ -0,0 +1,155 @@
+"""
+Slot availability engine: the weekly grid from a doctor's sessions and
+working days, DoctorAvailability date overrides, booked slots removed, and
+one query for any date range.
+"""
+
+from datetime import date, datetime
+from app import db
+from models.doctor import Doctor
+from models.appointment import Appointment
+from models.treatment import DoctorAvailability
+from utils.availability import working_weekdays, free_slots, earliest_slots, to_clock
+
+MONDAY = date(2030, 1, 7)
+BEFORE = datetime(2030, 1, 1, 8, 0)
+
+def slots(doctor, start=MONDAY, end=MONDAY, now=BEFORE):
+    return [(day, to_clock(minutes)) for day, minutes in free_slots([doctor], start, end, now=now)[doctor.id]]
+
+def times(doctor, day=MONDAY, now=BEFORE):
+    return [clock for _, clock in slots(doctor, day, day, now)]
+
+def book(factory, doctor, day, time, status='Booked'):
+    patient = factory.patient()
+    db.session.add(Appointment(patient_id=patient.id, doctor_id=doctor.id, appointment_date=day,
+                               appointment_time=time, status=status))
+    db.session.commit()
+
+def test_working_weekdays():
+    assert working_weekdays('Mon-Fri') == {0, 1, 2, 3, 4}
+    assert working_weekdays('Monday to Saturday') == {0, 1, 2, 3, 4, 5}
+    assert working_weekdays('Mon, Wed & Fri') == {0, 2, 4}
+    assert working_weekdays('Fri-Mon') == {4, 5, 6, 0}
+    assert working_weekdays('Daily') == set(range(7))
+    assert working_weekdays(None) == working_weekdays('nonsense') == {0, 1, 2, 3, 4}
+
+def test_grid_from_sessions(app, factory):
+    doctor = factory.doctor(working_days='Mon-Fri', morning_slot_start='09:00', morning_slot_end='10:30',
+                            evening_slot_start='15:00', evening_slot_end='15:50', avg_consultation_time=20)
+    assert times(doctor) == ['09:00', '09:20', '09:40', '10:00', '15:00', '15:20']
+    # Saturday is not a working day
+    assert times(doctor, date(2030, 1, 12)) == []
+    assert len(slots(doctor, MONDAY, date(2030, 1, 13))) == 5 * 6
+
+def test_bookings_remove_slots(app, factory):
+    doctor = factory.doctor(morning_slot_start='09:00', morning_slot_end='11:00', evening_slot_start='',
+                            evening_slot_end='', avg_consultation_time=30)
+    book(factory, doctor, MONDAY, '09:30')
+    book(factory, doctor, MONDAY, '10:15')  # off the grid: blocks 10:00 and 10:30
+    book(factory, doctor, MONDAY, '09:00', status='Cancelled')
+    assert times(doctor) == ['09:00']
+
+def test_date_overrides(app, factory):
+    doctor = factory.doctor(working_days='Mon-Fri', morning_slot_start='09:00', morning_slot_end='11:00',
+                            evening_slot_start='', evening_slot_end='', avg_consultation_time=30)
+    tuesday, wednesday, saturday = date(2030, 1, 8), date(2030, 1, 9), date(2030, 1, 12)
+    db.session.add_all([
+        DoctorAvailability(doctor_id=doctor.id, date=MONDAY, is_available=False),
+        DoctorAvailability(doctor_id=doctor.id, date=tuesday, start_time='09:30', end_time='10:30',
+                           is_available=False),
+        DoctorAvailability(doctor_id=doctor.id, date=wednesday, start_time='14:00', end_time='15:00'),
+        DoctorAvailability(doctor_id=doctor.id, date=saturday, start_time='10:00', end_time='11:00'),
+    ])
+    db.session.commit()
+
+    assert times(doctor, MONDAY) == []
+    assert times(doctor, tuesday) == ['09:00', '10:30']
+    assert times(doctor, wednesday) == ['14:00', '14:30']
+    assert times(doctor, saturday) == ['10:00', '10:30']
+
+def test_past_slots_and_unavailable_doctor(app, factory):
+    doctor = factory.doctor(morning_slot_start='09:00', morning_slot_end='11:00', evening_slot_start='',
+                            evening_slot_end='', avg_consultation_time=30)
+    assert times(doctor, now=datetime(2030, 1, 7, 9, 45)) == ['10:00', '10:30']
+    assert slots(doctor, date(2030, 1, 1), date(2030, 1, 8), now=datetime(2030, 1, 8, 0, 0))[0][0] == date(2030, 1, 8)
+
+    doctor.is_available = False
+    db.session.commit()
+    assert times(doctor) == []
+
+def test_many_doctors_in_one_query(app, factory, assert_max_queries):
+    doctors = [factory.doctor() for _ in range(5)]
+    for doctor in doctors:
+        book(factory, doctor, MONDAY, '09:00')
+        db.session.add(DoctorAvailability(doctor_id=doctor.id, date=date(2030, 1, 8), is_available=False))
+    db.session.commit()
+    doctors = Doctor.query.all()
+
+    with assert_max_queries(1):
+        streams = free_slots(doctors, MONDAY, date(2030, 2, 5), now=BEFORE)
+        found = {doctor_id: list(stream) for doctor_id, stream in streams.items()}
+    for doctor in doctors:
+        assert (MONDAY, 9 * 60) not in found[doctor.id]
+        assert not any(day == date(2030, 1, 8) for day, _ in found[doctor.id])
+
+def test_slots_endpoint(app, factory, login, assert_max_queries):
+    doctor = factory.doctor(morning_slot_start='09:00', morning_slot_end='10:00', evening_slot_start='',
+                            evening_slot_end='', avg_consultation_time=30)
+    book(factory, doctor, MONDAY, '09:00')
+    client = login(factory.patient().user)
+
+    url = f'/api/doctors/{doctor.id}/slots'
+    with assert_max_queries(3):
+        response = client.get(url + '?from=2030-01-07&days=7')
+    data = response.get_json()['data']
+    assert data['slot_minutes'] == 30
+    assert data['days'][0] == {'date': '2030-01-07', 'slots': ['09:30']}
+    assert [day['date'] for day in data['days']] == ['2030-01-07', '2030-01-08', '2030-01-09',
+                                                     '2030-01-10', '2030-01-11']
+
+    data = client.get(f'/api/doctors/{doctor.id}/slots?from=2030-01-08&to=2030-01-08').get_json()['data']
+    assert data['days'] == [{'date': '2030-01-08', 'slots': ['09:00', '09:30']}]
+
+    assert client.get(f'/api/doctors/{doctor.id}/slots?from=2030-13-01').status_code == 400
+    assert client.get(f'/api/doctors/{doctor.id}/slots?from=2030-01-07&days=90').status_code == 400
+    assert client.get(f'/api/doctors/{doctor.id}/slots?from=2030-01-07&to=2030-01-01').status_code == 400
+    assert client.get('/api/doctors/9999/slots').status_code == 404
+
+def test_earliest_slots_across_doctors(app, factory, assert_max_queries):
+    early = factory.doctor(morning_slot_start='09:00', morning_slot_end='10:00', evening_slot_start='',
+                           evening_slot_end='', avg_consultation_time=30)
+    late = factory.doctor(morning_slot_start='09:15', morning_slot_end='10:15', evening_slot_start='',
+                          evening_slot_end='', avg_consultation_time=30)
+    weekend = factory.doctor(working_days='Sat-Sun', morning_slot_start='08:00', morning_slot_end='09:00',
+                             evening_slot_start='', evening_slot_end='', avg_consultation_time=60)
+    book(factory, early, MONDAY, '09:00')
+    doctors = Doctor.query.all()
+
+    found = [(day, to_clock(minutes), doctor_id)
+             for day, minutes, doctor_id in earliest_slots(doctors, 3, MONDAY, now=BEFORE)]
+    assert found == [(MONDAY, '09:15', late.id), (MONDAY, '09:30', early.id), (MONDAY, '09:45', late.id)]
+
+    # Windows of 1, 2 and 4 days reach Saturday
+    with assert_max_queries(3):
+        found = earliest_slots([weekend], 1, MONDAY, now=BEFORE)
+    assert found == [(date(2030, 1, 12), 8 * 60, weekend.id)]
+    assert earliest_slots([weekend], 1, MONDAY, now=BEFORE, horizon=5) == []
+
+def test_next_available_endpoint(app, factory, login):
+    doctors = [factory.doctor(morning_slot_start='09:00', morning_slot_end='10:00', evening_slot_start='',
+                              evening_slot_end='', avg_consultation_time=30) for _ in range(3)]
+    doctors[2].is_available = False
+    db.session.commit()
+    department_id, ids = doctors[0].department_id, [doctor.id for doctor in doctors]
+    client = login(factory.patient().user)
+
+    url = f'/api/departments/{department_id}/next-available'
+    data = client.get(url + '?from=2030-01-07&count=5').get_json()['data']
+    assert [(slot['date'], slot['time'], slot['doctor_id']) for slot in data['slots']] == [
+        ('2030-01-07', '09:00', ids[0]), ('2030-01-07', '09:00', ids[1]),
+        ('2030-01-07', '09:30', ids[0]), ('2030-01-07', '09:30', ids[1]),
+        ('2030-01-08', '09:00', ids[0])]
+    assert data['slots'][0]['doctor_name'] == doctors[0].user.username
+    assert client.get(url + '?from=07-01-2030').status_code == 400
+    assert client.get('/api/departments/9999/next-available').status_code == 404
@@ -0,0 +1,79 @@
+"""
+Benchmark suite: the synthetic data generator is deterministic and skewed,
+every scenario succeeds on a small dataset, and the regression gate.
+"""
+
+import os
+import sys
+from collections import Counter
+from datetime import date
+from app import create_app, db
+from models.appointment import Appointment
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+
+import bench_suite
+import synthetic
+
+SMALL = dict(departments=6, doctors=12, patients=150, years=1, visits_per_year=3)
+
+def generated(tmp_path, name, **scale):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / name}"})
+    with app.app_context():
+        data = synthetic.generate(**scale)
+        fingerprint = synthetic.fingerprint()
+        db.session.remove()
+        db.engine.dispose()
+    return app, data, fingerprint
+
+def test_generator_is_deterministic_and_skewed(app, tmp_path):
+    data = synthetic.generate(**SMALL, seed=3)
+    _, again, same = generated(tmp_path, 'again.db', **SMALL, seed=3)
+    _, _, other = generated(tmp_path, 'other.db', **SMALL, seed=4)
+    assert synthetic.fingerprint() == same != other
+    assert data == again
+
+    appointments = Appointment.query.all()
+    assert len(appointments) == data.counts['appointments']
+    per_doctor = Counter(a.doctor_id for a in appointments).most_common()
+    assert per_doctor[0][1] > 3 * per_doctor[len(per_doctor) // 2][1]
+    weekdays = Counter(a.appointment_date.weekday() for a in appointments if a.appointment_date < date.today())
+    assert weekdays[0] > 3 * weekdays[6]  # Mondays busy, Sundays quiet
+    booked = [(a.doctor_id, a.appointment_date, a.appointment_time) for a in appointments if a.status == 'Booked']
+    assert len(booked) == len(set(booked)) and all(a.appointment_date >= date.today() for a in appointments
+                                                   if a.status == 'Booked')
+
+def test_every_scenario_runs(tmp_path):
+    app, data, _ = generated(tmp_path, 'suite.db', **SMALL)
+    results, total = bench_suite.run(app, data, requests=1, warmup=0)
+    assert {name.split('.')[0] for name in results} == {'main', 'auth', 'admin', 'doctor', 'patient', 'api', 'debug'}
+    assert total['requests'] == len(results) == len(bench_suite.scenarios(data))
+    assert all(row['p50_ms'] > 0 for row in results.values())
+    assert results['api.create_appointment']['queries_per_request'] > 0
+
+def test_regression_gate():
+    def results(slowdown=1.0, **changed):
+        rows = {f'api.scenario{n}': {'p50_ms': 4.0 * slowdown, 'p95_ms': 6.0 * slowdown, 'queries_per_request': 2}
+                for n in range(5)}
+        for name, row in changed.items():
+            rows[f'api.{name}'].update(row)
+        return {'scenarios': rows}
+
+    baseline = results()
+    assert bench_suite.compare(baseline, results(1.1)) == []
+    # Slower across the board fails every scenario on raw numbers, and once as drift when normalized
+    assert bench_suite.drift(baseline, results(1.3)) == 1.3
+    assert len(bench_suite.compare(baseline, results(1.3))) == 10
+    assert bench_suite.compare(baseline, results(1.3), normalize=True) == \
+        ['run-wide drift: p50 +30% across all scenarios']
+    # Normalized, drift within the threshold is forgiven but a scenario slower than the rest is not
+    assert bench_suite.compare(baseline, results(1.2), normalize=True) == []
+    assert bench_suite.compare(baseline, results(1.2, scenario3={'p50_ms': 7.2}), normalize=True) == \
+        ['api.scenario3: p50_ms 4.00 -> 7.20 (+50%)']
+    assert bench_suite.compare(baseline, results(scenario2={'p95_ms': 9.0})) == \
+        ['api.scenario2: p95_ms 6.00 -> 9.00 (+50%)']
+    assert bench_suite.compare(baseline, results(scenario0={'queries_per_request': 3})) == \
+        ['api.scenario0: queries/request 2 -> 3']
+    # Small absolute changes on fast endpoints are noise
+    assert bench_suite.compare(baseline, results(scenario1={'p50_ms': 4.9})) == []
+    assert bench_suite.compare(baseline, {'scenarios': {**results()['scenarios'], 'new.endpoint': {}}}) == []
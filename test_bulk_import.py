@@ -0,0 +1,118 @@
+"""
+Bulk import: valid rows go in batch by batch, invalid ones are reported by
+row number, and the dashboard counters stay in step.
+"""
+
+import json
+from datetime import date
+
+from app import db
+from models.user import User
+from models.doctor import Doctor
+from models.patient import Patient
+from models.appointment import Appointment
+from models.department import Department
+from utils.counters import check_counters
+from utils.bulk_import import PatientImporter
+
+def ndjson(rows):
+    return '\n'.join(json.dumps(row) for row in rows)
+
+def post(client, kind, body, content_type='application/x-ndjson', **params):
+    query = '&'.join(f'{k}={v}' for k, v in params.items())
+    resp = client.post(f'/api/bulk/{kind}?{query}', data=body, content_type=content_type)
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    return resp.get_json()['data']
+
+def test_patient_import_reports_bad_rows(app, factory, login):
+    existing = factory.patient()
+    client = login(factory.admin())
+    rows = [{'username': f'bulk{i}', 'email': f'bulk{i}@example.com', 'phone': f'555{i:04d}'}
+            for i in range(25)]
+    rows[3]['email'] = existing.user.email
+    rows[7]['email'] = rows[6]['email']
+    del rows[11]['username']
+    rows[15]['date_of_birth'] = '15/01/1990'
+
+    report = post(client, 'patients', ndjson(rows) + '\nnot json', batch_size=4)
+
+    assert report['inserted'] == 21
+    assert [(e['row'], e['error']) for e in report['errors']] == [
+        (4, 'Email already registered'),
+        (8, 'Duplicate email in upload: bulk6@example.com'),
+        (12, 'Missing required field: username'),
+        (16, 'Invalid date format: 15/01/1990. Use YYYY-MM-DD'),
+        (26, 'Invalid JSON object'),
+    ]
+    patient = Patient.query.join(User).filter(User.username == 'bulk0').one()
+    assert patient.phone == '5550000'
+    assert patient.user.role == 'patient' and not patient.user.check_password('')
+    assert check_counters() == {}
+
+def test_rolled_back_batch_does_not_claim_keys(app):
+    class FlakyImporter(PatientImporter):
+        failures = 1
+
+        def insert(self, conn, rows):
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError('disk full')
+            return super().insert(conn, rows)
+
+    rows = [{'username': 'retry0', 'email': 'retry0@example.com'},
+            {'username': 'retry1', 'email': 'retry1@example.com'},
+            {'username': 'retry0', 'email': 'retry0@example.com'}]
+    report = FlakyImporter(batch_size=2).run(rows)
+
+    # The first batch was rolled back, so its keys are free for the row that repeats them
+    assert report.inserted == 1
+    assert [e['row'] for e in report.errors] == [1, 2]
+    assert User.query.filter_by(username='retry0').count() == 1
+
+def test_doctor_import_from_csv(app, factory, login):
+    client = login(factory.admin())
+    department = Department.query.first()
+    body = ('username,email,department_id,license_number,consultation_fees\n'
+            f'drA,dra@example.com,{department.id},LIC-1,750\n'
+            f'drB,drb@example.com,9999,LIC-2,\n'
+            f'drC,drc@example.com,{department.id},LIC-1,\n'
+            f'drD,drd@example.com,{department.id},LIC-4,\n')
+
+    report = post(client, 'doctors', body, content_type='text/csv')
+
+    assert report['inserted'] == 2
+    assert [e['row'] for e in report['errors']] == [2, 3]
+    assert Doctor.query.filter_by(license_number='LIC-1').one().consultation_fees == 750
+    assert Doctor.query.filter_by(license_number='LIC-4').one().consultation_fees == 500
+    assert check_counters() == {}
+
+def test_appointment_import_checks_references_and_slots(app, factory, login):
+    doctor, patient = factory.doctor(consultation_fees=300), factory.patient()
+    db.session.add(Appointment(patient_id=patient.id, doctor_id=doctor.id,
+                               appointment_date=date(2030, 1, 1), appointment_time='09:00'))
+    db.session.commit()
+    client = login(factory.admin())
+    base = {'patient_id': patient.id, 'doctor_id': doctor.id, 'appointment_date': '2030-01-01'}
+    rows = [
+        dict(base, appointment_time='09:00'),                          # slot taken
+        dict(base, appointment_time='09:00', status='Completed'),      # history may overlap
+        dict(base, appointment_time='10:00'),
+        dict(base, appointment_time='10:00'),                          # taken earlier in upload
+        dict(base, appointment_time='11:00', patient_id=9999),
+        dict(base, appointment_time='12:00', status='Lost'),
+    ]
+
+    report = post(client, 'appointments', ndjson(rows))
+
+    assert report['inserted'] == 2
+    assert [e['row'] for e in report['errors']] == [1, 4, 5, 6]
+    imported = Appointment.query.filter_by(appointment_time='10:00').one()
+    assert imported.consultation_fees == 300
+    db.session.expire_all()
+    assert db.session.get(Doctor, doctor.id).total_appointments == 2
+    assert check_counters() == {}
+
+def test_bulk_import_is_admin_only(app, factory, login):
+    client = login(factory.patient().user)
+    resp = client.post('/api/bulk/patients', data='', content_type='application/x-ndjson')
+    assert resp.status_code == 403
@@ -0,0 +1,163 @@
+"""
+Live events: the in-process broker, publishing only after commit, and the
+Server-Sent Events streams per doctor and per patient.
+"""
+
+import json
+import threading
+from datetime import date
+from app import db
+from models.appointment import Appointment
+from utils.events import EventBroker, HEARTBEAT, RETRY, current_broker, patient_channel
+from utils.patient_queue import PatientQueue
+
+def parse(chunk):
+    fields = dict(line.split(': ', 1) for line in chunk.decode().strip().split('\n'))
+    return int(fields['id']), fields['event'], json.loads(fields['data'])
+
+def _take(stream, count):
+    return [next(stream) for _ in range(count)]
+
+def test_broker_replay_reset_and_heartbeat():
+    broker = EventBroker(buffer_size=3)
+    for n in range(5):
+        broker.publish(7, 'appointment', {'n': n})
+
+    assert [parse(chunk)[2]['n'] for chunk in _take(broker.listen(7, last_id=3), 2)] == [3, 4]
+    event_id, kind, _ = parse(next(broker.listen(7, last_id=1)))
+    assert (event_id, kind) == (5, 'reset')  # ids 1-2 fell out of the buffer
+    assert next(broker.listen(7, heartbeat=0.01)) == HEARTBEAT
+    assert next(broker.listen(8, last_id=0, heartbeat=0.01)) == HEARTBEAT
+
+def test_waiting_subscribers_are_woken():
+    broker = EventBroker()
+    received, started = [], threading.Barrier(51)
+
+    def subscribe():
+        stream = broker.listen(1, last_id=0, heartbeat=5)
+        started.wait()
+        received.append(parse(next(stream))[2])
+
+    threads = [threading.Thread(target=subscribe) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    started.wait()
+    broker.publish(2, 'appointment', {'doctor': 2})
+    broker.publish(1, 'appointment', {'doctor': 1})
+    for thread in threads:
+        thread.join(5)
+    assert received == [{'doctor': 1}] * 50
+
+def test_events_published_on_commit_only(app, factory):
+    doctor, patient = factory.doctor(), factory.patient()
+    broker = current_broker()
+    start = broker.last_id(doctor.id)
+
+    appointment = Appointment(patient_id=patient.id, doctor_id=doctor.id, appointment_date=date.today(),
+                              appointment_time='09:00', status='Booked')
+    db.session.add(appointment)
+    db.session.flush()
+    db.session.rollback()
+    assert broker.last_id(doctor.id) == start
+
+    db.session.add(appointment)
+    db.session.commit()
+    queue = PatientQueue(doctor.id)
+    queue.check_in(appointment)
+    appointment.appointment_time = '09:15'  # a second flush in the same transaction
+    db.session.commit()
+    queue.call_next()
+    db.session.commit()
+
+    events = [parse(chunk) for chunk in _take(broker.listen(doctor.id, last_id=start), 3)]
+    assert [kind for _, kind, _ in events] == ['appointment', 'appointment', 'queue']
+    assert events[0][2]['status'] == 'Booked' and events[0][2]['queue_position'] is None
+    assert events[1][2]['queue_position'] == 1 and events[1][2]['time'] == '09:15'
+    assert events[2][2] == {'doctor_id': doctor.id, 'date': date.today().isoformat(),
+                            'now_serving': 1, 'appointment_id': appointment.id}
+    assert 'patient_id' not in events[0][2]
+
+def test_moving_and_deleting_notify_old_doctor(app, factory):
+    first, second, patient = factory.doctor(), factory.doctor(), factory.patient()
+    appointment = Appointment(patient_id=patient.id, doctor_id=first.id, appointment_date=date.today(),
+                              appointment_time='10:00', status='Booked')
+    db.session.add(appointment)
+    db.session.commit()
+    broker = current_broker()
+    before_first, before_second = broker.last_id(first.id), broker.last_id(second.id)
+
+    appointment.doctor_id = second.id
+    db.session.commit()
+    assert parse(next(broker.listen(first.id, last_id=before_first)))[2]['removed'] is True
+    assert parse(next(broker.listen(second.id, last_id=before_second)))[2]['removed'] is False
+
+    db.session.delete(appointment)
+    db.session.commit()
+    assert parse(next(broker.listen(second.id, last_id=before_second + 1)))[2]['removed'] is True
+
+def test_event_stream_endpoint(app, factory, client, login):
+    doctor, patient = factory.doctor(), factory.patient()
+    doctor_id, patient_id = doctor.id, patient.id
+    assert client.get(f'/api/doctors/{doctor_id}/events').status_code == 401
+
+    login(patient.user)
+    assert client.get(f'/api/doctors/{doctor_id}/events').status_code == 403
+    login(factory.doctor().user)
+    assert client.get(f'/api/doctors/{doctor_id}/events').status_code == 403
+
+    login(doctor.user)
+    response = client.get(f'/api/doctors/{doctor_id}/events', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    stream = iter(response.response)
+    assert next(stream) == RETRY
+
+    db.session.add(Appointment(patient_id=patient_id, doctor_id=doctor_id, appointment_date=date.today(),
+                               appointment_time='11:00', status='Booked'))
+    db.session.commit()
+    event_id, kind, data = parse(next(stream))
+    assert kind == 'appointment' and data['time'] == '11:00'
+    assert current_broker().subscribers(doctor_id) == 1
+    response.close()
+    assert current_broker().subscribers(doctor_id) == 0
+
+    # Reconnecting with Last-Event-ID replays what was missed
+    response = client.get(f'/api/doctors/{doctor_id}/events', headers={'Last-Event-ID': str(event_id - 1)},
+                          buffered=False)
+    assert parse(_take(iter(response.response), 2)[1])[0] == event_id
+    response.close()
+    assert client.get('/api/doctors/999/events').status_code == 404
+
+def test_patient_stream_carries_only_their_appointments(app, factory, client, login):
+    doctor, patient, other = factory.doctor(), factory.patient(), factory.patient()
+    doctor_id, patient_id = doctor.id, patient.id
+    login(other.user)
+    assert client.get(f'/api/patients/{patient_id}/events').status_code == 403
+    login(doctor.user)
+    assert client.get(f'/api/patients/{patient_id}/events').status_code == 403
+
+    login(patient.user)
+    response = client.get(f'/api/patients/{patient_id}/events', buffered=False)
+    stream = iter(response.response)
+    assert next(stream) == RETRY
+
+    theirs, mine = [Appointment(patient_id=p.id, doctor_id=doctor_id, appointment_date=date.today(),
+                                appointment_time=t, status='Booked') for p, t in ((other, '09:00'), (patient, '09:15'))]
+    db.session.add_all([theirs, mine])
+    db.session.commit()
+    _, kind, data = parse(next(stream))
+    assert kind == 'appointment' and data['id'] == mine.id
+    response.close()
+
+    # Both check in; calling the first tells the other waiting patient who is being served
+    queue = PatientQueue(doctor_id)
+    queue.check_in(theirs)
+    queue.check_in(mine)
+    db.session.commit()
+    start = current_broker().last_id(patient_channel(patient_id))
+    queue.call_next()
+    db.session.commit()
+    _, kind, data = parse(next(current_broker().listen(patient_channel(patient_id), last_id=start)))
+    assert kind == 'queue' and data['now_serving'] == 1
+    assert data['appointment_id'] == mine.id and data['called'] is False
+    assert current_broker().last_id(patient_channel(patient_id)) == start + 1
+    assert client.get('/api/patients/999/events').status_code == 404
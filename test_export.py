@@ -0,0 +1,82 @@
+"""
+Streaming exports: every matching row, the same scoping and filters as the
+list endpoint, in NDJSON or CSV.
+"""
+
+import csv
+import io
+import json
+from datetime import date, timedelta
+
+from app import db
+from models.appointment import Appointment
+from models.treatment import Treatment
+
+def seed(factory):
+    doctors = [factory.doctor() for _ in range(2)]
+    patients = [factory.patient() for _ in range(3)]
+    statuses = ['Booked', 'Completed', 'Cancelled']
+    for i in range(30):
+        appointment = Appointment(patient_id=patients[i % 3].id, doctor_id=doctors[i % 2].id,
+                                  appointment_date=date(2025, 3, 1) + timedelta(days=i),
+                                  appointment_time='10:00', status=statuses[i % 3])
+        db.session.add(appointment)
+        db.session.flush()
+        if appointment.status == 'Completed':
+            db.session.add(Treatment(appointment_id=appointment.id, patient_id=appointment.patient_id,
+                                     doctor_id=appointment.doctor_id, diagnosis=f'Diagnosis {i}'))
+    db.session.commit()
+    return doctors, patients
+
+def ndjson(resp):
+    assert resp.status_code == 200
+    assert resp.mimetype == 'application/x-ndjson'
+    return [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+
+def test_appointment_export_matches_list_endpoint(app, factory, login):
+    seed(factory)
+    client = login(factory.admin())
+    params = 'status=Booked&date_from=2025-03-05&date_to=2025-03-25'
+
+    resp = client.get(f'/api/appointments/export?{params}')
+    assert resp.is_streamed
+    rows = ndjson(resp)
+    listed = client.get(f'/api/appointments?{params}&per_page=100').get_json()['data']['appointments']
+
+    assert sorted(row['id'] for row in rows) == sorted(a['id'] for a in listed)
+    by_id = {a['id']: a for a in listed}
+    for row in rows:
+        assert row['patient_name'] == by_id[row['id']]['patient']['name']
+        assert row['department'] == by_id[row['id']]['doctor']['department']
+        assert row['appointment_date'] == by_id[row['id']]['appointment_date']
+
+def test_export_is_role_scoped(app, factory, login):
+    doctors, patients = seed(factory)
+
+    rows = ndjson(login(doctors[1].user).get('/api/appointments/export'))
+    assert {row['doctor_id'] for row in rows} == {doctors[1].id}
+    assert len(rows) == 15
+
+    rows = ndjson(login(patients[1].user).get('/api/treatments/export'))
+    assert {row['patient_id'] for row in rows} == {patients[1].id}
+    assert len(rows) == Treatment.query.filter_by(patient_id=patients[1].id).count()
+
+def test_csv_export(app, factory, login):
+    seed(factory)
+    resp = login(factory.admin()).get('/api/treatments/export?format=csv')
+    assert resp.status_code == 200
+    assert resp.mimetype == 'text/csv'
+    assert 'treatments.csv' in resp.headers['Content-Disposition']
+
+    rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+    assert len(rows) == Treatment.query.count()
+    assert {row['diagnosis'] for row in rows} == {t.diagnosis for t in Treatment.query}
+
+def test_empty_csv_export_has_header(app, factory, login):
+    resp = login(factory.admin()).get('/api/appointments/export?format=csv')
+    assert resp.get_data(as_text=True).startswith('id,patient_id,patient_name')
+
+def test_export_rejects_bad_params(app, factory, login):
+    client = login(factory.admin())
+    assert client.get('/api/appointments/export?format=xml').status_code == 400
+    assert client.get('/api/treatments/export?date_from=03/01/2025').status_code == 400
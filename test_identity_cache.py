@@ -0,0 +1,98 @@
+"""
+Identity cache: repeat requests resolve the user and profile with one version
+lookup, and admin or profile changes, in this process or another, drop the
+cached entry.
+"""
+
+import time
+from flask import current_app, g
+
+from app import db
+from models.user import User
+from utils.identity import IdentityCache, Identity, bump_versions
+
+def identity_queries(statements):
+    return [s for s in statements if 'FROM users' in s and 'LEFT OUTER JOIN doctors' in s]
+
+def cached(user_id):
+    return current_app.extensions['identity_cache'].get(user_id)
+
+def test_repeat_requests_skip_identity_queries(app, factory, login, query_counter):
+    patient = factory.patient()
+    client = login(patient.user)
+
+    with query_counter() as first:
+        assert client.get('/api/appointments').status_code == 200
+    assert len(identity_queries(first)) == 1
+
+    login(patient.user)  # drop the per-request copy, keep the cross-request cache
+    with query_counter() as second:
+        assert client.get('/api/appointments').status_code == 200
+    assert identity_queries(second) == []
+    assert not any('FROM users' in s or 'FROM patients' in s for s in second)
+    # The full identity query is replaced by a primary key lookup of its version
+    assert len(second) == len(first)
+    assert len([s for s in second if 'FROM identity_versions' in s]) == 1
+
+def test_status_toggle_invalidates(app, factory, login):
+    patient = factory.patient()
+    login(patient.user).get('/api/appointments')
+    assert cached(patient.user_id).user['is_active'] is True
+
+    login(factory.admin()).post(f'/admin/patient/{patient.id}/toggle-status')
+    assert cached(patient.user_id) is None
+
+def test_profile_edit_is_visible_on_next_request(app, factory, login):
+    doctor = factory.doctor()
+    client = login(doctor.user)
+    client.get('/doctor/profile')
+
+    client.post('/doctor/profile', data={'phone': '123', 'bio': 'hi', 'email': 'new@example.com'})
+    assert cached(doctor.user_id) is None
+
+    login(doctor.user)
+    client.get('/api/appointments')
+    assert cached(doctor.user_id).user['email'] == 'new@example.com'
+
+def test_deleted_user_is_logged_out(app, factory, login):
+    patient = factory.patient()
+    user_id = patient.user_id
+    client = login(patient.user)
+    client.get('/api/appointments')
+
+    login(factory.admin()).post(f'/admin/patient/{patient.id}/remove')
+    assert cached(user_id) is None
+    assert db.session.get(User, user_id) is None
+
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+    g.pop('_login_user', None)
+    assert client.get('/api/appointments').status_code == 401
+
+def test_change_by_another_process_is_seen(app, factory, login):
+    patient = factory.patient()
+    user_id = patient.user_id
+    client = login(patient.user)
+    assert client.get('/api/appointments').status_code == 200
+    assert cached(user_id) is not None
+
+    # Another worker deactivates the user: this process's cache is untouched
+    with db.engine.begin() as conn:
+        conn.execute(User.__table__.update().where(User.__table__.c.id == user_id).values(is_active=False))
+        bump_versions(conn, [user_id])
+    assert cached(user_id).user['is_active'] is True
+
+    login(patient.user)
+    assert client.get('/api/appointments').status_code == 401
+    assert cached(user_id).user['is_active'] is False
+
+def test_cache_ttl_and_lru():
+    cache = IdentityCache(maxsize=2, ttl=0.05)
+    for user_id in (1, 2):
+        cache.put(Identity(user_id, {}, None, None, 0))
+    cache.get(1)
+    cache.put(Identity(3, {}, None, None, 0))
+    assert cache.get(2) is None and cache.get(1) and cache.get(3)
+
+    time.sleep(0.06)
+    assert cache.get(1) is None
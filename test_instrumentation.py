@@ -0,0 +1,121 @@
+"""
+Opt-in request instrumentation: per-endpoint latency, SQL statements and
+lazy loads, the admin metrics page and the Prometheus endpoint.
+"""
+
+import pytest
+from sqlalchemy import event
+from app import create_app, db
+from models.appointment import Appointment
+from models.doctor import Doctor
+from models.user import User
+from utils import instrumentation
+from utils.instrumentation import EndpointStats, BUCKETS, current_metrics
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'INSTRUMENTATION_ENABLED': True,
+        'METRICS_TOKEN': 'scrape-me',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+    })
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+def row_for(endpoint, method='GET'):
+    return next(row for row in current_metrics().rows() if (row['endpoint'], row['method']) == (endpoint, method))
+
+def test_counts_statements_and_lazy_loads_per_endpoint(app, factory, login, query_counter):
+    doctor_id = factory.doctor().id
+    db.session.expunge_all()
+
+    @app.route('/lazy')
+    def lazy():
+        return db.session.get(Doctor, doctor_id).user.username
+
+    @app.route('/boom')
+    def boom():
+        raise RuntimeError('boom')
+
+    client = login(factory.admin())
+    with query_counter() as statements:
+        for _ in range(3):
+            assert client.get('/api/doctors').status_code == 200
+    row = row_for('api.get_doctors')
+    assert row['requests'] == 3 and row['errors'] == 0
+    assert row['queries_per_request'] == len(statements) / 3
+    assert row['sql_ms_per_request'] > 0 and 0 < row['p50_ms'] <= row['max_ms']
+
+    # A view that touches an unloaded relationship shows up as a lazy load
+    db.session.expunge_all()
+    assert client.get('/lazy').status_code == 200
+    assert row_for('lazy')['lazy_loads_per_request'] == 1
+
+    assert client.get('/no-such-page').status_code == 404
+    assert row_for('<unmatched>')['requests'] == 1
+    assert current_metrics().endpoints[('<unmatched>', 'GET')].statuses == {404: 1}
+
+    # An unhandled error never produces a response; it counts as a 500
+    with pytest.raises(RuntimeError):
+        client.get('/boom')
+    assert row_for('boom')['errors'] == 1
+
+def test_work_outside_requests_is_not_recorded(app, factory):
+    factory.patient()
+    Appointment.query.count()
+    assert current_metrics().rows() == []
+
+def test_percentiles_interpolate_within_buckets():
+    stats = EndpointStats()
+    for seconds in [0.002] * 90 + [0.2] * 10:
+        stats.buckets[sum(bound < seconds for bound in BUCKETS)] += 1
+        stats.count += 1
+        stats.max_seconds = max(stats.max_seconds, seconds)
+    assert stats.percentile(0.5) < 0.005
+    assert 0.1 < stats.percentile(0.95) <= 0.2
+    assert stats.percentile(1.0) == pytest.approx(0.2)
+    assert EndpointStats().percentile(0.5) is None
+
+def test_prometheus_endpoint_access_and_format(app, factory, login):
+    client = login(factory.patient().user)
+    assert client.get('/api/doctors').status_code == 200
+    assert client.get('/admin/metrics/prometheus').status_code == 403
+    assert client.get('/admin/metrics').status_code == 302
+
+    scraped = app.test_client().get('/admin/metrics/prometheus', headers={'Authorization': 'Bearer scrape-me'})
+    assert scraped.status_code == 200 and scraped.mimetype == 'text/plain'
+    text = scraped.get_data(as_text=True)
+    labels = 'endpoint="api.get_doctors",method="GET"'
+    assert '# TYPE hms_request_duration_seconds histogram' in text
+    assert f'hms_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1' in text
+    assert f'hms_requests_total{{{labels},status="200"}} 1' in text
+    assert f'hms_sql_statements_total{{{labels}}}' in text
+    assert app.test_client().get('/admin/metrics/prometheus',
+                                 headers={'Authorization': 'Bearer wrong'}).status_code == 403
+
+    admin = login(factory.admin())
+    page = admin.get('/admin/metrics')
+    assert page.status_code == 200 and b'api.get_doctors' in page.data
+    assert admin.post('/admin/metrics/reset').status_code == 302
+    assert [row['endpoint'] for row in current_metrics().rows()] == ['admin.reset_metrics']
+
+def test_disabled_registers_nothing(tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'off.db'}"})
+    with app.app_context():
+        assert current_metrics() is None
+        assert not event.contains(db.engine, 'after_cursor_execute', instrumentation._after_cursor_execute)
+        assert instrumentation._before_request not in app.before_request_funcs.get(None, [])
+        admin = User(username='admin', email='a@test.com', password_hash='x', role='admin')
+        db.session.add(admin)
+        db.session.commit()
+        admin_id = admin.id
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin_id)
+        assert b'Instrumentation is off' in client.get('/admin/metrics').data
+        assert client.get('/admin/metrics/prometheus').status_code == 404
+        db.session.remove()
+        db.engine.dispose()
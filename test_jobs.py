@@ -0,0 +1,152 @@
+"""
+Background jobs: enqueue inside the caller's transaction, idempotency keys,
+retry with backoff, lease expiry, worker threads, and the booking totals
+that create_appointment now defers.
+"""
+
+import re
+import time
+from datetime import date, datetime, timedelta
+from app import db
+from models.job import Job
+from models.doctor import Doctor
+from models.patient import Patient
+from utils.jobs import JobRunner, job, enqueue, current_runner, worker_id
+from utils.counters import check_counters
+from utils.stats import dashboard_stats
+
+calls = []
+
+@job('test.record', max_attempts=3)
+def record(payload):
+    calls.append(payload['n'])
+
+@job('test.broken', max_attempts=2)
+def broken(payload):
+    raise RuntimeError('gateway down')
+
+def test_booking_defers_totals(app, factory, login, query_counter):
+    doctor, patient = factory.doctor(consultation_fees=500), factory.patient()
+    doctor_id, patient_id = doctor.id, patient.id
+    client = login(patient.user)
+
+    with query_counter() as statements:
+        response = client.post('/api/appointments', json={
+            'doctor_id': doctor_id, 'appointment_date': (date.today() + timedelta(days=3)).isoformat(),
+            'appointment_time': '10:00'})
+    assert response.status_code == 201
+    # The booking writes the appointment, the job and the schedule version; nothing shared
+    written = {re.match(r'(?:INSERT INTO|UPDATE) (\w+)', s).group(1) for s in statements
+               if s.startswith(('INSERT', 'UPDATE', 'DELETE'))}
+    assert written == {'appointments', 'jobs', 'schedule_versions'}
+    assert db.session.get(Doctor, doctor_id).total_appointments in (None, 0)
+    assert dashboard_stats()['appointments']['by_status'].get('Booked', 0) == 0
+
+    assert current_runner().run_pending() == 1
+    db.session.expire_all()
+    assert db.session.get(Doctor, doctor_id).total_appointments == 1
+    assert dashboard_stats()['appointments']['by_status']['Booked'] == 1
+    assert check_counters() == {}
+    patient = db.session.get(Patient, patient_id)
+    assert patient.total_visits == 1 and patient.last_visit.date() == date.today()
+    assert Job.query.one().status == 'done'
+
+def test_idempotency_key_and_rollback(app):
+    assert enqueue('test.record', {'n': 1}, key='once')
+    assert not enqueue('test.record', {'n': 2}, key='once')
+    db.session.commit()
+    assert not enqueue('test.record', {'n': 3}, key='once')
+    enqueue('test.record', {'n': 4})
+    db.session.rollback()
+    assert [j.payload for j in Job.query.all()] == ['{"n": 1}']
+
+def test_retry_then_fail(app):
+    runner = JobRunner(app, workers=0, retry_delay=60)
+    enqueue('test.broken')
+    db.session.commit()
+
+    assert runner.run_pending() == 1
+    failed = Job.query.one()
+    assert (failed.status, failed.attempts) == ('queued', 1)
+    assert failed.run_after > datetime.now() + timedelta(seconds=50)
+    assert failed.last_error == 'RuntimeError: gateway down'
+    assert runner.run_pending() == 0  # not due yet
+
+    failed.run_after = datetime.now()
+    db.session.commit()
+    assert runner.run_pending() == 1
+    db.session.expire_all()
+    assert (Job.query.one().status, Job.query.one().attempts) == ('failed', 2)
+    assert runner.snapshot()['retried'] == 1 and runner.snapshot()['failed'] == 1
+
+def test_abandoned_job_is_claimed_again(app):
+    calls.clear()
+    enqueue('test.record', {'n': 7})
+    db.session.commit()
+    stuck = Job.query.one()
+    stuck.status, stuck.locked_by, stuck.locked_at = 'running', 'dead-worker', datetime.now() - timedelta(hours=1)
+    db.session.commit()
+
+    assert JobRunner(app, workers=0, lease=60).run_pending() == 1
+    assert calls == [7]
+    db.session.expire_all()
+    assert Job.query.one().status == 'done' and Job.query.one().attempts == 1
+
+@job('test.reclaimed')
+def reclaimed(payload):
+    # Another run takes the job over (the lease ran out) while this one runs it;
+    # a second cron run in the same thread name claims under the same worker id
+    with db.engine.begin() as conn:
+        conn.execute(Job.__table__.update().values(locked_by=payload['by'],
+                                                   locked_at=datetime.now() + timedelta(seconds=1)))
+    enqueue('test.record', {'n': payload['n']})
+    if payload['fail']:
+        raise RuntimeError('too late anyway')
+
+def test_reclaimed_job_rolls_back(app):
+    runner = JobRunner(app, workers=0)
+    runs = [(by, fail) for by in ('other-worker', worker_id()) for fail in (False, True)]
+    for by, fail in runs:
+        Job.query.delete()
+        enqueue('test.reclaimed', {'n': 1, 'fail': fail, 'by': by})
+        db.session.commit()
+
+        assert runner.run_one() is True
+        db.session.expire_all()
+        job_ = Job.query.one()  # the handler's enqueue was rolled back
+        assert (job_.status, job_.locked_by, job_.finished_at) == ('running', by, None)
+    assert runner.snapshot()['lost'] == len(runs)
+    assert runner.snapshot()['succeeded'] == runner.snapshot()['retried'] == 0
+
+def test_worker_threads_run_each_job_once(app, factory):
+    doctor = factory.doctor()
+    patient = factory.patient()
+    for n in range(40):
+        enqueue('appointment.booked', {'doctor_id': doctor.id, 'patient_id': patient.id,
+                                       'booked_at': datetime.now().isoformat()}, key=f'booking-{n}')
+    db.session.commit()
+    doctor_id = doctor.id
+    db.session.remove()
+
+    runner = JobRunner(app, workers=4, poll_interval=0.05)
+    runner.start()
+    deadline = time.time() + 20
+    while time.time() < deadline and Job.query.filter_by(status='done').count() < 40:
+        db.session.remove()
+        time.sleep(0.05)
+    runner.stop()
+    assert Job.query.filter_by(status='done').count() == 40
+    assert db.session.get(Doctor, doctor_id).total_appointments == 40
+    assert runner.snapshot()['succeeded'] == 40
+
+def test_metrics_endpoint(app, factory, login):
+    enqueue('test.record', {'n': 1})
+    enqueue('test.broken')
+    db.session.commit()
+    current_runner().run_pending()
+
+    client = login(factory.patient().user)
+    assert client.get('/api/jobs/metrics').status_code == 403
+    data = login(factory.admin()).get('/api/jobs/metrics').get_json()['data']
+    assert data['queues'] == {'test.record': {'done': 1}, 'test.broken': {'queued': 1}}
+    assert data['runner']['succeeded'] == 1 and data['runner']['retried'] == 1
@@ -0,0 +1,76 @@
+"""
+HTML views must preload what their templates touch: rendering with the
+lazy-load guard enabled must succeed, in a query count independent of rows.
+"""
+
+from datetime import date, timedelta
+import pytest
+from flask import current_app, render_template_string
+
+from app import db
+from models.appointment import Appointment
+from models.treatment import Treatment
+from utils.lazy_loads import LazyLoadInTemplate
+
+def seed(factory, doctor, first_patient, rows, offset=0):
+    """Add `rows` patients with a treated appointment each, plus as many for first_patient"""
+    for i in range(offset, offset + rows):
+        for patient in (factory.patient(), first_patient):
+            appointment = Appointment(patient_id=patient.id, doctor_id=doctor.id,
+                                      appointment_date=date(2030, 1, 1) + timedelta(days=i),
+                                      appointment_time='10:00' if patient is first_patient else '11:00')
+            db.session.add(appointment)
+            db.session.flush()
+            db.session.add(Treatment(appointment_id=appointment.id, patient_id=patient.id, doctor_id=doctor.id,
+                                     diagnosis='Checkup', prescription='Rest', notes='None'))
+    db.session.commit()
+
+def pages(doctor, patient, appointment):
+    return {
+        'admin': ['/admin/dashboard', '/admin/doctors', '/admin/patients', '/admin/appointments',
+                  '/admin/appointments?status=Booked', '/admin/treatments',
+                  f'/admin/patient/{patient.id}/treatments', f'/admin/doctor/{doctor.id}/edit',
+                  '/admin/search/patients?q=patient', '/admin/search/doctors?q=doctor'],
+        'doctor': ['/doctor/dashboard', '/doctor/appointments', '/doctor/patients',
+                   f'/doctor/patient/{patient.id}/history', f'/doctor/treatment/{appointment.id}',
+                   '/doctor/profile'],
+        'patient': ['/patient/dashboard', '/patient/my-appointments', '/patient/treatment-history',
+                    f'/patient/search-doctors?department_id={doctor.department_id}',
+                    f'/patient/book-appointment/{doctor.id}',
+                    f'/patient/reschedule-appointment/{appointment.id}', '/patient/profile'],
+    }
+
+def render_counts(login, query_counter, users, doctor, patient, appointment):
+    counts = {}
+    for role, urls in pages(doctor, patient, appointment).items():
+        client = login(users[role])
+        for url in urls:
+            db.session.expire_all()
+            current_app.extensions['identity_cache'].clear()
+            with query_counter() as statements:
+                resp = client.get(url)
+            assert resp.status_code == 200, f'{url}: {resp.status_code} {resp.headers.get("Location")}'
+            counts[(role, url)] = len(statements)
+    return counts
+
+def test_pages_render_in_constant_queries(app, factory, login, query_counter):
+    doctor, patient = factory.doctor(), factory.patient()
+    seed(factory, doctor, patient, 2)
+    appointment = Appointment.query.filter_by(patient_id=patient.id).first()
+    users = {'admin': factory.admin(), 'doctor': doctor.user, 'patient': patient.user}
+    args = (login, query_counter, users, doctor, patient, appointment)
+
+    few = render_counts(*args)
+    seed(factory, doctor, patient, 23, offset=2)
+    many = render_counts(*args)
+    assert few == many
+
+def test_guard_raises_on_template_lazy_load(app, factory):
+    seed(factory, factory.doctor(), factory.patient(), 1)
+    appointment_id = Appointment.query.first().id
+    db.session.expire_all()
+
+    with app.test_request_context():
+        appointment = db.session.get(Appointment, appointment_id)
+        with pytest.raises(LazyLoadInTemplate):
+            render_template_string('{{ appointment.patient.user.username }}', appointment=appointment)
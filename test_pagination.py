@@ -0,0 +1,82 @@
+"""
+Cursor pagination: walking after= tokens must visit every row exactly once,
+in the page-number order, without a COUNT query.
+"""
+
+from datetime import date, timedelta
+import pytest
+
+from app import db
+from models.appointment import Appointment
+from utils.pagination import encode_cursor
+
+def seed(factory, rows):
+    doctors = [factory.doctor() for _ in range(3)]
+    patients = [factory.patient() for _ in range(rows)]
+    for i, patient in enumerate(patients):
+        # Several appointments share a date and time, so the id tiebreak matters
+        db.session.add(Appointment(patient_id=patient.id, doctor_id=doctors[i % 3].id,
+                                   appointment_date=date(2025, 1, 1) + timedelta(days=i // 6),
+                                   appointment_time=f'{10 + i % 2}:00'))
+    db.session.commit()
+    return doctors, patients
+
+def walk(client, url, name, per_page):
+    ids, after = [], ''
+    while after is not None:
+        resp = client.get(f'{url}?per_page={per_page}&after={after}')
+        assert resp.status_code == 200
+        data = resp.get_json()['data']
+        assert len(data[name]) <= per_page
+        ids.extend(row['id'] for row in data[name])
+        after = data['pagination']['after']
+        assert data['pagination']['has_more'] == (after is not None)
+    return ids
+
+@pytest.mark.parametrize('url,name', [('/api/appointments', 'appointments'),
+                                      ('/api/doctors', 'doctors'),
+                                      ('/api/patients', 'patients')])
+def test_cursor_walk_visits_every_row_once(app, factory, login, url, name):
+    seed(factory, 25)
+    client = login(factory.admin())
+
+    ids = walk(client, url, name, per_page=4)
+    assert len(ids) == len(set(ids))
+    full = client.get(f'{url}?per_page=100').get_json()['data']
+    if name == 'appointments':
+        expected = [a.id for a in Appointment.query.order_by(
+            Appointment.appointment_date.desc(), Appointment.appointment_time.desc(),
+            Appointment.id.desc())]
+    else:
+        expected = sorted(row['id'] for row in full[name])
+    assert ids == expected
+    assert full['pagination']['total'] == len(ids)
+
+def test_cursor_mode_skips_count(app, factory, login, query_counter):
+    seed(factory, 10)
+    client = login(factory.admin())
+    first = client.get('/api/appointments?per_page=3&after=').get_json()['data']
+
+    with query_counter() as statements:
+        resp = client.get(f"/api/appointments?per_page=3&after={first['pagination']['after']}")
+    assert resp.status_code == 200
+    assert not any('count(' in s.lower() for s in statements)
+
+def test_cursor_respects_role_scope_and_filters(app, factory, login):
+    doctors, _ = seed(factory, 25)
+    client = login(doctors[0].user)
+
+    ids = walk(client, '/api/appointments', 'appointments', per_page=2)
+    assert sorted(ids) == sorted(a.id for a in Appointment.query.filter_by(doctor_id=doctors[0].id))
+
+def test_invalid_cursor_is_rejected(app, factory, login):
+    seed(factory, 3)
+    client = login(factory.admin())
+    # Well-formed tokens whose values have the wrong types for (date, time, id)
+    wrong_types = [encode_cursor(values) for values in (
+        ['2025-01-01', '09:00', 'x'], [20250101, '09:00', 1], ['2025-01-01', 900, 1],
+        ['2025-01-01', '09:00', True], ['2025-01-01', '09:00', None])]
+    for token in ['not-a-cursor', 'WzEsMl0'] + wrong_types:
+        resp = client.get(f'/api/appointments?after={token}')
+        assert resp.status_code == 400
+        assert resp.get_json()['error'] == 'Invalid pagination cursor'
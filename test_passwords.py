@@ -0,0 +1,74 @@
+"""
+Password hashing policy: new hashes follow the configured method, older ones
+still verify and are upgraded on login.
+"""
+
+from werkzeug.security import generate_password_hash
+
+from app import db
+from models.user import User
+from utils import passwords
+
+FAST = 'pbkdf2:sha256:1000'
+
+def make_user(factory, password, method):
+    user = factory.user('patient')
+    user.password_hash = generate_password_hash(password, method=method)
+    db.session.commit()
+    return user
+
+def test_policy_controls_new_hashes(app):
+    app.config['PASSWORD_HASH_METHOD'] = FAST
+    user = User(username='u', email='u@example.com', role='patient')
+    user.set_password('secret1')
+
+    assert user.password_hash.startswith(FAST + '$')
+    assert user.check_password('secret1') and not user.check_password('wrong')
+    assert not user.password_needs_rehash()
+
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+    assert user.password_needs_rehash()
+
+def test_method_defaults_are_expanded(app):
+    assert passwords.method_parameters('scrypt') == 'scrypt:32768:8:1'
+    app.config['PASSWORD_HASH_METHOD'] = 'scrypt'
+    assert not passwords.needs_rehash(generate_password_hash('x', method='scrypt:32768:8:1'))
+
+def test_login_rehashes_outdated_hash(app, factory, client):
+    app.config['PASSWORD_HASH_METHOD'] = FAST
+    user = make_user(factory, 'secret1', 'pbkdf2:sha256:2000')
+
+    resp = client.post('/auth/login', data={'username': user.username, 'password': 'secret1', 'role': 'patient'})
+    assert resp.status_code == 302
+
+    db.session.expire_all()
+    user = db.session.get(User, user.id)
+    assert user.password_hash.startswith(FAST + '$')
+    assert user.check_password('secret1')
+
+def test_failed_login_keeps_hash(app, factory, client):
+    app.config['PASSWORD_HASH_METHOD'] = FAST
+    user = make_user(factory, 'secret1', 'pbkdf2:sha256:2000')
+    old_hash = user.password_hash
+
+    client.post('/auth/login', data={'username': user.username, 'password': 'nope', 'role': 'patient'})
+    db.session.expire_all()
+    assert db.session.get(User, user.id).password_hash == old_hash
+
+def test_verification_pool(app, factory):
+    app.config.update(PASSWORD_VERIFY_WORKERS=2, PASSWORD_VERIFY_QUEUE=1)
+    try:
+        pwhash = generate_password_hash('secret1', method=FAST)
+        assert passwords.verify_password(pwhash, 'secret1')
+        assert not passwords.verify_password(pwhash, 'wrong')
+        pool = passwords._pool
+
+        # A new queue depth rebuilds the pool and its semaphore; the same settings reuse it
+        app.config['PASSWORD_VERIFY_QUEUE'] = 3
+        assert passwords.verify_password(pwhash, 'secret1')
+        assert passwords._pool is not pool and passwords._pool_shape == (2, 3)
+        pool = passwords._pool
+        assert passwords.verify_password(pwhash, 'secret1')
+        assert passwords._pool is pool
+    finally:
+        passwords.shutdown_pool()
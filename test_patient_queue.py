@@ -0,0 +1,185 @@
+"""
+Check-in queue: positions per doctor and day, call-next, skip, no-show,
+wait estimates, and unique positions under concurrent check-ins.
+"""
+
+import threading
+from datetime import date, datetime, timedelta
+from app import create_app, db
+from models.appointment import Appointment
+from models.doctor_queue import DoctorQueue
+from utils.patient_queue import PatientQueue, QueueError
+
+TODAY = date.today()
+
+def book(factory, doctor, count, day=TODAY):
+    appointments = [Appointment(patient_id=factory.patient().id, doctor_id=doctor.id, appointment_date=day,
+                                appointment_time=f'{9 + i // 4:02d}:{i % 4 * 15:02d}', status='Booked')
+                    for i in range(count)]
+    db.session.add_all(appointments)
+    db.session.commit()
+    return appointments
+
+def test_check_in_and_call_next(app, factory):
+    doctor = factory.doctor(avg_consultation_time=10)
+    first, second, third = book(factory, doctor, 3)
+    queue = PatientQueue(doctor.id)
+
+    # Arrival order, not appointment time, decides the queue
+    assert [queue.check_in(a) for a in (third, first, second)] == [1, 2, 3]
+    assert queue.check_in(third) == 1
+    db.session.commit()
+
+    assert queue.call_next().id == third.id
+    assert queue.call_next().id == first.id
+    third.status = 'Completed'
+    first.status = 'Completed'
+    db.session.commit()
+    assert queue.call_next().id == second.id
+    assert queue.call_next() is None
+    assert db.session.get(DoctorQueue, (doctor.id, TODAY)).serving_position == 3
+
+def test_skip_and_no_show(app, factory):
+    doctor = factory.doctor()
+    first, second, third = book(factory, doctor, 3)
+    queue = PatientQueue(doctor.id)
+    for appointment in (first, second, third):
+        queue.check_in(appointment)
+
+    assert queue.call_next().id == first.id
+    assert queue.skip(first) == 4
+    queue.no_show(second)
+    db.session.commit()
+    assert second.status == 'No-show'
+    assert [row['appointment_id'] for row in queue.snapshot()['waiting']] == [third.id, first.id]
+    assert queue.call_next().id == third.id
+    assert queue.call_next().id == first.id
+
+    try:
+        queue.no_show(second)
+        assert False, 'a no-show cannot be marked again'
+    except QueueError:
+        pass
+
+def test_rejects_other_queues(app, factory):
+    doctor, other = factory.doctor(), factory.doctor()
+    tomorrow, = book(factory, doctor, 1, day=TODAY + timedelta(days=1))
+    elsewhere, = book(factory, other, 1)
+    for appointment in (tomorrow, elsewhere):
+        try:
+            PatientQueue(doctor.id).check_in(appointment)
+            assert False, 'appointment belongs to another queue'
+        except QueueError:
+            pass
+
+def test_wait_estimate(app, factory):
+    doctor = factory.doctor(avg_consultation_time=12)
+    appointments = book(factory, doctor, 4)
+    queue = PatientQueue(doctor.id)
+    for appointment in appointments:
+        queue.check_in(appointment)
+    assert queue.estimate(appointments[2]) == (2, 24)
+
+    queue.call_next()
+    db.session.commit()
+    called_at = db.session.get(DoctorQueue, (doctor.id, TODAY)).called_at
+    # Five minutes into the first consultation: 7 left, then one full one ahead
+    assert queue.estimate(appointments[2], now=called_at + timedelta(minutes=5)) == (1, 19)
+    assert queue.estimate(appointments[0]) == (0, 0)
+    waits = [row['estimated_wait_minutes'] for row in queue.snapshot(now=called_at + timedelta(minutes=5))['waiting']]
+    assert waits == [7, 19, 31]
+
+def test_position_ops_use_index(app, factory, query_counter):
+    doctor = factory.doctor()
+    appointments = book(factory, doctor, 50)
+    queue = PatientQueue(doctor.id)
+    for appointment in appointments:
+        queue.check_in(appointment)
+    db.session.commit()
+    with query_counter() as statements:
+        queue.call_next()
+    plans = [db.session.execute(db.text('EXPLAIN QUERY PLAN ' + s.replace('?', '1')), {}).all()
+             for s in statements if s.startswith('SELECT') and 'appointments' in s]
+    assert plans and all('uq_appointments_queue_position' in ' '.join(str(r[-1]) for r in plan) for plan in plans)
+
+def test_concurrent_check_ins_get_unique_positions(app, factory):
+    doctor = factory.doctor()
+    ids = [a.id for a in book(factory, doctor, 24)]
+    doctor_id, uri = doctor.id, app.config['SQLALCHEMY_DATABASE_URI']
+    db.session.remove()
+    errors = []
+
+    def check_in(chunk):
+        worker = create_app({'SQLALCHEMY_DATABASE_URI': uri})
+        with worker.app_context():
+            try:
+                for appointment_id in chunk:
+                    PatientQueue(doctor_id).check_in(db.session.get(Appointment, appointment_id))
+                    db.session.commit()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.session.remove()
+                db.engine.dispose()
+
+    threads = [threading.Thread(target=check_in, args=(ids[i::4],)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    positions = sorted(p for p, in db.session.query(Appointment.queue_position).filter_by(doctor_id=doctor_id))
+    assert positions == list(range(1, 25))
+    assert db.session.get(DoctorQueue, (doctor_id, TODAY)).last_position == 24
+
+def test_queue_endpoints(app, factory, login):
+    doctor = factory.doctor(avg_consultation_time=20)
+    first, second = book(factory, doctor, 2)
+    patient = db.session.get(Appointment, second.id).patient
+    first_id, second_id, doctor_id = first.id, second.id, doctor.id
+
+    client = login(patient.user)
+    assert client.post(f'/api/appointments/{first_id}/check-in').status_code == 403
+    response = client.post(f'/api/appointments/{second_id}/check-in')
+    assert response.get_json()['data']['queue_position'] == 1
+    assert client.post(f'/api/doctors/{doctor_id}/queue/call-next').status_code == 403
+
+    client = login(doctor.user)
+    client.post(f'/api/appointments/{first_id}/check-in')
+    assert client.post(f'/api/doctors/{doctor_id}/queue/call-next').get_json()['data']['id'] == second_id
+    assert client.post(f'/api/appointments/{second_id}/skip').get_json()['data']['queue_position'] == 3
+    body = client.get(f'/api/doctors/{doctor_id}/queue').get_json()['data']
+    assert [row['appointment_id'] for row in body['waiting']] == [first_id, second_id]
+    assert body['slot_minutes'] == 20
+
+    client = login(patient.user)
+    wait = client.get(f'/api/appointments/{second_id}/wait').get_json()['data']
+    assert wait['ahead'] == 1 and wait['estimated_wait_minutes'] == 20
+
+    client = login(factory.admin())
+    assert client.post(f'/api/appointments/{first_id}/no-show').get_json()['data']['status'] == 'No-show'
+    assert client.post(f'/api/appointments/{first_id}/no-show').status_code == 400
+
+def test_reschedule_and_cancel_leave_the_queue(app, factory, login):
+    doctor = factory.doctor()
+    tomorrow = TODAY + timedelta(days=1)
+    today_visit, = book(factory, doctor, 1)
+    tomorrow_visit, = book(factory, doctor, 1, day=tomorrow)
+    assert PatientQueue(doctor.id).check_in(today_visit) == 1
+    assert PatientQueue(doctor.id, tomorrow).check_in(tomorrow_visit) == 1
+    db.session.commit()
+    today_id, tomorrow_id = today_visit.id, tomorrow_visit.id
+
+    # Position 1 is taken in tomorrow's queue; the moved visit has not checked in there
+    client = login(factory.admin())
+    response = client.put(f'/api/appointments/{today_id}',
+                          json={'appointment_date': tomorrow.isoformat(), 'appointment_time': '15:00'})
+    assert response.status_code == 200
+    assert db.session.get(Appointment, today_id).queue_position is None
+
+    client = login(db.session.get(Appointment, tomorrow_id).patient.user)
+    assert client.delete(f'/api/appointments/{tomorrow_id}').status_code == 200
+    db.session.expire_all()
+    assert db.session.get(Appointment, tomorrow_id).queue_position is None
+    assert PatientQueue(doctor.id, tomorrow).call_next() is None
@@ -0,0 +1,80 @@
+"""
+Normalized phone lookup: patient_phones follows ORM writes and bulk imports,
+formatting and country codes are ignored, and exact and last-digits lookups
+are index seeks.
+"""
+
+from app import db
+from models.patient import Patient
+from models.patient_phone import PatientPhone
+from utils.phones import normalize, matching
+
+def lookup(number, match='auto'):
+    return sorted(db.session.scalars(matching(number, match)).all())
+
+def test_normalize():
+    assert normalize('+91 98765-43210') == '9876543210'
+    assert normalize('098765 43210') == '9876543210'
+    assert normalize('(987) 654.3210') == '9876543210'
+    assert normalize('ext 12') == '12'
+    assert normalize(None) == ''
+
+def test_lookup_table_follows_writes(app, factory):
+    patient = factory.patient(phone='+91 98765 43210', alternate_phone='080-2222-3333')
+    other = factory.patient(phone='9123443210')
+
+    assert lookup('9876543210') == [patient.id]
+    assert lookup('098765-43210', 'exact') == [patient.id]
+    assert lookup('43210') == [patient.id, other.id]
+    assert lookup('2223333') == [patient.id]
+    assert matching('210') is None
+
+    patient.phone = '99999 00000'
+    patient.alternate_phone = None
+    db.session.commit()
+    assert lookup('9876543210') == []
+    assert lookup('0000') == [patient.id]
+    assert PatientPhone.query.filter_by(patient_id=patient.id).count() == 1
+
+    db.session.delete(other)
+    db.session.commit()
+    assert lookup('43210') == []
+
+def test_suffix_lookup_uses_index(app, factory):
+    factory.patient(phone='9876543210')
+    plan = ' '.join(row[-1] for row in db.session.execute(
+        db.text('EXPLAIN QUERY PLAN ' + str(matching('3210').compile(
+            db.engine, compile_kwargs={'literal_binds': True})))).all())
+    assert 'ix_patient_phones_reversed' in plan
+
+def test_bulk_import_fills_lookup(app, factory, login):
+    client = login(factory.admin())
+    body = '{"username": "bulk1", "email": "bulk1@test.com", "phone": "+91-90000-11111"}\n'
+    assert client.post('/api/bulk/patients', data=body, content_type='application/x-ndjson').status_code == 200
+    patient = Patient.query.join(Patient.user).filter_by(username='bulk1').one()
+    assert lookup('9000011111') == [patient.id]
+
+def test_lookup_endpoint(app, factory, login):
+    patient = factory.patient(phone='98765 43210')
+    client = login(factory.admin())
+
+    data = client.get('/api/patients/lookup?phone=%2B91%2098765%2043210').get_json()['data']
+    assert [p['id'] for p in data['patients']] == [patient.id]
+    data = client.get('/api/patients/lookup?phone=3210&match=suffix').get_json()['data']
+    assert [p['id'] for p in data['patients']] == [patient.id]
+    data = client.get('/api/patients/lookup?phone=3210&match=exact').get_json()['data']
+    assert data['patients'] == []
+    assert client.get('/api/patients/lookup?phone=12').status_code == 400
+    assert client.get('/api/patients/lookup?phone=1234&match=fuzzy').status_code == 400
+
+    # Patients only find themselves
+    other = factory.patient(phone='98765 43210')
+    client = login(other.user)
+    data = client.get('/api/patients/lookup?phone=9876543210').get_json()['data']
+    assert [p['id'] for p in data['patients']] == [other.id]
+
+def test_admin_search_by_formatted_phone(app, factory, login):
+    factory.patient(username='front.desk', phone='9876543210')
+    client = login(factory.admin())
+    assert 'front.desk' in client.get('/admin/search/patients?q=%2B91 98765-43210').get_data(as_text=True)
+    assert 'front.desk' in client.get('/admin/search/patients?q=43210').get_data(as_text=True)
@@ -0,0 +1,112 @@
+"""
+EXPLAIN QUERY PLAN regression test for the appointment/treatment hot paths.
+Fails if any of the route queries below falls back to a full table scan.
+"""
+
+import re
+from datetime import date
+import pytest
+
+from app import db
+from models.appointment import Appointment
+from models.treatment import Treatment
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?(appointments|treatments)\b(?!.*USING)')
+
+ROUTES = [
+    'patient.book_appointment conflict check',
+    'patient.reschedule_appointment conflict check',
+    'api.create_appointment conflict check',
+    'doctor.dashboard',
+    'doctor.patient_history access check',
+    'doctor.patient_history appointments',
+    'doctor.patient_history treatments',
+    'patient.my_appointments',
+    'patient.treatment_history',
+    'admin.appointments',
+    'admin.appointments by status',
+    'admin.all_treatments',
+    'admin.patient_treatments',
+    'api.get_appointments admin',
+    'api.get_appointments doctor',
+    'api.get_appointments patient',
+    'api.get_patients doctor patient ids',
+]
+
+def route_queries():
+    """The appointment/treatment queries issued by routes/*.py, keyed by route"""
+    day = date(2025, 1, 15)
+    return {
+        'patient.book_appointment conflict check': Appointment.query.filter_by(
+            doctor_id=1, appointment_date=day, appointment_time='10:00', status='Booked'),
+        'patient.reschedule_appointment conflict check': Appointment.query.filter(
+            Appointment.doctor_id == 1, Appointment.appointment_date == day,
+            Appointment.appointment_time == '10:00', Appointment.status == 'Booked',
+            Appointment.id != 5),
+        'api.create_appointment conflict check': Appointment.query.filter_by(
+            doctor_id=1, appointment_date=day, appointment_time='10:00', status='Booked'),
+        'doctor.dashboard': Appointment.query.filter_by(doctor_id=1),
+        'doctor.patient_history access check': Appointment.query.filter_by(doctor_id=1, patient_id=2),
+        'doctor.patient_history appointments': Appointment.query.filter_by(
+            patient_id=2).order_by(Appointment.appointment_date.desc()),
+        'doctor.patient_history treatments': Treatment.query.filter_by(
+            patient_id=2).order_by(Treatment.created_at.desc()),
+        'patient.my_appointments': Appointment.query.filter_by(patient_id=2),
+        'patient.treatment_history': Treatment.query.filter_by(patient_id=2),
+        'admin.appointments': Appointment.query.order_by(
+            Appointment.appointment_date.desc()).limit(15).offset(0),
+        'admin.appointments by status': Appointment.query.filter_by(status='Completed').order_by(
+            Appointment.appointment_date.desc()).limit(15).offset(0),
+        'admin.all_treatments': Treatment.query.order_by(Treatment.created_at.desc()).limit(15).offset(0),
+        'admin.patient_treatments': Treatment.query.filter_by(
+            patient_id=2).order_by(Treatment.created_at.desc()),
+        'api.get_appointments admin': Appointment.query.filter(
+            Appointment.appointment_date >= day).order_by(
+            Appointment.appointment_date.desc(), Appointment.appointment_time.desc()).limit(20).offset(0),
+        'api.get_appointments doctor': Appointment.query.filter_by(doctor_id=1).order_by(
+            Appointment.appointment_date.desc(), Appointment.appointment_time.desc()).limit(20).offset(0),
+        'api.get_appointments patient': Appointment.query.filter_by(patient_id=2).order_by(
+            Appointment.appointment_date.desc(), Appointment.appointment_time.desc()).limit(20).offset(0),
+        'api.get_patients doctor patient ids': db.session.query(
+            Appointment.patient_id).filter_by(doctor_id=1).distinct(),
+    }
+
+def explain(query):
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    params = (None,) * len(compiled.positiontup or ())
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + compiled.string, params).fetchall()
+    return [row[-1] for row in rows]
+
+@pytest.mark.parametrize('name', ROUTES)
+def test_route_query_uses_index(app, name):
+    assert set(route_queries()) == set(ROUTES)
+    plan = explain(route_queries()[name])
+    scans = [step for step in plan if FULL_SCAN.match(step)]
+    assert not scans, f'{name} falls back to a table scan: {plan}'
+
+def test_migration_creates_indexes_on_existing_database(tmp_path):
+    """An old database without the indexes picks them up on the next start"""
+    import sqlite3
+    from app import create_app
+    from utils.migrations import MIGRATIONS
+
+    path = tmp_path / 'old.db'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    with app.app_context():
+        db.engine.dispose()
+
+    conn = sqlite3.connect(path)
+    conn.execute('DROP INDEX ix_appointments_doctor_slot')
+    conn.execute('DELETE FROM schema_migrations')
+    conn.commit()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    with app.app_context():
+        db.engine.dispose()
+
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    versions = [row[0] for row in conn.execute('SELECT version FROM schema_migrations ORDER BY version')]
+    conn.close()
+    assert 'ix_appointments_doctor_slot' in indexes
+    assert versions == [version for version, _, _ in MIGRATIONS]
@@ -0,0 +1,94 @@
+"""
+Reminder dispatch: due selection over the partial index, per-channel
+transports, bulk reminder_sent updates and retry of failed sends.
+"""
+
+import json
+from datetime import date, timedelta
+from app import db
+from models.appointment import Appointment
+from utils.reminders import ReminderDispatcher, Transport, FileTransport, due_batch, DUE
+
+TOMORROW = date.today() + timedelta(days=1)
+
+class Recorder(Transport):
+    def __init__(self, fail=False):
+        self.sent, self.fail = [], fail
+
+    def send(self, reminders):
+        if self.fail:
+            raise ConnectionError('gateway down')
+        self.sent.extend(reminders)
+        return [reminder.appointment_id for reminder in reminders]
+
+def appointment(patient, doctor, time, day=TOMORROW, **fields):
+    appointment = Appointment(patient_id=patient.id, doctor_id=doctor.id, appointment_date=day,
+                              appointment_time=time, **fields)
+    db.session.add(appointment)
+    db.session.commit()
+    return appointment.id
+
+def test_sends_due_reminders_once(app, factory):
+    doctor = factory.doctor()
+    by_email = factory.patient(notification_preference='email')
+    by_sms = factory.patient(notification_preference='sms', phone='98765 43210')
+    muted = factory.patient(enable_notifications=False)
+    no_phone = factory.patient(notification_preference='whatsapp')
+    due = [appointment(by_email, doctor, '09:00', status='Booked'),
+           appointment(by_sms, doctor, '09:15', status='Confirmed')]
+    appointment(by_email, doctor, '09:30', status='Cancelled')
+    appointment(by_email, doctor, '09:45', status='Booked', reminder_sent=True)
+    appointment(by_email, doctor, '10:00', day=TOMORROW + timedelta(days=5), status='Booked')
+    appointment(muted, doctor, '10:15', status='Booked')
+    appointment(no_phone, doctor, '10:30', status='Booked')
+
+    email, sms = Recorder(), Recorder()
+    report = ReminderDispatcher({'email': email, 'sms': sms, 'whatsapp': Recorder()}).run(TOMORROW, TOMORROW)
+    assert report == {'email_sent': 1, 'sms_sent': 1, 'undeliverable': 1}
+    assert email.sent[0].address == by_email.user.email and sms.sent[0].address == '98765 43210'
+    assert email.sent[0].doctor_name == doctor.user.username
+    assert sorted(id_ for id_, in db.session.query(Appointment.id).filter_by(reminder_sent=True)) == sorted(
+        due + [Appointment.query.filter_by(appointment_time='09:45').one().id])
+
+    assert ReminderDispatcher({'email': email, 'sms': sms}).run(TOMORROW, TOMORROW) == {'undeliverable': 1}
+
+def test_batches_and_failed_channel(app, factory, query_counter):
+    doctor = factory.doctor()
+    by_email = factory.patient()
+    by_sms = factory.patient(notification_preference='sms', phone='555-0100')
+    for i in range(7):
+        appointment(by_email, doctor, f'{9 + i}:00', status='Booked')
+        appointment(by_sms, doctor, f'{9 + i}:30', status='Booked')
+
+    email = Recorder()
+    dispatcher = ReminderDispatcher({'email': email, 'sms': Recorder(fail=True)}, batch_size=4, chunk_size=2)
+    with query_counter() as statements:
+        report = dispatcher.run(TOMORROW, TOMORROW)
+    assert report == {'email_sent': 7, 'failed': 7}
+    assert len(email.sent) == 7
+    updates = [s for s in statements if s.startswith('UPDATE appointments')]
+    assert len(updates) == 4  # one per batch of 4, never per appointment
+    assert Appointment.query.filter_by(reminder_sent=False).count() == 7
+
+    # The next run retries only what failed
+    sms = Recorder()
+    assert ReminderDispatcher({'email': email, 'sms': sms}).run(TOMORROW, TOMORROW) == {'sms_sent': 7}
+
+def test_due_query_uses_partial_index(app):
+    query = db.select(Appointment.id).where(DUE, Appointment.appointment_date.between(TOMORROW, TOMORROW)) \
+        .order_by(Appointment.appointment_date, Appointment.id)
+    sql = str(query.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    plan = ' '.join(str(row[-1]) for row in db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql)))
+    assert 'ix_appointments_reminder_due' in plan and 'TEMP B-TREE' not in plan
+
+def test_file_transport_and_cli(app, factory, tmp_path):
+    doctor, patient = factory.doctor(), factory.patient()
+    appointment_id = appointment(patient, doctor, '11:00', status='Booked')
+    app.extensions['reminder_transports']['email'] = FileTransport(str(tmp_path))
+
+    result = app.test_cli_runner().invoke(args=['send-reminders'])
+    assert 'email_sent: 1' in result.output
+    line = json.loads((tmp_path / 'email.ndjson').read_text())
+    assert line['appointment_id'] == appointment_id and line['to'] == patient.user.email
+    assert 'at 11:00' in line['message']
+    assert due_batch(TOMORROW, TOMORROW) == []
@@ -0,0 +1,135 @@
+"""
+Read-replica routing: reporting endpoints read from the 'replica' bind, writes
+and other endpoints use the primary, and a user who just wrote reads their own
+writes from the primary.
+"""
+
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+from flask import g
+
+from app import create_app, db
+from models.appointment import Appointment
+from models.patient import Patient
+from utils.replica import STICKY_KEY
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'primary.db'}",
+        'SQLALCHEMY_BINDS': {'replica': f"sqlite:///{tmp_path / 'replica.db'}"},
+    })
+    with app.app_context():
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+def replicate(tmp_path):
+    """Copy the primary into the replica file, like a replica catching up"""
+    source = sqlite3.connect(tmp_path / 'primary.db')
+    target = sqlite3.connect(tmp_path / 'replica.db')
+    source.backup(target)
+    source.close()
+    target.close()
+    db.engines['replica'].dispose()
+
+def login(client, user):
+    g.pop('_login_user', None)
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user.id)
+        sess['_fresh'] = True
+        sess.pop(STICKY_KEY, None)
+
+def test_reporting_endpoints_read_from_replica(app, factory, tmp_path):
+    admin = factory.admin()
+    factory.patient()
+    replicate(tmp_path)
+    factory.patient()  # not replicated yet
+
+    client = app.test_client()
+    login(client, admin)
+    assert client.get('/api/stats').get_json()['data']['patients']['total'] == 1
+    # Not a reporting endpoint: served by the primary
+    assert client.get('/api/patients').get_json()['data']['pagination']['total'] == 2
+
+    replicate(tmp_path)
+    assert client.get('/api/stats').get_json()['data']['patients']['total'] == 2
+
+def test_without_replica_everything_uses_primary(app, tmp_path):
+    plain = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'plain.db'}"})
+    with plain.test_request_context('/api/stats'):
+        plain.preprocess_request()
+        assert not g._use_replica
+        assert db.session.get_bind() is db.engine
+        db.session.remove()
+        db.engine.dispose()
+
+def test_patient_reads_own_booking_after_write(app, factory, tmp_path):
+    doctor = factory.doctor()
+    patient = factory.patient()
+    other = factory.patient()
+    replicate(tmp_path)
+
+    client = app.test_client()
+    login(client, patient.user)
+    day = (date.today() + timedelta(days=3)).isoformat()
+    resp = client.post(f'/patient/book-appointment/{doctor.id}',
+                       data={'appointment_date': day, 'appointment_time': '10:00'})
+    assert resp.status_code == 302
+    with client.session_transaction() as sess:
+        assert sess[STICKY_KEY] > 0
+
+    # The booking has not reached the replica, but the patient who made it
+    # is pinned to the primary for REPLICA_STICKY_SECONDS
+    assert Appointment.query.filter_by(patient_id=patient.id).count() == 1
+    page = client.get('/patient/my-appointments').get_data(as_text=True)
+    assert day in page
+
+    # Once the window ends the same page reads the (stale) replica again
+    with client.session_transaction() as sess:
+        sess[STICKY_KEY] = 0
+    assert day not in client.get('/patient/my-appointments').get_data(as_text=True)
+
+    # Other users were never pinned
+    other_client = app.test_client()
+    login(other_client, other.user)
+    assert other_client.get('/patient/my-appointments').status_code == 200
+    with other_client.session_transaction() as sess:
+        assert STICKY_KEY not in sess
+
+def test_core_writes_go_to_primary(app, factory, tmp_path):
+    doctor, patient = factory.doctor(), factory.patient()
+    replicate(tmp_path)
+    table = Appointment.__table__
+    with app.test_request_context('/api/stats'):
+        app.preprocess_request()
+        assert db.session.get_bind() is db.engines['replica']
+        db.session.execute(table.insert().values(
+            patient_id=patient.id, doctor_id=doctor.id, appointment_date=date.today(),
+            appointment_time='09:00', status='Booked'))
+        assert g._wrote
+        # Later reads in the request see the write
+        assert db.session.get_bind() is db.engine
+        assert db.session.query(Appointment).count() == 1
+        db.session.commit()
+
+def test_textual_writes_go_to_primary(app, factory, tmp_path):
+    patient = factory.patient()
+    replicate(tmp_path)
+    with app.test_request_context('/api/stats'):
+        app.preprocess_request()
+        db.session.execute(db.text('SELECT count(*) FROM patients'))
+        db.session.execute(db.text('WITH p AS (SELECT id FROM patients) SELECT count(*) FROM p'))
+        assert not g._wrote and db.session.get_bind() is db.engines['replica']
+
+        db.session.execute(db.text('/* touch */ update patients SET city = :city WHERE id = :id'),
+                           {'city': 'Pune', 'id': patient.id})
+        assert g._wrote
+        assert db.session.get_bind() is db.engine
+        db.session.commit()
+    db.session.expire_all()
+    assert db.session.get(Patient, patient.id).city == 'Pune'
@@ -0,0 +1,117 @@
+"""
+Schedule cache: occupancy bitmaps answer slot listings and conflict checks
+from memory, this process patches them on commit, and version stamps make
+other processes' changes visible.
+"""
+
+from datetime import date, datetime
+from app import create_app, db
+from models.doctor import Doctor
+from models.appointment import Appointment
+from models.treatment import DoctorAvailability
+from models.schedule_version import ScheduleVersion
+from utils.availability import free_slots
+from utils.booking import SlotReservation, SlotUnavailable
+from utils.schedule_cache import DayCalendar, current_cache
+
+MONDAY = date(2030, 1, 7)
+BEFORE = datetime(2030, 1, 1, 8, 0)
+
+def open_times(doctor, day=MONDAY):
+    return [f'{m // 60:02d}:{m % 60:02d}' for _, m in free_slots([doctor], day, day, now=BEFORE)[doctor.id]]
+
+def make_doctor(factory):
+    return factory.doctor(morning_slot_start='09:00', morning_slot_end='11:00', evening_slot_start='',
+                          evening_slot_end='', avg_consultation_time=30)
+
+def test_day_calendar_bits():
+    calendar = DayCalendar(3, 30, booked=[9 * 60, 9 * 60, 10 * 60 + 15])
+    assert calendar.bits == 1 << 18
+    assert calendar.extra == (9 * 60, 10 * 60 + 15)
+    assert calendar.booked(9 * 60) and not calendar.booked(9 * 60 + 30)
+    assert calendar.blocks(10 * 60) and calendar.blocks(10 * 60 + 30) and not calendar.blocks(11 * 60)
+    assert calendar.blocks(8 * 60 + 45)  # off-grid slot overlapping the 09:00 booking
+
+    changed = calendar.changed([('remove', 9 * 60), ('remove', 9 * 60), ('add', 9 * 60 + 30)], 4)
+    assert changed.version == 4 and calendar.version == 3
+    assert not changed.booked(9 * 60) and changed.booked(9 * 60 + 30)
+
+def test_listing_served_from_cache(app, factory, assert_max_queries):
+    doctor = make_doctor(factory)
+    db.session.add(Appointment(patient_id=factory.patient().id, doctor_id=doctor.id,
+                               appointment_date=MONDAY, appointment_time='09:30', status='Booked'))
+    db.session.commit()
+    doctor = db.session.get(Doctor, doctor.id)
+
+    assert open_times(doctor) == ['09:00', '10:00', '10:30']
+    with assert_max_queries(1) as statements:
+        assert open_times(doctor) == ['09:00', '10:00', '10:30']
+    assert 'appointments' not in statements[0]
+
+def test_commit_patches_cache(app, factory, assert_max_queries):
+    doctor = make_doctor(factory)
+    patient = factory.patient()
+    doctor = db.session.get(Doctor, doctor.id)
+    open_times(doctor)
+
+    appointment = SlotReservation().book(patient.id, doctor.id, MONDAY, '10:00')
+    db.session.commit()
+    calendar = current_cache().get((doctor.id, MONDAY))
+    assert calendar.version == 1 and calendar.booked(10 * 60)
+    doctor = db.session.get(Doctor, doctor.id)
+    with assert_max_queries(1):
+        assert open_times(doctor) == ['09:00', '09:30', '10:30']
+
+    SlotReservation().move(appointment, MONDAY, '09:00')
+    db.session.commit()
+    assert open_times(doctor) == ['09:30', '10:00', '10:30']
+
+    appointment.status = 'Cancelled'
+    db.session.commit()
+    assert open_times(doctor) == ['09:00', '09:30', '10:00', '10:30']
+    assert db.session.get(ScheduleVersion, (doctor.id, MONDAY)).version == 3
+
+def test_taken_slot_refused_from_memory(app, factory, query_counter):
+    doctor = make_doctor(factory)
+    first, second = factory.patient(), factory.patient()
+    SlotReservation().book(first.id, doctor.id, MONDAY, '09:00')
+    db.session.commit()
+    doctor = db.session.get(Doctor, doctor.id)
+    open_times(doctor)
+
+    with query_counter() as statements:
+        try:
+            SlotReservation().book(second.id, doctor.id, MONDAY, '09:00')
+            assert False, 'slot should be taken'
+        except SlotUnavailable:
+            pass
+    assert not any('INSERT' in statement for statement in statements)
+    assert Appointment.query.count() == 1
+
+def test_other_process_changes_are_seen(app, factory):
+    doctor = make_doctor(factory)
+    patient = factory.patient()
+    doctor_id, patient_id = doctor.id, patient.id
+    doctor = db.session.get(Doctor, doctor.id)
+    assert open_times(doctor) == ['09:00', '09:30', '10:00', '10:30']
+
+    # A second worker with its own cache books and adds a blocked window
+    other = create_app({'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI']})
+    with other.app_context():
+        SlotReservation().book(patient_id, doctor_id, MONDAY, '09:30')
+        db.session.add(DoctorAvailability(doctor_id=doctor_id, date=MONDAY, start_time='10:30',
+                                          end_time='11:00', is_available=False))
+        db.session.commit()
+        db.session.remove()
+
+    assert open_times(doctor) == ['09:00', '10:00']
+    # 09:30 is cached as taken here; the version check notices the other worker's cancellation
+    with other.app_context():
+        appointment = Appointment.query.one()
+        appointment.status = 'Cancelled'
+        db.session.commit()
+        db.session.remove()
+        db.engine.dispose()
+    SlotReservation().book(patient_id, doctor_id, MONDAY, '09:30')
+    db.session.commit()
+    assert Appointment.query.filter_by(status='Booked').count() == 1
@@ -0,0 +1,112 @@
+"""
+Full-text search: the FTS5 index follows inserts, updates and deletes made
+through the ORM and Core, ranks prefix matches, corrects single typos, and
+/api/search applies the same role scoping as the list endpoints.
+"""
+
+from datetime import date
+
+from app import db
+from models.user import User
+from models.doctor import Doctor
+from models.patient import Patient
+from models.appointment import Appointment
+from utils import search
+from utils.search import patient_index, doctor_index
+
+def search_patients(text):
+    return [p.user.username for p in patient_index.search(Patient.query.join(User), text, 20).all()]
+
+def test_index_follows_writes(app, factory):
+    patient = factory.patient(username='alice.smith', phone='555-0101')
+    assert search_patients('alice') == ['alice.smith']
+    assert search_patients('555') == ['alice.smith']
+
+    patient.user.username = 'alicia.jones'
+    patient.phone = '777-0202'
+    db.session.commit()
+    assert search_patients('smith') == []
+    assert search_patients('jones') == ['alicia.jones']
+    assert search_patients('777') == ['alicia.jones']
+
+    # Core statements (as used by /api/bulk) fire the same triggers
+    db.session.execute(Patient.__table__.delete().where(Patient.id == patient.id))
+    db.session.commit()
+    assert search_patients('jones') == []
+
+def test_prefix_ranking_and_typos(app, factory):
+    factory.patient(username='john.smith', phone='555-1000')
+    factory.patient(username='mary.johnson', phone='555-2000')
+    factory.patient(username='peter.brown', phone='555-3000')
+
+    # Username matches outrank email-only matches; both are prefix matches
+    assert search_patients('john') == ['john.smith', 'mary.johnson']
+    assert search_patients('jo sm') == ['john.smith']
+    # One-edit typos are corrected: transposition, substitution, deletion, insertion
+    assert search_patients('jhon smith') == ['john.smith']
+    assert search_patients('browm') == ['peter.brown']
+    assert search_patients('peer') == ['peter.brown']
+    assert search_patients('smiith') == ['john.smith']
+    assert search_patients('zzzzzz') == []
+    assert search_patients('!!') == []
+
+def test_doctor_index(app, factory):
+    factory.doctor(username='dr.house', specialization='Diagnostic Medicine', qualification='MD')
+    factory.doctor(username='dr.grey', specialization='Surgery')
+    found = doctor_index.search(Doctor.query.join(User), 'diagnos', 20).all()
+    assert [d.user.username for d in found] == ['dr.house']
+
+def test_api_search_scoping(app, factory, login):
+    doctor = factory.doctor(username='dr.watson', specialization='Cardiology')
+    mine = factory.patient(username='sam.carter')
+    other = factory.patient(username='sam.jackson')
+    db.session.add(Appointment(patient_id=mine.id, doctor_id=doctor.id,
+                               appointment_date=date(2030, 1, 1), appointment_time='10:00'))
+    db.session.commit()
+
+    client = login(factory.admin())
+    data = client.get('/api/search?q=sam').get_json()['data']
+    assert sorted(p['user']['username'] for p in data['patients']) == ['sam.carter', 'sam.jackson']
+
+    client = login(doctor.user)
+    data = client.get('/api/search?q=sam').get_json()['data']
+    assert [p['user']['username'] for p in data['patients']] == ['sam.carter']
+
+    client = login(other.user)
+    data = client.get('/api/search?q=sam&type=patients').get_json()['data']
+    assert [p['user']['username'] for p in data['patients']] == ['sam.jackson']
+    data = client.get('/api/search?q=watsn&type=doctors').get_json()['data']
+    assert [d['user']['username'] for d in data['doctors']] == ['dr.watson']
+    assert 'patients' not in data
+
+    assert client.get('/api/search').status_code == 400
+    assert client.get('/api/search?q=x&type=rooms').status_code == 400
+
+def test_admin_search_pages(app, factory, login):
+    patient = factory.patient(username='zoe.quinn', phone='555-4242')
+    factory.doctor(username='dr.strange', specialization='Neurosurgery')
+    client = login(factory.admin())
+
+    page = client.get('/admin/search/patients?q=zoe').get_data(as_text=True)
+    assert 'zoe.quinn' in page
+    page = client.get(f'/admin/search/patients?q={patient.id}').get_data(as_text=True)
+    assert 'zoe.quinn' in page
+    page = client.post('/admin/search/doctors', data={'q': 'neuro'}).get_data(as_text=True)
+    assert 'dr.strange' in page
+
+def test_falls_back_to_like_without_index(app, factory, login):
+    """A database whose search migration has not run yet still searches, by ILIKE"""
+    for name in ('patient_search', 'doctor_search'):
+        for suffix in ('insert', 'update', 'delete', 'user_update'):
+            db.session.execute(db.text(f'DROP TRIGGER {name}_{suffix}'))
+        db.session.execute(db.text(f'DROP TABLE {name}_vocab'))
+        db.session.execute(db.text(f'DROP TABLE {name}'))
+    db.session.commit()
+    search.init_app(app)  # as on the next start
+    factory.patient(username='alice.smith')
+    factory.doctor(username='dr.jones', specialization='Cardiology')
+
+    assert search_patients('smith') == ['alice.smith']
+    client = login(factory.admin())
+    assert client.get('/api/search?q=cardio').get_json()['data']['doctors'][0]['id']
+    assert b'alice.smith' in client.get('/admin/search/patients?q=alice').data
@@ -0,0 +1,47 @@
+"""
+List endpoints must serialize a page in a constant number of queries.
+"""
+
+from datetime import date, timedelta
+import pytest
+
+from app import db
+from models.appointment import Appointment
+
+def seed(factory, rows):
+    doctors = [factory.doctor() for _ in range(3)]
+    patients = [factory.patient() for _ in range(rows)]
+    for i, patient in enumerate(patients):
+        db.session.add(Appointment(patient_id=patient.id, doctor_id=doctors[i % 3].id,
+                                   appointment_date=date(2025, 1, 1) + timedelta(days=i),
+                                   appointment_time='10:00'))
+    db.session.commit()
+    return doctors, patients
+
+# (endpoint, role, query limit): user loader + role profile + COUNT + page
+ENDPOINTS = [
+    ('/api/appointments?per_page=100', 'admin', 3),
+    ('/api/appointments?per_page=100', 'doctor', 4),
+    ('/api/appointments?per_page=100', 'patient', 4),
+    ('/api/doctors?per_page=100', 'admin', 3),
+    ('/api/patients?per_page=100', 'admin', 3),
+    ('/api/patients?per_page=100', 'doctor', 4),
+]
+
+@pytest.mark.parametrize('url,role,limit', ENDPOINTS)
+def test_list_endpoint_query_bound(app, factory, login, assert_max_queries, url, role, limit):
+    doctors, patients = seed(factory, 30)
+    user = {'admin': factory.admin(), 'doctor': doctors[0].user, 'patient': patients[0].user}[role]
+    client = login(user)
+
+    db.session.expire_all()
+    with assert_max_queries(limit):
+        resp = client.get(url)
+    assert resp.status_code == 200
+
+def test_serialized_appointment_includes_relations(app, factory, login):
+    doctors, patients = seed(factory, 2)
+    data = login(factory.admin()).get('/api/appointments').get_json()['data']['appointments']
+
+    assert {a['patient']['name'] for a in data} == {p.user.username for p in patients}
+    assert all(a['doctor']['department'] for a in data)
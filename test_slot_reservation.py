@@ -0,0 +1,174 @@
+"""
+SlotReservation tests, including a multi-threaded booking stress test.
+"""
+
+import threading
+from datetime import date
+import pytest
+
+from app import db
+from models.appointment import Appointment
+from utils.booking import SlotReservation, SlotUnavailable
+
+DAY = date(2025, 3, 10)
+
+def test_book_rejects_active_duplicate(app, factory):
+    doctor = factory.doctor()
+    first, second = factory.patient(), factory.patient()
+
+    SlotReservation().book(first.id, doctor.id, DAY, '10:00')
+    db.session.commit()
+
+    with pytest.raises(SlotUnavailable):
+        SlotReservation().book(second.id, doctor.id, '2025-03-10', '10:00')
+    assert Appointment.query.count() == 1
+
+def test_cancelled_slot_can_be_rebooked(app, factory):
+    doctor = factory.doctor()
+    patient = factory.patient()
+
+    appointment = SlotReservation().book(patient.id, doctor.id, DAY, '10:00')
+    appointment.status = 'Cancelled'
+    db.session.commit()
+
+    SlotReservation().book(patient.id, doctor.id, DAY, '10:00')
+    db.session.commit()
+    assert Appointment.query.filter_by(status='Booked').count() == 1
+
+def test_move_into_taken_slot_keeps_original(app, factory):
+    doctor = factory.doctor()
+    patient = factory.patient()
+    SlotReservation().book(patient.id, doctor.id, DAY, '10:00')
+    moving = SlotReservation().book(patient.id, doctor.id, DAY, '11:00')
+    db.session.commit()
+
+    with pytest.raises(SlotUnavailable):
+        SlotReservation().move(moving, DAY, '10:00')
+    assert db.session.get(Appointment, moving.id).appointment_time == '11:00'
+
+    SlotReservation().move(moving, DAY, '12:00')
+    db.session.commit()
+    assert db.session.get(Appointment, moving.id).appointment_time == '12:00'
+
+def test_api_create_appointment_conflict(app, factory, login):
+    doctor = factory.doctor()
+    client = login(factory.admin())
+    payload = {'doctor_id': doctor.id, 'patient_id': factory.patient().id,
+               'appointment_date': '2025-03-10', 'appointment_time': '09:00'}
+
+    assert client.post('/api/appointments', json=payload).status_code == 201
+    resp = client.post('/api/appointments', json=payload)
+    assert resp.status_code == 400
+    assert 'already booked' in resp.get_json()['error']
+
+def test_restoring_cancelled_into_taken_slot(app, factory, login):
+    doctor = factory.doctor()
+    reservation = SlotReservation()
+    cancelled = reservation.book(factory.patient().id, doctor.id, '2025-03-10', '09:00')
+    reservation.cancel(cancelled)
+    db.session.commit()
+    reservation.book(factory.patient().id, doctor.id, '2025-03-10', '09:00')
+    db.session.commit()
+    cancelled_id = cancelled.id
+
+    client = login(factory.admin())
+    resp = client.put(f'/api/appointments/{cancelled_id}', json={'status': 'Booked'})
+    assert resp.status_code == 400
+    assert 'already booked' in resp.get_json()['error']
+    assert db.session.get(Appointment, cancelled_id).status == 'Cancelled'
+
+    resp = client.put(f'/api/appointments/{cancelled_id}',
+                      json={'status': 'Booked', 'appointment_time': '09:30'})
+    assert resp.status_code == 200
+    assert resp.get_json()['data']['status'] == 'Booked'
+
+def test_patient_book_appointment_route(app, factory, login):
+    doctor = factory.doctor()
+    patient = factory.patient()
+    client = login(patient.user)
+    form = {'appointment_date': '2025-03-10', 'appointment_time': '09:00'}
+
+    client.post(f'/patient/book-appointment/{doctor.id}', data=form)
+    resp = client.post(f'/patient/book-appointment/{doctor.id}', data=form)
+    assert resp.headers['Location'].endswith(f'/patient/book-appointment/{doctor.id}')
+    assert Appointment.query.count() == 1
+
+    # A form without a date is a validation error, not a 500
+    resp = client.post(f'/patient/book-appointment/{doctor.id}', data={'appointment_time': '09:00'})
+    assert resp.status_code == 302
+    assert Appointment.query.count() == 1
+
+def test_concurrent_booking_stress(app, factory):
+    """Many threads race for the same slots; each slot must end up booked exactly once"""
+    doctors = [factory.doctor().id for _ in range(3)]
+    patients = [factory.patient().id for _ in range(8)]
+    slots = [(d, f'{9 + h:02d}:{m:02d}') for d in doctors for h in range(3) for m in (0, 30)]
+    results = {'booked': 0, 'rejected': 0}
+    lock = threading.Lock()
+
+    def worker(patient_id):
+        with app.app_context():
+            for doctor_id, slot_time in slots:
+                try:
+                    SlotReservation().book(patient_id, doctor_id, DAY, slot_time)
+                    db.session.commit()
+                    outcome = 'booked'
+                except SlotUnavailable:
+                    outcome = 'rejected'
+                with lock:
+                    results[outcome] += 1
+            db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(p,)) for p in patients]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    attempts = len(slots) * len(patients)
+
+    per_slot = db.session.query(
+        Appointment.doctor_id, Appointment.appointment_time, db.func.count()
+    ).filter_by(status='Booked').group_by(Appointment.doctor_id, Appointment.appointment_time).all()
+
+    assert results['booked'] == len(slots)
+    assert results['rejected'] == attempts - len(slots)
+    assert len(per_slot) == len(slots)
+    assert all(count == 1 for _, _, count in per_slot)
+
+def test_double_booked_database_still_migrates_and_guards(tmp_path):
+    """A pre-existing double booking defers only the unique index; booking falls back to a query check"""
+    import sqlite3
+    from app import create_app
+    from utils.migrations import MIGRATIONS, ACTIVE_SLOT_INDEX
+
+    path = tmp_path / 'old.db'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    with app.app_context():
+        db.engine.dispose()
+    conn = sqlite3.connect(path)
+    conn.execute('DROP INDEX uq_appointments_active_slot')
+    conn.execute('DELETE FROM schema_migrations')
+    conn.execute('DELETE FROM stats_counters')
+    conn.execute("INSERT INTO users (id, username, email, password_hash, role) VALUES (1, 'd', 'd@x', 'x', 'doctor'), "
+                 "(2, 'p', 'p@x', 'x', 'patient')")
+    conn.execute('INSERT INTO doctors (id, user_id, department_id) VALUES (1, 1, 1)')
+    conn.execute('INSERT INTO patients (id, user_id) VALUES (1, 2)')
+    conn.executemany("INSERT INTO appointments (patient_id, doctor_id, appointment_date, appointment_time, status) "
+                     "VALUES (1, 1, '2025-03-10', '10:00', 'Booked')", [(), ()])
+    conn.commit()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    with app.app_context():
+        SlotReservation().book(1, 1, DAY, '11:00')
+        db.session.commit()
+        with pytest.raises(SlotUnavailable):
+            SlotReservation().book(1, 1, DAY, '11:00')
+        db.session.remove()
+        db.engine.dispose()
+
+    versions = {row[0] for row in conn.execute('SELECT version FROM schema_migrations')}
+    booked = conn.execute("SELECT value FROM stats_counters WHERE key = 'appointments.status.Booked'").fetchone()
+    conn.close()
+    assert versions == {version for version, _, _ in MIGRATIONS} - {ACTIVE_SLOT_INDEX}
+    assert booked == (3,)
@@ -0,0 +1,115 @@
+"""
+Slow-query log: threshold, bound parameters, originating endpoint and
+frame, captured query plans, the ring buffer and the admin page.
+"""
+
+import time
+import pytest
+from sqlalchemy import text
+from app import create_app, db
+from config import _threshold_ms
+from models.patient import Patient
+from utils.slow_queries import current_slow_queries, format_sqlite_plan
+
+@pytest.fixture
+def app(tmp_path):
+    # A 1 ns threshold: every statement counts as slow
+    app = create_app({
+        'TESTING': True,
+        'SLOW_QUERY_MS': 1e-6,
+        'SLOW_QUERY_BUFFER_SIZE': 20,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+    })
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+def pause(connection):
+    connection.connection.dbapi_connection.create_function('pause', 1, lambda seconds: time.sleep(seconds) or 1)
+
+def test_request_statements_carry_endpoint_frame_and_plan(app, factory, login):
+    factory.patient()
+    client = login(factory.admin())
+    current_slow_queries().clear()
+    assert client.get('/admin/search/patients?q=1').status_code == 200
+
+    entries = [e for e in current_slow_queries().entries() if e.frame and e.frame.startswith('routes/admin.py')]
+    assert entries
+    by_id = next(e for e in entries if 'patients.id = ?' in e.statement)
+    assert (by_id.endpoint, by_id.blueprint, by_id.method, by_id.path) == \
+        ('admin.search_patients', 'admin', 'GET', '/admin/search/patients')
+    assert 'in search_patients' in by_id.frame
+    assert '1' in by_id.parameters
+    assert 'SEARCH patients USING INTEGER PRIMARY KEY' in by_id.plan
+
+def test_only_statements_over_the_threshold(app, factory):
+    log = current_slow_queries()
+    log.threshold = 0.05
+    log.clear()
+    factory.patient()
+    Patient.query.count()
+    assert log.entries() == []
+
+    pause(db.session.connection())
+    db.session.execute(text('SELECT pause(:seconds) FROM patients WHERE id > :after'), {'seconds': 0.06, 'after': 0})
+    [entry] = log.entries()
+    assert entry.duration_ms >= 60 and entry.endpoint is None
+    assert entry.frame.startswith('test_slow_queries.py:') and entry.frame.endswith('in test_only_statements_over_the_threshold')
+    assert entry.parameters == '(0.06, 0)'
+    assert entry.plan.startswith('SEARCH patients USING INTEGER PRIMARY KEY')
+
+def test_writes_are_not_explained_and_buffer_is_bounded(app):
+    db.session.execute(text('CREATE TABLE scratch (n INTEGER)'))
+    db.session.execute(text('INSERT INTO scratch (n) VALUES (:n)'), [{'n': n} for n in range(3)])
+    db.session.execute(text('DELETE FROM scratch WHERE n = :n'), {'n': 1})
+    inserted, deleted = [next(e for e in current_slow_queries().entries() if e.statement.startswith(verb))
+                         for verb in ('INSERT', 'DELETE')]
+    assert inserted.plan is None
+    assert deleted.plan == 'SCAN scratch'
+    assert db.session.execute(text('SELECT count(*) FROM scratch')).scalar() == 2  # EXPLAIN did not run the DELETE
+
+    for _ in range(30):
+        db.session.execute(text('SELECT 1'))
+    log = current_slow_queries()
+    assert len(log.entries()) == 20 and log.total > 30
+    assert log.entries()[0].statement == 'SELECT 1'
+
+def test_format_sqlite_plan_indents_children():
+    rows = [(2, 0, 0, 'SCAN a'), (5, 0, 0, 'CORRELATED SCALAR SUBQUERY 1'), (9, 5, 0, 'SEARCH b USING INDEX ix_b (a_id=?)')]
+    assert format_sqlite_plan(rows) == 'SCAN a\nCORRELATED SCALAR SUBQUERY 1\n  SEARCH b USING INDEX ix_b (a_id=?)'
+
+def test_admin_page(app, factory, login):
+    client = login(factory.patient().user)
+    assert client.get('/admin/slow-queries').status_code == 302
+    client = login(factory.admin())
+    page = client.get('/admin/slow-queries')
+    assert page.status_code == 200 and b'Query plan' in page.data
+    assert client.post('/admin/slow-queries/clear').status_code == 302
+    assert all(e.endpoint == 'admin.clear_slow_queries' for e in current_slow_queries().entries())
+
+def test_default_threshold_keeps_fast_statements_out(tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'default.db'}"})
+    with app.app_context():
+        assert current_slow_queries().threshold == 0.25
+        Patient.query.count()
+        assert current_slow_queries().entries() == []
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.mark.parametrize('value, expected', [(None, 250.0), ('100', 100.0), ('0.5', 0.5),
+                                             ('', None), ('0', None), ('off', None), (' OFF ', None)])
+def test_threshold_from_environment(monkeypatch, value, expected):
+    if value is None:
+        monkeypatch.delenv('SLOW_QUERY_MS', raising=False)
+    else:
+        monkeypatch.setenv('SLOW_QUERY_MS', value)
+    assert _threshold_ms('SLOW_QUERY_MS', 250.0) == expected
+
+def test_zero_threshold_turns_the_log_off(tmp_path):
+    app = create_app({'TESTING': True, 'SLOW_QUERY_MS': 0,
+                      'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'off.db'}"})
+    with app.app_context():
+        assert current_slow_queries() is None
+        db.session.remove()
+        db.engine.dispose()
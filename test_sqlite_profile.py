@@ -0,0 +1,44 @@
+"""
+SQLite engine profile: config.py drives create_app and every pooled
+connection gets the configured PRAGMAs.
+"""
+
+import threading
+import time
+
+from app import create_app, db
+from utils.sqlite_profile import current_pragmas
+
+def test_pooled_connections_use_profile(app):
+    assert current_pragmas() == {
+        'journal_mode': 'wal',
+        'synchronous': 1,  # NORMAL
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'temp_store': 2,  # MEMORY
+    }
+    assert db.engine.pool.size() == 10
+
+def test_writer_waits_for_lock_instead_of_failing(app):
+    holder = db.engine.connect()
+    holder.exec_driver_sql('BEGIN IMMEDIATE')
+    holder.exec_driver_sql("INSERT INTO stats_counters (key, value) VALUES ('lock.test', 1)")
+    threading.Timer(0.2, holder.commit).start()
+
+    started = time.perf_counter()
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO stats_counters (key, value) VALUES ('lock.test.2', 1)")
+    assert time.perf_counter() - started >= 0.15
+    holder.close()
+
+def test_config_classes_drive_create_app(tmp_path, monkeypatch):
+    monkeypatch.setenv('FLASK_CONFIG', 'development')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/dev.db'})
+    assert app.debug and app.config['RAISE_ON_TEMPLATE_LAZY_LOAD']
+    assert app.config['BULK_IMPORT_BATCH_SIZE'] == 2000
+
+    app = create_app(config_name='testing')
+    assert app.testing and app.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite:///:memory:'
+    with app.app_context():
+        assert current_pragmas(['journal_mode']) == {'journal_mode': 'memory'}
@@ -0,0 +1,144 @@
+"""
+Dashboard statistics: grouped aggregates must match the per-KPI counts they replaced.
+"""
+
+from datetime import date, timedelta
+
+from app import db
+from models.user import User
+from models.doctor import Doctor
+from models.patient import Patient
+from models.appointment import Appointment
+from models.department import Department
+from models.treatment import Treatment
+from utils.stats import dashboard_stats
+from utils.jobs import current_runner
+
+def seed(factory):
+    departments = Department.query.all()
+    doctors = [factory.doctor(department_id=departments[i % 2].id) for i in range(4)]
+    doctors[0].user.is_active = False
+    patients = [factory.patient() for _ in range(5)]
+    patients[1].user.is_active = False
+
+    today = date.today()
+    statuses = ['Booked', 'Completed', 'Cancelled', 'Confirmed', 'No-show']
+    for i in range(30):
+        appointment = Appointment(patient_id=patients[i % 5].id, doctor_id=doctors[i % 4].id,
+                                  appointment_date=today + timedelta(days=i - 15),
+                                  appointment_time=f'{9 + i % 8:02d}:00', status=statuses[i % 5])
+        db.session.add(appointment)
+        db.session.flush()
+        if appointment.status == 'Completed':
+            db.session.add(Treatment(appointment_id=appointment.id, patient_id=appointment.patient_id,
+                                     doctor_id=appointment.doctor_id, diagnosis='ok'))
+    db.session.commit()
+    return today
+
+def test_dashboard_stats_matches_individual_counts(app, factory, query_counter):
+    today = seed(factory)
+
+    with query_counter() as statements:
+        stats = dashboard_stats(today)
+    assert len(statements) == 2
+    # Upcoming is summed from the per-date buckets, not counted from appointments
+    assert not any('FROM appointments' in s for s in statements)
+
+    assert stats['doctors'] == {
+        'total': Doctor.query.count(),
+        'active': Doctor.query.join(User).filter(User.is_active == True).count(),
+    }
+    assert stats['patients'] == {
+        'total': Patient.query.count(),
+        'active': Patient.query.join(User).filter(User.is_active == True).count(),
+    }
+    assert stats['appointments']['total'] == Appointment.query.count()
+    for status in ('Booked', 'Completed', 'Cancelled'):
+        assert stats['appointments'][status.lower()] == Appointment.query.filter_by(status=status).count()
+    assert stats['appointments']['upcoming'] == Appointment.query.filter(
+        Appointment.appointment_date >= today,
+        Appointment.status.in_(['Booked', 'Confirmed'])
+    ).count()
+    assert stats['treatments']['total'] == Treatment.query.count()
+    assert stats['departments'] == [
+        {'id': d.id, 'name': d.name, 'doctors': Doctor.query.filter_by(department_id=d.id).count()}
+        for d in Department.query.order_by(Department.id)
+    ]
+
+def test_stats_endpoints(app, factory, login):
+    seed(factory)
+    client = login(factory.admin())
+
+    data = client.get('/api/stats').get_json()['data']
+    assert data['appointments'] == {'total': 30, 'booked': 6, 'completed': 6, 'cancelled': 6}
+    assert data['doctors'] == {'total': 4, 'active': 3}
+
+    resp = client.get('/admin/dashboard')
+    assert resp.status_code == 200
+
+def test_counters_follow_route_changes(app, factory, login):
+    from utils.counters import check_counters
+    seed(factory)
+    assert check_counters() == {}
+
+    client = login(factory.admin())
+    doctor = Doctor.query.join(User).filter(User.is_active == True).first()
+    patient = Patient.query.first()
+    appointment = Appointment.query.filter_by(status='Booked').first()
+
+    client.post(f'/admin/doctor/{doctor.id}/toggle-status')
+    client.post(f'/admin/patient/{patient.id}/toggle-status')
+    client.put(f'/api/appointments/{appointment.id}', json={'status': 'Cancelled'})
+    client.post('/api/appointments', json={'doctor_id': doctor.id, 'patient_id': patient.id,
+                                           'appointment_date': '2030-01-01', 'appointment_time': '10:00'})
+    other = Department.query.filter(Department.id != doctor.department_id).first()
+    client.put(f'/api/doctors/{doctor.id}', json={'is_active': True})
+    db.session.expire_all()
+    doctor = db.session.get(Doctor, doctor.id)
+    doctor.department_id = other.id
+    db.session.commit()
+    client.delete(f'/api/appointments/{appointment.id}')
+    removable = factory.patient()
+    client.post(f'/admin/patient/{removable.id}/remove')
+
+    # The API booking's counter deltas are applied by its background job
+    assert len(check_counters()) > 0
+    assert current_runner().run_pending() == 1
+    assert check_counters() == {}
+
+def test_upcoming_buckets_follow_date_and_status(app, factory):
+    from utils.counters import check_counters
+    today = seed(factory)
+    upcoming = lambda: dashboard_stats(today)['appointments']['upcoming']
+    before = upcoming()
+
+    past = Appointment.query.filter(Appointment.status == 'Booked', Appointment.appointment_date < today).first()
+    past.appointment_date = today + timedelta(days=3)
+    db.session.commit()
+    assert upcoming() == before + 1
+
+    past.status = 'Cancelled'
+    db.session.commit()
+    assert upcoming() == before
+    assert check_counters() == {}
+
+def test_rebuild_repairs_drift(app, factory):
+    from models.stats_counter import StatsCounter
+    from utils.counters import check_counters, rebuild_counters
+    seed(factory)
+
+    db.session.get(StatsCounter, 'appointments.status.Booked').value += 5
+    db.session.delete(db.session.get(StatsCounter, 'treatments.total'))
+    db.session.commit()
+    assert set(check_counters()) == {'appointments.status.Booked', 'treatments.total'}
+
+    rebuild_counters()
+    db.session.expire_all()
+    assert check_counters() == {}
+
+def test_rebuild_stats_command(app, factory):
+    seed(factory)
+    result = app.test_cli_runner().invoke(args=['check-stats'])
+    assert 'Counters are consistent.' in result.output
+    result = app.test_cli_runner().invoke(args=['rebuild-stats'])
+    assert 'Rebuilt' in result.output
@@ -0,0 +1,155 @@
+# Slot availability engine
+# A doctor's bookable slots come from their morning and evening sessions,
+# working_days and avg_consultation_time, adjusted by DoctorAvailability rows
+# for specific dates, minus active appointments. Bookings and date overrides
+# come from the per-(doctor, date) schedule cache (utils/schedule_cache.py),
+# which reads whatever it is missing for a date range in one query, and free
+# slots are generated lazily in time order, so callers can stop early or
+# merge several doctors' streams (earliest_slots).
+#
+# Doctors marked is_available=False have no slots.
+# DoctorAvailability rows for a date:
+#   is_available=False, no times  -> the doctor is off that day
+#   is_available=False, with times -> that window is blocked
+#   is_available=True, with times  -> these windows replace the usual hours
+#                                     (also on a non-working day)
+
+import heapq
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import islice
+from models.doctor import Doctor
+from utils.schedule_cache import load, to_minutes
+
+# What Schedule reads; selecting these instead of Doctor objects is enough
+SCHEDULE_COLUMNS = (Doctor.id, Doctor.is_available, Doctor.avg_consultation_time, Doctor.working_days,
+                    Doctor.morning_slot_start, Doctor.morning_slot_end,
+                    Doctor.evening_slot_start, Doctor.evening_slot_end)
+DEFAULT_WORKING_DAYS = 'Mon-Fri'
+DEFAULT_SLOT_MINUTES = 30
+DAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+EVERY_DAY = frozenset(range(7))
+
+def _weekday(name):
+    return DAY_NAMES.index(name[:3]) if name[:3] in DAY_NAMES else None
+
+@lru_cache(maxsize=256)
+def working_weekdays(text):
+    """Weekday numbers (Mon=0) for 'Mon-Fri', 'Mon, Wed, Fri', 'Monday to Saturday', 'Daily'..."""
+    text = (text or DEFAULT_WORKING_DAYS).lower()
+    if text.strip() in ('daily', 'all', 'everyday', 'every day', 'all days'):
+        return EVERY_DAY
+    days = set()
+    for part in re.split(r'[,;/&]|\band\b', text):
+        bounds = [_weekday(name) for name in re.split(r'\s*(?:-|–|\bto\b)\s*', part.strip()) if name]
+        if len(bounds) == 1 and bounds[0] is not None:
+            days.add(bounds[0])
+        elif len(bounds) == 2 and None not in bounds:
+            first, last = bounds
+            days.update(day % 7 for day in range(first, last + 1 if last >= first else last + 8))
+    return frozenset(days) if days else working_weekdays(DEFAULT_WORKING_DAYS)
+
+def to_clock(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+@lru_cache(maxsize=1024)
+def _slots_in(step, windows):
+    slots = set()
+    for start, end in windows:
+        if start is None or end is None:
+            continue
+        slots.update(range(start, end - step + 1, step))
+    return tuple(sorted(slots))
+
+class Schedule:
+    """A doctor's weekly slot grid"""
+
+    def __init__(self, doctor):
+        self.doctor_id = doctor.id
+        self.bookable = doctor.is_available is not False
+        self.step = doctor.avg_consultation_time or DEFAULT_SLOT_MINUTES
+        self.weekdays = working_weekdays(doctor.working_days)
+        sessions = ((doctor.morning_slot_start, doctor.morning_slot_end),
+                    (doctor.evening_slot_start, doctor.evening_slot_end))
+        self.grid = self.slots_in([(to_minutes(start), to_minutes(end)) for start, end in sessions])
+
+    def slots_in(self, windows):
+        """Slot start minutes that fit entirely inside the (start, end) windows"""
+        return _slots_in(self.step, tuple(windows))
+
+    def day_slots(self, day, overrides=()):
+        """Working slots on a date before bookings, after DoctorAvailability overrides"""
+        windows = [(to_minutes(start), to_minutes(end)) for start, end, available in overrides if available]
+        if windows:
+            slots = self.slots_in(windows)
+        elif day.weekday() in self.weekdays:
+            slots = self.grid
+        else:
+            return ()
+        for start, end, available in overrides:
+            if available:
+                continue
+            start, end = to_minutes(start), to_minutes(end)
+            if start is None or end is None:
+                return ()
+            slots = [slot for slot in slots if slot + self.step <= start or slot >= end]
+        return slots
+
+    def free_slots(self, start, end, calendars, now=None):
+        """
+        Yield (date, minutes) for every free slot from start to end inclusive,
+        in time order. calendars maps date -> DayCalendar (bookings and overrides).
+        """
+        if not self.bookable:
+            return
+        now = now or datetime.now()
+        today, now_minutes = now.date(), now.hour * 60 + now.minute
+        day = max(start, today)
+        while day <= end:
+            calendar = calendars.get(day)
+            slots = self.day_slots(day, calendar.overrides if calendar else ())
+            if calendar and not calendar.empty:
+                slots = [slot for slot in slots if not calendar.blocks(slot)]
+            for slot in slots:
+                if day == today and slot <= now_minutes:
+                    continue
+                yield day, slot
+            day += timedelta(days=1)
+
+def _tagged(doctor_id, stream):
+    for day, minutes in stream:
+        yield day, minutes, doctor_id
+
+def free_slots(doctors, start, end, now=None):
+    """
+    {doctor_id: iterator of (date, minutes)} for the doctors' free slots, with
+    calendars from the schedule cache (at most one query for the whole range)
+    """
+    now = now or datetime.now()
+    schedules = {doctor.id: Schedule(doctor) for doctor in doctors}
+    first = max(start, now.date())
+    calendars = load({doctor_id: schedule.step for doctor_id, schedule in schedules.items()}, first, end) \
+        if first <= end else {}
+    return {doctor_id: schedule.free_slots(first, end, calendars.get(doctor_id, {}), now=now)
+            for doctor_id, schedule in schedules.items()}
+
+def earliest_slots(doctors, count, start=None, now=None, horizon=62):
+    """
+    The first count free slots across the doctors as (date, minutes, doctor_id),
+    earliest first. The doctors' streams are merged with a heap, so only the
+    slots up to the count-th are generated. Calendars load one window at a
+    time, starting with a single day and doubling, until count slots are
+    found or horizon days have been searched.
+    """
+    now = now or datetime.now()
+    first = max(start or now.date(), now.date())
+    last_day = first + timedelta(days=horizon - 1)
+    found, window = [], 1
+    while len(found) < count and first <= last_day:
+        last = min(first + timedelta(days=window - 1), last_day)
+        streams = free_slots(doctors, first, last, now=now)
+        merged = heapq.merge(*[_tagged(doctor_id, stream) for doctor_id, stream in streams.items()])
+        found.extend(islice(merged, count - len(found)))
+        first, window = last + timedelta(days=1), window * 2
+    return found
@@ -0,0 +1,156 @@
+# Slot reservation service
+# The partial unique index uq_appointments_active_slot allows at most one
+# 'Booked' appointment per (doctor, date, time). Booking and rescheduling are a
+# single INSERT/UPDATE that either succeeds or trips the index, so there is no
+# check-then-insert window for concurrent requests to race through.
+# A slot the schedule cache already knows is taken (utils/schedule_cache.py)
+# is refused before the INSERT, without touching the appointments table.
+# Until the index exists (its migration is deferred while old double bookings
+# remain) the taken check also queries the appointments table, as before.
+# The doctor and patient booking totals and the dashboard counter deltas
+# (appointments.status.Booked, shared by every booking) are applied by a
+# background job (record_booking). The booking transaction writes the
+# appointment row, the job row and one extra row: the (doctor, date)
+# schedule_versions bump, which must change atomically with the booking for
+# other processes' schedule caches to notice it.
+
+from datetime import date, datetime
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models.doctor import Doctor
+from models.patient import Patient
+from models.appointment import Appointment
+from utils.schedule_cache import slot_taken
+from utils.jobs import job, enqueue
+from utils.counters import apply_deltas, deferred_counters
+from utils.migrations import ACTIVE_SLOT_INDEX, deferred
+
+ACTIVE_STATUS = 'Booked'
+CANCELLED_STATUS = 'Cancelled'
+TAKEN_MESSAGE = 'This time slot is already booked. Please choose another time.'
+
+class SlotUnavailable(Exception):
+    """Raised when the doctor already has an active booking in the slot"""
+
+def _as_date(value):
+    """Accept a date or a 'YYYY-MM-DD' string (raises ValueError otherwise)"""
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def is_slot_conflict(error):
+    """True if an IntegrityError came from the active slot unique index"""
+    message = str(error.orig)
+    return 'uq_appointments_active_slot' in message or (
+        'appointments.doctor_id' in message and 'appointments.appointment_time' in message)
+
+class SlotReservation:
+    """
+    Reserve and move appointment slots with one statement each.
+    On conflict the session is rolled back and SlotUnavailable is raised,
+    so callers should do the reservation before other pending changes.
+    """
+
+    def __init__(self, session=None):
+        self.session = session or db.session
+
+    def _flush(self):
+        try:
+            self.session.flush()
+        except IntegrityError as e:
+            self.session.rollback()
+            if is_slot_conflict(e):
+                raise SlotUnavailable(TAKEN_MESSAGE) from e
+            raise
+
+    def _refuse_if_taken(self, doctor_id, appointment_date, appointment_time):
+        if slot_taken(doctor_id, appointment_date, appointment_time, self.session) or (
+                deferred(ACTIVE_SLOT_INDEX) and self.session.query(Appointment.id).filter_by(
+                    doctor_id=doctor_id, appointment_date=appointment_date,
+                    appointment_time=appointment_time, status=ACTIVE_STATUS).first()):
+            self.session.rollback()
+            raise SlotUnavailable(TAKEN_MESSAGE)
+
+    def book(self, patient_id, doctor_id, appointment_date, appointment_time, **fields):
+        """Insert a Booked appointment, or raise SlotUnavailable"""
+        appointment_date = _as_date(appointment_date)
+        self._refuse_if_taken(doctor_id, appointment_date, appointment_time)
+        appointment = Appointment(
+            patient_id=patient_id,
+            doctor_id=doctor_id,
+            appointment_date=appointment_date,
+            appointment_time=appointment_time,
+            status=ACTIVE_STATUS,
+            **fields
+        )
+        self.session.add(appointment)
+        self._flush()
+        return appointment
+
+    def move(self, appointment, new_date, new_time):
+        """Move an appointment to another slot, or raise SlotUnavailable"""
+        new_date = _as_date(new_date)
+        if appointment.status == ACTIVE_STATUS and \
+                (new_date, new_time) != (appointment.appointment_date, appointment.appointment_time):
+            self._refuse_if_taken(appointment.doctor_id, new_date, new_time)
+        if new_date != appointment.appointment_date:
+            # Its check-in was for the old day's queue
+            appointment.queue_position = None
+        appointment.appointment_date = new_date
+        appointment.appointment_time = new_time
+        self._flush()
+        return appointment
+
+    def cancel(self, appointment):
+        """Cancel an appointment, freeing its slot and its place in the check-in queue"""
+        appointment.status = CANCELLED_STATUS
+        appointment.queue_position = None
+        return appointment
+
+    def change_status(self, appointment, status):
+        """
+        Set an appointment's status; putting it back to Booked reclaims its
+        slot, or raises SlotUnavailable if someone else has booked it since
+        """
+        if status == CANCELLED_STATUS:
+            return self.cancel(appointment)
+        if status == ACTIVE_STATUS and appointment.status != ACTIVE_STATUS:
+            self._refuse_if_taken(appointment.doctor_id, appointment.appointment_date,
+                                  appointment.appointment_time)
+        appointment.status = status
+        self._flush()
+        return appointment
+
+def book_deferred(patient_id, doctor_id, appointment_date, appointment_time, **fields):
+    """
+    Book like SlotReservation.book, but queue the totals and counter deltas
+    for record_booking instead of writing them (the caller commits)
+    """
+    with deferred_counters() as deltas:
+        appointment = SlotReservation().book(patient_id, doctor_id, appointment_date, appointment_time, **fields)
+    defer_booking_totals(appointment, deltas)
+    return appointment
+
+def defer_booking_totals(appointment, counters=None):
+    """Queue record_booking for a just-booked appointment, in the booking transaction"""
+    enqueue('appointment.booked', {
+        'doctor_id': appointment.doctor_id,
+        'patient_id': appointment.patient_id,
+        'booked_at': datetime.now().isoformat(),
+        'counters': dict(counters or {}),
+    }, key=f'appointment.booked:{appointment.id}')
+
+@job('appointment.booked')
+def record_booking(payload):
+    """
+    doctor.total_appointments, patient.total_visits, patient.last_visit and
+    the booking's dashboard counter deltas for one booking
+    """
+    if payload.get('counters'):
+        apply_deltas(db.session.connection(), payload['counters'])
+    doctors, patients = Doctor.__table__, Patient.__table__
+    db.session.execute(doctors.update().where(doctors.c.id == payload['doctor_id']).values(
+        total_appointments=db.func.coalesce(doctors.c.total_appointments, 0) + 1))
+    db.session.execute(patients.update().where(patients.c.id == payload['patient_id']).values(
+        total_visits=db.func.coalesce(patients.c.total_visits, 0) + 1,
+        last_visit=datetime.fromisoformat(payload['booked_at'])))
@@ -0,0 +1,390 @@
+# Bulk import of patients, doctors and historical appointments
+# Rows are validated in batches: the uniqueness and foreign keys a batch refers
+# to are fetched with one IN query per key, then the valid rows are inserted
+# with executemany inside one transaction per batch. Invalid rows are skipped
+# and reported by row number instead of aborting the import.
+# Core inserts bypass the ORM flush hooks, so each batch applies its own
+# stats counter deltas.
+
+import csv
+import io
+import json
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import date
+from utils.passwords import hash_password
+from app import db
+from models.user import User
+from models.doctor import Doctor
+from models.patient import Patient
+from models.appointment import Appointment
+from models.department import Department
+from utils.counters import apply_deltas
+from utils.phones import sync_phones
+from utils.stats import status_key, department_key, upcoming_key, UPCOMING_STATUSES
+from utils.schedule_cache import bump_versions
+
+# Users imported without a password or password_hash cannot log in until reset
+UNUSABLE_PASSWORD = '!'
+APPOINTMENT_STATUSES = {'Booked', 'Confirmed', 'Completed', 'Cancelled', 'No-show'}
+
+class RowError(ValueError):
+    """A row that cannot be imported; the message goes into the report"""
+
+# ==================== Input Parsing ====================
+
+def read_rows(stream, fmt):
+    """Yield dicts from an NDJSON or CSV byte stream (empty CSV cells become None)"""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        for row in csv.DictReader(text):
+            yield {key: (value if value != '' else None) for key, value in row.items()}
+        return
+    for line in text:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row if isinstance(row, dict) else RowError('Invalid JSON object')
+
+def _text(value):
+    return None if value is None else str(value).strip() or None
+
+def _int(value):
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f'Invalid integer: {value}')
+
+def _float(value):
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise RowError(f'Invalid number: {value}')
+
+def _date(value):
+    if value is None or value == '':
+        return None
+    try:
+        if len(str(value)) != 10:
+            raise ValueError
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise RowError(f'Invalid date format: {value}. Use YYYY-MM-DD')
+
+def _bool(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('true', '1', 'yes')
+
+def _in_chunks(values, size=500):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def _existing(conn, column, values):
+    """The subset of values already present in column"""
+    found = set()
+    for chunk in _in_chunks({v for v in values if v is not None}):
+        found.update(conn.execute(db.select(column).where(column.in_(chunk))).scalars())
+    return found
+
+# ==================== Importers ====================
+
+class ImportReport:
+    """Running totals and per-row errors for one import"""
+
+    def __init__(self):
+        self.inserted = 0
+        self.errors = []
+
+    def fail(self, row_number, message):
+        self.errors.append({'row': row_number, 'error': message})
+
+    def to_dict(self):
+        return {'inserted': self.inserted, 'failed': len(self.errors), 'errors': self.errors}
+
+class BulkImporter(ABC):
+    """
+    Base class. Subclasses declare the accepted fields and implement
+    validate() (one batch against prefetched keys) and insert().
+    """
+    required = ()
+    fields = {}
+
+    def __init__(self, batch_size=2000):
+        self.batch_size = max(int(batch_size), 1)
+        # Keys inserted by earlier batches of this upload
+        self.seen = {}
+        # Keys claimed by the batch being imported, added to seen once it commits
+        self._claims = {}
+
+    def run(self, rows):
+        report = ImportReport()
+        batch = []
+        for row_number, row in enumerate(rows, start=1):
+            batch.append((row_number, row))
+            if len(batch) == self.batch_size:
+                self._import_batch(batch, report)
+                batch = []
+        if batch:
+            self._import_batch(batch, report)
+        report.errors.sort(key=lambda error: error['row'])
+        return report
+
+    def convert(self, row):
+        """Typed values for the declared fields, or raise RowError"""
+        if isinstance(row, Exception):
+            raise row
+        missing = [field for field in self.required if row.get(field) in (None, '')]
+        if missing:
+            raise RowError(f'Missing required field: {missing[0]}')
+        return {field: convert(row.get(field)) for field, convert in self.fields.items()}
+
+    def claim(self, kind, key):
+        """Reject a key already used earlier in the upload"""
+        claimed = self._claims.setdefault(kind, set())
+        if key in claimed or key in self.seen.get(kind, ()):
+            raise RowError(f'Duplicate {kind} in upload: {key}')
+        claimed.add(key)
+
+    def _import_batch(self, batch, report):
+        self._claims = {}
+        converted = []
+        for row_number, row in batch:
+            try:
+                converted.append((row_number, self.convert(row)))
+            except RowError as e:
+                report.fail(row_number, str(e))
+
+        try:
+            with db.engine.begin() as conn:
+                valid = []
+                for row_number, values, error in self.validate(conn, converted):
+                    if error:
+                        report.fail(row_number, error)
+                    else:
+                        valid.append(values)
+                if valid:
+                    apply_deltas(conn, self.insert(conn, valid))
+        except Exception as e:
+            # The batch was rolled back; report every row that would have gone in
+            failed = {number for number, _ in converted} - {error['row'] for error in report.errors}
+            for row_number in sorted(failed):
+                report.fail(row_number, f'Batch failed: {e.__class__.__name__}: {e}')
+        else:
+            report.inserted += len(valid)
+            for kind, keys in self._claims.items():
+                self.seen.setdefault(kind, set()).update(keys)
+
+    @abstractmethod
+    def validate(self, conn, rows):
+        """Yield (row_number, values, error or None) for converted rows"""
+
+    @abstractmethod
+    def insert(self, conn, rows):
+        """Insert valid rows and return the stats counter deltas"""
+
+class _UserImporter(BulkImporter):
+    """Shared user-account handling for patients and doctors"""
+    role = None
+    user_fields = {'username': _text, 'email': _text, 'password': _text, 'password_hash': _text}
+
+    def validate_users(self, conn, rows):
+        usernames = _existing(conn, User.username, (values['username'] for _, values in rows))
+        emails = _existing(conn, User.email, (values['email'] for _, values in rows))
+        for row_number, values in rows:
+            try:
+                if values['email'] in emails:
+                    raise RowError('Email already registered')
+                if values['username'] in usernames:
+                    raise RowError('Username already taken')
+                self.claim('email', values['email'])
+                self.claim('username', values['username'])
+            except RowError as e:
+                yield row_number, values, str(e)
+            else:
+                yield row_number, values, None
+
+    def insert_users(self, conn, rows):
+        """Insert the user accounts and return their ids in row order"""
+        users = [{
+            'username': values['username'],
+            'email': values['email'],
+            # Prefer pre-hashed passwords: hashing plain ones dominates import time
+            'password_hash': values['password_hash'] or (
+                hash_password(values['password']) if values['password'] else UNUSABLE_PASSWORD),
+            'role': self.role,
+            'is_active': True,
+        } for values in rows]
+        conn.execute(User.__table__.insert(), users)
+        ids = {}
+        for chunk in _in_chunks(user['username'] for user in users):
+            ids.update(conn.execute(db.select(User.username, User.id).where(User.username.in_(chunk))).all())
+        return [ids[user['username']] for user in users]
+
+    def profile_rows(self, rows, user_ids):
+        profile_fields = [field for field in self.fields if field not in self.user_fields]
+        return [dict({field: values[field] for field in profile_fields}, user_id=user_id)
+                for values, user_id in zip(rows, user_ids)]
+
+class PatientImporter(_UserImporter):
+    role = 'patient'
+    required = ('username', 'email')
+    fields = dict(_UserImporter.user_fields, **{
+        'phone': _text, 'alternate_phone': _text, 'date_of_birth': _date, 'gender': _text,
+        'blood_group': _text, 'address': _text, 'city': _text, 'pincode': _text,
+        'medical_history': _text, 'allergies': _text, 'insurance_provider': _text,
+        'insurance_id': _text, 'emergency_contact': _text, 'emergency_contact_name': _text,
+    })
+
+    def validate(self, conn, rows):
+        return self.validate_users(conn, rows)
+
+    def insert(self, conn, rows):
+        user_ids = self.insert_users(conn, rows)
+        conn.execute(Patient.__table__.insert(), self.profile_rows(rows, user_ids))
+        
+        # Core inserts skip the flush hook that maintains the phone lookup
+        with_phones = {user_id: values for values, user_id in zip(rows, user_ids)
+                       if values['phone'] or values['alternate_phone']}
+        patient_ids = {}
+        for chunk in _in_chunks(with_phones):
+            patient_ids.update(conn.execute(
+                db.select(Patient.user_id, Patient.id).where(Patient.user_id.in_(chunk))).all())
+        sync_phones(conn, {patient_ids[user_id]: values for user_id, values in with_phones.items()})
+        return {'patients.total': len(rows), 'patients.active': len(rows)}
+
+class DoctorImporter(_UserImporter):
+    role = 'doctor'
+    required = ('username', 'email', 'department_id', 'license_number')
+    fields = dict(_UserImporter.user_fields, **{
+        'department_id': _int, 'license_number': _text, 'phone': _text, 'experience_years': _int,
+        'qualification': _text, 'specialization': _text, 'bio': _text,
+        'consultation_fees': _float, 'is_available': _bool,
+    })
+
+    def validate(self, conn, rows):
+        departments = set(conn.execute(db.select(Department.id)).scalars())
+        licenses = _existing(conn, Doctor.license_number, (values['license_number'] for _, values in rows))
+        checked = []
+        for row_number, values in rows:
+            if values['department_id'] not in departments:
+                yield row_number, values, 'Invalid department_id'
+            elif values['license_number'] in licenses:
+                yield row_number, values, 'License number already exists'
+            else:
+                checked.append((row_number, values))
+
+        for row_number, values, error in self.validate_users(conn, checked):
+            if not error:
+                try:
+                    self.claim('license number', values['license_number'])
+                except RowError as e:
+                    error = str(e)
+            yield row_number, values, error
+
+    def insert(self, conn, rows):
+        user_ids = self.insert_users(conn, rows)
+        doctors = self.profile_rows(rows, user_ids)
+        for doctor in doctors:
+            # Match create_doctor's defaults; executemany needs the same keys on every row
+            doctor['experience_years'] = doctor['experience_years'] or 0
+            if doctor['consultation_fees'] is None:
+                doctor['consultation_fees'] = 500.0
+            if doctor['is_available'] is None:
+                doctor['is_available'] = True
+        conn.execute(Doctor.__table__.insert(), doctors)
+        deltas = Counter({'doctors.total': len(rows), 'doctors.active': len(rows)})
+        deltas.update(department_key(values['department_id']) for values in rows)
+        return deltas
+
+class AppointmentImporter(BulkImporter):
+    required = ('patient_id', 'doctor_id', 'appointment_date', 'appointment_time')
+    fields = {
+        'patient_id': _int, 'doctor_id': _int, 'appointment_date': _date, 'appointment_time': _text,
+        'status': _text, 'notes': _text, 'appointment_type': _text, 'consultation_fees': _float,
+        'payment_status': _text,
+    }
+
+    def convert(self, row):
+        values = super().convert(row)
+        values['status'] = values['status'] or 'Booked'
+        if values['status'] not in APPOINTMENT_STATUSES:
+            raise RowError(f"Invalid status: {values['status']}")
+        return values
+
+    def validate(self, conn, rows):
+        patients = _existing(conn, Patient.id, (values['patient_id'] for _, values in rows))
+        doctor_ids = {values['doctor_id'] for _, values in rows}
+        fees = {}
+        for chunk in _in_chunks(doctor_ids):
+            fees.update(conn.execute(
+                db.select(Doctor.id, Doctor.consultation_fees).where(Doctor.id.in_(chunk))).all())
+
+        # Active bookings the new Booked rows could collide with
+        booked_rows = [values for _, values in rows if values['status'] == 'Booked']
+        taken = set()
+        if booked_rows:
+            dates = [values['appointment_date'] for values in booked_rows]
+            for chunk in _in_chunks({values['doctor_id'] for values in booked_rows}):
+                taken.update(conn.execute(
+                    db.select(Appointment.doctor_id, Appointment.appointment_date, Appointment.appointment_time)
+                    .where(Appointment.doctor_id.in_(chunk), Appointment.status == 'Booked',
+                           Appointment.appointment_date.between(min(dates), max(dates)))).all())
+
+        for row_number, values in rows:
+            error = None
+            if values['patient_id'] not in patients:
+                error = 'Patient not found'
+            elif values['doctor_id'] not in fees:
+                error = 'Doctor not found'
+            elif values['status'] == 'Booked':
+                slot = (values['doctor_id'], values['appointment_date'], values['appointment_time'])
+                try:
+                    if slot in taken:
+                        raise RowError('This time slot is already booked')
+                    self.claim('booked slot', slot)
+                except RowError as e:
+                    error = str(e)
+            if not error and values['consultation_fees'] is None:
+                values['consultation_fees'] = fees[values['doctor_id']]
+            yield row_number, values, error
+
+    def insert(self, conn, rows):
+        for values in rows:
+            values['appointment_type'] = values['appointment_type'] or 'Regular'
+            values['payment_status'] = values['payment_status'] or 'Pending'
+        conn.execute(Appointment.__table__.insert(), rows)
+        bump_versions(conn, {(values['doctor_id'], values['appointment_date']) for values in rows
+                             if values['status'] in UPCOMING_STATUSES})
+
+        # The per-profile totals create_appointment keeps
+        per_doctor = Counter(values['doctor_id'] for values in rows)
+        per_patient = Counter(values['patient_id'] for values in rows)
+        doctors, patients = Doctor.__table__, Patient.__table__
+        conn.execute(doctors.update().where(doctors.c.id == db.bindparam('_id')).values(
+            total_appointments=db.func.coalesce(doctors.c.total_appointments, 0) + db.bindparam('_n')),
+            [{'_id': k, '_n': n} for k, n in per_doctor.items()])
+        conn.execute(patients.update().where(patients.c.id == db.bindparam('_id')).values(
+            total_visits=db.func.coalesce(patients.c.total_visits, 0) + db.bindparam('_n')),
+            [{'_id': k, '_n': n} for k, n in per_patient.items()])
+
+        deltas = Counter(status_key(values['status']) for values in rows)
+        deltas.update(upcoming_key(values['appointment_date']) for values in rows
+                      if values['status'] in UPCOMING_STATUSES)
+        return deltas
+
+IMPORTERS = {
+    'patients': PatientImporter,
+    'doctors': DoctorImporter,
+    'appointments': AppointmentImporter,
+}
@@ -0,0 +1,212 @@
+# Materialised dashboard counters
+# An after_flush hook turns every Appointment/Doctor/Patient/Treatment insert,
+# update and delete (plus User.is_active toggles) into +/- deltas on the
+# stats_counters table, in the same transaction as the change itself.
+# Bulk Core statements bypass the ORM, so code that uses them must call
+# apply_deltas() itself or run `flask rebuild-stats` afterwards.
+# Appointments also count towards the upcoming bucket of their date while
+# Booked or Confirmed (see utils/stats.py).
+# Inside deferred_counters() the deltas are collected instead of written, so
+# a hot write path (booking) can hand them to a background job and leave the
+# shared counter rows, such as appointments.status.Booked, out of its
+# transaction.
+
+from collections import Counter
+from contextlib import contextmanager
+import click
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app import db
+from models.user import User
+from models.doctor import Doctor
+from models.patient import Patient
+from models.appointment import Appointment
+from models.treatment import Treatment
+from models.stats_counter import StatsCounter
+from utils.dialects import UPSERT_INSERTS
+from utils.stats import compute_counters, status_key, department_key, upcoming_key, UPCOMING_STATUSES
+
+def _old_value(obj, attr):
+    """Value of an attribute before the current flush"""
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.added:
+        return None
+    return getattr(obj, attr)
+
+def _user_active(session, user_id, before_flush):
+    with session.no_autoflush:
+        user = session.get(User, user_id)
+    if user is None:
+        return False
+    return bool(_old_value(user, 'is_active') if before_flush else user.is_active)
+
+def _profile(session, obj, sign, deltas, before_flush):
+    """Deltas for a Doctor or Patient row appearing (+1) or disappearing (-1)"""
+    prefix = 'doctors' if isinstance(obj, Doctor) else 'patients'
+    deltas[f'{prefix}.total'] += sign
+    if _user_active(session, obj.user_id, before_flush):
+        deltas[f'{prefix}.active'] += sign
+    if isinstance(obj, Doctor):
+        department_id = _old_value(obj, 'department_id') if before_flush else obj.department_id
+        deltas[department_key(department_id)] += sign
+
+def _upcoming(deltas, status, day, sign):
+    """Delta for the upcoming bucket of an appointment's date"""
+    if status in UPCOMING_STATUSES and day is not None:
+        deltas[upcoming_key(day)] += sign
+
+def collect_deltas(session):
+    """Counter deltas for the objects in a flush"""
+    deltas = Counter()
+    new, deleted = set(session.new), set(session.deleted)
+
+    for obj in new:
+        if isinstance(obj, Appointment):
+            deltas[status_key(obj.status)] += 1
+            _upcoming(deltas, obj.status, obj.appointment_date, 1)
+        elif isinstance(obj, Treatment):
+            deltas['treatments.total'] += 1
+        elif isinstance(obj, (Doctor, Patient)):
+            _profile(session, obj, 1, deltas, before_flush=False)
+
+    for obj in deleted:
+        if isinstance(obj, Appointment):
+            deltas[status_key(_old_value(obj, 'status'))] -= 1
+            _upcoming(deltas, _old_value(obj, 'status'), _old_value(obj, 'appointment_date'), -1)
+        elif isinstance(obj, Treatment):
+            deltas['treatments.total'] -= 1
+        elif isinstance(obj, (Doctor, Patient)):
+            _profile(session, obj, -1, deltas, before_flush=True)
+
+    for obj in session.dirty:
+        if obj in deleted or not session.is_modified(obj):
+            continue
+        if isinstance(obj, Appointment):
+            old, new_status = _old_value(obj, 'status'), obj.status
+            if old != new_status:
+                deltas[status_key(old)] -= 1
+                deltas[status_key(new_status)] += 1
+            old_date = _old_value(obj, 'appointment_date')
+            if (old, old_date) != (new_status, obj.appointment_date):
+                _upcoming(deltas, old, old_date, -1)
+                _upcoming(deltas, new_status, obj.appointment_date, 1)
+        elif isinstance(obj, Doctor):
+            old = _old_value(obj, 'department_id')
+            if old != obj.department_id:
+                deltas[department_key(old)] -= 1
+                deltas[department_key(obj.department_id)] += 1
+        elif isinstance(obj, User):
+            was, now = bool(_old_value(obj, 'is_active')), bool(obj.is_active)
+            if was == now:
+                continue
+            with session.no_autoflush:
+                profiles = list(obj.doctor_profile) + list(obj.patient_profile)
+            for profile in profiles:
+                if profile in new or profile in deleted:
+                    continue
+                prefix = 'doctors' if isinstance(profile, Doctor) else 'patients'
+                deltas[f'{prefix}.active'] += 1 if now else -1
+
+    return {key: value for key, value in deltas.items() if value}
+
+def apply_deltas(conn, deltas):
+    """Add deltas to the stored counters, creating missing keys"""
+    table = StatsCounter.__table__
+    insert = UPSERT_INSERTS.get(conn.dialect.name)
+    if insert is not None:
+        # Create missing keys at 0 first, so concurrent first writers of a key
+        # cannot both take the insert path and collide on the primary key
+        conn.execute(insert(table).values([{'key': key, 'value': 0} for key in deltas])
+                     .on_conflict_do_nothing(index_elements=['key']))
+    for key, delta in deltas.items():
+        result = conn.execute(
+            table.update().where(table.c.key == key).values(value=table.c.value + delta))
+        if result.rowcount == 0:
+            conn.execute(table.insert().values(key=key, value=delta))
+
+def _before_flush(session, flush_context, instances):
+    """Load what _after_flush reads while the rows still exist"""
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Appointment):
+            obj.status, obj.appointment_date
+        elif isinstance(obj, (Doctor, Patient)):
+            if obj.user_id is not None:
+                with session.no_autoflush:
+                    session.get(User, obj.user_id)
+            if isinstance(obj, Doctor):
+                obj.department_id
+
+def _after_flush(session, flush_context):
+    deltas = collect_deltas(session)
+    if not deltas:
+        return
+    deferred = session.info.get('deferred_counter_deltas')
+    if deferred is not None:
+        deferred.update(deltas)
+    else:
+        apply_deltas(session.connection(), deltas)
+
+@contextmanager
+def deferred_counters(session=None):
+    """
+    Collect the counter deltas of the flushes in the block into the yielded
+    Counter instead of writing them; the caller must apply_deltas() them later
+    """
+    session = session or db.session
+    deltas = session.info['deferred_counter_deltas'] = Counter()
+    try:
+        yield deltas
+    finally:
+        session.info.pop('deferred_counter_deltas', None)
+
+def rebuild_counters(conn=None):
+    """Replace all stored counters with freshly computed values"""
+    table = StatsCounter.__table__
+    if conn is None:
+        with db.engine.begin() as conn:
+            return rebuild_counters(conn)
+    counters = compute_counters(conn)
+    conn.execute(table.delete())
+    conn.execute(table.insert(), [{'key': k, 'value': v} for k, v in counters.items()])
+    return counters
+
+def check_counters():
+    """Return {key: (stored, actual)} for every counter that has drifted"""
+    actual = compute_counters()
+    stored = dict(db.session.execute(db.select(StatsCounter.key, StatsCounter.value)).all())
+    return {
+        key: (stored.get(key, 0), actual.get(key, 0))
+        for key in set(actual) | set(stored)
+        if stored.get(key, 0) != actual.get(key, 0)
+    }
+
+# Attributes whose pre-flush value decides which counter to decrement
+TRACKED_ATTRIBUTES = (Appointment.status, Appointment.appointment_date, Doctor.department_id, User.is_active)
+
+def _track(target, value, oldvalue, initiator):
+    return value
+
+def init_app(app):
+    """Register the flush hook (once per process) and the CLI commands"""
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'before_flush', _before_flush)
+        event.listen(Session, 'after_flush', _after_flush)
+        # Load the old value before an expired attribute is overwritten
+        for attribute in TRACKED_ATTRIBUTES:
+            event.listen(attribute, 'set', _track, active_history=True)
+
+    @app.cli.command('rebuild-stats')
+    def rebuild_stats_command():
+        """Recompute the dashboard counters from scratch."""
+        counters = rebuild_counters()
+        click.echo(f'Rebuilt {len(counters)} stats counters.')
+
+    @app.cli.command('check-stats')
+    def check_stats_command():
+        """Compare stored dashboard counters with the live tables."""
+        drift = check_counters()
+        for key, (stored, actual) in sorted(drift.items()):
+            click.echo(f'{key}: stored {stored}, actual {actual}')
+        click.echo('Counters are consistent.' if not drift else f'{len(drift)} counters drifted.')
@@ -0,0 +1,10 @@
+# Dialect-specific SQL helpers
+# Kept apart from the services that use them, so a module that only needs an
+# INSERT ... ON CONFLICT does not pull in unrelated machinery.
+
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# insert() constructs that support .on_conflict_do_nothing(), by dialect name;
+# other dialects fall back to checking first
+UPSERT_INSERTS = {'sqlite': sqlite_insert, 'postgresql': postgresql_insert}
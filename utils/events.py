@@ -0,0 +1,205 @@
+# Live appointment and queue events
+# An in-process pub/sub with one channel per doctor and one per patient
+# (patient_channel()). A patient's channel carries only their own
+# appointments and the calls of the queues they wait in. Session hooks snapshot
+# appointment changes at flush time and publish them only after the commit
+# succeeds (a rollback drops them). Core writers that the ORM does not see,
+# such as PatientQueue.call_next, call stage() themselves.
+#
+# Each channel keeps its last EVENT_BUFFER_SIZE events already encoded as
+# Server-Sent Events text, with ids counting up from 1. A subscriber is just
+# a cursor into that buffer plus a wait on the channel's condition, so idle
+# subscribers use no CPU and no database connection. Publishing encodes
+# once and wakes only that channel's subscribers. A reconnect with
+# Last-Event-ID replays what it missed, or gets a "reset" event if the
+# buffer has moved past it.
+#
+# Events only reach subscribers connected to the process that made the
+# change; run the event stream on a single worker, or behind a broker,
+# when serving from several processes.
+
+import json
+import threading
+from collections import deque
+from itertools import islice
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models.appointment import Appointment
+
+HEARTBEAT = b': keep-alive\n\n'
+RETRY = b'retry: 3000\n\n'  # first chunk of a stream: reconnect delay in ms, and flushes the headers
+EVENT_FIELDS = ('doctor_id', 'appointment_date', 'appointment_time', 'status', 'queue_position')
+
+def encode(event_id, kind, data):
+    return f'id: {event_id}\nevent: {kind}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode()
+
+class Channel:
+    __slots__ = ('condition', 'events', 'next_id', 'subscribers')
+
+    def __init__(self, size):
+        self.condition = threading.Condition()
+        self.events = deque(maxlen=size)  # (id, encoded event)
+        self.next_id = 1
+        self.subscribers = 0
+
+    def since(self, cursor):
+        """Encoded events after id cursor, or None if they are no longer buffered"""
+        latest = self.next_id - 1
+        if cursor > latest or cursor < 0:
+            return None
+        if cursor == latest:
+            return []
+        first = self.events[0][0]
+        if cursor < first - 1:
+            return None
+        return [payload for _, payload in islice(self.events, cursor - first + 1, None)]
+
+class EventBroker:
+    """Per-channel ring buffers of encoded events with blocking subscribers"""
+
+    def __init__(self, buffer_size=256):
+        self.buffer_size = buffer_size
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def _channel(self, key):
+        channel = self._channels.get(key)
+        if channel is None:
+            with self._lock:
+                channel = self._channels.setdefault(key, Channel(self.buffer_size))
+        return channel
+
+    def publish(self, key, kind, data):
+        """Append an event to a channel and wake its subscribers; returns the event id"""
+        channel = self._channel(key)
+        with channel.condition:
+            event_id = channel.next_id
+            channel.events.append((event_id, encode(event_id, kind, data)))
+            channel.next_id += 1
+            channel.condition.notify_all()
+        return event_id
+
+    def last_id(self, key):
+        return self._channel(key).next_id - 1
+
+    def subscribers(self, key=None):
+        channels = [self._channel(key)] if key is not None else list(self._channels.values())
+        return sum(channel.subscribers for channel in channels)
+
+    def listen(self, key, last_id=None, heartbeat=15):
+        """
+        Yield encoded events published to key after last_id (default: from
+        now on), forever. Yields HEARTBEAT after heartbeat seconds of quiet.
+        """
+        channel = self._channel(key)
+        with channel.condition:
+            channel.subscribers += 1
+            cursor = channel.next_id - 1 if last_id is None else last_id
+        try:
+            while True:
+                with channel.condition:
+                    pending = channel.since(cursor)
+                    if pending == []:
+                        channel.condition.wait(heartbeat)
+                        pending = channel.since(cursor)
+                    latest = channel.next_id - 1
+                if pending is None:
+                    cursor = latest
+                    yield encode(latest, 'reset', {'reason': 'missed events, reload the queue'})
+                elif not pending:
+                    yield HEARTBEAT
+                else:
+                    cursor += len(pending)
+                    yield from pending
+        finally:
+            with channel.condition:
+                channel.subscribers -= 1
+
+def event_stream(broker, key, last_id, heartbeat):
+    """Response body for an SSE request: the retry hint, then the channel's events"""
+    yield RETRY
+    yield from broker.listen(key, last_id, heartbeat)
+
+def patient_channel(patient_id):
+    """Channel key of a patient's own feed (doctor channels are keyed by doctor id)"""
+    return f'patient:{patient_id}'
+
+def current_broker():
+    """The app's EventBroker, or None outside an app or before init_app"""
+    return current_app.extensions.get('events') if has_app_context() else None
+
+# ---- session hooks ----
+
+def stage(session, channel, kind, data, key=None):
+    """Publish an event on a channel (a doctor id or patient_channel()) when the session's transaction commits"""
+    # Keyed so that a row changed in several flushes is announced once, in its final state
+    session.info.setdefault('pending_events', {})[key if key is not None else object()] = (channel, kind, data)
+
+def _stage_appointment(session, appointment, doctor_id, patient_id, removed, key):
+    """Stage an appointment event for its doctor and for its patient"""
+    data = appointment_event(appointment, removed)
+    stage(session, doctor_id, 'appointment', data, key)
+    if patient_id is not None:
+        stage(session, patient_channel(patient_id), 'appointment', data, ('patient',) + key)
+
+def appointment_event(appointment, removed=False):
+    return {
+        'id': appointment.id,
+        'doctor_id': appointment.doctor_id,
+        'date': appointment.appointment_date.isoformat() if appointment.appointment_date else None,
+        'time': appointment.appointment_time,
+        'status': appointment.status,
+        'queue_position': appointment.queue_position,
+        'removed': removed,
+    }
+
+def _old_value(appointment, attr):
+    history = inspect(appointment).attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(appointment, attr)
+
+def _before_flush(session, flush_context, instances):
+    """Load what _after_flush reads while deleted rows still exist"""
+    for obj in session.deleted:
+        if isinstance(obj, Appointment):
+            for attr in ('id', 'patient_id') + EVENT_FIELDS:
+                getattr(obj, attr)
+
+def _after_flush(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, Appointment):
+            _stage_appointment(session, obj, obj.doctor_id, obj.patient_id, False, ('appointment', obj.id))
+    for obj in session.deleted:
+        if isinstance(obj, Appointment):
+            _stage_appointment(session, obj, _old_value(obj, 'doctor_id'), _old_value(obj, 'patient_id'),
+                               True, ('appointment', obj.id))
+    for obj in session.dirty:
+        if not isinstance(obj, Appointment) or obj in session.deleted:
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[attr].history.has_changes() for attr in EVENT_FIELDS):
+            continue
+        old_doctor = _old_value(obj, 'doctor_id')
+        if old_doctor != obj.doctor_id:
+            stage(session, old_doctor, 'appointment', appointment_event(obj, removed=True), ('moved', obj.id))
+        _stage_appointment(session, obj, obj.doctor_id, obj.patient_id, False, ('appointment', obj.id))
+
+def _after_commit(session):
+    pending = session.info.pop('pending_events', None)
+    broker = current_broker()
+    if not pending or broker is None:
+        return
+    for channel, kind, data in pending.values():
+        broker.publish(channel, kind, data)
+
+def _after_rollback(session):
+    session.info.pop('pending_events', None)
+
+def init_app(app):
+    """Create the app's broker and register the session hooks (once per process)"""
+    app.extensions['events'] = EventBroker(app.config.get('EVENT_BUFFER_SIZE', 256))
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'before_flush', _before_flush)
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
@@ -0,0 +1,226 @@
+# Identity cache for the logged-in user
+# load_user() used to SELECT the user on every request, and most routes then
+# looked up the Doctor/Patient profile by user_id. The user's columns and the
+# ids of their profiles are now resolved in one query, kept on g for the rest
+# of the request and in a small per-process TTL/LRU cache across requests.
+# A cached user is attached to the session with merge(load=False), which
+# issues no SQL.
+# A flush that changes a User row (status toggles, email edits, deletes) or
+# adds, moves or deletes a Doctor/Patient profile drops that user's entry, and
+# again after commit. It also bumps the user's row in identity_versions, in
+# the same transaction. A cached identity carries the version it was read
+# with and is confirmed with a primary key lookup on identity_versions at the
+# start of each request, so a user deactivated or removed through another
+# process is logged out on their next request, not when the TTL runs out.
+# Code that changes these tables with Core statements must call
+# bump_versions() in its transaction.
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask import current_app, g, has_app_context
+from flask_login import current_user
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app import db
+from models.user import User
+from models.doctor import Doctor
+from models.patient import Patient
+from models.identity_version import IdentityVersion
+from utils.dialects import UPSERT_INSERTS
+
+Identity = namedtuple('Identity', 'user_id user doctor_id patient_id version')
+
+# Columns kept in the cache; password_hash is loaded only when needed
+USER_COLUMNS = [c for c in User.__table__.columns if c.key != 'password_hash']
+
+class IdentityCache:
+    """Thread-safe LRU of Identity tuples with a time-to-live"""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            identity, expires = entry
+            if expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return identity
+
+    def put(self, identity):
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[identity.user_id] = (identity, time.monotonic() + self.ttl)
+            self._entries.move_to_end(identity.user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def _cache():
+    return current_app.extensions['identity_cache']
+
+def _fetch(user_id):
+    """User columns and profile ids in one query (always on the primary: a fresh
+    account may not have reached the read replica yet)"""
+    row = db.session.execute(
+        db.select(*USER_COLUMNS, Doctor.id.label('doctor_id'), Patient.id.label('patient_id'),
+                  db.func.coalesce(IdentityVersion.version, 0).label('version'))
+        .outerjoin(Doctor, Doctor.user_id == User.id)
+        .outerjoin(Patient, Patient.user_id == User.id)
+        .outerjoin(IdentityVersion, IdentityVersion.user_id == User.id)
+        .where(User.id == user_id)
+        .limit(1),
+        bind_arguments={'bind': db.engine},
+    ).first()
+    if row is None:
+        return None
+    user = {column.key: row._mapping[column] for column in USER_COLUMNS}
+    return Identity(user_id, user, row.doctor_id, row.patient_id, row.version)
+
+def _current_version(user_id):
+    """The user's identity version on the primary (0 if it was never bumped)"""
+    return db.session.scalar(
+        db.select(IdentityVersion.version).where(IdentityVersion.user_id == user_id),
+        bind_arguments={'bind': db.engine},
+    ) or 0
+
+def resolve(user_id):
+    """The Identity for a user id: from g, then the cache, then the database"""
+    identity = g.get('_identity')
+    if identity is not None and identity.user_id == user_id:
+        return identity
+    identity = _cache().get(user_id)
+    if identity is not None and identity.version != _current_version(user_id):
+        # Changed by another process since it was cached
+        _cache().discard(user_id)
+        identity = None
+    if identity is None:
+        identity = _fetch(user_id)
+        if identity is None:
+            return None
+        _cache().put(identity)
+    g._identity = identity
+    return identity
+
+def load_user(user_id):
+    """Flask-Login user_loader: a session-attached User, without a query on a cache hit"""
+    identity = resolve(user_id)
+    if identity is None:
+        return None
+    user = User(**identity.user)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+def current_doctor_id():
+    """Doctor.id of the logged-in user, or None"""
+    if not current_user.is_authenticated:
+        return None
+    identity = resolve(current_user.id)
+    return identity.doctor_id if identity else None
+
+def current_patient_id():
+    """Patient.id of the logged-in user, or None"""
+    if not current_user.is_authenticated:
+        return None
+    identity = resolve(current_user.id)
+    return identity.patient_id if identity else None
+
+def _get(model, pk, options):
+    # get() skips options for an instance already in the identity map
+    return db.session.get(model, pk, options=options, populate_existing=bool(options))
+
+def current_doctor(*options):
+    """The logged-in user's Doctor (a primary-key get with loader options), or None"""
+    doctor_id = current_doctor_id()
+    return _get(Doctor, doctor_id, options) if doctor_id else None
+
+def current_patient(*options):
+    """The logged-in user's Patient (a primary-key get with loader options), or None"""
+    patient_id = current_patient_id()
+    return _get(Patient, patient_id, options) if patient_id else None
+
+def invalidate(user_id):
+    """Forget a user's cached identity"""
+    if not has_app_context() or 'identity_cache' not in current_app.extensions:
+        return
+    _cache().discard(user_id)
+    if g.get('_identity') is not None and g._identity.user_id == user_id:
+        g.pop('_identity')
+
+def _user_ids(session):
+    """Ids of users whose cached columns or profile ids the flush changed"""
+    user_ids = set()
+    new, deleted = set(session.new), set(session.deleted)
+    for obj in new | deleted | set(session.dirty):
+        if isinstance(obj, User):
+            if obj in new or obj in deleted or session.is_modified(obj):
+                user_ids.add(obj.id)
+        elif isinstance(obj, (Doctor, Patient)):
+            history = inspect(obj).attrs.user_id.history
+            if obj in new or obj in deleted:
+                user_ids.add(obj.user_id)
+            user_ids.update(history.added or ())
+            user_ids.update(history.deleted or ())
+    user_ids.discard(None)
+    return user_ids
+
+def bump_versions(conn, user_ids):
+    """Bump the identity version of each user, so every process drops its cached copy"""
+    table = IdentityVersion.__table__
+    user_ids = sorted(user_ids)
+    if not user_ids:
+        return
+    insert = UPSERT_INSERTS.get(conn.dialect.name)
+    if insert is not None:
+        conn.execute(insert(table).values([{'user_id': user_id, 'version': 0} for user_id in user_ids])
+                     .on_conflict_do_nothing(index_elements=['user_id']))
+    else:
+        known = set(conn.scalars(db.select(table.c.user_id).where(table.c.user_id.in_(user_ids))))
+        missing = [{'user_id': user_id, 'version': 0} for user_id in user_ids if user_id not in known]
+        if missing:
+            conn.execute(table.insert(), missing)
+    conn.execute(table.update().where(table.c.user_id.in_(user_ids)).values(version=table.c.version + 1))
+
+def _after_flush(session, flush_context):
+    user_ids = _user_ids(session)
+    if not user_ids:
+        return
+    bump_versions(session.connection(), user_ids)
+    session.info.setdefault('identity_changes', set()).update(user_ids)
+    for user_id in user_ids:
+        invalidate(user_id)
+
+def _after_commit(session):
+    # A concurrent request may have cached the pre-commit row in between
+    for user_id in session.info.pop('identity_changes', ()):
+        invalidate(user_id)
+
+def _after_rollback(session):
+    session.info.pop('identity_changes', None)
+
+def init_app(app):
+    """Create the app's cache and register the session hooks (once per process)"""
+    app.config.setdefault('IDENTITY_CACHE_TTL', 60)
+    app.config.setdefault('IDENTITY_CACHE_SIZE', 1024)
+    app.extensions['identity_cache'] = IdentityCache(app.config['IDENTITY_CACHE_SIZE'],
+                                                     app.config['IDENTITY_CACHE_TTL'])
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
@@ -0,0 +1,211 @@
+# Request and SQL instrumentation
+# Opt-in with INSTRUMENTATION_ENABLED. When it is off nothing is registered,
+# so requests and statements run exactly as without this module. When it is
+# on, each request records its latency, the number and total time of the SQL
+# statements it ran (engine before/after_cursor_execute) and the
+# relationship lazy loads that reached the database. Totals are kept per
+# (endpoint, method) in a fixed-bucket latency histogram, so recording is a
+# bisect and a few additions under a lock.
+#
+# The numbers are per process. /admin/metrics shows them as a table with
+# percentiles estimated from the buckets; /admin/metrics/prometheus serves
+# the same counters in the Prometheus text format.
+
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from flask import current_app, request, request_finished
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+
+# Upper bounds of the latency buckets in seconds (the last bucket is +Inf)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestStats:
+    __slots__ = ('started', 'statements', 'sql_seconds', 'sql_started', 'lazy_loads', 'status', 'token')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.sql_started = self.started
+        self.lazy_loads = 0
+        self.status = 500
+
+class EndpointStats:
+    __slots__ = ('buckets', 'count', 'seconds', 'max_seconds', 'statements', 'sql_seconds', 'lazy_loads', 'statuses')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.lazy_loads = 0
+        self.statuses = {}
+
+    def percentile(self, fraction):
+        """Latency in seconds below which this fraction of requests fell, interpolated within a bucket"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen, lower = 0, 0.0
+        for n, bound in enumerate(BUCKETS + (self.max_seconds,)):
+            in_bucket = self.buckets[n]
+            if in_bucket and seen + in_bucket >= rank:
+                upper = min(bound, self.max_seconds)
+                return lower + (upper - lower) * (rank - seen) / in_bucket
+            seen += in_bucket
+            lower = bound
+        return self.max_seconds
+
+class Metrics:
+    """Per-(endpoint, method) request, SQL and lazy-load totals for one process"""
+
+    def __init__(self):
+        self.endpoints = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, method, stats, seconds):
+        with self._lock:
+            entry = self.endpoints.get((endpoint, method))
+            if entry is None:
+                entry = self.endpoints[(endpoint, method)] = EndpointStats()
+            entry.buckets[bisect_left(BUCKETS, seconds)] += 1
+            entry.count += 1
+            entry.seconds += seconds
+            entry.max_seconds = max(entry.max_seconds, seconds)
+            entry.statements += stats.statements
+            entry.sql_seconds += stats.sql_seconds
+            entry.lazy_loads += stats.lazy_loads
+            entry.statuses[stats.status] = entry.statuses.get(stats.status, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+            self.started = time.time()
+
+    def rows(self):
+        """One dict per endpoint for the admin page, slowest total time first"""
+        with self._lock:
+            items = list(self.endpoints.items())
+        rows = []
+        for (endpoint, method), entry in items:
+            count = entry.count
+            rows.append({
+                'endpoint': endpoint,
+                'method': method,
+                'requests': count,
+                'errors': sum(n for status, n in entry.statuses.items() if status >= 500),
+                'p50_ms': entry.percentile(0.5) * 1000,
+                'p95_ms': entry.percentile(0.95) * 1000,
+                'p99_ms': entry.percentile(0.99) * 1000,
+                'max_ms': entry.max_seconds * 1000,
+                'total_ms': entry.seconds * 1000,
+                'queries_per_request': entry.statements / count,
+                'sql_ms_per_request': entry.sql_seconds / count * 1000,
+                'lazy_loads_per_request': entry.lazy_loads / count,
+            })
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def prometheus(self):
+        """The totals in the Prometheus text exposition format"""
+        with self._lock:
+            snapshot = [(f'endpoint="{endpoint}",method="{method}"', list(e.buckets), e.count, e.seconds,
+                         e.statements, e.sql_seconds, e.lazy_loads, sorted(e.statuses.items()))
+                        for (endpoint, method), e in sorted(self.endpoints.items())]
+
+        def header(name, kind, help_text):
+            return [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+
+        lines = header('hms_request_duration_seconds', 'histogram', 'Request latency by endpoint.')
+        for labels, buckets, count, seconds, *_ in snapshot:
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ('+Inf',), buckets):
+                cumulative += n
+                lines.append(f'hms_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'hms_request_duration_seconds_sum{{{labels}}} {seconds:.6f}')
+            lines.append(f'hms_request_duration_seconds_count{{{labels}}} {count}')
+
+        lines += header('hms_requests_total', 'counter', 'Requests by endpoint and response status.')
+        for labels, *_, statuses in snapshot:
+            lines += [f'hms_requests_total{{{labels},status="{status}"}} {n}' for status, n in statuses]
+        lines += header('hms_sql_statements_total', 'counter', 'SQL statements executed while handling requests.')
+        lines += [f'hms_sql_statements_total{{{row[0]}}} {row[4]}' for row in snapshot]
+        lines += header('hms_sql_duration_seconds_total', 'counter', 'Time spent in SQL while handling requests.')
+        lines += [f'hms_sql_duration_seconds_total{{{row[0]}}} {row[5]:.6f}' for row in snapshot]
+        lines += header('hms_orm_lazy_loads_total', 'counter', 'Relationship lazy loads that reached the database.')
+        lines += [f'hms_orm_lazy_loads_total{{{row[0]}}} {row[6]}' for row in snapshot]
+        return '\n'.join(lines) + '\n'
+
+def current_metrics():
+    """The app's Metrics, or None when instrumentation is off"""
+    return current_app.extensions.get('instrumentation')
+
+# ---- hooks ----
+# The request's stats live in a context variable rather than on g: the
+# statement hooks run for every cursor execute, and a ContextVar.get is much
+# cheaper than resolving has_request_context() and the g proxy each time.
+
+_current = ContextVar('request_stats', default=None)
+
+def _before_request():
+    stats = RequestStats()
+    stats.token = _current.set(stats)
+
+def _record_status(sender, response, **extra):
+    # request_finished is sent for every response Flask makes, hooks or not;
+    # receiving it costs less than an after_request function
+    stats = _current.get()
+    if stats is not None:
+        stats.status = response.status_code
+
+def _recorder(metrics):
+    def teardown_request(error):
+        stats = _current.get()
+        if stats is None:
+            return
+        _current.reset(stats.token)
+        seconds = time.perf_counter() - stats.started
+        current = request._get_current_object()
+        endpoint = current.url_rule.endpoint if current.url_rule else '<unmatched>'
+        metrics.record(endpoint, current.method, stats, seconds)
+    return teardown_request
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # The start time goes on the request's stats, not the execution context:
+    # statements in one request run one at a time, and a slot write is the
+    # cheapest place to keep it
+    stats = _current.get()
+    if stats is not None:
+        stats.sql_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_seconds += time.perf_counter() - stats.sql_started
+
+def _count_lazy_load(orm_execute_state):
+    # lazy_loaded_from is only set for lazy loads, not for selectin/subquery eager loads
+    stats = _current.get()
+    if stats is not None and orm_execute_state.lazy_loaded_from is not None:
+        stats.lazy_loads += 1
+
+def init_app(app):
+    """Register the request, engine and ORM hooks when INSTRUMENTATION_ENABLED (call inside an app context)"""
+    if not app.config.get('INSTRUMENTATION_ENABLED'):
+        return
+    metrics = app.extensions['instrumentation'] = Metrics()
+    app.before_request(_before_request)
+    app.teardown_request(_recorder(metrics))
+    request_finished.connect(_record_status, app)
+    for engine in db.engines.values():
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    if not event.contains(Session, 'do_orm_execute', _count_lazy_load):
+        event.listen(Session, 'do_orm_execute', _count_lazy_load)
@@ -0,0 +1,293 @@
+# Background jobs
+# Deferred side effects (counters, notifications, audit entries) are queued
+# as rows in the jobs table with enqueue(), inside the transaction that
+# caused them: the job exists if and only if that transaction commits. An
+# idempotency key makes enqueueing the same work twice a no-op.
+#
+# A JobRunner claims jobs with a compare-and-set UPDATE (queued -> running)
+# in a short transaction of its own, then runs the handler and marks the job
+# done in one transaction, so a handler's database writes happen exactly
+# once even if a worker dies halfway. Failures are retried with exponential
+# backoff up to max_attempts, then left as 'failed' with the error. A job
+# left running longer than JOB_LEASE_SECONDS (its worker died) is claimed
+# again; if the first worker was only slow, its mark-done UPDATE then matches
+# no row and it rolls its writes back instead of committing them twice.
+#
+# With JOB_WORKERS > 0 each web process starts that many worker threads on
+# its first enqueue, and commits that queue a job wake them up. Tests
+# (TESTING) and `flask run-jobs` drain the queue synchronously instead.
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+import click
+from flask import current_app, has_app_context
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from app import db
+from models.job import Job
+from utils.dialects import UPSERT_INSERTS
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}  # name -> (function(payload), max_attempts)
+CLAIM_CANDIDATES = 8
+
+def job(name, max_attempts=5):
+    """Register a function taking the payload dict as the handler for jobs called name"""
+    def register(fn):
+        HANDLERS[name] = (fn, max_attempts)
+        return fn
+    return register
+
+def enqueue(name, payload=None, key=None, delay=0, session=None):
+    """
+    Queue a job in the session's transaction; returns False if a job with
+    the same idempotency key already exists
+    """
+    session = session or db.session
+    table = Job.__table__
+    values = dict(name=name, payload=json.dumps(payload or {}), idempotency_key=key, status='queued',
+                  attempts=0, max_attempts=HANDLERS[name][1],
+                  run_after=datetime.now() + timedelta(seconds=delay))
+    insert = UPSERT_INSERTS.get(session.connection().dialect.name)
+    if insert is not None:
+        result = session.execute(insert(table).values(**values).on_conflict_do_nothing(
+            index_elements=['idempotency_key']))
+        created = result.rowcount == 1
+    else:
+        created = key is None or session.scalar(db.select(table.c.id).where(table.c.idempotency_key == key)) is None
+        if created:
+            session.execute(table.insert().values(**values))
+    if created:
+        session.info['jobs_enqueued'] = True
+    return created
+
+# ==================== Runner ====================
+
+def worker_id():
+    """host:pid:thread of the calling thread, recorded in locked_by when it claims a job"""
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'
+
+class JobRunner:
+    """Claims and runs queued jobs, inline or on a pool of daemon threads"""
+
+    def __init__(self, app, workers=2, poll_interval=1.0, lease=300, retry_delay=5, retention=86400):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.retry_delay = retry_delay
+        self.retention = retention
+        self.stats = Counter()
+        self.busy_seconds = 0.0
+        self._stats_lock = threading.Lock()
+        self._wake = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        self._last_purge = 0.0
+
+    # ---- threads ----
+
+    def start(self):
+        with self._wake:
+            if self._threads or not self.workers:
+                return
+            self._stopping = False
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        with self._wake:
+            self._stopping = True
+            self._wake.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def wake(self):
+        """A job was queued: start the threads if needed and wake one idle worker"""
+        self.start()
+        with self._wake:
+            self._wake.notify()
+
+    def _work(self):
+        worker = worker_id()
+        while not self._stopping:
+            try:
+                with self.app.app_context():
+                    ran = self.run_one(worker)
+                    if not ran and time.monotonic() - self._last_purge > 3600:
+                        self._last_purge = time.monotonic()
+                        self.purge()
+            except Exception:
+                logger.exception('Job worker %s failed; retrying', worker)
+                ran = False
+            if not ran:
+                with self._wake:
+                    if not self._stopping:
+                        self._wake.wait(self.poll_interval)
+
+    # ---- claiming and running ----
+
+    def _claim(self, worker):
+        """Mark one runnable job as ours; returns its row or None"""
+        table = Job.__table__
+        now = datetime.now()
+        candidates = db.session.execute(db.select(table.c.id, table.c.status, table.c.locked_at).where(
+            table.c.status == 'queued', table.c.run_after <= now
+        ).order_by(table.c.run_after, table.c.id).limit(CLAIM_CANDIDATES)).all()
+        if not candidates:
+            candidates = db.session.execute(db.select(table.c.id, table.c.status, table.c.locked_at).where(
+                table.c.status == 'running', table.c.locked_at < now - timedelta(seconds=self.lease)
+            ).limit(CLAIM_CANDIDATES)).all()
+        for candidate in candidates:
+            result = db.session.execute(table.update().where(
+                table.c.id == candidate.id, table.c.status == candidate.status,
+                table.c.locked_at.is_(None) if candidate.locked_at is None else table.c.locked_at == candidate.locked_at,
+            ).values(status='running', locked_by=worker, locked_at=now, attempts=table.c.attempts + 1))
+            db.session.commit()
+            if result.rowcount:
+                return db.session.execute(db.select(table).where(table.c.id == candidate.id)).one()
+        db.session.rollback()
+        return None
+
+    def run_one(self, worker=None):
+        """Claim and run one job; False if none was runnable"""
+        worker = worker or worker_id()
+        claimed = self._claim(worker)
+        if claimed is None:
+            return False
+        table = Job.__table__
+        # Still our lease: a reclaim changes locked_at even if the same worker id took it
+        mine = (table.c.id == claimed.id) & (table.c.locked_by == worker) & (table.c.locked_at == claimed.locked_at)
+        started = time.perf_counter()
+        outcome = 'succeeded'
+        try:
+            handler, _ = HANDLERS[claimed.name]
+            handler(json.loads(claimed.payload))
+            if db.session.execute(table.update().where(mine).values(
+                    status='done', finished_at=datetime.now(), last_error=None)).rowcount:
+                db.session.commit()
+            else:
+                outcome = self._lost(claimed, worker)
+        except Exception as e:
+            db.session.rollback()
+            retry = claimed.attempts < claimed.max_attempts and claimed.name in HANDLERS
+            outcome = 'retried' if retry else 'failed'
+            error = f'{type(e).__name__}: {e}' if claimed.name in HANDLERS else f'No handler for {claimed.name!r}'
+            logger.warning('Job %s (%s) attempt %s failed: %s', claimed.id, claimed.name, claimed.attempts, error)
+            delay = self.retry_delay * 2 ** (claimed.attempts - 1)
+            if db.session.execute(table.update().where(mine).values(
+                    status='queued' if retry else 'failed', run_after=datetime.now() + timedelta(seconds=delay),
+                    last_error=error[:2000], locked_by=None, finished_at=None if retry else datetime.now())).rowcount:
+                db.session.commit()
+            else:
+                outcome = self._lost(claimed, worker)
+        with self._stats_lock:
+            self.stats[outcome] += 1
+            self.busy_seconds += time.perf_counter() - started
+        return True
+
+    def _lost(self, claimed, worker):
+        """The lease ran out and another worker reclaimed the job: undo this run's writes"""
+        db.session.rollback()
+        logger.warning('Job %s (%s) was reclaimed while %s ran it; its writes were rolled back',
+                       claimed.id, claimed.name, worker)
+        return 'lost'
+
+    def run_pending(self, limit=None):
+        """Run runnable jobs until none are left (or limit); returns how many ran"""
+        count = 0
+        while (limit is None or count < limit) and self.run_one():
+            count += 1
+        return count
+
+    def purge(self):
+        """Delete finished jobs older than the retention period"""
+        table = Job.__table__
+        cutoff = datetime.now() - timedelta(seconds=self.retention)
+        result = db.session.execute(table.delete().where(table.c.status == 'done', table.c.finished_at < cutoff))
+        db.session.commit()
+        return result.rowcount
+
+    def snapshot(self):
+        with self._stats_lock:
+            ran = sum(self.stats.values())
+            return {
+                'workers': self.workers,
+                'threads_alive': sum(thread.is_alive() for thread in self._threads),
+                'succeeded': self.stats['succeeded'],
+                'retried': self.stats['retried'],
+                'failed': self.stats['failed'],
+                'lost': self.stats['lost'],
+                'avg_run_ms': round(self.busy_seconds / ran * 1000, 2) if ran else None,
+            }
+
+def current_runner():
+    """The app's JobRunner, or None outside an app or before init_app"""
+    return current_app.extensions.get('jobs') if has_app_context() else None
+
+def metrics():
+    """Job counts per name and status, the oldest runnable job's wait, and this process's runner"""
+    table = Job.__table__
+    queues = {}
+    for name, status, count in db.session.execute(db.select(
+            table.c.name, table.c.status, func.count()).group_by(table.c.name, table.c.status)):
+        queues.setdefault(name, {})[status] = count
+    oldest = db.session.scalar(db.select(func.min(table.c.run_after)).where(
+        table.c.status == 'queued', table.c.run_after <= datetime.now()))
+    runner = current_runner()
+    return {
+        'queues': queues,
+        'oldest_runnable_seconds': round((datetime.now() - oldest).total_seconds(), 1) if oldest else 0,
+        'runner': runner.snapshot() if runner else None,
+    }
+
+# ==================== Hooks ====================
+
+def _after_commit(session):
+    if session.info.pop('jobs_enqueued', None):
+        runner = current_runner()
+        if runner is not None and not runner.app.testing:
+            runner.wake()
+
+def _after_rollback(session):
+    session.info.pop('jobs_enqueued', None)
+
+def init_app(app):
+    """Create the app's runner, register the wake-up hooks and the run-jobs command"""
+    app.extensions['jobs'] = JobRunner(
+        app,
+        workers=app.config.get('JOB_WORKERS', 2),
+        poll_interval=app.config.get('JOB_POLL_SECONDS', 1.0),
+        lease=app.config.get('JOB_LEASE_SECONDS', 300),
+        retry_delay=app.config.get('JOB_RETRY_DELAY_SECONDS', 5),
+        retention=app.config.get('JOB_RETENTION_SECONDS', 86400),
+    )
+    if not event.contains(Session, 'after_commit', _after_commit):
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
+
+    @app.cli.command('run-jobs')
+    @click.option('--forever', is_flag=True, help='Keep running on JOB_WORKERS threads until interrupted.')
+    def run_jobs_command(forever):
+        """Run queued background jobs."""
+        runner = app.extensions['jobs']
+        if not forever:
+            click.echo(f'Ran {runner.run_pending()} jobs.')
+            return
+        runner.workers = runner.workers or 1
+        runner.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            runner.stop()
@@ -0,0 +1,37 @@
+# Lazy-load guard for templates
+# Views are expected to eager-load everything their template touches. With
+# RAISE_ON_TEMPLATE_LAZY_LOAD enabled (the default in debug mode), any
+# relationship load that reaches the database while a template is rendering
+# raises LazyLoadInTemplate instead of silently adding a query per row.
+# Many-to-one loads answered from the identity map never reach the database,
+# so they are not flagged.
+
+from flask import before_render_template, template_rendered, current_app, g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+class LazyLoadInTemplate(RuntimeError):
+    """Raised when a template triggers a lazy relationship load"""
+
+def _template_started(sender, template, context, **extra):
+    g._rendering_templates = g.get('_rendering_templates', 0) + 1
+
+def _template_finished(sender, template, context, **extra):
+    g._rendering_templates = max(g.get('_rendering_templates', 0) - 1, 0)
+
+def _check_orm_execute(orm_execute_state):
+    if not orm_execute_state.is_relationship_load or not has_app_context():
+        return
+    if not current_app.config.get('RAISE_ON_TEMPLATE_LAZY_LOAD') or not g.get('_rendering_templates'):
+        return
+    prop = orm_execute_state.loader_strategy_path[-1] if orm_execute_state.loader_strategy_path else None
+    raise LazyLoadInTemplate(
+        f'Template lazy-loaded {prop}; add an eager-load option to the view query')
+
+def init_app(app):
+    """Enable the guard for this app (the ORM listener is registered once per process)"""
+    app.config.setdefault('RAISE_ON_TEMPLATE_LAZY_LOAD', app.debug)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    if not event.contains(Session, 'do_orm_execute', _check_orm_execute):
+        event.listen(Session, 'do_orm_execute', _check_orm_execute)
@@ -0,0 +1,140 @@
+# Versioned schema migrations
+# db.create_all() only creates missing tables, so anything added to an existing
+# table (indexes, columns) is applied here. Each step runs once per database and
+# is recorded in the schema_migrations table. Steps are independent: one that is
+# deferred (existing data must be fixed first) is retried on the next start
+# while the others still apply, and code that relies on it can ask deferred().
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+
+schema_migrations = db.Table(
+    'schema_migrations',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('name', db.String(200), nullable=False),
+    db.Column('applied_at', db.DateTime, default=db.func.current_timestamp()),
+)
+
+class MigrationDeferred(Exception):
+    """Raised by a step that cannot run until existing data is fixed"""
+
+def _create_indexes(conn, table, names):
+    """Create the named indexes declared on a model table if they are missing"""
+    for index in table.indexes:
+        if index.name in names:
+            index.create(conn, checkfirst=True)
+
+def _hot_path_indexes(conn):
+    """Composite indexes for appointment/treatment list and double-booking queries"""
+    from models.appointment import Appointment
+    from models.treatment import Treatment
+
+    _create_indexes(conn, Appointment.__table__, {
+        'ix_appointments_doctor_slot',
+        'ix_appointments_patient_date',
+        'ix_appointments_date_time',
+        'ix_appointments_status_date',
+        'ix_appointments_created_at',
+    })
+    _create_indexes(conn, Treatment.__table__, {
+        'ix_treatments_patient_created',
+        'ix_treatments_doctor_created',
+        'ix_treatments_appointment',
+        'ix_treatments_created_at',
+    })
+
+def _active_slot_unique_index(conn):
+    """Partial unique index that makes slot booking atomic"""
+    from models.appointment import Appointment
+
+    duplicates = conn.execute(
+        db.select(Appointment.doctor_id, Appointment.appointment_date, Appointment.appointment_time)
+        .where(Appointment.status == 'Booked')
+        .group_by(Appointment.doctor_id, Appointment.appointment_date, Appointment.appointment_time)
+        .having(db.func.count() > 1)
+        .limit(5)
+    ).fetchall()
+    if duplicates:
+        raise MigrationDeferred(
+            f'double-booked slots must be resolved first (doctor_id, date, time): {duplicates}')
+
+    _create_indexes(conn, Appointment.__table__, {'uq_appointments_active_slot'})
+
+def _populate_stats_counters(conn):
+    """Fill stats_counters from the existing rows"""
+    from utils.counters import rebuild_counters
+    rebuild_counters(conn)
+
+def _search_index(conn):
+    """FTS5 patient/doctor search tables and their sync triggers (SQLite only)"""
+    if conn.dialect.name != 'sqlite':
+        return
+    from utils.search import INDEXES
+    for index in INDEXES:
+        index.create(conn)
+
+def _populate_phone_lookup(conn):
+    """Fill patient_phones from the existing patients"""
+    from utils.phones import rebuild_phones
+    rebuild_phones(conn)
+
+def _availability_index(conn):
+    """Index for per-doctor date overrides"""
+    from models.treatment import DoctorAvailability
+    _create_indexes(conn, DoctorAvailability.__table__, {'ix_doctor_availabilities_doctor_date'})
+
+def _queue_position_index(conn):
+    """Partial unique index on the check-in queue positions"""
+    from models.appointment import Appointment
+    _create_indexes(conn, Appointment.__table__, {'uq_appointments_queue_position'})
+
+def _reminder_due_index(conn):
+    """Partial index on appointments still owed a reminder"""
+    from models.appointment import Appointment
+    _create_indexes(conn, Appointment.__table__, {'ix_appointments_reminder_due'})
+
+ACTIVE_SLOT_INDEX = 2
+
+# (version, name, step) - append only, never renumber
+MIGRATIONS = [
+    (1, 'appointment and treatment hot path indexes', _hot_path_indexes),
+    (ACTIVE_SLOT_INDEX, 'unique active appointment slot', _active_slot_unique_index),
+    (3, 'populate stats counters', _populate_stats_counters),
+    (4, 'patient and doctor full-text search index', _search_index),
+    (5, 'populate normalized patient phone lookup', _populate_phone_lookup),
+    (6, 'doctor availability date index', _availability_index),
+    (7, 'unique check-in queue position', _queue_position_index),
+    (8, 'pending reminder index', _reminder_due_index),
+]
+
+def applied_versions():
+    """Return the set of migration versions already applied"""
+    with db.engine.connect() as conn:
+        return {row.version for row in conn.execute(db.select(schema_migrations.c.version))}
+
+def deferred(version):
+    """True if this process started with the migration still deferred"""
+    return version in current_app.extensions.get('deferred_migrations', ())
+
+def run_migrations():
+    """Apply pending migrations in version order, one transaction per step"""
+    schema_migrations.create(db.engine, checkfirst=True)
+    done = applied_versions()
+    skipped = current_app.extensions['deferred_migrations'] = set()
+
+    for version, name, step in MIGRATIONS:
+        if version in done:
+            continue
+        try:
+            with db.engine.begin() as conn:
+                step(conn)
+                conn.execute(schema_migrations.insert().values(version=version, name=name))
+            current_app.logger.info('Applied schema migration %s: %s', version, name)
+        except IntegrityError:
+            # Another worker recorded this version first; steps are idempotent
+            continue
+        except MigrationDeferred as e:
+            # Retried on the next start; later steps do not depend on it
+            current_app.logger.warning('Schema migration %s deferred: %s', version, e)
+            skipped.add(version)
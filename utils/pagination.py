@@ -0,0 +1,81 @@
+# Keyset (cursor) pagination for the JSON API
+# Page-number pagination runs a COUNT(*) and an OFFSET scan, so deep pages get
+# linearly slower. A keyset page instead filters on the sort key of the last
+# row returned, e.g. (appointment_date, appointment_time, id) < (...), which an
+# index answers directly. The key travels to the client as an opaque token.
+
+import base64
+import json
+from datetime import date
+from sqlalchemy import tuple_
+
+class InvalidCursor(ValueError):
+    """Raised when an after= token cannot be decoded for this listing"""
+
+def encode_cursor(values):
+    """Opaque token for a row's sort key"""
+    payload = json.dumps([v.isoformat() if isinstance(v, date) else v for v in values],
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def _sort_value(column, value):
+    """A decoded token value as the column's Python type (raises ValueError if it is not one)"""
+    python_type = column.type.python_type
+    if issubclass(python_type, date):
+        # Dates and datetimes travel as ISO strings
+        if not isinstance(value, str):
+            raise ValueError
+        return python_type.fromisoformat(value)
+    if python_type is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    # bool is an int subclass, so it would pass for an integer column
+    if not isinstance(value, python_type) or (isinstance(value, bool) and python_type is not bool):
+        raise ValueError
+    return value
+
+def decode_cursor(token, columns):
+    """Sort key values for the given columns from a token made by encode_cursor()"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [_sort_value(column, v) for column, v in zip(columns, values)]
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid pagination cursor')
+
+class KeysetPage:
+    """One page of rows plus the token for the next one"""
+
+    def __init__(self, items, per_page, next_cursor):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+
+    @property
+    def has_more(self):
+        return self.next_cursor is not None
+
+    def to_dict(self):
+        return {'per_page': self.per_page, 'after': self.next_cursor, 'has_more': self.has_more}
+
+def keyset_paginate(query, columns, after=None, per_page=20, descending=False):
+    """
+    Return the page of query rows that follows the `after` token.
+    columns must end in a unique column (usually the primary key); the query's
+    own ordering is replaced by these columns, all in the same direction.
+    """
+    per_page = max(per_page, 1)
+    if after:
+        key = tuple_(*columns)
+        values = tuple_(*decode_cursor(after, columns))
+        query = query.filter(key < values if descending else key > values)
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(None).order_by(*order).limit(per_page + 1).all()
+
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+    return KeysetPage(items, per_page, next_cursor)
@@ -0,0 +1,71 @@
+# Password hashing policy
+# PASSWORD_HASH_METHOD picks the Werkzeug algorithm and cost for new hashes
+# (e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'). A stored hash made with
+# other parameters still verifies, and login replaces it with one made under
+# the current policy.
+# With PASSWORD_VERIFY_WORKERS > 0, verification runs in a bounded process
+# pool: the request thread waits without holding the GIL, and at most
+# workers * PASSWORD_VERIFY_QUEUE checks are in flight; further callers block.
+
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULTS = {
+    'PASSWORD_HASH_METHOD': 'scrypt',
+    'PASSWORD_VERIFY_WORKERS': 0,
+    'PASSWORD_VERIFY_QUEUE': 4,
+}
+
+_pool = None
+_slots = None
+_pool_shape = None  # (workers, queue) the pool and semaphore were made for
+_pool_lock = threading.Lock()
+
+def _setting(name):
+    if has_app_context():
+        return current_app.config.get(name, DEFAULTS[name])
+    return DEFAULTS[name]
+
+@lru_cache(maxsize=None)
+def method_parameters(method):
+    """The full 'algorithm:cost...' prefix Werkzeug writes for a method ('scrypt' -> 'scrypt:32768:8:1')"""
+    return generate_password_hash('', method, salt_length=1).split('$', 1)[0]
+
+def hash_password(password):
+    """Hash with the configured algorithm and cost"""
+    return generate_password_hash(password, method=_setting('PASSWORD_HASH_METHOD'))
+
+def needs_rehash(pwhash):
+    """True if a stored hash was made with other parameters than the current policy"""
+    return pwhash.split('$', 1)[0] != method_parameters(_setting('PASSWORD_HASH_METHOD'))
+
+def _executor(workers, queue):
+    global _pool, _slots, _pool_shape
+    with _pool_lock:
+        if _pool is None or _pool_shape != (workers, queue):
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _slots = threading.BoundedSemaphore(workers * queue)
+            _pool_shape = (workers, queue)
+        return _pool, _slots
+
+def verify_password(pwhash, password):
+    """check_password_hash, in the verification pool when one is configured"""
+    workers = _setting('PASSWORD_VERIFY_WORKERS')
+    if not workers:
+        return check_password_hash(pwhash, password)
+    pool, slots = _executor(workers, _setting('PASSWORD_VERIFY_QUEUE'))
+    with slots:
+        return pool.submit(check_password_hash, pwhash, password).result()
+
+def shutdown_pool():
+    """Stop the verification pool (it is restarted on next use)"""
+    global _pool, _pool_shape
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = _pool_shape = None
@@ -0,0 +1,181 @@
+# Check-in queue
+# Each doctor has one queue per day. Checking in gives an appointment the
+# next queue_position from its doctor_queues row; the increment runs as an
+# UPDATE inside the check-in transaction, so concurrent check-ins are
+# serialised on that row and never share or skip a number. The partial
+# unique index uq_appointments_queue_position backs this up.
+#
+# Waiting patients are the Booked appointments with a position above
+# serving_position (the last one called). Call-next, skip and no-show are
+# each an index seek on (doctor_id, appointment_date, queue_position) plus a
+# single-row update, so they stay O(log n) for queues of hundreds. Call-next
+# moves serving_position with a compare-and-set, so two doctors' assistants
+# clicking at once cannot call the same patient.
+
+from datetime import date, datetime
+from app import db
+from models.doctor import Doctor
+from models.appointment import Appointment
+from models.doctor_queue import DoctorQueue
+from utils.availability import DEFAULT_SLOT_MINUTES
+from utils import events
+from utils.dialects import UPSERT_INSERTS
+
+WAITING_STATUS = 'Booked'
+NO_SHOW_STATUS = 'No-show'
+CALL_ATTEMPTS = 5
+
+class QueueError(Exception):
+    """Raised when a queue operation does not apply to the appointment"""
+
+class PatientQueue:
+    """One doctor's check-in queue for one day"""
+
+    def __init__(self, doctor_id, day=None, session=None):
+        self.doctor_id = doctor_id
+        self.day = day or date.today()
+        self.session = session or db.session
+        self.table = DoctorQueue.__table__
+
+    def _where(self):
+        return (self.table.c.doctor_id == self.doctor_id) & (self.table.c.date == self.day)
+
+    def state(self):
+        """(last_position, serving_position, called_at); zeros before the first check-in"""
+        row = self.session.execute(db.select(
+            self.table.c.last_position, self.table.c.serving_position, self.table.c.called_at
+        ).where(self._where())).first()
+        return tuple(row) if row else (0, 0, None)
+
+    def _next_position(self):
+        """Hand out the next position; the row stays locked until the transaction ends"""
+        insert = UPSERT_INSERTS.get(self.session.connection().dialect.name)
+        if insert is not None:
+            # The day's first check-ins may race to create the row
+            self.session.execute(insert(self.table).values(
+                doctor_id=self.doctor_id, date=self.day, last_position=0, serving_position=0,
+            ).on_conflict_do_nothing(index_elements=['doctor_id', 'date']))
+        result = self.session.execute(self.table.update().where(self._where()).values(
+            last_position=self.table.c.last_position + 1))
+        if result.rowcount == 0:
+            self.session.execute(self.table.insert().values(
+                doctor_id=self.doctor_id, date=self.day, last_position=1, serving_position=0))
+        return self.session.scalar(db.select(self.table.c.last_position).where(self._where()))
+
+    def _check(self, appointment):
+        if appointment.doctor_id != self.doctor_id or appointment.appointment_date != self.day:
+            raise QueueError("Appointment is not in this doctor's queue for the day")
+
+    def _waiting(self, serving):
+        return Appointment.query.filter(
+            Appointment.doctor_id == self.doctor_id,
+            Appointment.appointment_date == self.day,
+            Appointment.queue_position > serving,
+            Appointment.status == WAITING_STATUS,
+        )
+
+    def check_in(self, appointment):
+        """Give a Booked appointment the next position (again returns the one it has)"""
+        self._check(appointment)
+        if appointment.status != WAITING_STATUS:
+            raise QueueError(f'Only booked appointments can check in (status: {appointment.status})')
+        if appointment.queue_position is None:
+            appointment.queue_position = self._next_position()
+            self.session.flush()
+        return appointment.queue_position
+
+    def call_next(self):
+        """Call the first waiting patient; returns their appointment, or None if nobody waits"""
+        for _ in range(CALL_ATTEMPTS):
+            _, serving, _ = self.state()
+            head = self._waiting(serving).order_by(Appointment.queue_position).first()
+            if head is None:
+                return None
+            result = self.session.execute(self.table.update().where(
+                self._where(), self.table.c.serving_position == serving
+            ).values(serving_position=head.queue_position, called_at=datetime.now()))
+            if result.rowcount:
+                self._announce(head)
+                return head
+            # Someone else called a patient in between; look again
+        raise QueueError('The queue is busy, please try again')
+
+    def _announce(self, head):
+        """Stage the call for the doctor's feed and for the feeds of everyone still waiting"""
+        call = {'doctor_id': self.doctor_id, 'date': self.day.isoformat(), 'now_serving': head.queue_position}
+        events.stage(self.session, self.doctor_id, 'queue', dict(call, appointment_id=head.id),
+                     ('queue', self.doctor_id, self.day))
+        # Patients only learn whether it is their own appointment being called
+        waiting = self._waiting(head.queue_position).with_entities(Appointment.id, Appointment.patient_id)
+        for appointment_id, patient_id in [(head.id, head.patient_id)] + waiting.all():
+            events.stage(self.session, events.patient_channel(patient_id), 'queue',
+                         dict(call, appointment_id=appointment_id, called=appointment_id == head.id),
+                         ('queue', patient_id, self.doctor_id, self.day))
+
+    def skip(self, appointment):
+        """Send a waiting or just-called patient to the back of the queue"""
+        self._check(appointment)
+        if appointment.status != WAITING_STATUS or appointment.queue_position is None:
+            raise QueueError('Only checked-in patients who have not been seen can be skipped')
+        appointment.queue_position = self._next_position()
+        self.session.flush()
+        return appointment.queue_position
+
+    def no_show(self, appointment):
+        """Mark a checked-in patient as not present; they leave the queue"""
+        self._check(appointment)
+        if appointment.status != WAITING_STATUS or appointment.queue_position is None:
+            raise QueueError('Only checked-in patients who have not been seen can be marked no-show')
+        appointment.status = NO_SHOW_STATUS
+        self.session.flush()
+
+    # ---- wait estimates ----
+
+    def _step(self):
+        step = self.session.scalar(db.select(Doctor.avg_consultation_time).where(Doctor.id == self.doctor_id))
+        return step or DEFAULT_SLOT_MINUTES
+
+    def _in_progress(self, serving, called_at, step, now):
+        """Minutes left with the patient called last, assuming a full consultation"""
+        if not serving or called_at is None:
+            return 0
+        current = self.session.scalar(db.select(Appointment.status).where(
+            Appointment.doctor_id == self.doctor_id, Appointment.appointment_date == self.day,
+            Appointment.queue_position == serving))
+        if current != WAITING_STATUS:
+            return 0
+        elapsed = (now - called_at).total_seconds() / 60
+        return max(step - elapsed, 0)
+
+    def estimate(self, appointment, now=None):
+        """(patients ahead, estimated minutes until called) for a checked-in appointment"""
+        self._check(appointment)
+        if appointment.queue_position is None:
+            raise QueueError('Appointment has not checked in')
+        _, serving, called_at = self.state()
+        if appointment.status != WAITING_STATUS or appointment.queue_position <= serving:
+            return 0, 0
+        ahead = self._waiting(serving).filter(Appointment.queue_position < appointment.queue_position).count()
+        step = self._step()
+        return ahead, round(ahead * step + self._in_progress(serving, called_at, step, now or datetime.now()))
+
+    def snapshot(self, now=None):
+        """The queue as a dict: now serving and every waiting patient with their estimate"""
+        _, serving, called_at = self.state()
+        step = self._step()
+        remaining = self._in_progress(serving, called_at, step, now or datetime.now())
+        waiting = self._waiting(serving).order_by(Appointment.queue_position).all()
+        return {
+            'doctor_id': self.doctor_id,
+            'date': self.day.isoformat(),
+            'slot_minutes': step,
+            'now_serving': serving or None,
+            'called_at': called_at.isoformat() if called_at else None,
+            'waiting': [{
+                'appointment_id': appointment.id,
+                'patient_id': appointment.patient_id,
+                'position': appointment.queue_position,
+                'ahead': ahead,
+                'estimated_wait_minutes': round(ahead * step + remaining),
+            } for ahead, appointment in enumerate(waiting)],
+        }
@@ -0,0 +1,122 @@
+# Normalized phone lookup
+# patient_phones holds every patient phone number as digits only, with the
+# country code or trunk prefix dropped (the last PHONE_NATIONAL_DIGITS
+# digits), plus the same digits reversed. "+91 98765-43210", "098765 43210"
+# and "9876543210" all become 9876543210. An exact lookup is an index seek on
+# digits; a "last 4-6 digits" lookup is a prefix range on reversed_digits, so
+# both are O(log n) instead of a leading-wildcard scan.
+# An after_flush hook keeps the table current for ORM writes; Core inserts
+# (the bulk importer) call sync_phones() themselves.
+
+import click
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app import db
+from models.patient import Patient
+from models.patient_phone import PatientPhone
+
+FIELDS = ('phone', 'alternate_phone')
+MIN_SUFFIX_DIGITS = 4
+
+def national_digits():
+    if has_app_context():
+        return current_app.config.get('PHONE_NATIONAL_DIGITS', 10)
+    return 10
+
+def normalize(number):
+    """Digits of a phone number without country code or trunk prefix ('' if none)"""
+    digits = ''.join(char for char in number or '' if char.isdigit())
+    return digits[-national_digits():]
+
+def phone_rows(patient_id, values):
+    """patient_phones rows for one patient; values maps field name to the raw number"""
+    rows = []
+    for field in FIELDS:
+        digits = normalize(values.get(field))
+        if digits:
+            rows.append({'patient_id': patient_id, 'field': field,
+                         'digits': digits, 'reversed_digits': digits[::-1]})
+    return rows
+
+def sync_phones(conn, patients):
+    """Replace the stored numbers of the given {patient_id: {field: number}}"""
+    table = PatientPhone.__table__
+    ids = list(patients)
+    for start in range(0, len(ids), 500):
+        conn.execute(table.delete().where(table.c.patient_id.in_(ids[start:start + 500])))
+    rows = [row for patient_id, values in patients.items() for row in phone_rows(patient_id, values)]
+    if rows:
+        conn.execute(table.insert(), rows)
+
+def matching(number, match='auto'):
+    """
+    Subquery of patient ids whose phone matches number: 'exact' on the national
+    digits, 'suffix' on the last digits, or 'auto' (exact for a full number).
+    Returns None if number has too few digits.
+    """
+    digits = normalize(number)
+    if match == 'auto':
+        match = 'exact' if len(digits) >= national_digits() else 'suffix'
+    if match == 'exact' and digits:
+        condition = PatientPhone.digits == digits
+    elif match == 'suffix' and len(digits) >= MIN_SUFFIX_DIGITS:
+        # ':' sorts right after '9', so this is every value starting with the reversed digits
+        reversed_digits = digits[::-1]
+        condition = (PatientPhone.reversed_digits >= reversed_digits) & \
+                    (PatientPhone.reversed_digits < reversed_digits + ':')
+    else:
+        return None
+    return db.select(PatientPhone.patient_id).where(condition)
+
+def looks_like_phone(text):
+    """True for input made of digits and phone punctuation, with enough digits to look up"""
+    return (sum(char.isdigit() for char in text) >= MIN_SUFFIX_DIGITS
+            and all(char.isdigit() or char in ' +-().' for char in text))
+
+def _changed(session):
+    """{patient_id: {field: number}} for patients whose numbers changed in this flush"""
+    changed = {}
+    for obj in session.new:
+        if isinstance(obj, Patient):
+            changed[obj.id] = {field: getattr(obj, field) for field in FIELDS}
+    for obj in session.dirty:
+        if isinstance(obj, Patient) and any(inspect(obj).attrs[field].history.has_changes() for field in FIELDS):
+            changed[obj.id] = {field: getattr(obj, field) for field in FIELDS}
+    for obj in session.deleted:
+        if isinstance(obj, Patient):
+            changed[obj.id] = {}
+    return changed
+
+def _after_flush(session, flush_context):
+    changed = _changed(session)
+    if changed:
+        sync_phones(session.connection(), changed)
+
+def rebuild_phones(conn):
+    """Refill patient_phones from the patients table"""
+    conn.execute(PatientPhone.__table__.delete())
+    last_id = 0
+    while True:
+        batch = conn.execute(
+            db.select(Patient.id, Patient.phone, Patient.alternate_phone)
+            .where(Patient.id > last_id).order_by(Patient.id).limit(5000)
+        ).all()
+        if not batch:
+            return
+        rows = [row for p in batch for row in phone_rows(p.id, p._mapping)]
+        if rows:
+            conn.execute(PatientPhone.__table__.insert(), rows)
+        last_id = batch[-1].id
+
+def init_app(app):
+    """Register the flush hook (once per process) and the rebuild command"""
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+
+    @app.cli.command('rebuild-phones')
+    def rebuild_phones_command():
+        """Recompute the normalized phone lookup table."""
+        with db.engine.begin() as conn:
+            rebuild_phones(conn)
+        click.echo('Rebuilt patient phone lookup.')
@@ -0,0 +1,203 @@
+# Appointment reminders
+# `flask send-reminders` (run nightly by cron or a timer) sends one reminder
+# per upcoming appointment whose patient has notifications enabled, through
+# the transport for the patient's notification_preference (email, sms,
+# whatsapp). Transports are pluggable objects with a send() method; the
+# built-in ones log the messages or append them to NDJSON files in an outbox
+# directory, as stand-ins for a real mail or SMS gateway.
+#
+# Due appointments are read in keyset batches over the partial index
+# ix_appointments_reminder_due, so each batch is an index range scan however
+# many reminders are already sent. A batch is grouped by channel and sent in
+# chunks on a small thread pool (REMINDER_CONCURRENCY sends in flight). Only
+# then are the delivered ids marked reminder_sent, with one bulk UPDATE per
+# batch in its own short transaction; no lock is held while sending.
+# Failed or undeliverable reminders stay unmarked and are retried next run.
+# Runs should not overlap: two at once may send some reminders twice.
+
+import json
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import click
+from sqlalchemy import tuple_
+from sqlalchemy.orm import aliased
+from app import db
+from models.user import User
+from models.doctor import Doctor
+from models.patient import Patient
+from models.appointment import Appointment
+from utils.stats import UPCOMING_STATUSES
+
+logger = logging.getLogger(__name__)
+
+CHANNELS = ('email', 'sms', 'whatsapp')
+UPDATE_CHUNK = 500  # ids per UPDATE ... IN (...), below SQLite's variable limit
+
+Reminder = namedtuple('Reminder', 'appointment_id channel address patient_name doctor_name date time')
+
+def message(reminder):
+    return (f'Hello {reminder.patient_name}, this is a reminder of your appointment with '
+            f'Dr. {reminder.doctor_name} on {reminder.date:%d %b %Y} at {reminder.time}.')
+
+# ==================== Transports ====================
+
+class Transport(ABC):
+    """Delivers one channel's reminders"""
+
+    @abstractmethod
+    def send(self, reminders):
+        """Deliver a non-empty list of Reminders and return the appointment ids delivered"""
+
+class LogTransport(Transport):
+    """Writes each reminder to the application log"""
+
+    def send(self, reminders):
+        for reminder in reminders:
+            logger.info('%s to %s: %s', reminder.channel, reminder.address, message(reminder))
+        return [reminder.appointment_id for reminder in reminders]
+
+class FileTransport(Transport):
+    """Appends reminders as NDJSON lines to <directory>/<channel>.ndjson"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def send(self, reminders):
+        lines = ''.join(json.dumps({
+            'appointment_id': r.appointment_id, 'to': r.address, 'message': message(r),
+        }) + '\n' for r in reminders)
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(os.path.join(self.directory, f'{reminders[0].channel}.ndjson'), 'a') as f:
+            f.write(lines)
+        return [reminder.appointment_id for reminder in reminders]
+
+def default_transports(config):
+    """{channel: Transport} for REMINDER_TRANSPORT ('log' or 'file')"""
+    if config.get('REMINDER_TRANSPORT', 'log') == 'file':
+        transport = FileTransport(config.get('REMINDER_OUTBOX', 'outbox'))
+    else:
+        transport = LogTransport()
+    return {channel: transport for channel in CHANNELS}
+
+# ==================== Dispatch ====================
+
+PatientUser = aliased(User)
+DoctorUser = aliased(User)
+
+# Written out literally so SQLite can match the partial index's WHERE clause
+DUE = db.and_(
+    Appointment.reminder_sent == db.false(),
+    Appointment.status.in_([db.literal_column(f"'{status}'") for status in UPCOMING_STATUSES]),
+)
+
+def due_batch(start, end, after=None, limit=1000):
+    """Up to limit due reminders in (appointment_date, id) order, following the after key"""
+    query = (db.select(Appointment.id, Appointment.appointment_date, Appointment.appointment_time,
+                       Patient.notification_preference, Patient.phone, Patient.alternate_phone,
+                       PatientUser.email, PatientUser.username.label('patient_name'),
+                       DoctorUser.username.label('doctor_name'))
+             .join(Patient, Patient.id == Appointment.patient_id)
+             .join(PatientUser, PatientUser.id == Patient.user_id)
+             .join(Doctor, Doctor.id == Appointment.doctor_id)
+             .join(DoctorUser, DoctorUser.id == Doctor.user_id)
+             .where(DUE, Appointment.appointment_date.between(start, end),
+                    Patient.enable_notifications.isnot(False)))
+    if after:
+        query = query.where(tuple_(Appointment.appointment_date, Appointment.id) > tuple_(*after))
+    return db.session.execute(query.order_by(Appointment.appointment_date, Appointment.id).limit(limit)).all()
+
+def to_reminder(row):
+    """The Reminder for a due_batch row, or None if the patient has no address for the channel"""
+    channel = row.notification_preference if row.notification_preference in CHANNELS else 'email'
+    address = row.email if channel == 'email' else (row.phone or row.alternate_phone)
+    if not address:
+        return None
+    return Reminder(row.id, channel, address, row.patient_name, row.doctor_name,
+                    row.appointment_date, row.appointment_time)
+
+def mark_sent(ids):
+    """Set reminder_sent on the given appointments in one short transaction"""
+    ids = sorted(ids)
+    for start in range(0, len(ids), UPDATE_CHUNK):
+        db.session.execute(db.update(Appointment).where(Appointment.id.in_(ids[start:start + UPDATE_CHUNK]))
+                           .values(reminder_sent=True).execution_options(synchronize_session=False))
+    db.session.commit()
+
+class ReminderDispatcher:
+    """Sends the due reminders for a date range in batches"""
+
+    def __init__(self, transports, batch_size=1000, chunk_size=200, concurrency=4):
+        self.transports = transports
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+
+    def _send(self, transport, chunk):
+        try:
+            return chunk, set(transport.send(chunk))
+        except Exception:
+            logger.exception('Sending %d %s reminders failed', len(chunk), chunk[0].channel)
+            return chunk, set()
+
+    def run(self, start, end):
+        """Send reminders for appointments dated start..end; returns a Counter of outcomes"""
+        report = Counter()
+        after = None
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while True:
+                rows = due_batch(start, end, after, self.batch_size)
+                # Nothing written yet: end the read transaction before the slow part
+                db.session.rollback()
+                if not rows:
+                    return report
+                after = (rows[-1].appointment_date, rows[-1].id)
+
+                by_channel = {}
+                for row in rows:
+                    reminder = to_reminder(row)
+                    if reminder is None:
+                        report['undeliverable'] += 1
+                    elif reminder.channel not in self.transports:
+                        report['no_transport'] += 1
+                    else:
+                        by_channel.setdefault(reminder.channel, []).append(reminder)
+
+                futures = [pool.submit(self._send, self.transports[channel], reminders[i:i + self.chunk_size])
+                           for channel, reminders in by_channel.items()
+                           for i in range(0, len(reminders), self.chunk_size)]
+                delivered = set()
+                for future in futures:
+                    chunk, sent = future.result()
+                    for reminder in chunk:
+                        report[f'{reminder.channel}_sent' if reminder.appointment_id in sent else 'failed'] += 1
+                    delivered |= sent
+                if delivered:
+                    mark_sent(delivered)
+
+def dispatcher(app):
+    """A ReminderDispatcher configured from the app's settings"""
+    return ReminderDispatcher(
+        app.extensions['reminder_transports'],
+        batch_size=app.config.get('REMINDER_BATCH_SIZE', 1000),
+        chunk_size=app.config.get('REMINDER_CHUNK_SIZE', 200),
+        concurrency=app.config.get('REMINDER_CONCURRENCY', 4),
+    )
+
+def init_app(app):
+    """Set up the default transports and register the send-reminders command"""
+    # Replace entries to plug in a real gateway, e.g. app.extensions['reminder_transports']['sms'] = ...
+    app.extensions['reminder_transports'] = default_transports(app.config)
+
+    @app.cli.command('send-reminders')
+    @click.option('--days', default=1, show_default=True, help='Remind appointments up to this many days ahead.')
+    def send_reminders_command(days):
+        """Send reminders for upcoming appointments that have not had one."""
+        start = date.today() + timedelta(days=1)
+        report = dispatcher(app).run(start, start + timedelta(days=days - 1))
+        click.echo(', '.join(f'{key}: {count}' for key, count in sorted(report.items())) or 'No reminders due.')
@@ -0,0 +1,88 @@
+# Read-replica routing
+# With a 'replica' entry in SQLALCHEMY_BINDS, requests to the endpoints or
+# blueprints listed in REPLICA_ENDPOINTS read through the replica engine while
+# everything else, and every flush, goes to the primary.
+# Core INSERT/UPDATE/DELETE statements run through the session go to the
+# primary too, and so do textual statements (db.text) that write: those whose
+# first keyword is not SELECT, or a WITH query that contains INSERT, UPDATE,
+# DELETE or REPLACE. Read-your-writes: a request that writes (an ORM flush, a Core
+# write through the session, or pin_to_primary() for statements run on an
+# engine directly) keeps its user on the primary for
+# REPLICA_STICKY_SECONDS, e.g. a patient viewing the appointment they just booked.
+# This module must not import app: app.py passes RoutingSession to SQLAlchemy().
+
+import re
+import time
+from flask import current_app, g, has_request_context, request, session as cookie_session
+from flask_login import current_user
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+REPLICA_BIND = 'replica'
+STICKY_KEY = '_primary_until'
+# Leading comments and the first keyword of a textual statement
+FIRST_KEYWORD = re.compile(r'\s*(?:(?:--[^\n]*\n|/\*.*?\*/)\s*)*(\w+)', re.S)
+CTE_WRITE = re.compile(r'\b(?:INSERT|UPDATE|DELETE|REPLACE)\b', re.I)
+
+def _writes(clause):
+    """True for Core DML and for textual statements that may write"""
+    if isinstance(clause, UpdateBase):
+        return True
+    if not isinstance(clause, TextClause):
+        return False
+    match = FIRST_KEYWORD.match(clause.text)
+    keyword = match.group(1).upper() if match else ''
+    if keyword == 'WITH':
+        return bool(CTE_WRITE.search(clause.text))
+    return keyword != 'SELECT'
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica while the request allows it"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if _writes(clause):
+            pin_to_primary()
+        elif bind is None and not self._flushing and _replica_allowed():
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def _replica_allowed():
+    return has_request_context() and g.get('_use_replica', False) and not g.get('_wrote', False)
+
+def pin_to_primary():
+    """Read from the primary for the rest of this request and the sticky window"""
+    if has_request_context():
+        g._wrote = True
+
+def _after_flush(session, flush_context):
+    pin_to_primary()
+
+def _routes_to_replica(endpoint):
+    if not endpoint:
+        return False
+    targets = current_app.config.get('REPLICA_ENDPOINTS', ())
+    return endpoint in targets or endpoint.split('.', 1)[0] in targets
+
+def _before_request():
+    g._wrote = False
+    g._use_replica = (
+        REPLICA_BIND in current_app.config.get('SQLALCHEMY_BINDS', {})
+        and _routes_to_replica(request.endpoint)
+        and cookie_session.get(STICKY_KEY, 0) < time.time()
+    )
+
+def _after_request(response):
+    if g.get('_wrote') and current_user.is_authenticated:
+        cookie_session[STICKY_KEY] = time.time() + current_app.config.get('REPLICA_STICKY_SECONDS', 10)
+    return response
+
+def init_app(app):
+    """Install the per-request routing hooks (the flush listener is registered once per process)"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    if not event.contains(RoutingSession, 'after_flush', _after_flush):
+        event.listen(RoutingSession, 'after_flush', _after_flush)
@@ -0,0 +1,411 @@
+# Per-(doctor, date) schedule cache
+# A DayCalendar holds one doctor's active bookings on one date as an
+# occupancy bitmap, one bit per avg_consultation_time slot counted from
+# midnight (a 09:30 booking with 30-minute slots sets bit 19). Bookings off
+# that grid, or a second booking at the same time, go in a small overflow
+# tuple. The date's DoctorAvailability overrides ride along. Calendars live
+# in an in-process LRU (app.extensions['schedule_cache']).
+#
+# schedule_versions holds a version per (doctor, date), bumped in the same
+# transaction as any booking or override change (after_flush hook; Core
+# writers call bump_versions() themselves). Other processes therefore notice
+# a change the next time they compare versions: listings compare a whole
+# range in one small query, and a cached "taken" answer is confirmed with a
+# primary key lookup before a booking is refused. A calendar is loaded in
+# the same statement as its version, so it is never newer than its stamp.
+# After a commit this process patches its own calendars instead of
+# reloading them.
+
+import threading
+from collections import OrderedDict
+from datetime import date
+from functools import lru_cache
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, literal, type_coerce, union_all
+from sqlalchemy.orm import Session
+from app import db
+from models.appointment import Appointment
+from models.treatment import DoctorAvailability
+from models.schedule_version import ScheduleVersion
+from utils.dialects import UPSERT_INSERTS
+from utils.stats import UPCOMING_STATUSES
+
+RELOAD = ('reload', None)  # a change that cannot be patched into a cached calendar
+
+@lru_cache(maxsize=4096)
+def to_minutes(value):
+    """'HH:MM' (or 'HH:MM:SS') to minutes after midnight, None if unusable"""
+    try:
+        hours, minutes = str(value).split(':')[:2]
+        total = int(hours) * 60 + int(minutes)
+    except (TypeError, ValueError):
+        return None
+    return total if 0 <= total < 24 * 60 else None
+
+class DayCalendar:
+    """One doctor's active bookings and availability overrides on one date"""
+
+    __slots__ = ('version', 'step', 'bits', 'extra', 'overrides')
+
+    def __init__(self, version, step, booked=(), overrides=()):
+        self.version = version
+        self.step = step
+        self.bits = 0
+        self.extra = ()
+        self.overrides = tuple(overrides)
+        for minutes in booked:
+            self._add(minutes)
+
+    def _add(self, minutes):
+        slot, offset = divmod(minutes, self.step)
+        if offset or self.bits >> slot & 1:
+            self.extra += (minutes,)
+        else:
+            self.bits |= 1 << slot
+
+    def _remove(self, minutes):
+        if minutes in self.extra:
+            extra = list(self.extra)
+            extra.remove(minutes)
+            self.extra = tuple(extra)
+        elif minutes % self.step == 0:
+            self.bits &= ~(1 << minutes // self.step)
+
+    def booked(self, minutes):
+        """True if a booking starts exactly at minutes"""
+        slot, offset = divmod(minutes, self.step)
+        return (not offset and bool(self.bits >> slot & 1)) or minutes in self.extra
+
+    def blocks(self, minutes):
+        """True if any booking overlaps a slot starting at minutes"""
+        slot, offset = divmod(minutes, self.step)
+        # Grid bookings within one step: this slot's bit, and the next one if off the grid
+        if self.bits >> slot & 1 or (offset and self.bits >> slot + 1 & 1):
+            return True
+        return any(abs(minutes - booked) < self.step for booked in self.extra)
+
+    @property
+    def empty(self):
+        return not self.bits and not self.extra
+
+    def changed(self, deltas, version):
+        """A copy with ('add' | 'remove', minutes) deltas applied, at version"""
+        calendar = DayCalendar(version, self.step, overrides=self.overrides)
+        calendar.bits, calendar.extra = self.bits, self.extra
+        for action, minutes in deltas:
+            if action == 'add':
+                calendar._add(minutes)
+            else:
+                calendar._remove(minutes)
+        return calendar
+
+class ScheduleCache:
+    """Thread-safe LRU of DayCalendars keyed by (doctor_id, date)"""
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, calendar):
+        with self._lock:
+            self._entries[key] = calendar
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+def current_cache():
+    """The app's ScheduleCache, or None outside an app or before init_app"""
+    return current_app.extensions.get('schedule_cache') if has_app_context() else None
+
+# ---- loading ----
+
+def _versions(doctor_ids, start, end):
+    rows = db.session.execute(db.select(ScheduleVersion.doctor_id, ScheduleVersion.date, ScheduleVersion.version).where(
+        ScheduleVersion.doctor_id.in_(doctor_ids), ScheduleVersion.date.between(start, end))).all()
+    return {(doctor_id, day): version for doctor_id, day, version in rows}
+
+def _days(start, end):
+    return [date.fromordinal(ordinal) for ordinal in range(start.toordinal(), end.toordinal() + 1)]
+
+def _fetch(steps, start, end):
+    """Fresh calendars for every doctor in steps and every day from start to end, in one query"""
+    doctor_ids = list(steps)
+    # 'value' is is_available for overrides and the version for version rows
+    bookings = db.select(
+        literal('booking').label('kind'),
+        Appointment.doctor_id.label('doctor_id'),
+        type_coerce(Appointment.appointment_date, db.String).label('day'),
+        Appointment.appointment_time.label('start_time'),
+        literal(None).label('end_time'),
+        literal(None).label('value'),
+    ).where(
+        Appointment.doctor_id.in_(doctor_ids),
+        Appointment.appointment_date.between(start, end),
+        Appointment.status.in_(UPCOMING_STATUSES),
+    )
+    overrides = db.select(
+        literal('override'),
+        DoctorAvailability.doctor_id,
+        DoctorAvailability.date,
+        DoctorAvailability.start_time,
+        DoctorAvailability.end_time,
+        DoctorAvailability.is_available,
+    ).where(
+        DoctorAvailability.doctor_id.in_(doctor_ids),
+        DoctorAvailability.date.between(start, end),
+    )
+    versions = db.select(
+        literal('version'),
+        ScheduleVersion.doctor_id,
+        ScheduleVersion.date,
+        literal(None),
+        literal(None),
+        ScheduleVersion.version,
+    ).where(
+        ScheduleVersion.doctor_id.in_(doctor_ids),
+        ScheduleVersion.date.between(start, end),
+    )
+
+    # SQLite days come back as ISO strings, parsed once per distinct day rather than per row
+    days, booked, dated, stamped = {}, {}, {}, {}
+    for kind, doctor_id, day, start_time, end_time, value in db.session.execute(
+            union_all(bookings, overrides, versions)).all():
+        if day not in days:
+            days[day] = date.fromisoformat(day) if isinstance(day, str) else day
+        key = (doctor_id, days[day])
+        if kind == 'booking':
+            minutes = to_minutes(start_time)
+            if minutes is not None:
+                booked.setdefault(key, []).append(minutes)
+        elif kind == 'override':
+            available = value is None or bool(value)  # the column defaults to True
+            dated.setdefault(key, []).append((start_time, end_time, available))
+        else:
+            stamped[key] = value
+
+    return {(doctor_id, day): DayCalendar(stamped.get((doctor_id, day), 0), step,
+                                          booked.get((doctor_id, day), ()), dated.get((doctor_id, day), ()))
+            for doctor_id, step in steps.items() for day in _days(start, end)}
+
+def load(steps, start, end):
+    """
+    {doctor_id: {date: DayCalendar}} from start to end for the doctors in
+    steps ({doctor_id: slot minutes}). Cached calendars are reused while their
+    version is current; the rest are fetched in one query.
+    """
+    cache = current_cache()
+    days = _days(start, end)
+    cached = {}
+    if cache is not None:
+        for doctor_id in steps:
+            for day in days:
+                calendar = cache.get((doctor_id, day))
+                if calendar is not None:
+                    cached[(doctor_id, day)] = calendar
+
+    fetched = {}
+    if cached:
+        versions = _versions(list(steps), start, end)
+        stale = [(doctor_id, day) for doctor_id, step in steps.items() for day in days
+                 if (calendar := cached.get((doctor_id, day))) is None
+                 or calendar.version != versions.get((doctor_id, day), 0) or calendar.step != step]
+        if stale:
+            stale_ids = {doctor_id for doctor_id, _ in stale}
+            fetched = _fetch({doctor_id: steps[doctor_id] for doctor_id in stale_ids},
+                             min(day for _, day in stale), max(day for _, day in stale))
+    else:
+        fetched = _fetch(steps, start, end)
+
+    if cache is not None:
+        for key, calendar in fetched.items():
+            cache.put(key, calendar)
+    cached.update(fetched)
+
+    calendars = {doctor_id: {} for doctor_id in steps}
+    for (doctor_id, day), calendar in cached.items():
+        calendars[doctor_id][day] = calendar
+    return calendars
+
+def slot_taken(doctor_id, day, time, session=None):
+    """
+    True if the cache shows an active booking at exactly this slot and its
+    version is confirmed current. False when unsure: the unique slot index
+    stays the authority, this only spares a doomed INSERT.
+    """
+    cache, minutes = current_cache(), to_minutes(time)
+    if cache is None or minutes is None:
+        return False
+    key = (doctor_id, day)
+    calendar = cache.get(key)
+    if calendar is None or not calendar.booked(minutes):
+        return False
+    session = session or db.session
+    version = session.scalar(db.select(ScheduleVersion.version).where(
+        ScheduleVersion.doctor_id == doctor_id, ScheduleVersion.date == day)) or 0
+    if version == calendar.version:
+        return True
+    cache.discard(key)
+    return False
+
+# ---- versioning ----
+
+def bump_versions(conn, keys):
+    """Bump the version of each (doctor_id, date) in keys (new rows start at 1); returns {key: version}"""
+    table = ScheduleVersion.__table__
+    keys = list(keys)
+    if not keys:
+        return {}
+    insert = UPSERT_INSERTS.get(conn.dialect.name)
+    if insert is not None:
+        # Missing rows are created at 0 first, so concurrent first bumps of a
+        # key cannot both insert it
+        for start in range(0, len(keys), 500):
+            conn.execute(insert(table).values([{'doctor_id': doctor_id, 'date': day, 'version': 0}
+                                               for doctor_id, day in keys[start:start + 500]])
+                         .on_conflict_do_nothing(index_elements=['doctor_id', 'date']))
+    conn.execute(table.update().where(table.c.doctor_id == db.bindparam('_doctor_id'),
+                                      table.c.date == db.bindparam('_date')).values(version=table.c.version + 1),
+                 [{'_doctor_id': doctor_id, '_date': day} for doctor_id, day in keys])
+    wanted, versions = set(keys), {}
+    doctor_ids = sorted({doctor_id for doctor_id, _ in keys})
+    first, last = min(day for _, day in keys), max(day for _, day in keys)
+    for start in range(0, len(doctor_ids), 500):
+        for doctor_id, day, version in conn.execute(db.select(table.c.doctor_id, table.c.date, table.c.version).where(
+                table.c.doctor_id.in_(doctor_ids[start:start + 500]), table.c.date.between(first, last))):
+            if (doctor_id, day) in wanted:
+                versions[(doctor_id, day)] = version
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        conn.execute(table.insert(), [{'doctor_id': doctor_id, 'date': day, 'version': 1} for doctor_id, day in missing])
+        versions.update((key, 1) for key in missing)
+    return versions
+
+def _before(obj, attr):
+    """Value of an attribute before the current flush"""
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, attr)
+
+def collect_changes(session):
+    """{(doctor_id, date): [('add' | 'remove', minutes) or RELOAD]} for the objects in a flush"""
+    changes = {}
+
+    def note(doctor_id, day, change):
+        if doctor_id is not None and day is not None:
+            changes.setdefault((doctor_id, day), []).append(change)
+
+    def booking(doctor_id, day, time, action):
+        minutes = to_minutes(time)
+        note(doctor_id, day, (action, minutes) if minutes is not None else RELOAD)
+
+    deleted = set(session.deleted)
+    for obj in session.new:
+        if isinstance(obj, Appointment) and obj.status in UPCOMING_STATUSES:
+            booking(obj.doctor_id, obj.appointment_date, obj.appointment_time, 'add')
+        elif isinstance(obj, DoctorAvailability):
+            note(obj.doctor_id, obj.date, RELOAD)
+
+    for obj in deleted:
+        if isinstance(obj, Appointment) and _before(obj, 'status') in UPCOMING_STATUSES:
+            booking(_before(obj, 'doctor_id'), _before(obj, 'appointment_date'),
+                    _before(obj, 'appointment_time'), 'remove')
+        elif isinstance(obj, DoctorAvailability):
+            note(_before(obj, 'doctor_id'), _before(obj, 'date'), RELOAD)
+
+    for obj in session.dirty:
+        if obj in deleted or not session.is_modified(obj):
+            continue
+        if isinstance(obj, Appointment):
+            old = tuple(_before(obj, attr) for attr in BOOKING_FIELDS)
+            new = tuple(getattr(obj, attr) for attr in BOOKING_FIELDS)
+            if old == new:
+                continue
+            if old[3] in UPCOMING_STATUSES:
+                booking(*old[:3], 'remove')
+            if new[3] in UPCOMING_STATUSES:
+                booking(*new[:3], 'add')
+        elif isinstance(obj, DoctorAvailability):
+            note(_before(obj, 'doctor_id'), _before(obj, 'date'), RELOAD)
+            note(obj.doctor_id, obj.date, RELOAD)
+
+    return changes
+
+BOOKING_FIELDS = ('doctor_id', 'appointment_date', 'appointment_time', 'status')
+TRACKED_ATTRIBUTES = tuple(getattr(Appointment, attr) for attr in BOOKING_FIELDS) + \
+    (DoctorAvailability.doctor_id, DoctorAvailability.date)
+
+def _before_flush(session, flush_context, instances):
+    """Load what _after_flush reads while deleted rows still exist"""
+    for obj in session.deleted:
+        if isinstance(obj, Appointment):
+            for attr in BOOKING_FIELDS:
+                getattr(obj, attr)
+        elif isinstance(obj, DoctorAvailability):
+            obj.doctor_id, obj.date
+
+def _after_flush(session, flush_context):
+    changes = collect_changes(session)
+    if not changes:
+        return
+    versions = bump_versions(session.connection(), changes)
+    # {key: [version before this transaction, latest version, deltas]} for _after_commit
+    pending = session.info.setdefault('schedule_changes', {})
+    for key, deltas in changes.items():
+        if key in pending:
+            pending[key][1] = versions[key]
+            pending[key][2].extend(deltas)
+        else:
+            pending[key] = [versions[key] - 1, versions[key], list(deltas)]
+
+def _after_commit(session):
+    pending = session.info.pop('schedule_changes', None)
+    cache = current_cache()
+    if not pending or cache is None:
+        return
+    for key, (before, after, deltas) in pending.items():
+        calendar = cache.get(key)
+        if calendar is None:
+            continue
+        if calendar.version != before or RELOAD in deltas:
+            cache.discard(key)
+        else:
+            cache.put(key, calendar.changed(deltas, after))
+
+def _after_rollback(session):
+    # Cached calendars are left alone; their versions still match the database
+    session.info.pop('schedule_changes', None)
+
+def _track(target, value, oldvalue, initiator):
+    return value
+
+def init_app(app):
+    """Create the app's cache and register the session hooks (once per process)"""
+    app.extensions['schedule_cache'] = ScheduleCache(app.config.get('SCHEDULE_CACHE_SIZE', 50000))
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'before_flush', _before_flush)
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
+        # Load the old value before an expired attribute is overwritten
+        for attribute in TRACKED_ATTRIBUTES:
+            event.listen(attribute, 'set', _track, active_history=True)
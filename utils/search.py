@@ -0,0 +1,220 @@
+# Full-text search index
+# SQLite FTS5 tables shadow the searchable patient and doctor fields
+# (patient_search, doctor_search; rowid = profile id). Triggers on users,
+# patients and doctors keep them in sync, so ORM writes, Core bulk inserts and
+# raw SQL all update the index.
+# Without the FTS table, search falls back to ILIKE scans over the same
+# columns: slower and unranked, but it returns the same profiles. The app
+# checks once, at startup, after the migrations (init_app). The fallback is
+# used in two cases:
+# - The database is not SQLite. Migration 4 is a no-op there, since there is
+#   no FTS5.
+# - The database is SQLite, but the FTS tables are missing even though
+#   migration 4 is recorded. Examples: a restore from a copy that left out
+#   the virtual tables, or tables dropped by hand.
+# Without the fallback, every search would fail with "no such table" until
+# someone recreated the index. Recreating the tables (SearchIndex.create)
+# takes effect on the next restart.
+#
+# Every query token matches as a prefix ("smi" finds "smith"). A token that is
+# not the prefix of any indexed term is treated as a typo and replaced by its
+# one-edit variants that are ("jhon" searches "john" and "jon").
+# Matches are ranked by per-column weights (name first), whole words above
+# prefixes. This is scored in Python over at most RANK_LIMIT rows: FTS5's
+# bm25 reads the whole doclist of every term (all of "555" for a phone
+# search) and costs tens of milliseconds at 1M rows even for a handful of hits.
+
+import re
+from flask import current_app
+from sqlalchemy import inspect, or_
+from app import db
+from models.user import User
+from models.doctor import Doctor
+from models.patient import Patient
+
+TOKEN = re.compile(r'[^\W_]+')  # what FTS5's unicode61 tokenizer keeps
+FUZZY_MIN_LENGTH = 4  # shorter unknown tokens are not corrected
+RANK_LIMIT = 500  # above this many matches ranking is skipped; newest first instead
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+DIGITS = '0123456789'
+
+def _edits(token, position):
+    """One-edit variants of token (delete, transpose, replace, insert) around position"""
+    alphabet = LETTERS if token.isalpha() else DIGITS if token.isdigit() else LETTERS + DIGITS
+    variants = set()
+    for i in range(max(0, position - 1), min(len(token), position + 1)):
+        head, tail = token[:i], token[i:]
+        variants.add(head + tail[1:])
+        if len(tail) > 1:
+            variants.add(head + tail[1] + tail[0] + tail[2:])
+        for char in alphabet:
+            variants.add(head + char + tail[1:])
+            variants.add(head + char + tail)
+    variants.discard(token)
+    return sorted(variants)
+
+class SearchIndex:
+    """An FTS5 table over a profile's users columns and its own columns"""
+
+    def __init__(self, name, model, user_fields, own_fields, weights):
+        self.name = name
+        self.model = model
+        self.user_fields = user_fields
+        self.own_fields = own_fields
+        self.fields = user_fields + own_fields
+        self.weights = weights
+        self.table = db.table(name, db.column('rowid'), db.column(name))
+
+    def available(self):
+        """True if the database had this index's FTS table when the app started (else search() uses ILIKE)"""
+        return self.name in current_app.extensions.get('search_indexes', ())
+
+    # ---- schema ----
+
+    def _insert_sql(self, where):
+        """INSERT the index rows for the profiles matching where (p = profile, u = users)"""
+        values = [f'u.{field}' for field in self.user_fields] + [f'p.{field}' for field in self.own_fields]
+        return (f'INSERT INTO {self.name}(rowid, {", ".join(self.fields)}) '
+                f'SELECT p.id, {", ".join(values)} FROM {self.model.__tablename__} p '
+                f'JOIN users u ON u.id = p.user_id WHERE {where}')
+
+    def ddl(self):
+        """FTS5 table, vocabulary view and the sync triggers"""
+        name, profile = self.name, self.model.__tablename__
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5({', '.join(self.fields)}, prefix='2 3')",
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {name}_vocab USING fts5vocab({name}, 'row')",
+            f"CREATE TRIGGER IF NOT EXISTS {name}_insert AFTER INSERT ON {profile} BEGIN "
+            f"{self._insert_sql('p.id = NEW.id')}; END",
+            f"CREATE TRIGGER IF NOT EXISTS {name}_update AFTER UPDATE OF {', '.join(('user_id',) + self.own_fields)} "
+            f"ON {profile} BEGIN DELETE FROM {name} WHERE rowid = OLD.id; {self._insert_sql('p.id = NEW.id')}; END",
+            f"CREATE TRIGGER IF NOT EXISTS {name}_delete AFTER DELETE ON {profile} BEGIN "
+            f"DELETE FROM {name} WHERE rowid = OLD.id; END",
+            f"CREATE TRIGGER IF NOT EXISTS {name}_user_update AFTER UPDATE OF {', '.join(self.user_fields)} "
+            f"ON users BEGIN DELETE FROM {name} WHERE rowid IN (SELECT id FROM {profile} WHERE user_id = NEW.id); "
+            f"{self._insert_sql('p.user_id = NEW.id')}; END",
+        ]
+
+    def create(self, conn):
+        """Create the index and fill it from the existing rows"""
+        for statement in self.ddl():
+            conn.exec_driver_sql(statement)
+        self.rebuild(conn)
+
+    def rebuild(self, conn):
+        """Refill the index from the profile and users tables"""
+        conn.exec_driver_sql(f'DELETE FROM {self.name}')
+        conn.exec_driver_sql(self._insert_sql('1'))
+
+    # ---- queries ----
+
+    def _has_prefix(self, prefix):
+        return db.session.execute(
+            db.text(f'SELECT 1 FROM {self.name} WHERE {self.name} MATCH :term LIMIT 1'),
+            {'term': f'"{prefix}"*'},
+        ).first() is not None
+
+    def _known(self, candidates, prefix):
+        """The candidates that are (or begin, with prefix=True) an indexed term, in one statement"""
+        params = {f'c{i}': candidate for i, candidate in enumerate(candidates)}
+        rows = ', '.join(f'(:{key})' for key in params)
+        condition = 'term >= t AND term < t || char(1114111)' if prefix else 'term = t'
+        return db.session.scalars(db.text(
+            f'WITH c(t) AS (VALUES {rows}) SELECT t FROM c WHERE EXISTS '
+            f'(SELECT 1 FROM {self.name}_vocab WHERE {condition})'
+        ), params).all()
+
+    def _corrections(self, token):
+        """Prefix terms to search for token: itself, or its known one-edit variants"""
+        if len(token) < FUZZY_MIN_LENGTH or self._has_prefix(token):
+            return [token]
+        # Longest prefix of token that some term starts with; the typo is right
+        # after it. One-letter prefixes are not probed (no prefix index for them).
+        known, unknown = 1, len(token)
+        while unknown - known > 1:
+            middle = (known + unknown) // 2
+            if self._has_prefix(token[:middle]):
+                known = middle
+            else:
+                unknown = middle
+        # Whole-word corrections are cheaper to check than prefixes of longer words
+        variants = _edits(token, known)
+        return self._known(variants, prefix=False) or self._known(variants, prefix=True) or [token]
+
+    def _hits(self, groups):
+        """FTS rows (id and fields) matching every group of alternative prefix terms"""
+        expression = ' AND '.join('(' + ' OR '.join(f'"{term}"*' for term in terms) + ')' for terms in groups)
+        columns = [self.table.c.rowid.label('id')] + [db.column(field) for field in self.fields]
+        return db.select(*columns).select_from(self.table).where(
+            self.table.c[self.name].match(expression)).subquery()
+
+    def _score(self, values, groups):
+        """Weighted field score: a whole-word hit counts twice a prefix hit"""
+        score = 0.0
+        for weight, value in zip(self.weights, values):
+            words = TOKEN.findall(value.lower()) if value else ()
+            for terms in groups:
+                if any(word in terms for word in words):
+                    score += 2 * weight
+                elif any(word.startswith(term) for word in words for term in terms):
+                    score += weight
+        return score
+
+    def _like_filter(self, text):
+        like = f'%{text}%'
+        columns = [getattr(User, field) for field in self.user_fields] + \
+                  [getattr(self.model, field) for field in self.own_fields]
+        return or_(*[column.ilike(like) for column in columns])
+
+    def _candidates(self, query, groups):
+        """(id, score) for up to RANK_LIMIT matches in query, or None if there are more"""
+        hits = self._hits(groups)
+        rows = query.join(hits, hits.c.id == self.model.id).with_entities(
+            hits.c.id, *[hits.c[field] for field in self.fields]).limit(RANK_LIMIT + 1).all()
+        if len(rows) > RANK_LIMIT:
+            return None
+        return [(row[0], self._score(row[1:], groups)) for row in rows]
+
+    def search(self, query, text, limit):
+        """
+        The first limit profiles in query (which must already join User) that
+        match text, best match first. Up to RANK_LIMIT matches are ranked in
+        Python; beyond that the newest matches come first.
+        """
+        if not self.available():
+            return query.filter(self._like_filter(text)).limit(limit)
+
+        tokens = TOKEN.findall(text.lower())
+        if not tokens:
+            return query.filter(db.false())
+
+        # Typo correction only runs when the plain prefix search finds nothing
+        exact = [[token] for token in tokens]
+        groups, candidates = exact, self._candidates(query, exact)
+        if candidates == [] and any(len(token) >= FUZZY_MIN_LENGTH for token in tokens):
+            groups = [self._corrections(token) for token in tokens]
+            if groups != exact:
+                candidates = self._candidates(query, groups)
+
+        if candidates is None:
+            hits = self._hits(groups)
+            return query.join(hits, hits.c.id == self.model.id).order_by(hits.c.id.desc()).limit(limit)
+        ids = [id_ for id_, score in sorted(candidates, key=lambda hit: (-hit[1], -hit[0]))[:limit]]
+        if not ids:
+            return query.filter(db.false())
+        return query.filter(self.model.id.in_(ids)).order_by(
+            db.case({id_: position for position, id_ in enumerate(ids)}, value=self.model.id, else_=len(ids)))
+
+patient_index = SearchIndex('patient_search', Patient, ('username', 'email'), ('phone', 'alternate_phone'),
+                            weights=(10.0, 5.0, 2.0, 2.0))
+doctor_index = SearchIndex('doctor_search', Doctor, ('username', 'email'), ('specialization', 'qualification'),
+                           weights=(10.0, 3.0, 5.0, 2.0))
+
+INDEXES = [patient_index, doctor_index]
+
+def init_app(app):
+    """Note which FTS tables exist, after the migrations (call inside an app context)"""
+    present = set()
+    if db.engine.dialect.name == 'sqlite':
+        present = set(inspect(db.engine).get_table_names()) & {index.name for index in INDEXES}
+    app.extensions['search_indexes'] = present
@@ -0,0 +1,174 @@
+# Model serializers for the JSON API
+# Each serializer declares the relationships its dump() touches as loader
+# options. apply() adds them to a query so a page of rows is serialized in a
+# constant number of queries instead of several lazy loads per row.
+
+from abc import ABC, abstractmethod
+from sqlalchemy.orm import joinedload
+from models.doctor import Doctor
+from models.patient import Patient
+from models.appointment import Appointment
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+class Serializer(ABC):
+    """Base class: subclasses implement dump() and declare its load_options()"""
+
+    def load_options(self):
+        """Loader options for every relationship dump() reads"""
+        return []
+
+    def apply(self, query):
+        """Add the eager-load options to a query"""
+        return query.options(*self.load_options())
+
+    @abstractmethod
+    def dump(self, obj):
+        """The object as a JSON-ready dict"""
+
+    def dump_many(self, objs):
+        return [self.dump(obj) for obj in objs]
+
+class DoctorSerializer(Serializer):
+    def __init__(self, include_user=True):
+        self.include_user = include_user
+
+    def load_options(self):
+        options = [joinedload(Doctor.department)]
+        if self.include_user:
+            options.append(joinedload(Doctor.user))
+        return options
+
+    def dump(self, doctor):
+        data = {
+            'id': doctor.id,
+            'phone': doctor.phone,
+            'license_number': doctor.license_number,
+            'experience_years': doctor.experience_years,
+            'qualification': doctor.qualification,
+            'specialization': doctor.specialization,
+            'bio': doctor.bio,
+            'consultation_fees': doctor.consultation_fees,
+            'rating': doctor.rating,
+            'total_patients': doctor.total_patients,
+            'total_appointments': doctor.total_appointments,
+            'is_available': doctor.is_available,
+            'clinic_name': doctor.clinic_name,
+            'working_days': doctor.working_days,
+            'morning_slot_start': doctor.morning_slot_start,
+            'morning_slot_end': doctor.morning_slot_end,
+            'evening_slot_start': doctor.evening_slot_start,
+            'evening_slot_end': doctor.evening_slot_end,
+            'avg_consultation_time': doctor.avg_consultation_time,
+            'created_at': _isoformat(doctor.created_at),
+        }
+
+        if self.include_user and doctor.user:
+            data['user'] = {
+                'id': doctor.user.id,
+                'username': doctor.user.username,
+                'email': doctor.user.email,
+                'is_active': doctor.user.is_active
+            }
+
+        if doctor.department:
+            data['department'] = {
+                'id': doctor.department.id,
+                'name': doctor.department.name
+            }
+
+        return data
+
+class PatientSerializer(Serializer):
+    def __init__(self, include_user=True):
+        self.include_user = include_user
+
+    def load_options(self):
+        return [joinedload(Patient.user)] if self.include_user else []
+
+    def dump(self, patient):
+        data = {
+            'id': patient.id,
+            'phone': patient.phone,
+            'alternate_phone': patient.alternate_phone,
+            'date_of_birth': _isoformat(patient.date_of_birth),
+            'gender': patient.gender,
+            'blood_group': patient.blood_group,
+            'address': patient.address,
+            'city': patient.city,
+            'pincode': patient.pincode,
+            'medical_history': patient.medical_history,
+            'allergies': patient.allergies,
+            'insurance_provider': patient.insurance_provider,
+            'insurance_id': patient.insurance_id,
+            'emergency_contact': patient.emergency_contact,
+            'emergency_contact_name': patient.emergency_contact_name,
+            'enable_notifications': patient.enable_notifications,
+            'notification_preference': patient.notification_preference,
+            'last_visit': _isoformat(patient.last_visit),
+            'total_visits': patient.total_visits,
+            'total_spent': patient.total_spent,
+            'created_at': _isoformat(patient.created_at),
+        }
+
+        if self.include_user and patient.user:
+            data['user'] = {
+                'id': patient.user.id,
+                'username': patient.user.username,
+                'email': patient.user.email,
+                'is_active': patient.user.is_active
+            }
+
+        return data
+
+class AppointmentSerializer(Serializer):
+    def __init__(self, include_relations=True):
+        self.include_relations = include_relations
+
+    def load_options(self):
+        if not self.include_relations:
+            return []
+        doctor = joinedload(Appointment.doctor)
+        return [
+            joinedload(Appointment.patient).joinedload(Patient.user),
+            doctor.joinedload(Doctor.user),
+            doctor.joinedload(Doctor.department),
+        ]
+
+    def dump(self, appointment):
+        data = {
+            'id': appointment.id,
+            'patient_id': appointment.patient_id,
+            'doctor_id': appointment.doctor_id,
+            'appointment_date': _isoformat(appointment.appointment_date),
+            'appointment_time': appointment.appointment_time,
+            'status': appointment.status,
+            'notes': appointment.notes,
+            'queue_position': appointment.queue_position,
+            'reminder_sent': appointment.reminder_sent,
+            'appointment_type': appointment.appointment_type,
+            'consultation_fees': appointment.consultation_fees,
+            'payment_status': appointment.payment_status,
+            'is_confirmed': appointment.is_confirmed,
+            'created_at': _isoformat(appointment.created_at),
+        }
+
+        if self.include_relations:
+            if appointment.patient and appointment.patient.user:
+                data['patient'] = {
+                    'id': appointment.patient.id,
+                    'name': appointment.patient.user.username,
+                    'email': appointment.patient.user.email,
+                    'phone': appointment.patient.phone
+                }
+
+            if appointment.doctor and appointment.doctor.user:
+                data['doctor'] = {
+                    'id': appointment.doctor.id,
+                    'name': appointment.doctor.user.username,
+                    'specialization': appointment.doctor.specialization,
+                    'department': appointment.doctor.department.name if appointment.doctor.department else None
+                }
+
+        return data
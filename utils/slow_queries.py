@@ -0,0 +1,152 @@
+# Slow-query log
+# Every statement is timed with the engine's before/after_cursor_execute
+# events. One that takes SLOW_QUERY_MS or longer is logged and kept in a
+# per-process ring buffer (the last SLOW_QUERY_BUFFER_SIZE), with its bound
+# parameters, the endpoint and blueprint of the request that ran it, the
+# innermost application frame that issued it and its query plan: EXPLAIN
+# QUERY PLAN on SQLite, EXPLAIN on PostgreSQL. /admin/slow-queries lists them.
+#
+# The time is that of cursor.execute(). On SQLite that covers sorting and
+# grouping (the first row is only ready once they are done) but not the rest
+# of a plain scan, which happens while the rows are fetched.
+#
+# The plan is read on a separate DBAPI cursor of the same connection, so it
+# bypasses the engine events and leaves the slow statement's rows unread.
+# Only statements that EXPLAIN does not run are explained.
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+from app import db
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN = {'sqlite': 'EXPLAIN QUERY PLAN ', 'postgresql': 'EXPLAIN '}
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+MAX_PARAMETERS_LENGTH = 2000
+
+SlowQuery = namedtuple('SlowQuery', 'recorded_at duration_ms statement parameters endpoint blueprint method path '
+                                    'frame plan')
+
+class SlowQueryLog:
+    """The most recent slow statements of one process, newest first"""
+
+    def __init__(self, threshold_ms, size=100, explain=True, root=None):
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self.root = os.path.join(os.path.abspath(root or os.getcwd()), '')
+        self.total = 0
+        self._entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def entries(self):
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total = 0
+
+    def record(self, cursor, statement, parameters, executemany, seconds):
+        endpoint = blueprint = method = path = None
+        if has_request_context():
+            endpoint, blueprint, method, path = request.endpoint, request.blueprint, request.method, request.path
+        plan = None
+        if self.explain and not executemany and statement.lstrip().upper().startswith(EXPLAINABLE):
+            plan = explain(cursor, statement, parameters)
+        entry = SlowQuery(datetime.now(), round(seconds * 1000, 2), statement,
+                          repr(parameters)[:MAX_PARAMETERS_LENGTH], endpoint, blueprint, method, path,
+                          self.calling_frame(), plan)
+        with self._lock:
+            self._entries.append(entry)
+            self.total += 1
+        logger.warning('Slow query (%.1f ms) in %s from %s: %s\nparameters: %s\nplan:\n%s',
+                       entry.duration_ms, endpoint or '-', entry.frame or '-', statement, entry.parameters,
+                       plan or '-')
+        return entry
+
+    def calling_frame(self):
+        """'path:line in function' of the innermost frame in the application's own code"""
+        frame = sys._getframe(1)
+        while frame is not None:
+            filename = frame.f_code.co_filename  # '<...>' for generated code
+            if filename.startswith(self.root) and filename != __file__ and 'site-packages' not in filename:
+                return f'{os.path.relpath(filename, self.root)}:{frame.f_lineno} in {frame.f_code.co_name}'
+            frame = frame.f_back
+        return None
+
+def explain(cursor, statement, parameters):
+    """The statement's query plan as text, read on a fresh cursor of the same DBAPI connection"""
+    dbapi_connection = cursor.connection
+    prefix = EXPLAIN.get(_dialect_of(dbapi_connection))
+    if prefix is None:
+        return None
+    plan_cursor = dbapi_connection.cursor()
+    try:
+        plan_cursor.execute(prefix + statement, parameters)
+        rows = plan_cursor.fetchall()
+    except Exception as e:
+        return f'(EXPLAIN failed: {type(e).__name__}: {e})'
+    finally:
+        plan_cursor.close()
+    if prefix == EXPLAIN['sqlite']:
+        return format_sqlite_plan(rows)
+    return '\n'.join(row[0] for row in rows)
+
+def format_sqlite_plan(rows):
+    """EXPLAIN QUERY PLAN rows (id, parent, notused, detail) as an indented tree, like the sqlite3 shell"""
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node] + detail)
+    return '\n'.join(lines)
+
+def _dialect_of(dbapi_connection):
+    module = type(dbapi_connection).__module__
+    if module.startswith('sqlite3'):
+        return 'sqlite'
+    if module.startswith('psycopg'):
+        return 'postgresql'
+    return None
+
+def current_slow_queries():
+    """The app's SlowQueryLog, or None when SLOW_QUERY_MS is off"""
+    return current_app.extensions.get('slow_queries')
+
+# ---- hooks ----
+
+def _listeners(log):
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._slow_query_started = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_slow_query_started', None)
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        if seconds >= log.threshold:
+            log.record(cursor, statement, parameters, executemany, seconds)
+
+    return before_cursor_execute, after_cursor_execute
+
+def init_app(app):
+    """Time every statement on the app's engines unless SLOW_QUERY_MS is None or 0 (call inside an app context)"""
+    threshold = app.config.get('SLOW_QUERY_MS')
+    if not threshold:
+        return
+    log = app.extensions['slow_queries'] = SlowQueryLog(
+        threshold, size=app.config.get('SLOW_QUERY_BUFFER_SIZE', 100),
+        explain=app.config.get('SLOW_QUERY_EXPLAIN', True), root=app.root_path)
+    before, after = _listeners(log)
+    for engine in db.engines.values():
+        event.listen(engine, 'before_cursor_execute', before)
+        event.listen(engine, 'after_cursor_execute', after)
@@ -0,0 +1,33 @@
+# SQLite engine profile
+# Applies the SQLITE_PRAGMAS setting to every new DBAPI connection through the
+# engine's connect event, so pooled connections all share the same journal
+# mode, sync level, busy timeout and cache sizing.
+
+from flask import current_app
+from sqlalchemy import event
+from app import db
+
+def _pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+    return set_pragmas
+
+def current_pragmas(names=None):
+    """PRAGMA values as a connection from the pool sees them"""
+    names = names or list(current_app.config.get('SQLITE_PRAGMAS') or {})
+    with db.engine.connect() as conn:
+        return {name: conn.exec_driver_sql(f'PRAGMA {name}').scalar() for name in names}
+
+def init_app(app):
+    """Register the PRAGMA hook on the app's SQLite engines (call inside an app context)"""
+    pragmas = dict(app.config.get('SQLITE_PRAGMAS') or {})
+    if not pragmas:
+        return
+    for engine in db.engines.values():
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', _pragma_listener(pragmas))
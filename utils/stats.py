@@ -0,0 +1,142 @@
+# Dashboard statistics
+# Shared by admin.dashboard and api.get_stats. KPIs are read from the
+# stats_counters table, which utils/counters.py keeps current on every flush.
+# compute_counters() derives the same values from grouped aggregates and is
+# used to rebuild and verify the stored counters.
+# The upcoming KPI depends on today's date, so it is stored as one bucket per
+# appointment date (appointments.upcoming.<ISO date>: Booked/Confirmed visits
+# on that day) and summed over the buckets from today on. Past buckets are
+# kept; they are never read, and rebuild-stats recomputes them.
+
+from datetime import datetime
+from sqlalchemy import case, literal, null, or_, union_all
+from app import db
+from models.user import User
+from models.doctor import Doctor
+from models.patient import Patient
+from models.appointment import Appointment
+from models.department import Department
+from models.treatment import Treatment
+from models.stats_counter import StatsCounter
+
+UPCOMING_STATUSES = ('Booked', 'Confirmed')
+
+UPCOMING_PREFIX = 'appointments.upcoming.'
+# Sorts after every ISO date, closing the key range of the upcoming buckets
+UPCOMING_END = UPCOMING_PREFIX + '~'
+
+def status_key(status):
+    return f'appointments.status.{status or "Unknown"}'
+
+def upcoming_key(day):
+    return f'{UPCOMING_PREFIX}{day.isoformat()}'
+
+def department_key(department_id):
+    return f'departments.{department_id}.doctors'
+
+def _totals_query():
+    """
+    (label, day, count, extra) rows: one per appointment status and date, plus
+    patients and treatments
+    """
+    appointments = db.select(
+        Appointment.status.label('label'),
+        Appointment.appointment_date.label('day'),
+        db.func.count().label('total'),
+        literal(0).label('extra'),
+    ).group_by(Appointment.status, Appointment.appointment_date)
+
+    patients = db.select(
+        literal('__patients').label('label'),
+        null().label('day'),
+        db.func.count().label('total'),
+        db.func.sum(case((User.is_active == True, 1), else_=0)).label('extra'),
+    ).select_from(Patient).join(User, User.id == Patient.user_id, isouter=True)
+
+    treatments = db.select(
+        literal('__treatments').label('label'),
+        null().label('day'),
+        db.func.count().label('total'),
+        literal(0).label('extra'),
+    ).select_from(Treatment)
+
+    return union_all(appointments, patients, treatments)
+
+def _doctors_query():
+    """Doctors and active doctors per department"""
+    return db.select(
+        Doctor.department_id,
+        db.func.count().label('doctors'),
+        db.func.sum(case((User.is_active == True, 1), else_=0)).label('active_doctors'),
+    ).select_from(Doctor).join(
+        User, User.id == Doctor.user_id, isouter=True
+    ).group_by(Doctor.department_id)
+
+def compute_counters(conn=None):
+    """Recompute every counter from scratch with two grouped aggregates"""
+    execute = (conn or db.session).execute
+    counters = {
+        'doctors.total': 0, 'doctors.active': 0,
+        'patients.total': 0, 'patients.active': 0,
+        'treatments.total': 0,
+    }
+
+    for label, day, total, extra in execute(_totals_query()):
+        if label == '__patients':
+            counters['patients.total'] = total
+            counters['patients.active'] = int(extra or 0)
+        elif label == '__treatments':
+            counters['treatments.total'] = total
+        else:
+            counters[status_key(label)] = counters.get(status_key(label), 0) + total
+            if label in UPCOMING_STATUSES:
+                key = upcoming_key(day)
+                counters[key] = counters.get(key, 0) + total
+
+    for department_id, doctors, active in execute(_doctors_query()):
+        counters[department_key(department_id)] = doctors
+        counters['doctors.total'] += doctors
+        counters['doctors.active'] += int(active or 0)
+
+    return counters
+
+def read_counters(today):
+    """Stored counters plus the upcoming buckets from today on, summed, in one round trip"""
+    # Both are primary key ranges on stats_counters; the buckets are skipped in `stored`
+    upcoming = db.select(
+        literal('__upcoming').label('key'),
+        db.func.coalesce(db.func.sum(StatsCounter.value), 0).label('value'),
+    ).where(StatsCounter.key.between(upcoming_key(today), UPCOMING_END))
+    stored = db.select(StatsCounter.key, StatsCounter.value).where(
+        or_(StatsCounter.key < UPCOMING_PREFIX, StatsCounter.key > UPCOMING_END))
+    return dict(db.session.execute(union_all(stored, upcoming)).all())
+
+def dashboard_stats(today=None):
+    """Dashboard KPIs from the materialised counters in two round trips"""
+    counters = read_counters(today or datetime.today().date())
+    by_status = {
+        key[len('appointments.status.'):]: value
+        for key, value in counters.items()
+        if key.startswith('appointments.status.') and value
+    }
+
+    departments = [
+        {'id': dept_id, 'name': name, 'doctors': counters.get(department_key(dept_id), 0)}
+        for dept_id, name in db.session.execute(
+            db.select(Department.id, Department.name).order_by(Department.id))
+    ]
+
+    return {
+        'doctors': {'total': counters.get('doctors.total', 0), 'active': counters.get('doctors.active', 0)},
+        'patients': {'total': counters.get('patients.total', 0), 'active': counters.get('patients.active', 0)},
+        'appointments': {
+            'total': sum(by_status.values()),
+            'booked': by_status.get('Booked', 0),
+            'completed': by_status.get('Completed', 0),
+            'cancelled': by_status.get('Cancelled', 0),
+            'upcoming': counters.get('__upcoming', 0),
+            'by_status': by_status,
+        },
+        'treatments': {'total': counters.get('treatments.total', 0)},
+        'departments': departments,
+    }